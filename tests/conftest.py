@@ -0,0 +1,5 @@
+import os
+import sys
+
+# georef_core.py lives next to the add-on snippets in tools/, not in a package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools"))
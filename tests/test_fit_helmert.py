@@ -0,0 +1,100 @@
+import math
+
+import pytest
+
+np = pytest.importorskip("numpy")
+georef_core = pytest.importorskip("georef_core")
+
+TRUE = {"eastings": 440123.456, "northings": 4470987.654, "orthogonal_height": 652.3,
+        "scale": 1.0002, "rotation_deg": 12.5}
+
+
+def _to_map(local):
+    theta = math.radians(TRUE["rotation_deg"])
+    a, b = TRUE["scale"] * math.cos(theta), TRUE["scale"] * math.sin(theta)
+    return np.column_stack([
+        a * local[:, 0] - b * local[:, 1] + TRUE["eastings"],
+        b * local[:, 0] + a * local[:, 1] + TRUE["northings"],
+        TRUE["scale"] * local[:, 2] + TRUE["orthogonal_height"],
+    ])
+
+
+def _control_points(count=20, outlier_share=0.3, seed=7):
+    rng = np.random.default_rng(seed)
+    local = np.column_stack([rng.uniform(-200, 200, count), rng.uniform(-150, 150, count), rng.uniform(0, 40, count)])
+    target = _to_map(local) + rng.normal(0.0, 0.002, (count, 3))
+    bad = rng.choice(count, int(round(count * outlier_share)), replace=False)
+    target[bad] += rng.choice([-1.0, 1.0], (len(bad), 3)) * rng.uniform(5.0, 25.0, (len(bad), 3))
+    flags = np.zeros(count, dtype=bool)
+    flags[bad] = True
+    return local, target, flags
+
+
+def _position_error(fit):
+    # Error of the fitted transform at the corners of the survey area, in map units
+    corners = np.array([[-200.0, -150.0, 0.0], [200.0, -150.0, 0.0], [200.0, 150.0, 40.0], [-200.0, 150.0, 40.0]])
+    mc = fit["map_conversion"]
+    theta = math.atan2(mc["x_axis_ordinate"], mc["x_axis_abscissa"])
+    a, b = mc["scale"] * math.cos(theta), mc["scale"] * math.sin(theta)
+    fitted = np.column_stack([a * corners[:, 0] - b * corners[:, 1] + mc["eastings"],
+                              b * corners[:, 0] + a * corners[:, 1] + mc["northings"],
+                              mc["scale"] * corners[:, 2] + mc["orthogonal_height"]])
+    return float(np.abs(fitted - _to_map(corners)).max())
+
+
+@pytest.mark.parametrize("robust", ["huber", "tukey"])
+def test_robust_fit_ignores_gross_outliers(robust):
+    local, target, flags = _control_points()
+    fit = georef_core.fit_helmert(local, target, robust=robust)
+    assert _position_error(fit) < 0.01
+    assert fit["rotation_deg"] == pytest.approx(TRUE["rotation_deg"], abs=1e-4)
+    assert fit["map_conversion"]["scale"] == pytest.approx(TRUE["scale"], abs=1e-5)
+    assert fit["converged"]
+    assert np.array_equal(fit["outliers"], flags)
+    assert fit["rmse"]["horizontal"] < 0.01
+
+
+def test_plain_least_squares_is_pulled_by_outliers():
+    local, target, _ = _control_points()
+    fit = georef_core.fit_helmert(local, target, robust="none")
+    assert _position_error(fit) > 1.0
+    assert not fit["outliers"].any()
+
+
+@pytest.mark.parametrize("robust", ["none", "huber", "tukey"])
+def test_two_points_give_the_exact_transform(robust):
+    local = np.array([[0.0, 0.0, 0.0], [30.0, 40.0, 3.0]])
+    fit = georef_core.fit_helmert(local, _to_map(local), robust=robust)
+    mc = fit["map_conversion"]
+    assert mc["eastings"] == pytest.approx(TRUE["eastings"], abs=1e-6)
+    assert mc["northings"] == pytest.approx(TRUE["northings"], abs=1e-6)
+    assert mc["orthogonal_height"] == pytest.approx(TRUE["orthogonal_height"], abs=1e-6)
+    assert mc["scale"] == pytest.approx(TRUE["scale"], abs=1e-9)
+    assert fit["rotation_deg"] == pytest.approx(TRUE["rotation_deg"], abs=1e-7)
+    assert not fit["outliers"].any()
+
+
+def test_two_points_without_scale_keep_unit_scale():
+    local = np.array([[0.0, 0.0], [30.0, 40.0]])
+    target = _to_map(np.column_stack([local, np.zeros(2)]))[:, :2]
+    fit = georef_core.fit_helmert(local, target, robust="none", fit_scale=False)
+    assert fit["map_conversion"]["scale"] == pytest.approx(1.0)
+    assert fit["rotation_deg"] == pytest.approx(TRUE["rotation_deg"], abs=1e-6)
+
+
+@pytest.mark.parametrize("robust", ["none", "huber", "tukey"])
+def test_coincident_local_points_are_rejected(robust):
+    local = np.array([[5.0, 5.0, 0.0]] * 4)
+    target = np.array([[440000.0, 4470000.0, 650.0], [440010.0, 4470000.0, 650.0],
+                       [440000.0, 4470010.0, 650.0], [440010.0, 4470010.0, 650.0]])
+    with pytest.raises(ValueError, match="single local position"):
+        georef_core.fit_helmert(local, target, robust=robust)
+
+
+def test_invalid_input_is_rejected():
+    with pytest.raises(ValueError, match="At least 2"):
+        georef_core.fit_helmert([[0.0, 0.0]], [[1.0, 1.0]])
+    with pytest.raises(ValueError, match="map points"):
+        georef_core.fit_helmert([[0.0, 0.0], [1.0, 0.0]], [[1.0, 1.0]])
+    with pytest.raises(ValueError, match="robust"):
+        georef_core.fit_helmert([[0.0, 0.0], [1.0, 0.0]], [[1.0, 1.0], [2.0, 1.0]], robust="ransac")
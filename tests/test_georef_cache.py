@@ -0,0 +1,59 @@
+import pytest
+
+ifcopenshell = pytest.importorskip("ifcopenshell")
+pytest.importorskip("ifcopenshell.api")
+georef_core = pytest.importorskip("georef_core")
+georef_bench = pytest.importorskip("georef_bench")
+
+
+@pytest.fixture
+def model(tmp_path):
+    path = str(tmp_path / "model.ifc")
+    georef_bench.write_synthetic_ifc(path, schema="IFC4", elements=20, operations=1)
+    return ifcopenshell.open(path)
+
+
+def test_cache_hit_while_unchanged(model):
+    assert not georef_core.cached_georeferencing_info(model)["from_cache"]
+    assert georef_core.cached_georeferencing_info(model)["from_cache"]
+    assert georef_core.model_revision(model) == georef_core.model_revision(model)
+
+
+def test_attribute_edit_outside_a_transaction_is_seen(model):
+    before = georef_core.cached_georeferencing_info(model)["map_conversion"]["eastings"]
+    conversion = model.by_type("IfcMapConversion")[0]
+    ifcopenshell.api.run("attribute.edit_attributes", model, product=conversion,
+                         attributes={"Eastings": before + 123.0})
+    info = georef_core.cached_georeferencing_info(model)
+    assert not info["from_cache"]
+    assert info["map_conversion"]["eastings"] == pytest.approx(before + 123.0)
+
+
+def test_site_placement_edit_is_seen(model):
+    georef_core.cached_georeferencing_info(model)
+    model.by_type("IfcSite")[0].ObjectPlacement.RelativePlacement.Location.Coordinates = (5.0, 6.0, 7.0)
+    info = georef_core.cached_georeferencing_info(model)
+    assert not info["from_cache"]
+    assert info["site"]["local_placement_origin"] == [5.0, 6.0, 7.0]
+
+
+def test_snapshot_serves_an_edit_made_outside_a_transaction(model):
+    store = georef_core.SnapshotStore()
+    store.after_command(model, "get_ifc_georeferencing_info")
+    before = store.serve("get_ifc_georeferencing_info", {})["map_conversion"]["eastings"]
+
+    # What execute_blender_code or another add-on handler may do, then the add-on's post-command hook
+    model.by_type("IfcMapConversion")[0].Eastings = before + 50.0
+    store.after_command(model, "execute_blender_code")
+
+    assert store.serve("get_ifc_georeferencing_info", {})["map_conversion"]["eastings"] == pytest.approx(before + 50.0)
+    result = store.serve("transform_ifc_coordinates", {"points": [[0.0, 0.0, 0.0]]})
+    assert result["success"], result
+    assert result["points"][0][0] == pytest.approx(before + 50.0)
+
+
+def test_snapshot_read_commands_reuse_the_snapshot(model):
+    store = georef_core.SnapshotStore()
+    first = store.after_command(model, "get_ifc_georeferencing_info")
+    assert store.after_command(model, "transform_ifc_coordinates") is first
+    assert store.after_command(model, "georeference_ifc_model") is not first
@@ -0,0 +1,40 @@
+import pytest
+
+pytest.importorskip("ifcopenshell")
+georef_core = pytest.importorskip("georef_core")
+georef_bench = pytest.importorskip("georef_bench")
+
+
+@pytest.fixture
+def paths(tmp_path):
+    paths = []
+    for i in range(3):
+        path = str(tmp_path / f"model_{i}.ifc")
+        georef_bench.write_synthetic_ifc(path, schema="IFC4", elements=5)
+        paths.append(path)
+    return paths
+
+
+def test_least_recently_used_clean_file_is_evicted(paths):
+    cache = georef_core.HotFileCache(max_files=2)
+    for path in paths:
+        cache.get(path)
+    assert not cache.describe(paths[0])["loaded"]
+    assert cache.describe(paths[1])["loaded"] and cache.describe(paths[2])["loaded"]
+
+
+def test_dirty_file_is_not_evicted(paths):
+    cache = georef_core.HotFileCache(max_files=1)
+    edited = cache.get(paths[0])
+    cache.edited(paths[0])
+    cache.get(paths[1])
+    cache.get(paths[2])
+    assert cache.peek(paths[0]) is edited
+    assert cache.describe(paths[0])["dirty"]
+    assert not cache.describe(paths[1])["loaded"]
+    assert cache.stats()["dirty"] == 1
+
+    # Written back: clean again, and evictable
+    cache.edited(paths[0], written_path=paths[0])
+    cache.get(paths[1])
+    assert not cache.describe(paths[0])["loaded"]
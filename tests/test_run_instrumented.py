@@ -0,0 +1,41 @@
+import tracemalloc
+
+import pytest
+
+georef_core = pytest.importorskip("georef_core")
+
+
+@pytest.fixture(autouse=True)
+def _not_tracing():
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    yield
+    tracemalloc.stop()
+
+
+def test_tracemalloc_profile_reports_allocations():
+    result = georef_core.run_instrumented("test", lambda: {"success": True, "data": [0] * 100000},
+                                          profile="tracemalloc")
+    assert result["profile"]["mode"] == "tracemalloc"
+    assert result["profile"]["peak_kb"] > 0
+    assert not tracemalloc.is_tracing()
+
+
+def test_tracemalloc_stops_after_a_raising_call():
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        georef_core.run_instrumented("test", fail, profile="tracemalloc")
+    assert not tracemalloc.is_tracing()
+
+
+def test_tracemalloc_stops_after_a_non_dict_result():
+    assert georef_core.run_instrumented("test", lambda: "done", profile="tracemalloc") == "done"
+    assert not tracemalloc.is_tracing()
+
+
+def test_tracing_started_by_the_caller_is_left_on():
+    tracemalloc.start()
+    georef_core.run_instrumented("test", lambda: {"success": True}, profile="tracemalloc")
+    assert tracemalloc.is_tracing()
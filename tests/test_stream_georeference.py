@@ -0,0 +1,113 @@
+import json
+
+import pytest
+
+ifcopenshell = pytest.importorskip("ifcopenshell")
+pytest.importorskip("ifcopenshell.validate")
+georef_core = pytest.importorskip("georef_core")
+georef_bench = pytest.importorskip("georef_bench")
+
+PARAMS = dict(crs_mode="epsg", epsg=25830, eastings=440000.5, northings=4470000.25, orthogonal_height=650.0,
+              x_axis_abscissa=0.9, x_axis_ordinate=0.1, site_ref_latitude_dd=40.4, site_ref_longitude_dd=-3.7,
+              site_ref_elevation=650.0, overwrite=True, all_contexts=True)
+
+
+def _georeferencing(path):
+    file = ifcopenshell.open(path)
+    info = georef_core.extract_georeferencing_info(file.by_type("IfcProject"), file.by_type("IfcSite"), True, {})
+    info.pop("debug", None)
+    return file, json.loads(json.dumps(info, sort_keys=True, default=str))
+
+
+def _validation_errors(path):
+    logger = ifcopenshell.validate.json_logger()
+    ifcopenshell.validate.validate(path, logger)
+    return [s for s in logger.statements if s.get("level", "error").lower() == "error"]
+
+
+@pytest.mark.parametrize("schema", ["IFC4", "IFC4X3"])
+@pytest.mark.parametrize("operations, update_mode, gc", [
+    (0, "incremental", False),  # create the CRS and MapConversion
+    (1, "incremental", False),  # update them in place
+    (2, "replace", True),       # replace them and purge the orphans
+])
+def test_streamed_patch_matches_loaded_model(tmp_path, schema, operations, update_mode, gc):
+    source = str(tmp_path / "source.ifc")
+    georef_bench.write_synthetic_ifc(source, schema=schema, elements=50, sites=2, contexts=2, operations=operations)
+    params = dict(PARAMS, update_mode=update_mode, gc=gc)
+
+    loaded = ifcopenshell.open(source)
+    expected = georef_core.georeference_file(loaded, **params)
+    assert expected["success"], expected
+    reference = str(tmp_path / "reference.ifc")
+    loaded.write(reference)
+
+    patched = str(tmp_path / "patched.ifc")
+    result = georef_core.stream_georeference_file(source, write_path=patched, **params)
+    assert result["success"], result
+    assert [op["op"] for op in result["plan"]] == [op["op"] for op in expected["plan"]]
+
+    reference_file, reference_info = _georeferencing(reference)
+    patched_file, patched_info = _georeferencing(patched)
+    assert patched_info == reference_info
+    assert len(patched_file.by_type("IfcRoot")) == len(reference_file.by_type("IfcRoot"))
+    assert len(patched_file.by_type("IfcMapConversion")) == len(reference_file.by_type("IfcMapConversion"))
+    assert _validation_errors(patched) == []
+
+
+def test_streamed_patch_in_place(tmp_path):
+    path = str(tmp_path / "model.ifc")
+    georef_bench.write_synthetic_ifc(path, schema="IFC4", elements=20)
+    result = georef_core.stream_georeference_file(path, write_path=path, crs_mode="epsg", epsg=25830,
+                                                  eastings=1.0, northings=2.0)
+    assert result["success"], result
+    file = ifcopenshell.open(path)
+    assert file.by_type("IfcProjectedCRS")[0].Name == "EPSG:25830"
+    assert file.by_type("IfcMapConversion")[0].Eastings == pytest.approx(1.0)
+    assert _validation_errors(path) == []
+
+
+def test_streamed_dry_run_leaves_the_file_alone(tmp_path):
+    path = str(tmp_path / "model.ifc")
+    georef_bench.write_synthetic_ifc(path, schema="IFC4", elements=20)
+    before = open(path, "rb").read()
+    result = georef_core.stream_georeference_file(path, dry_run=True, crs_mode="epsg", epsg=25830,
+                                                  eastings=1.0, northings=2.0)
+    assert result["success"], result
+    assert result["plan"]
+    assert open(path, "rb").read() == before
+
+
+def test_streamed_patch_rejects_ifc2x3(tmp_path):
+    path = str(tmp_path / "model.ifc")
+    georef_bench.write_synthetic_ifc(path, schema="IFC2X3", elements=5)
+    result = georef_core.stream_georeference_file(path, write_path=str(tmp_path / "out.ifc"), **PARAMS)
+    assert not result["success"]
+    assert "IFC2X3" in result["error"]
+
+
+def _api_model(path, schema):
+    # Written by ifcopenshell itself: "IFC4X3" is saved as the IFC4X3_ADD2 schema identifier
+    import ifcopenshell.api
+    file = ifcopenshell.file(schema=schema)
+    project = ifcopenshell.api.run("root.create_entity", file, ifc_class="IfcProject", name="Project")
+    ifcopenshell.api.run("unit.assign_unit", file)
+    ifcopenshell.api.run("context.add_context", file, context_type="Model")
+    site = ifcopenshell.api.run("root.create_entity", file, ifc_class="IfcSite", name="Site")
+    ifcopenshell.api.run("aggregate.assign_object", file, relating_object=project, products=[site])
+    file.write(path)
+    return file.schema_identifier
+
+
+@pytest.mark.parametrize("schema", ["IFC4", "IFC4X3"])
+def test_streamed_patch_of_an_ifcopenshell_written_file(tmp_path, schema):
+    source = str(tmp_path / "source.ifc")
+    identifier = _api_model(source, schema)
+    patched = str(tmp_path / "patched.ifc")
+    result = georef_core.stream_georeference_file(source, write_path=patched, crs_mode="epsg", epsg=25830,
+                                                  eastings=1.0, northings=2.0)
+    assert result["success"], result
+    file = ifcopenshell.open(patched)
+    assert file.schema_identifier == identifier
+    assert file.by_type("IfcMapConversion")[0].Northings == pytest.approx(2.0)
+    assert _validation_errors(patched) == []
@@ -0,0 +1,123 @@
+"""
+IMPORTANT:
+
+    This file contains code snippets that must be included in the
+    addon.py and tools.py files. On their own, they do not provide
+    any functionality.
+
+    Requires `georef_core.py` (in this folder) next to addon.py and tools.py,
+    and the `import georef_core` lines from the other georeferencing tools.
+"""
+
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This key-value pair must be included in the `handlers` dictionary
+    inside the `_execute_command_internal` definition.
+"""
+#---------------------------------------------------------------------------------------------------
+
+"apply_georeference_plan": self.apply_georeference_plan,
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This definition must be added inside the `BlenderMCPServer` class,
+    along with the other existing definitions.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@staticmethod
+def apply_georeference_plan(
+    plan_id: str,
+    action: str = "commit",
+    write_path: str = None,
+    async_write: bool = False,
+    path: str = None,
+    timings: bool = False,
+    profile: str = None,
+):
+    """
+    Usage:
+    Commits or discards the edit plan returned by `georeference_ifc_model(dry_run=True)`.
+
+    Args:
+        plan_id (str): The `plan_id` of the dry run.
+        action (str): "commit" applies every planned create/update/remove as one
+            transaction; "discard" drops the plan. A plan can only be committed
+            while the model is unchanged since the dry run.
+        write_path (str): Optional path to write the IFC after committing
+            (defaults to the write_path given to the dry run).
+        async_write (bool): Write in the background; see `get_georeference_job_status`.
+        path (str): The IFC file on disk the dry run was made on (georeference_ifc_model(path=...)).
+        timings (bool): Adds per-phase timings (create_entity, remove, write, ...).
+        profile (str): "cprofile" or "tracemalloc" to capture this one call.
+    """
+    from bonsai.bim.ifc import IfcStore
+    return georef_core.apply_plan_command(
+        IfcStore.get_file,
+        plan_id,
+        action=action,
+        write_path=write_path,
+        async_write=async_write,
+        path=path,
+        timings=timings,
+        profile=profile,
+    )
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN tools.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This code snippet must be included within the IFC tools block
+    of the `tool.py` file.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@mcp.tool()
+async def apply_georeference_plan(
+    plan_id: str,
+    action: str = "commit",
+    write_path: str = None,
+    async_write: bool = False,
+    path: str = None,
+    timings: bool = False,
+    profile: str = None,
+    timeout: float = None,
+) -> str:
+    """
+    Commits (action="commit") or discards (action="discard") the georeferencing
+    plan previewed with `georeference_ifc_model(dry_run=True)`. Committing
+    applies all planned edits in one step and can also write the file
+    (in the background with async_write=True).
+    Plans made with georeference_ifc_model(path=...) need the same `path`.
+    timings=True / profile="cprofile"|"tracemalloc" instrument the call.
+    `timeout` bounds the wait in seconds (default georef_core.COMMAND_TIMEOUT_S).
+    """
+    params = {"plan_id": plan_id, "action": action}
+    if write_path:
+        params["write_path"] = write_path
+        params["async_write"] = bool(async_write)
+    if path:
+        params["path"] = path
+    if timings:
+        params["timings"] = True
+    if profile:
+        params["profile"] = profile
+
+    try:
+        result = await send_georef_command_async("apply_georeference_plan", params, timeout)
+        return json.dumps(result, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.exception("apply_georeference_plan error")
+        return json.dumps(
+            {"success": False, "error": "Could not apply the georeferencing plan.", "details": str(e)},
+            ensure_ascii=False,
+            indent=2,
+        )
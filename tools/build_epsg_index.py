@@ -0,0 +1,137 @@
+"""
+Builds epsg_index.bin, the offline EPSG metadata used by georef_core to fill
+IfcProjectedCRS (datum, projection, zone, unit) and to check that eastings and
+northings fall within the area of use of the CRS, without importing pyproj in
+Blender.
+
+    python build_epsg_index.py                      # -> epsg_index.bin next to this script
+    python build_epsg_index.py --output D:/addons/epsg_index.bin --include-deprecated
+
+Every EPSG projected CRS of the PROJ database bundled with pyproj is indexed
+(a few minutes: the projected bounds of each area of use are computed once).
+Run it again after upgrading pyproj to pick up a newer EPSG release.
+
+Requires pyproj; georef_core.py must be in this folder.
+"""
+
+import argparse
+import math
+import os
+import re
+import struct
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+if HERE not in sys.path:
+    sys.path.insert(0, HERE)
+
+import georef_core  # noqa: E402
+
+# "WGS 84 / UTM zone 30N" -> "30N", "NAD83 / California zone 3" -> "3"
+ZONE_PATTERN = re.compile(r"\bzone\s+([0-9]+[A-Z]?|[IVX]+)\b", re.IGNORECASE)
+
+
+def crs_rows(include_deprecated: bool = False):
+    """One dict per EPSG projected CRS with the fields of georef_core.EPSG_INDEX_FIELDS and both bounds."""
+    import pyproj
+    from pyproj.database import query_crs_info
+    from pyproj.enums import PJType
+
+    for info in query_crs_info(auth_name="EPSG", pj_types=[PJType.PROJECTED_CRS], allow_deprecated=include_deprecated):
+        try:
+            crs = pyproj.CRS.from_epsg(int(info.code))
+        except (pyproj.exceptions.CRSError, ValueError):
+            continue
+        geodetic = crs.geodetic_crs
+        operation = crs.coordinate_operation
+        unit = crs.axis_info[0].unit_name if crs.axis_info else None
+        area = info.area_of_use
+        lonlat = (area.west, area.south, area.east, area.north) if area else (math.nan,) * 4
+        projected = (math.nan,) * 4
+        if area:
+            try:
+                transformer = pyproj.Transformer.from_crs("EPSG:4326", crs, always_xy=True)
+                projected = transformer.transform_bounds(*lonlat, densify_pts=21)
+            except Exception:
+                pass
+        if not all(math.isfinite(v) for v in projected):
+            projected = (math.nan,) * 4
+        zone = ZONE_PATTERN.search(info.name)
+        yield {
+            "code": int(info.code),
+            "name": info.name,
+            "geodetic_datum": geodetic.name if geodetic else None,
+            "datum": crs.datum.name if crs.datum else None,
+            "map_projection": info.projection_method_name or (operation.method_name if operation else None),
+            "map_zone": zone.group(1) if zone else None,
+            "map_unit": unit,
+            "area_name": area.name if area else None,
+            "lonlat": lonlat,
+            "projected": projected,
+        }
+
+
+def write_index(path: str, rows: list, source: str) -> int:
+    """Writes the georef_core.EpsgIndex layout; returns the file size."""
+    # The PROJ query can list a code twice (e.g. once per usage); keep one record per code
+    rows = sorted({r["code"]: r for r in rows}.values(), key=lambda r: r["code"])
+    pool = bytearray()
+    offsets = {}
+
+    def string(value):
+        if value is None:
+            return georef_core.EPSG_INDEX_NO_STRING
+        if value not in offsets:
+            data = value.encode("utf-8")[:0xFFFF]
+            offsets[value] = len(pool)
+            pool.extend(len(data).to_bytes(2, "little") + data)
+        return offsets[value]
+
+    record = struct.Struct(georef_core.EPSG_INDEX_RECORD)
+    header = struct.calcsize(georef_core.EPSG_INDEX_HEADER)
+    source_offset = string(source)
+    body = bytearray()
+    for row in rows:
+        body.extend(record.pack(*[string(row[f]) for f in georef_core.EPSG_INDEX_FIELDS],
+                                *row["lonlat"], *row["projected"]))
+    codes = struct.pack(f"<{len(rows)}I", *[r["code"] for r in rows])
+    records_offset = header + len(codes)
+    pool_offset = records_offset + len(body)
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as fh:
+        fh.write(struct.pack(georef_core.EPSG_INDEX_HEADER, georef_core.EPSG_INDEX_MAGIC, len(rows),
+                             records_offset, pool_offset, source_offset))
+        fh.write(codes)
+        fh.write(body)
+        fh.write(pool)
+    os.replace(temp_path, path)
+    return os.path.getsize(path)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default=os.path.join(HERE, "epsg_index.bin"))
+    parser.add_argument("--include-deprecated", action="store_true", help="Also index deprecated EPSG codes")
+    args = parser.parse_args(argv)
+
+    import pyproj
+    start = time.perf_counter()
+    rows = list(crs_rows(args.include_deprecated))
+    epsg_version = pyproj.database.get_database_metadata("EPSG.VERSION") or "unknown"
+    source = f"EPSG {epsg_version} (PROJ {pyproj.proj_version_str}, pyproj {pyproj.__version__})"
+    size = write_index(args.output, rows, source)
+
+    index = georef_core.EpsgIndex(args.output)
+    check = index.get(rows[0]["code"]) if rows else None
+    if rows and (check is None or check["name"] != rows[0]["name"]):
+        print("The written index could not be read back", file=sys.stderr)
+        return 1
+    print(f"{index.stats()['entries']} CRS from {source} -> {args.output} ({size / 1024:.0f} kB) "
+          f"in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
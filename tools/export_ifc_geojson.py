@@ -0,0 +1,192 @@
+"""
+IMPORTANT:
+
+    This file contains code snippets that must be included in the
+    addon.py and tools.py files. On their own, they do not provide
+    any functionality.
+
+    Requires `georef_core.py` (in this folder) next to addon.py and tools.py,
+    and the `import georef_core` lines and `send_georef_command_async` helper from
+    get_ifc_georeferencing_info.py.
+"""
+
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This key-value pair must be included in the `handlers` dictionary
+    inside the `_execute_command_internal` definition.
+"""
+#---------------------------------------------------------------------------------------------------
+
+"export_ifc_geojson": self.export_ifc_geojson,
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This definition must be added inside the `BlenderMCPServer` class,
+    along with the other existing definitions.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@staticmethod
+def export_ifc_geojson(
+    output_path: str,
+    format: str = "geojson",
+    geometry: str = "point",
+    ifc_class: str = "IfcElement",
+    storeys: list = None,
+    target: str = "map",
+    map_conversion: dict = None,
+    map_crs: str = None,
+    batch_size: int = 5000,
+    threads: int = None,
+    path: str = None,
+    timings: bool = False,
+    profile: str = None,
+):
+    """
+    Usage:
+    Exports the IFC elements as GeoJSON features in real-world coordinates,
+    using the IfcMapConversion and TargetCRS of the model. Features are
+    transformed in batches and streamed to disk, so memory does not grow with
+    the number of exported elements.
+
+    Args:
+        output_path (str): File to write (replaced atomically when complete).
+        format (str): "geojson" (one FeatureCollection) or "ndjson" (one Feature per line).
+        geometry (str): "point" (placement origin of each element) or "footprint"
+            (2D convex hull of the element geometry, computed with ifcopenshell.geom).
+        ifc_class (str): Elements to export. Default: every IfcElement.
+        storeys (list): Only elements of these storeys (GlobalId or Name).
+        target (str): "map" (projected CRS, with a GeoJSON "crs" member) or "wgs84" (lon/lat).
+        map_conversion (dict): Optional explicit MapConversion. By default it is read from the model.
+        map_crs (str): Projected CRS name. Default: the TargetCRS name.
+        batch_size (int): Features transformed and written per batch.
+        threads (int): Geometry iterator threads for geometry="footprint". Default: CPU count.
+        path (str): IFC file on disk instead of the opened model (kept hot like georeference_ifc_model).
+        timings (bool): Adds per-phase timings (select, iterate, transform, encode, write).
+        profile (str): "cprofile" or "tracemalloc" to capture this one call.
+
+    Returns:
+        dict: {"success", "output_path", "format", "geometry", "target", "crs",
+               "features", "selected", "bytes", "warnings"}
+    """
+    try:
+        return georef_core.export_command(
+            IfcStore.get_file,
+            output_path,
+            format=format,
+            geometry=geometry,
+            ifc_class=ifc_class,
+            storeys=storeys,
+            target=target,
+            map_conversion=map_conversion,
+            map_crs=map_crs,
+            batch_size=batch_size,
+            threads=threads,
+            path=path,
+            timings=timings,
+            profile=profile,
+        )
+    except Exception as e:
+        import traceback
+        return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN tools.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This code snippet must be included within the IFC tools block
+    of the `tool.py` file. It uses `send_georef_command_async` from
+    get_ifc_georeferencing_info.py.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@mcp.tool()
+async def export_ifc_geojson(
+    output_path: str,
+    format: str = "geojson",
+    geometry: str = "point",
+    ifc_class: str = "IfcElement",
+    storeys: list = None,
+    target: str = "map",
+    map_conversion: dict = None,
+    map_crs: str = None,
+    batch_size: int = 5000,
+    threads: int = None,
+    path: str = None,
+    timings: bool = False,
+    profile: str = None,
+    timeout: float = None,
+) -> str:
+    """
+    Exports IFC elements to a GeoJSON (FeatureCollection) or NDJSON (one
+    feature per line) file in the model's projected CRS or in WGS84, for use
+    in GIS tools. Each feature carries GlobalId, ifc_class, Name and storey.
+
+    Parameters
+    ----------
+    output_path : str
+        Destination file (written to a temporary name, then renamed).
+    format : str
+        "geojson" or "ndjson" (better for millions of features).
+    geometry : str
+        "point" (element placement origin) or "footprint" (2D convex hull of
+        the element geometry; slower, needs ifcopenshell.geom).
+    ifc_class : str
+        IFC class to export (default "IfcElement", e.g. "IfcWall", "IfcSpace").
+    storeys : list, optional
+        Storey GlobalIds or names to restrict the export to.
+    target : str
+        "map" (eastings/northings/height in the TargetCRS) or "wgs84" (lon/lat/height).
+    map_conversion / map_crs : optional
+        Override the MapConversion / CRS read from the model.
+    batch_size : int
+        Number of features transformed and written at a time.
+    threads : int, optional
+        Geometry iterator threads for geometry="footprint" (default: all CPUs).
+    path : str, optional
+        IFC file on disk (headless worker, no Blender) instead of the opened model.
+    timings / profile :
+        Per-phase timings, or a cProfile/tracemalloc capture of the export.
+    timeout : float, optional
+        Seconds to wait for the answer (default georef_core.COMMAND_TIMEOUT_S).
+
+    Returns
+    -------
+    str (JSON)
+        {"success", "output_path", "features", "selected", "bytes", "crs", "warnings"}
+    """
+    params = {
+        "output_path": output_path,
+        "format": format,
+        "geometry": geometry,
+        "ifc_class": ifc_class,
+        "storeys": list(storeys) if storeys else None,
+        "target": target,
+        "map_conversion": map_conversion,
+        "map_crs": map_crs,
+        "batch_size": batch_size,
+        "threads": threads,
+        "path": path,
+        "timings": timings or None,
+        "profile": profile,
+    }
+    params = {k: v for k, v in params.items() if v is not None}
+
+    try:
+        result = await send_georef_command_async("export_ifc_geojson", params, timeout)
+        return json.dumps(result, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.exception("export_ifc_geojson error")
+        return json.dumps(
+            {"success": False, "error": "Could not export the GeoJSON file.", "details": str(e)},
+            ensure_ascii=False,
+            indent=2,
+        )
@@ -0,0 +1,203 @@
+"""
+IMPORTANT:
+
+    This file contains code snippets that must be included in the
+    addon.py and tools.py files. On their own, they do not provide
+    any functionality.
+
+    Requires `georef_core.py` (in this folder) next to addon.py and tools.py,
+    and the `import georef_core` lines and `send_georef_command_async` helper from
+    get_ifc_georeferencing_info.py.
+"""
+
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This key-value pair must be included in the `handlers` dictionary
+    inside the `_execute_command_internal` definition.
+"""
+#---------------------------------------------------------------------------------------------------
+
+"export_ifc_mesh": self.export_ifc_mesh,
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This definition must be added inside the `BlenderMCPServer` class,
+    along with the other existing definitions.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@staticmethod
+def export_ifc_mesh(
+    output_path: str,
+    format: str = "glb",
+    ifc_class: str = "IfcElement",
+    storeys: list = None,
+    map_conversion: dict = None,
+    map_crs: str = None,
+    origin="auto",
+    precision: str = "float32",
+    part_vertices: int = None,
+    batch_vertices: int = 1048576,
+    threads: int = None,
+    path: str = None,
+    timings: bool = False,
+    profile: str = None,
+):
+    """
+    Usage:
+    Exports the triangulated geometry of the IFC elements in map coordinates
+    (eastings, northings, height of the IfcMapConversion). The geometry is
+    produced by ifcopenshell's multithreaded geometry iterator, transformed in
+    NumPy batches and streamed to disk, so memory does not grow with the model.
+
+    Args:
+        output_path (str): File to write (replaced atomically when complete).
+        format (str): "glb" (binary glTF), "gltf" (JSON + .bin sidecar), "ply"
+            (binary, faces carry the element's STEP id) or "obj".
+        ifc_class (str): Elements to export. Default: every IfcElement.
+        storeys (list): Only elements of these storeys (GlobalId or Name).
+        map_conversion (dict): Optional explicit MapConversion. By default it is read from the model.
+        map_crs (str): Projected CRS name recorded in the file. Default: the TargetCRS name.
+        origin: Subtracted from every vertex and recorded in the file: "auto" (the
+            MapConversion origin), [E, N, H], or "none" for absolute coordinates.
+        precision (str): "float32" or "float64" vertices for PLY/OBJ (glTF is always float32).
+        part_vertices (int): Split the output into numbered files of about this many vertices.
+        batch_vertices (int): Vertices transformed and written per batch.
+        threads (int): Geometry iterator threads. Default: CPU count.
+        path (str): IFC file on disk instead of the opened model (kept hot like georeference_ifc_model).
+        timings (bool): Adds per-phase timings (select, iterate, transform, encode, write).
+        profile (str): "cprofile" or "tracemalloc" to capture this one call.
+
+    Returns:
+        dict: {"success", "output_path", "parts", "format", "crs", "origin", "up_axis",
+               "precision", "selected", "elements", "vertices", "triangles", "bytes", "warnings"}
+    """
+    try:
+        return georef_core.mesh_export_command(
+            IfcStore.get_file,
+            output_path,
+            format=format,
+            ifc_class=ifc_class,
+            storeys=storeys,
+            map_conversion=map_conversion,
+            map_crs=map_crs,
+            origin=origin,
+            precision=precision,
+            part_vertices=part_vertices,
+            batch_vertices=batch_vertices,
+            threads=threads,
+            path=path,
+            timings=timings,
+            profile=profile,
+        )
+    except Exception as e:
+        import traceback
+        return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN tools.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This code snippet must be included within the IFC tools block
+    of the `tool.py` file. It uses `send_georef_command_async` from
+    get_ifc_georeferencing_info.py.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@mcp.tool()
+async def export_ifc_mesh(
+    output_path: str,
+    format: str = "glb",
+    ifc_class: str = "IfcElement",
+    storeys: list = None,
+    map_conversion: dict = None,
+    map_crs: str = None,
+    origin="auto",
+    precision: str = "float32",
+    part_vertices: int = None,
+    batch_vertices: int = 1048576,
+    threads: int = None,
+    path: str = None,
+    timings: bool = False,
+    profile: str = None,
+    timeout: float = None,
+) -> str:
+    """
+    Exports the 3D geometry of the IFC elements already placed in real-world
+    map coordinates (the model's projected CRS), for GIS and digital-twin
+    platforms, without reprojecting in another tool.
+
+    Parameters
+    ----------
+    output_path : str
+        Destination file (written to a temporary name, then renamed).
+    format : str
+        "glb" (default), "gltf", "ply" or "obj". glTF is Y-up: the map axes are
+        stored as x=eastings, y=height, z=-northings, with one node per element
+        (GlobalId, class, Name and storey in its extras).
+    ifc_class : str
+        IFC class to export (default "IfcElement", e.g. "IfcWall", "IfcSlab").
+    storeys : list, optional
+        Storey GlobalIds or names to restrict the export to.
+    map_conversion / map_crs : optional
+        Override the MapConversion / CRS read from the model.
+    origin : str | list
+        "auto" (default) writes coordinates relative to the MapConversion
+        origin (the glTF root node is translated back to it; PLY/OBJ record it
+        in a comment), which keeps float32 vertices precise to the millimetre.
+        [E, N, H] uses another origin; "none" writes absolute coordinates.
+    precision : str
+        "float32" or "float64" vertices for PLY/OBJ.
+    part_vertices : int, optional
+        Split very large exports into numbered files (name_001.glb, ...).
+    batch_vertices / threads : int, optional
+        Vertices per transform/write batch, and geometry iterator threads.
+    path : str, optional
+        IFC file on disk (headless worker, no Blender) instead of the opened model.
+    timings / profile :
+        Per-phase timings, or a cProfile/tracemalloc capture of the export.
+    timeout : float, optional
+        Seconds to wait for the answer (default georef_core.COMMAND_TIMEOUT_S).
+
+    Returns
+    -------
+    str (JSON)
+        {"success", "output_path", "parts", "crs", "origin", "up_axis", "elements",
+         "vertices", "triangles", "bytes", "warnings"}
+    """
+    params = {
+        "output_path": output_path,
+        "format": format,
+        "ifc_class": ifc_class,
+        "storeys": list(storeys) if storeys else None,
+        "map_conversion": map_conversion,
+        "map_crs": map_crs,
+        "origin": [float(v) for v in origin] if isinstance(origin, (list, tuple)) else origin,
+        "precision": precision,
+        "part_vertices": part_vertices,
+        "batch_vertices": batch_vertices,
+        "threads": threads,
+        "path": path,
+        "timings": timings or None,
+        "profile": profile,
+    }
+    params = {k: v for k, v in params.items() if v is not None}
+
+    try:
+        result = await send_georef_command_async("export_ifc_mesh", params, timeout)
+        return json.dumps(result, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.exception("export_ifc_mesh error")
+        return json.dumps(
+            {"success": False, "error": "Could not export the mesh file.", "details": str(e)},
+            ensure_ascii=False,
+            indent=2,
+        )
@@ -0,0 +1,212 @@
+"""
+IMPORTANT:
+
+    This file contains code snippets that must be included in the
+    addon.py and tools.py files. On their own, they do not provide
+    any functionality.
+
+    Requires `georef_core.py` (in this folder) next to addon.py and tools.py,
+    and the `import georef_core` lines and `send_georef_command_async` helper from
+    get_ifc_georeferencing_info.py.
+"""
+
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This key-value pair must be included in the `handlers` dictionary
+    inside the `_execute_command_internal` definition.
+"""
+#---------------------------------------------------------------------------------------------------
+
+"find_ifc_elements_by_location": self.find_ifc_elements_by_location,
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This definition must be added inside the `BlenderMCPServer` class,
+    along with the other existing definitions.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@staticmethod
+def find_ifc_elements_by_location(
+    center: list = None,
+    radius: float = None,
+    bbox: list = None,
+    space: str = "map",
+    ifc_class: str = "IfcElement",
+    geometry: str = "origin",
+    map_conversion: dict = None,
+    map_crs: str = None,
+    limit: int = 10000,
+    output: str = "elements",
+    threads: int = None,
+    path: str = None,
+    fields: list = None,
+    timings: bool = False,
+    profile: str = None,
+):
+    """
+    Usage:
+    Finds the elements within a radius of a point, or inside a bounding box,
+    in map coordinates (IfcMapConversion), WGS84 or local coordinates. The
+    first query builds a grid index over every placed product in map
+    coordinates; it is kept until the model changes (model revision,
+    MapConversion), so later queries only touch the matching grid cells.
+
+    Args:
+        center (list): [x, y] in `space` ([lon, lat] for "wgs84"), used with `radius`.
+        radius (float): Search radius in map units (metres for most CRS).
+        bbox (list): [min_x, min_y, max_x, max_y] in `space`, instead of center/radius.
+            WGS84 and local boxes are replaced by their envelope in map coordinates.
+        space (str): "map" (default), "wgs84" or "local".
+        ifc_class (str): Only instances of this class (subtypes included). Default: "IfcElement".
+        geometry (str): "origin" (placement origins) or "bbox" (map envelope of each
+            element's geometry; the first build tessellates the model).
+        map_conversion (dict): Optional explicit MapConversion. By default it is read from the model.
+        map_crs (str): Projected CRS for WGS84 queries. Default: the TargetCRS name.
+        limit (int): Maximum number of elements returned ("total" counts them all).
+        output (str): "elements" (GlobalId, class, Name, map position, distance) or "ids" (GlobalIds only).
+        threads (int): Geometry iterator threads for the geometry="bbox" build. Default: CPU count.
+        path (str): IFC file on disk instead of the opened model (kept hot like georeference_ifc_model).
+        fields (list): Optional keys to keep in the response.
+        timings (bool): Adds per-phase timings (spatial_collect, spatial_build, spatial_query, ...).
+        profile (str): "cprofile" or "tracemalloc" to capture this one call.
+
+    Returns:
+        dict: {"success", "query", "map_crs", "total", "count", "truncated",
+               "elements" | "global_ids", "index": {"elements", "grid", "cell_size", "from_cache"},
+               "warnings"}
+    """
+    try:
+        return georef_core.spatial_query_command(
+            IfcStore.get_file,
+            center=center,
+            radius=radius,
+            bbox=bbox,
+            space=space,
+            ifc_class=ifc_class,
+            geometry=geometry,
+            map_conversion=map_conversion,
+            map_crs=map_crs,
+            limit=limit,
+            output=output,
+            threads=threads,
+            path=path,
+            fields=fields,
+            timings=timings,
+            profile=profile,
+        )
+    except Exception as e:
+        import traceback
+        return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN tools.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This code snippet must be included within the IFC tools block
+    of the `tool.py` file. It uses `send_georef_command_async` from
+    get_ifc_georeferencing_info.py.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@mcp.tool()
+async def find_ifc_elements_by_location(
+    center: list = None,
+    radius: float = None,
+    bbox: list = None,
+    space: str = "map",
+    ifc_class: str = "IfcElement",
+    geometry: str = "origin",
+    map_conversion: dict = None,
+    map_crs: str = None,
+    limit: int = 10000,
+    output: str = "elements",
+    threads: int = None,
+    path: str = None,
+    format: str = "pretty",
+    fields: list = None,
+    timings: bool = False,
+    profile: str = None,
+    timeout: float = None,
+) -> str:
+    """
+    Answers "which elements are within 50 m of this coordinate" or "which
+    elements lie in this area" for a georeferenced model, nearest first,
+    without listing every element.
+
+    Parameters
+    ----------
+    center : list, optional
+        [E, N] in map coordinates, [lon, lat] with space="wgs84", or [x, y]
+        with space="local". Requires `radius`.
+    radius : float, optional
+        Search radius in map units (usually metres).
+    bbox : list, optional
+        [min_x, min_y, max_x, max_y] in the same space, instead of center/radius.
+    space : str
+        "map" (default), "wgs84" or "local".
+    ifc_class : str
+        Class filter, e.g. "IfcWall", "IfcDoor" (default "IfcElement").
+    geometry : str
+        "origin" (element placement points, fast) or "bbox" (element geometry
+        envelopes; slower to build the first time).
+    map_conversion / map_crs : optional
+        Override the MapConversion / CRS read from the model.
+    limit : int
+        Maximum number of elements in the answer.
+    output : str
+        "elements" (with Name, class, map position and distance) or "ids".
+    threads : int, optional
+        Geometry iterator threads used to build the geometry="bbox" index.
+    path : str, optional
+        IFC file on disk (headless worker, no Blender) instead of the opened model.
+    format / fields :
+        Response encoding ("pretty", "compact", "binary") and key projection.
+    timings / profile :
+        Per-phase timings, or a cProfile/tracemalloc capture of the call.
+    timeout : float, optional
+        Seconds to wait for the answer (default georef_core.COMMAND_TIMEOUT_S).
+
+    Returns
+    -------
+    str (JSON)
+        {"success", "total", "count", "truncated",
+         "elements": [{"GlobalId", "ifc_class", "Name", "map", "distance"}, ...] | "global_ids",
+         "index", "warnings"}
+    """
+    params = {
+        "center": [float(v) for v in center] if center else None,
+        "radius": radius,
+        "bbox": [float(v) for v in bbox] if bbox else None,
+        "space": space,
+        "ifc_class": ifc_class,
+        "geometry": geometry,
+        "map_conversion": map_conversion,
+        "map_crs": map_crs,
+        "limit": int(limit),
+        "output": output,
+        "threads": threads,
+        "path": path,
+        "fields": list(fields) if fields else None,
+        "timings": timings or None,
+        "profile": profile,
+    }
+    params = {k: v for k, v in params.items() if v is not None}
+
+    try:
+        result = await send_georef_command_async("find_ifc_elements_by_location", params, timeout)
+        return georef_core.encode_response(result, format)
+    except Exception as e:
+        logger.exception("find_ifc_elements_by_location error")
+        return georef_core.encode_response(
+            {"success": False, "error": "Could not query the elements by location.", "details": str(e)},
+            format,
+        )
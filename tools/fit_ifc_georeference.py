@@ -0,0 +1,227 @@
+"""
+IMPORTANT:
+
+    This file contains code snippets that must be included in the
+    addon.py and tools.py files. On their own, they do not provide
+    any functionality.
+
+    Requires `georef_core.py` (in this folder) next to addon.py and tools.py,
+    and the `import georef_core` lines and `send_georef_command_async` helper from
+    get_ifc_georeferencing_info.py.
+"""
+
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This key-value pair must be included in the `handlers` dictionary
+    inside the `_execute_command_internal` definition.
+"""
+#---------------------------------------------------------------------------------------------------
+
+"fit_ifc_georeference": self.fit_ifc_georeference,
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This definition must be added inside the `BlenderMCPServer` class,
+    along with the other existing definitions.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@staticmethod
+def fit_ifc_georeference(
+    local_points: list,
+    map_points: list,
+    map_space: str = "map",
+    map_crs: str = None,
+    weights: list = None,
+    robust: str = "huber",
+    outlier_threshold: float = None,
+    fit_scale: bool = True,
+    include_residuals: bool = True,
+    apply: bool = False,
+    epsg: int = None,
+    dry_run: bool = False,
+    write_path: str = None,
+    async_write: bool = False,
+    path: str = None,
+    fields: list = None,
+    timings: bool = False,
+    profile: str = None,
+):
+    """
+    Usage:
+    Fits the IfcMapConversion parameters (eastings, northings, rotation, scale,
+    orthogonal height) from control point pairs: local model coordinates and
+    the surveyed map coordinates of the same points. The 2D similarity is solved
+    in closed form with NumPy; robust="huber"|"tukey" starts from a
+    least-median-of-squares estimate and reweights iteratively, so gross
+    outliers are detected and left out of the final least-squares fit.
+
+    Args:
+        local_points (list): [[x, y(, z)], ...] in model coordinates.
+        map_points (list): Matching [[E, N(, H)], ...], or [[lon, lat(, h)], ...] with map_space="wgs84".
+        map_space (str): "map" (projected CRS) or "wgs84" (converted with map_crs / epsg / the TargetCRS).
+        map_crs (str): Projected CRS of the WGS84 conversion, e.g. "EPSG:25830".
+        weights (list): Optional a-priori weight per pair (0 ignores a pair).
+        robust (str): "huber" (default), "tukey" or "none" (plain least squares).
+        outlier_threshold (float): Residual (map units) above which a pair is an outlier.
+            Default: 3 robust sigmas (robust modes only).
+        fit_scale (bool): Fit the scale; False keeps it at 1.0 (rotation + translation only).
+        include_residuals (bool): Return the [dE, dN(, dH)] residual of every pair.
+        apply (bool): Write the result to the model's IfcMapConversion (in place, only the
+            attributes that differ) or, if there is none, create it with `epsg`.
+        epsg (int): CRS used when apply=True and the model has no IfcMapConversion.
+        dry_run (bool): With apply, only plan the edit (commit it with apply_georeference_plan).
+        write_path (str): With apply, write the file afterwards (async_write: in the background).
+        path (str): IFC file on disk instead of the opened model (kept hot like georeference_ifc_model).
+        fields (list): Optional keys to keep in the response.
+        timings (bool): Adds per-phase timings (fit_horizontal, fit_height, fit_inliers, apply_plan, ...).
+        profile (str): "cprofile" or "tracemalloc" to capture this one call.
+
+    Returns:
+        dict: {"success", "count", "inliers", "map_conversion", "rotation_deg", "map_crs",
+               "rmse": {"horizontal", "vertical", "horizontal_all", "vertical_all"},
+               "max_residual", "sigma", "outliers", "residuals", "applied", "apply", "warnings"}
+    """
+    from bonsai.bim.ifc import IfcStore
+    return georef_core.fit_command(
+        IfcStore.get_file,
+        local_points,
+        map_points,
+        map_space=map_space,
+        map_crs=map_crs,
+        weights=weights,
+        robust=robust,
+        outlier_threshold=outlier_threshold,
+        fit_scale=fit_scale,
+        include_residuals=include_residuals,
+        apply=apply,
+        epsg=epsg,
+        dry_run=dry_run,
+        write_path=write_path,
+        async_write=async_write,
+        path=path,
+        fields=fields,
+        timings=timings,
+        profile=profile,
+    )
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN tools.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This code snippet must be included within the IFC tools block
+    of the `tool.py` file. It uses `send_georef_command_async` from
+    get_ifc_georeferencing_info.py.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@mcp.tool()
+async def fit_ifc_georeference(
+    local_points: list,
+    map_points: list,
+    map_space: str = "map",
+    map_crs: str = None,
+    weights: list = None,
+    robust: str = "huber",
+    outlier_threshold: float = None,
+    fit_scale: bool = True,
+    include_residuals: bool = True,
+    apply: bool = False,
+    epsg: int = None,
+    dry_run: bool = False,
+    write_path: str = None,
+    async_write: bool = False,
+    path: str = None,
+    format: str = "pretty",
+    fields: list = None,
+    timings: bool = False,
+    profile: str = None,
+    timeout: float = None,
+) -> str:
+    """
+    Computes the IfcMapConversion from surveyed control points instead of
+    typing eastings, northings and rotation by hand: give the local model
+    coordinates of N points and their surveyed map coordinates, and get the
+    best-fit translation, rotation, scale and height offset with per-point
+    residuals and RMSE. Wrong pairs (typos, swapped points) are detected as
+    outliers and excluded.
+
+    Parameters
+    ----------
+    local_points : list
+        [[x, y, z], ...] model coordinates of the control points.
+    map_points : list
+        [[E, N, H], ...] surveyed coordinates in the same order (Z optional on
+        both sides; the height offset needs it). With map_space="wgs84" these
+        are [lon, lat, h] and are projected with map_crs (or epsg, or the
+        model's TargetCRS).
+    weights : list, optional
+        A-priori weight per pair (e.g. 1/σ² of the survey).
+    robust : str
+        "huber" (default), "tukey" (rejects harder) or "none".
+    outlier_threshold : float, optional
+        Residual in map units above which a pair is an outlier (default: 3 robust sigmas).
+    fit_scale : bool
+        False fixes the scale at 1.0.
+    include_residuals : bool
+        Return every pair's residual (turn off for very large point sets).
+    apply : bool
+        Write the fitted values to the model's IfcMapConversion (only the
+        attributes that change), or create it with `epsg` when there is none.
+        With dry_run=True the edit is returned as a plan for apply_georeference_plan.
+    write_path / async_write : optional
+        Save the model after applying.
+    path : str, optional
+        IFC file on disk (headless worker, no Blender) instead of the opened model.
+    format / fields :
+        Response encoding ("pretty", "compact", "binary") and key projection.
+    timings / profile :
+        Per-phase timings, or a cProfile/tracemalloc capture of the call.
+    timeout : float, optional
+        Seconds to wait for the answer (default georef_core.COMMAND_TIMEOUT_S).
+
+    Returns
+    -------
+    str (JSON)
+        {"success", "map_conversion", "rotation_deg", "rmse", "outliers",
+         "residuals", "applied", "warnings"}
+    """
+    params = {
+        "local_points": [list(p) for p in local_points],
+        "map_points": [list(p) for p in map_points],
+        "map_space": map_space,
+        "map_crs": map_crs,
+        "weights": list(weights) if weights else None,
+        "robust": robust,
+        "outlier_threshold": outlier_threshold,
+        "fit_scale": bool(fit_scale),
+        "include_residuals": bool(include_residuals),
+        "apply": apply or None,
+        "epsg": epsg,
+        "dry_run": dry_run or None,
+        "write_path": write_path,
+        "async_write": async_write or None,
+        "path": path,
+        "fields": list(fields) if fields else None,
+        "timings": timings or None,
+        "profile": profile,
+    }
+    params = {k: v for k, v in params.items() if v is not None}
+
+    try:
+        result = await send_georef_command_async("fit_ifc_georeference", params, timeout)
+        return georef_core.encode_response(result, format)
+    except Exception as e:
+        logger.exception("fit_ifc_georeference error")
+        return georef_core.encode_response(
+            {"success": False, "error": "Could not fit the georeference.", "details": str(e)},
+            format,
+        )
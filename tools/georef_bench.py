@@ -0,0 +1,462 @@
+"""
+Benchmark for the georeferencing tools, runnable without Blender.
+
+    python georef_bench.py --schemas IFC2X3,IFC4 --elements 1000,100000 --output bench.json
+    python georef_bench.py --elements 100000 --compare bench.json --output bench_new.json
+
+It writes synthetic IFC models (number of elements, sites, contexts and
+existing coordinate operations are configurable), loads the addon.py handlers
+of get_ifc_georeferencing_info.py and georeference_ifc_model.py (next to this
+script) with `IfcStore.get_file()` shimmed over plain ifcopenshell, and
+records latency, peak memory and output file size of the read, georeference,
+overwrite and write paths in a JSON file. `--compare` checks the medians
+against a previous results file to catch regressions between versions.
+
+Requires ifcopenshell (pyproj optional); georef_core.py must be in this folder.
+"""
+
+import argparse
+import gc
+import itertools
+import json
+import logging
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import types
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+if HERE not in sys.path:
+    sys.path.insert(0, HERE)
+
+import georef_core  # noqa: E402
+
+BENCH_FORMAT = 1
+CASES = ("read_cold", "read_warm", "read_scan", "georeference", "overwrite", "write", "write_async")
+SCHEMAS = ("IFC2X3", "IFC4", "IFC4X3")
+CONTEXT_TYPES = ("Model", "Plan", "Model", "Plan")
+
+logger = logging.getLogger("georef_bench")
+
+
+#---------------------------------------------------------------------------------------------------
+# Synthetic models
+#---------------------------------------------------------------------------------------------------
+
+def _guid(n: int) -> str:
+    import ifcopenshell.guid
+    return ifcopenshell.guid.compress(f"{0x6e0bec0000000000 + n:032x}")
+
+
+def write_synthetic_ifc(
+    path: str,
+    schema: str = "IFC4",
+    elements: int = 1000,
+    sites: int = 1,
+    contexts: int = 1,
+    operations: int = 0,
+    sub_contexts: int = 1,
+) -> dict:
+    """
+    Writes an IFC-SPF model straight to `path` (no ifcopenshell.api calls, so
+    millions of elements take seconds). Each top-level context gets
+    `sub_contexts` "Body"-like sub-contexts; the first `operations` contexts get
+    an IfcProjectedCRS + IfcMapConversion (ignored for IFC2X3, which has none).
+    Elements are IfcBuildingElementProxy instances spread over the sites.
+    """
+    if schema not in SCHEMAS:
+        raise ValueError(f"schema must be one of {', '.join(SCHEMAS)}")
+    sites = max(1, int(sites))
+    contexts = max(1, int(contexts))
+    operations = 0 if schema == "IFC2X3" else min(int(operations), contexts)
+
+    next_id = itertools.count(1)
+    guids = itertools.count(1)
+    out = open(path, "w", encoding="ascii", newline="\n")
+    write = out.write
+
+    def emit(record: str) -> int:
+        eid = next(next_id)
+        write(f"#{eid}={record};\n")
+        return eid
+
+    try:
+        write("ISO-10303-21;\nHEADER;\n")
+        write("FILE_DESCRIPTION(('ViewDefinition [CoordinationView]'),'2;1');\n")
+        write(f"FILE_NAME('{os.path.basename(path)}','{time.strftime('%Y-%m-%dT%H:%M:%S')}',(''),(''),"
+              "'georef_bench','georef_bench','');\n")
+        write(f"FILE_SCHEMA(('{schema}'));\nENDSEC;\nDATA;\n")
+
+        person = emit("IFCPERSON($,'bench',$,$,$,$,$,$)")
+        org = emit("IFCORGANIZATION($,'bench',$,$,$)")
+        user = emit(f"IFCPERSONANDORGANIZATION(#{person},#{org},$)")
+        app = emit(f"IFCAPPLICATION(#{org},'1','georef_bench','georef_bench')")
+        owner = emit(f"IFCOWNERHISTORY(#{user},#{app},$,.ADDED.,$,$,$,0)")
+        unit = emit("IFCSIUNIT(*,.LENGTHUNIT.,$,.METRE.)")
+        units = emit(f"IFCUNITASSIGNMENT((#{unit}))")
+        origin = emit("IFCCARTESIANPOINT((0.,0.,0.))")
+        z_axis = emit("IFCDIRECTION((0.,0.,1.))")
+        x_axis = emit("IFCDIRECTION((1.,0.,0.))")
+        world = emit(f"IFCAXIS2PLACEMENT3D(#{origin},#{z_axis},#{x_axis})")
+
+        ctx_ids = []
+        for k in range(contexts):
+            ctx_type = CONTEXT_TYPES[k % len(CONTEXT_TYPES)]
+            ctx = emit(f"IFCGEOMETRICREPRESENTATIONCONTEXT($,'{ctx_type}',3,1.E-05,#{world},$)")
+            ctx_ids.append(ctx)
+            for s in range(sub_contexts):
+                emit(f"IFCGEOMETRICREPRESENTATIONSUBCONTEXT('Body{s or ''}','{ctx_type}',*,*,*,*,#{ctx},$,.MODEL_VIEW.,$)")
+        project = emit(f"IFCPROJECT('{_guid(next(guids))}',#{owner},'Bench',$,$,$,$,"
+                       f"({','.join(f'#{c}' for c in ctx_ids)}),#{units})")
+
+        scale_yz = ",$,$" if schema == "IFC4X3" else ""
+        for ctx in ctx_ids[:operations]:
+            crs = emit("IFCPROJECTEDCRS('EPSG:25830',$,'WGS84',$,'TransverseMercator',$,$)")
+            emit(f"IFCMAPCONVERSION(#{ctx},#{crs},440000.,4470000.,0.,1.,0.,1.{scale_yz})")
+
+        site_ids, site_placements = [], []
+        for s in range(sites):
+            point = emit(f"IFCCARTESIANPOINT(({s * 1000.0!r},0.,0.))")
+            axis = emit(f"IFCAXIS2PLACEMENT3D(#{point},$,$)")
+            placement = emit(f"IFCLOCALPLACEMENT($,#{axis})")
+            site_ids.append(emit(f"IFCSITE('{_guid(next(guids))}',#{owner},'Site {s}',$,$,#{placement},$,$,"
+                                 ".ELEMENT.,$,$,$,$,$)"))
+            site_placements.append(placement)
+        emit(f"IFCRELAGGREGATES('{_guid(next(guids))}',#{owner},$,$,#{project},"
+             f"({','.join(f'#{s}' for s in site_ids)}))")
+
+        contained = [[] for _ in site_ids]
+        for i in range(int(elements)):
+            s = i % sites
+            point = emit(f"IFCCARTESIANPOINT(({float(i % 1000)!r},{float(i // 1000)!r},0.))")
+            axis = emit(f"IFCAXIS2PLACEMENT3D(#{point},$,$)")
+            placement = emit(f"IFCLOCALPLACEMENT(#{site_placements[s]},#{axis})")
+            contained[s].append(emit(f"IFCBUILDINGELEMENTPROXY('{_guid(next(guids))}',#{owner},'E{i}',$,$,"
+                                     f"#{placement},$,$,$)"))
+        for site, members in zip(site_ids, contained):
+            if members:
+                emit(f"IFCRELCONTAINEDINSPATIALSTRUCTURE('{_guid(next(guids))}',#{owner},$,$,"
+                     f"({','.join(f'#{e}' for e in members)}),#{site})")
+
+        write("ENDSEC;\nEND-ISO-10303-21;\n")
+    finally:
+        out.close()
+
+    return {"path": path, "schema": schema, "elements": int(elements), "sites": sites,
+            "contexts": contexts, "operations": operations, "file_bytes": os.path.getsize(path)}
+
+
+#---------------------------------------------------------------------------------------------------
+# Handlers with IfcStore shimmed over plain ifcopenshell
+#---------------------------------------------------------------------------------------------------
+
+class IfcStoreShim:
+    """Stands in for bonsai.bim.ifc.IfcStore: get_file() returns whatever file is set."""
+
+    file = None
+    path = ""
+
+    @classmethod
+    def get_file(cls):
+        return cls.file
+
+
+_SECTION_RE = re.compile(r"^#-+\n# TO INCLUDE IN (\S+)\n#-+\n", re.M)
+
+
+def load_handlers(tools_dir: str = HERE) -> dict:
+    """
+    Execs the `@staticmethod` handler definitions of the addon.py sections of the
+    georeferencing snippet files, with IfcStore resolved to IfcStoreShim.
+    """
+    ifc_module = types.ModuleType("bonsai.bim.ifc")
+    ifc_module.IfcStore = IfcStoreShim
+    for name in ("bonsai", "bonsai.bim"):
+        sys.modules.setdefault(name, types.ModuleType(name))
+    sys.modules["bonsai.bim.ifc"] = ifc_module
+
+    namespace = {"georef_core": georef_core, "IfcStore": IfcStoreShim, "json": json, "logger": logger}
+    handlers = {}
+    for snippet in ("get_ifc_georeferencing_info.py", "georeference_ifc_model.py"):
+        with open(os.path.join(tools_dir, snippet), encoding="utf-8") as fh:
+            parts = _SECTION_RE.split(fh.read())
+        for target, body in zip(parts[1::2], parts[2::2]):
+            if target != "addon.py" or "@staticmethod" not in body:
+                continue
+            body = body[body.index("@staticmethod"):]
+            exec(compile(body, f"{snippet}:{target}", "exec"), namespace)
+        name = snippet[:-3]
+        handler = namespace[name]
+        handlers[name] = getattr(handler, "__func__", handler)
+    return handlers
+
+
+#---------------------------------------------------------------------------------------------------
+# Measurement
+#---------------------------------------------------------------------------------------------------
+
+def _rss_kb():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss // 1024
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class _RssSampler:
+    """Best-effort peak RSS over a block, sampled every few milliseconds."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def _sample(self):
+        rss = _rss_kb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def __enter__(self):
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def measure(run, setup=None, repeats: int = 5, memory: bool = True) -> dict:
+    """
+    Times `run(state)` over `repeats` fresh `setup()` states, then does one more
+    run under tracemalloc (Python allocations) and an RSS sampler (everything,
+    including ifcopenshell's C++ heap) so the timings are not skewed by tracing.
+    """
+    times = []
+    last = None
+    for _ in range(max(1, repeats)):
+        state = setup() if setup else None
+        gc.collect()
+        start = time.perf_counter()
+        last = run(state)
+        times.append((time.perf_counter() - start) * 1000.0)
+
+    result = {
+        "repeats": len(times),
+        "latency_ms": {
+            "min": round(min(times), 3),
+            "median": round(statistics.median(times), 3),
+            "mean": round(statistics.fmean(times), 3),
+            "max": round(max(times), 3),
+        },
+        "traced_peak_kb": None,
+        "rss_peak_kb": None,
+    }
+    if memory:
+        state = setup() if setup else None
+        gc.collect()
+        tracemalloc.start()
+        try:
+            with _RssSampler() as sampler:
+                run(state)
+            result["traced_peak_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+        finally:
+            tracemalloc.stop()
+        result["rss_peak_kb"] = sampler.peak
+    result["last"] = last
+    return result
+
+
+def _wait_for_job(write_job: dict, timeout: float = 3600.0) -> dict:
+    if not write_job:
+        return {"state": "missing"}
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = georef_core.get_job_status(write_job["job_id"])
+        if status.get("state") != "running":
+            return status
+        time.sleep(0.002)
+    return {"state": "timeout"}
+
+
+#---------------------------------------------------------------------------------------------------
+# Benchmark cases
+#---------------------------------------------------------------------------------------------------
+
+def run_model_cases(model: dict, handlers: dict, cases, repeats: int, workdir: str, epsg: int = 25830) -> list:
+    """Runs the selected cases on one synthetic model; returns one record per case."""
+    import ifcopenshell
+
+    info = handlers["get_ifc_georeferencing_info"]
+    georef = handlers["georeference_ifc_model"]
+    params = {"crs_mode": "epsg", "epsg": epsg, "eastings": 440100.0, "northings": 4470100.0,
+              "site_ref_elevation": 650.0, "all_contexts": model["contexts"] > 1}
+    out_path = os.path.join(workdir, f"out_{model['schema']}_{model['elements']}.ifc")
+
+    def fresh():
+        IfcStoreShim.file = ifcopenshell.open(model["path"])
+        georef_core.invalidate_georeferencing_info()
+        return IfcStoreShim.file
+
+    loaded = fresh()
+    runners = {
+        "read_cold": (lambda _: (georef_core.invalidate_georeferencing_info(), info(include_contexts=True))[1], None),
+        "read_warm": (lambda _: info(include_contexts=True), None),
+        "read_scan": (lambda _: info(include_contexts=True, path=model["path"]), None),
+        "georeference": (lambda _: georef(**params), fresh),
+        "overwrite": (lambda _: georef(overwrite=True, **params), fresh),
+        "write": (lambda _: georef(overwrite=True, write_path=out_path, **params), fresh),
+        "write_async": (
+            lambda _: (lambda r: dict(r, job=_wait_for_job(r.get("write_job"))))(
+                georef(overwrite=True, write_path=out_path, async_write=True, **params)),
+            fresh,
+        ),
+    }
+
+    records = []
+    for case in cases:
+        run, setup = runners[case]
+        IfcStoreShim.file = loaded
+        if case == "read_warm":
+            info(include_contexts=True)  # Populate the cache outside the timings
+        record = {k: model[k] for k in ("schema", "elements", "sites", "contexts", "operations", "file_bytes")}
+        record["case"] = case
+        try:
+            measured = measure(run, setup, repeats)
+            last = measured.pop("last") or {}
+            record.update(measured)
+            record["success"] = bool(last.get("success", "error" not in last))
+            record["error"] = last.get("error") or (last.get("job") or {}).get("error")
+            record["output_bytes"] = os.path.getsize(out_path) if case.startswith("write") and os.path.exists(out_path) else None
+        except Exception as e:
+            logger.exception("case %s failed", case)
+            record.update({"success": False, "error": f"{type(e).__name__}: {e}"})
+        records.append(record)
+        if case.startswith("write") and os.path.exists(out_path):
+            os.remove(out_path)
+    IfcStoreShim.file = None
+    return records
+
+
+def environment() -> dict:
+    env = {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine(),
+           "cpu_count": os.cpu_count()}
+    for module in ("ifcopenshell", "pyproj", "numpy"):
+        try:
+            imported = __import__(module)
+            env[module] = getattr(imported, "__version__", None) or str(getattr(imported, "version", None))
+        except Exception:
+            env[module] = None
+    return env
+
+
+def _record_key(record: dict) -> tuple:
+    return tuple(record.get(k) for k in ("case", "schema", "elements", "sites", "contexts", "operations"))
+
+
+def compare_results(current: dict, baseline: dict, threshold: float = 0.2, min_delta_ms: float = 1.0) -> list:
+    """Cases whose median latency grew more than `threshold` (and `min_delta_ms`) over the baseline."""
+    previous = {_record_key(r): r for r in baseline.get("results", []) if r.get("latency_ms")}
+    regressions = []
+    for record in current.get("results", []):
+        before = previous.get(_record_key(record))
+        if not before or not record.get("latency_ms"):
+            continue
+        old, new = before["latency_ms"]["median"], record["latency_ms"]["median"]
+        if new > old * (1.0 + threshold) and new - old >= min_delta_ms:
+            regressions.append({"key": dict(zip(("case", "schema", "elements", "sites", "contexts", "operations"),
+                                                _record_key(record))),
+                                "baseline_ms": old, "current_ms": new, "ratio": round(new / old, 3) if old else None})
+    return regressions
+
+
+def _int_list(text: str) -> list:
+    return [int(v) for v in text.split(",") if v.strip()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--schemas", default="IFC2X3,IFC4", help="Comma-separated: IFC2X3, IFC4, IFC4X3")
+    parser.add_argument("--elements", default="1000,10000", help="Comma-separated element counts")
+    parser.add_argument("--sites", default="1", help="Comma-separated site counts")
+    parser.add_argument("--contexts", default="1", help="Comma-separated top-level context counts")
+    parser.add_argument("--operations", default="0,1", help="Comma-separated counts of existing MapConversions")
+    parser.add_argument("--cases", default=",".join(CASES), help="Comma-separated: " + ", ".join(CASES))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--workdir", default=None, help="Where models are generated (default: a temp dir)")
+    parser.add_argument("--keep-files", action="store_true", help="Do not delete the generated models")
+    parser.add_argument("--output", default="georef_bench.json")
+    parser.add_argument("--compare", default=None, help="Previous results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed median slowdown (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    cases = [c for c in args.cases.split(",") if c]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown case(s): {', '.join(sorted(unknown))}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="georef_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    handlers = load_handlers()
+    results = {"format": BENCH_FORMAT, "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+               "environment": environment(), "results": []}
+
+    grid = itertools.product(args.schemas.split(","), _int_list(args.elements), _int_list(args.sites),
+                             _int_list(args.contexts), _int_list(args.operations))
+    seen = set()
+    for schema, elements, sites, contexts, operations in grid:
+        if schema == "IFC2X3":
+            operations = 0  # No IfcMapConversion in IFC2X3
+        if (schema, elements, sites, contexts, operations) in seen:
+            continue
+        seen.add((schema, elements, sites, contexts, operations))
+
+        path = os.path.join(workdir, f"bench_{schema}_{elements}_{sites}_{contexts}_{operations}.ifc")
+        start = time.perf_counter()
+        model = write_synthetic_ifc(path, schema, elements, sites, contexts, operations)
+        print(f"{schema} elements={elements} sites={sites} contexts={contexts} operations={operations} "
+              f"({model['file_bytes'] / 1e6:.1f} MB, generated in {time.perf_counter() - start:.1f}s)", flush=True)
+        for record in run_model_cases(model, handlers, cases, args.repeats, workdir):
+            results["results"].append(record)
+            latency = record.get("latency_ms") or {}
+            print(f"  {record['case']:<13} median={latency.get('median')} ms  rss_peak={record.get('rss_peak_kb')} kB"
+                  f"  ok={record['success']}" + (f"  ({record['error']})" if record.get("error") else ""), flush=True)
+        if not args.keep_files:
+            os.remove(path)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            regressions = compare_results(results, json.load(fh), args.threshold)
+        results["regressions"] = regressions
+        for r in regressions:
+            print(f"REGRESSION {r['key']}: {r['baseline_ms']} ms -> {r['current_ms']} ms (x{r['ratio']})")
+        exit_code = 1 if regressions else 0
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)  # Serialize first: no half-written results file
+    with open(args.output, "w", encoding="utf-8") as fh:
+        fh.write(text)
+    print(f"Results written to {args.output}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
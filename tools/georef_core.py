@@ -0,0 +1,6215 @@
+"""
+IMPORTANT:
+
+    This file is a standalone helper module shared by the georeferencing
+    snippets in this folder. It must be copied next to addon.py (the
+    Blender add-ons folder is on sys.path, so `import georef_core` works).
+    It does not depend on bpy or Bonsai.
+"""
+
+import bisect
+import glob as _glob
+import mmap
+import os
+import re
+import socket
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from types import MappingProxyType
+
+
+#---------------------------------------------------------------------------------------------------
+# pyproj Transformer pool
+#---------------------------------------------------------------------------------------------------
+
+# Maximum number of Transformers kept alive (LRU eviction beyond that)
+TRANSFORMER_CACHE_SIZE = int(os.environ.get("BONSAI_MCP_TRANSFORMER_CACHE_SIZE", "32"))
+
+# EPSG codes built in the background when the add-on starts.
+# Override with e.g. BONSAI_MCP_PREWARM_EPSG="25830,25831,32630"
+PREWARM_EPSG_CODES = [
+    int(code) for code in
+    os.environ.get("BONSAI_MCP_PREWARM_EPSG", "25829,25830,25831,32629,32630,32631,3857").split(",")
+    if code.strip()
+]
+
+
+def crs_key(crs):
+    """Normalizes 4326 / "4326" / "epsg:4326" to "EPSG:4326"; other strings are kept as given."""
+    if isinstance(crs, int):
+        return f"EPSG:{crs}"
+    text = str(crs).strip()
+    if text.isdigit():
+        return f"EPSG:{text}"
+    if text.upper().startswith("EPSG:"):
+        return "EPSG:" + text[5:].strip()
+    return text
+
+
+class TransformerPool:
+    """
+    Process-wide LRU registry of pyproj Transformers keyed by
+    (source CRS, target CRS, always_xy).
+
+    Transformers are built outside the lock, so a slow CRS database lookup
+    (e.g. while pre-warming) never blocks hits on other keys.
+    """
+
+    def __init__(self, maxsize: int = TRANSFORMER_CACHE_SIZE):
+        self.maxsize = max(1, int(maxsize))
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, source, target, always_xy: bool = True):
+        """Returns (transformer, hit). Raises ImportError if pyproj is not installed."""
+        key = (crs_key(source), crs_key(target), bool(always_xy))
+        with self._lock:
+            transformer = self._items.get(key)
+            if transformer is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return transformer, True
+            self.misses += 1
+
+        from pyproj import Transformer
+        transformer = Transformer.from_crs(key[0], key[1], always_xy=key[2])
+
+        with self._lock:
+            # Another thread may have built the same key meanwhile; keep the first one
+            existing = self._items.get(key)
+            if existing is not None:
+                self._items.move_to_end(key)
+                return existing, False
+            self._items[key] = transformer
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+                self.evictions += 1
+        return transformer, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._items),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "keys": [f"{s}->{t}" + ("" if xy else " (authority axis order)") for s, t, xy in self._items],
+            }
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+TRANSFORMERS = TransformerPool()
+
+
+def get_transformer(source, target, always_xy: bool = True):
+    """Shortcut to TRANSFORMERS.get(); returns (transformer, hit)."""
+    return TRANSFORMERS.get(source, target, always_xy)
+
+
+def prewarm_transformers(epsg_codes=None, source="EPSG:4326"):
+    """
+    Builds WGS84 -> EPSG:<code> Transformers on a daemon thread so the first
+    georeferencing call does not pay the pyproj import and CRS lookup.
+    Returns the started thread (or None when there is nothing to do).
+    """
+    codes = PREWARM_EPSG_CODES if epsg_codes is None else list(epsg_codes)
+    if not codes:
+        return None
+
+    def _run():
+        for code in codes:
+            try:
+                TRANSFORMERS.get(source, code, True)
+            except Exception:
+                # pyproj missing or unknown code: nothing to pre-warm
+                if not _pyproj_available():
+                    return
+
+    thread = threading.Thread(target=_run, name="georef-transformer-prewarm", daemon=True)
+    thread.start()
+    return thread
+
+
+def _pyproj_available() -> bool:
+    try:
+        import pyproj  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+#---------------------------------------------------------------------------------------------------
+# Instrumentation (per-phase timings, metrics registry, one-call profiling)
+#---------------------------------------------------------------------------------------------------
+
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+PROFILE_MODES = ("cprofile", "tracemalloc")
+
+_PHASES = threading.local()
+
+
+class PhaseTimer:
+    """
+    Accumulates wall-clock time (and, while tracemalloc is tracing, allocated
+    bytes) per named phase. Phases may nest; each one reports inclusive totals.
+    """
+
+    def __init__(self):
+        self.phases = OrderedDict()
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        tracing = tracemalloc.is_tracing()
+        before = tracemalloc.get_traced_memory()[0] if tracing else None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry = self.phases.setdefault(name, {"ms": 0.0, "calls": 0})
+            entry["ms"] += (time.perf_counter() - start) * 1000.0
+            entry["calls"] += 1
+            if tracing and tracemalloc.is_tracing():
+                entry["alloc_kb"] = entry.get("alloc_kb", 0.0) + (tracemalloc.get_traced_memory()[0] - before) / 1024.0
+
+    def as_dict(self) -> dict:
+        return {
+            "total_ms": round((time.perf_counter() - self._start) * 1000.0, 3),
+            "phases": {
+                name: {k: round(v, 3) if isinstance(v, float) else v for k, v in entry.items()}
+                for name, entry in self.phases.items()
+            },
+        }
+
+
+@contextmanager
+def phase(name: str):
+    """Times a block into the PhaseTimer of the current call, if any (no-op otherwise)."""
+    timer = getattr(_PHASES, "timer", None)
+    if timer is None:
+        yield
+        return
+    with timer.phase(name):
+        yield
+
+
+class MetricsRegistry:
+    """Process-lifetime call counts, error counts and latency histograms per command."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._commands = {}
+        self.started = time.time()
+
+    def record(self, command: str, elapsed_ms: float, error: bool = False):
+        with self._lock:
+            m = self._commands.get(command)
+            if m is None:
+                m = self._commands[command] = {
+                    "calls": 0, "errors": 0, "total_ms": 0.0, "min_ms": None, "max_ms": 0.0,
+                    "last_ms": None, "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                }
+            m["calls"] += 1
+            m["errors"] += 1 if error else 0
+            m["total_ms"] += elapsed_ms
+            m["min_ms"] = elapsed_ms if m["min_ms"] is None else min(m["min_ms"], elapsed_ms)
+            m["max_ms"] = max(m["max_ms"], elapsed_ms)
+            m["last_ms"] = elapsed_ms
+            m["buckets"][bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    @staticmethod
+    def _quantile(buckets: list, calls: int, q: float):
+        """Upper bound of the histogram bucket holding the q-quantile (None = above the last bound)."""
+        if not calls:
+            return None
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS + (None,), buckets):
+            seen += count
+            if seen >= q * calls:
+                return bound
+        return None
+
+    def snapshot(self, command: str = None, reset: bool = False) -> dict:
+        with self._lock:
+            names = [command] if command else sorted(self._commands)
+            commands = {}
+            for name in names:
+                m = self._commands.get(name)
+                if m is None:
+                    continue
+                commands[name] = {
+                    "calls": m["calls"],
+                    "errors": m["errors"],
+                    "mean_ms": round(m["total_ms"] / m["calls"], 3) if m["calls"] else None,
+                    "min_ms": round(m["min_ms"], 3) if m["min_ms"] is not None else None,
+                    "max_ms": round(m["max_ms"], 3),
+                    "last_ms": round(m["last_ms"], 3) if m["last_ms"] is not None else None,
+                    "p50_le_ms": self._quantile(m["buckets"], m["calls"], 0.5),
+                    "p95_le_ms": self._quantile(m["buckets"], m["calls"], 0.95),
+                    # Non-empty buckets only: [upper bound in ms ("inf" for the overflow), count]
+                    "histogram": [
+                        [bound, count]
+                        for bound, count in zip(list(LATENCY_BUCKETS_MS) + ["inf"], m["buckets"]) if count
+                    ],
+                }
+            if reset:
+                for name in names:
+                    self._commands.pop(name, None)
+        return {"uptime_s": round(time.time() - self.started, 3), "commands": commands}
+
+
+METRICS = MetricsRegistry()
+
+
+def _is_error_result(result) -> bool:
+    if not isinstance(result, dict):
+        return False
+    return result.get("success") is False or (bool(result.get("error")) and "success" not in result)
+
+
+def _cprofile_report(profiler, top: int) -> list:
+    import pstats
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+    return [
+        {
+            "function": f"{func} ({os.path.basename(filename)}:{line})",
+            "ncalls": nc,
+            "tottime_ms": round(tt * 1000.0, 3),
+            "cumtime_ms": round(ct * 1000.0, 3),
+        }
+        for (filename, line, func), (cc, nc, tt, ct, callers) in rows
+    ]
+
+
+def run_instrumented(command: str, call, timings: bool = False, profile: str = None, profile_top: int = 25):
+    """
+    Runs `call()` (a handler body) for `command` and records it in METRICS.
+    timings=True adds "timings" (total + per-phase wall-clock ms, and allocated
+    kB when tracemalloc is tracing) to the returned dict. profile="cprofile"
+    or "tracemalloc" captures that one call and adds "profile" (top functions
+    by cumulative time, or top allocation sites and the peak traced memory).
+    """
+    if profile and profile not in PROFILE_MODES:
+        METRICS.record(command, 0.0, True)
+        return {"success": False, "error": f"profile must be one of {', '.join(PROFILE_MODES)}"}
+
+    timer = PhaseTimer() if timings else None
+    previous = getattr(_PHASES, "timer", None)
+    _PHASES.timer = timer
+
+    profiler = None
+    started_tracing = False
+    before = None
+    if profile == "cprofile":
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif profile == "tracemalloc":
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            started_tracing = True
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+
+    start = time.perf_counter()
+    result = None
+    failed = True
+    peak = after = None
+    try:
+        result = call()
+        failed = _is_error_result(result)
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        if profiler is not None:
+            profiler.disable()
+        if profile == "tracemalloc":
+            if isinstance(result, dict):
+                peak = tracemalloc.get_traced_memory()[1]
+                after = tracemalloc.take_snapshot()
+            # Tracing slows every allocation: never leave it on after the call, whatever it returned
+            if started_tracing:
+                tracemalloc.stop()
+        _PHASES.timer = previous
+        METRICS.record(command, elapsed_ms, failed)
+
+    if not isinstance(result, dict) or not (timings or profile):
+        return result
+
+    result = dict(result)
+    if timer is not None:
+        result["timings"] = timer.as_dict()
+    if profiler is not None:
+        result["profile"] = {"mode": "cprofile", "top": _cprofile_report(profiler, profile_top)}
+    elif profile == "tracemalloc":
+        ignore = (tracemalloc.Filter(False, tracemalloc.__file__),)
+        after = after.filter_traces(ignore)
+        before = before.filter_traces(ignore)
+        result["profile"] = {
+            "mode": "tracemalloc",
+            "peak_kb": round(peak / 1024.0, 3),
+            "top": [
+                {"where": str(stat.traceback[0]), "size_kb": round(stat.size_diff / 1024.0, 3), "count": stat.count_diff}
+                for stat in after.compare_to(before, "lineno")[:profile_top]
+            ],
+        }
+    return result
+
+
+def georeferencing_metrics(command: str = None, reset: bool = False) -> dict:
+    """METRICS snapshot plus the state of the shared caches and background jobs."""
+    snapshot = METRICS.snapshot(command, reset)
+    with _JOBS_LOCK:
+        jobs = {}
+        for job in JOBS.values():
+            jobs[job.state] = jobs.get(job.state, 0) + 1
+    snapshot["counters"] = {
+        "transformer_cache": TRANSFORMERS.stats(),
+        "info_cache_entries": len(_INFO_CACHE),
+        "placement_cache_entries": len(_PLACEMENT_CACHE),
+        "spatial_index_entries": len(_SPATIAL_CACHE),
+        "snapshot": SNAPSHOTS.stats(),
+        "stored_plans": len(_PLANS),
+        "jobs": jobs,
+    }
+    snapshot["success"] = True
+    return snapshot
+
+
+#---------------------------------------------------------------------------------------------------
+# Georeferencing info extraction
+#---------------------------------------------------------------------------------------------------
+
+def iter_representation_contexts(project):
+    """
+    Yields (context, parent) for every representation context of `project`: its
+    RepresentationContexts, then their sub-contexts through the HasSubContexts
+    inverse (no by_type scan). `parent` is None for top-level contexts.
+    """
+    pending = deque((ctx, None) for ctx in (getattr(project, "RepresentationContexts", None) or []))
+    seen = set()
+    while pending:
+        ctx, parent = pending.popleft()
+        if ctx.id() in seen:
+            continue
+        seen.add(ctx.id())
+        yield ctx, parent
+        pending.extend((sub, ctx) for sub in (getattr(ctx, "HasSubContexts", None) or ()))
+
+
+def entity_key(entity) -> str:
+    """GlobalId of a rooted entity, or "#<id>" for entities without one (contexts)."""
+    try:
+        global_id = entity.GlobalId
+    except AttributeError:
+        global_id = None
+    return global_id or f"#{entity.id()}"
+
+
+def _read_context_placement(ctx, ctx_entry: dict, warnings: list):
+    # WorldCoordinateSystem → Local origin
+    try:
+        wcs = getattr(ctx, "WorldCoordinateSystem", None)
+        if wcs and getattr(wcs, "Location", None):
+            loc = wcs.Location
+            if getattr(loc, "Coordinates", None):
+                ctx_entry["world_origin"] = list(loc.Coordinates)
+    except Exception as e:
+        warnings.append(f"WorldCoordinateSystem read error (#{ctx.id()}): {str(e)}")
+
+    # TrueNorth
+    try:
+        if hasattr(ctx, "TrueNorth") and ctx.TrueNorth:
+            ctx_entry["true_north"] = list(getattr(ctx.TrueNorth, "DirectionRatios", []) or [])
+    except Exception as e:
+        warnings.append(f"TrueNorth read error (#{ctx.id()}): {str(e)}")
+
+
+def _read_context(ctx, warnings: list, parent_entry: dict = None) -> dict:
+    ctx_entry = {
+        "id": ctx.id(),
+        "context_identifier": getattr(ctx, "ContextIdentifier", None),
+        "context_type": getattr(ctx, "ContextType", None),
+        "world_origin": None,
+        "true_north": None,
+        "has_coordinate_operation": []
+    }
+
+    if parent_entry is not None:
+        # Sub-contexts derive both from their parent (written as `*` in the file)
+        ctx_entry["world_origin"] = parent_entry["world_origin"]
+        ctx_entry["true_north"] = parent_entry["true_north"]
+    else:
+        _read_context_placement(ctx, ctx_entry, warnings)
+
+    # HasCoordinateOperation → IfcMapConversion / TargetCRS
+    try:
+        for op in getattr(ctx, "HasCoordinateOperation", None) or ():
+            op_entry = {"type": op.is_a(), "target_crs": None, "map_conversion": None}
+
+            # TargetCRS
+            crs = getattr(op, "TargetCRS", None)
+            if crs:
+                try:
+                    map_unit = getattr(crs, "MapUnit", None)
+                    map_unit = map_unit.Name if map_unit else None
+                except Exception:
+                    map_unit = None
+                op_entry["target_crs"] = {
+                    "name": getattr(crs, "Name", None),
+                    "geodetic_datum": getattr(crs, "GeodeticDatum", None),
+                    "vertical_datum": getattr(crs, "VerticalDatum", None),
+                    "map_unit": map_unit
+                }
+
+            # IfcMapConversion
+            if op.is_a("IfcMapConversion"):
+                op_entry["map_conversion"] = {
+                    "eastings": getattr(op, "Eastings", None),
+                    "northings": getattr(op, "Northings", None),
+                    "orthogonal_height": getattr(op, "OrthogonalHeight", None),
+                    "scale": getattr(op, "Scale", None),
+                    "x_axis_abscissa": getattr(op, "XAxisAbscissa", None),
+                    "x_axis_ordinate": getattr(op, "XAxisOrdinate", None)
+                }
+
+            ctx_entry["has_coordinate_operation"].append(op_entry)
+    except Exception as e:
+        warnings.append(f"HasCoordinateOperation read error (#{ctx.id()}): {str(e)}")
+
+    return ctx_entry
+
+
+def _summarize_contexts(ctx_entries: list) -> dict:
+    """
+    Project-level view of its contexts. Each value comes from the first context
+    that has it, top-level "Model" contexts first, then the other top-level
+    contexts, then sub-contexts (instead of whichever context was visited last).
+    """
+    ordered = sorted(
+        ctx_entries,
+        key=lambda c: 2 if c["parent_context"] is not None else 0 if (c["context_type"] or "").lower() == "model" else 1,
+    )
+    summary = {
+        "crs": {"name": None, "geodetic_datum": None, "vertical_datum": None, "map_unit": None},
+        "map_conversion": {
+            "eastings": None, "northings": None, "orthogonal_height": None,
+            "scale": None, "x_axis_abscissa": None, "x_axis_ordinate": None
+        },
+        "world_origin": next((c["world_origin"] for c in ordered if c["world_origin"]), None),
+        "true_north": next((c["true_north"] for c in ordered if c["true_north"]), None),
+    }
+    operations = [op for c in ordered for op in c["has_coordinate_operation"]]
+    # Prefer the CRS of the MapConversion that is reported, so both describe the same operation
+    op = next((op for op in operations if op["map_conversion"]), None) \
+        or next((op for op in operations if op["target_crs"]), None)
+    if op:
+        if op["target_crs"]:
+            summary["crs"].update(op["target_crs"])
+        if op["map_conversion"]:
+            summary["map_conversion"].update(op["map_conversion"])
+    summary["georeferenced"] = bool(
+        any(summary["crs"].values()) and any(v is not None for v in summary["map_conversion"].values())
+    )
+    return summary
+
+
+def _read_site(site, warnings: list) -> dict:
+    site_entry = {
+        "name": getattr(site, "Name", None),
+        "project": None,
+        "parent_site": None,
+        "local_placement_origin": None,
+        "ref_latitude": None,
+        "ref_longitude": None,
+        "ref_elevation": None
+    }
+
+    # Aggregation parents through the Decomposes inverse (sites may nest in sites)
+    try:
+        parent, hops = site, 0
+        while parent is not None and hops < 32:
+            rels = getattr(parent, "Decomposes", None) or ()
+            parent = rels[0].RelatingObject if rels else None
+            hops += 1
+            if parent is None:
+                break
+            if parent.is_a("IfcProject"):
+                site_entry["project"] = entity_key(parent)
+                break
+            if parent.is_a("IfcSite") and site_entry["parent_site"] is None:
+                site_entry["parent_site"] = entity_key(parent)
+    except Exception as e:
+        warnings.append(f"IfcSite.Decomposes read error ({entity_key(site)}): {str(e)}")
+
+    # LocalPlacement
+    try:
+        if getattr(site, "ObjectPlacement", None):
+            placement = site.ObjectPlacement
+            axisPlacement = getattr(placement, "RelativePlacement", None)
+            if axisPlacement and getattr(axisPlacement, "Location", None):
+                loc = axisPlacement.Location
+                if getattr(loc, "Coordinates", None):
+                    site_entry["local_placement_origin"] = list(loc.Coordinates)
+    except Exception as e:
+        warnings.append(f"IfcSite.ObjectPlacement read error ({entity_key(site)}): {str(e)}")
+
+    # Lat/Long/Alt
+    try:
+        lat = getattr(site, "RefLatitude", None)
+        lon = getattr(site, "RefLongitude", None)
+        site_entry["ref_latitude"] = list(lat) if lat else None
+        site_entry["ref_longitude"] = list(lon) if lon else None
+        site_entry["ref_elevation"] = getattr(site, "RefElevation", None)
+    except Exception as e:
+        warnings.append(f"IfcSite (lat/long/elev) read error ({entity_key(site)}): {str(e)}")
+
+    return site_entry
+
+
+def extract_georeferencing_info(projects, sites, include_contexts: bool = False, debug: dict = None) -> dict:
+    """
+    Builds the `get_ifc_georeferencing_info` result from IfcProject / IfcSite
+    entities. Works with ifcopenshell entities and with the lazy records of
+    StepGeorefScanner alike (only getattr / is_a and the HasCoordinateOperation,
+    HasSubContexts and Decomposes inverses are used).
+
+    Every project, context (sub-contexts included) and site is covered in one
+    pass: `projects` and `sites` are keyed by GlobalId, contexts by "#<id>".
+    The legacy top-level keys describe the first project and the first site.
+    """
+    debug = {} if debug is None else debug
+    warnings = []
+    result = {
+        "georeferenced": False,
+        "crs": {
+            "name": None,
+            "geodetic_datum": None,
+            "vertical_datum": None,
+            "map_unit": None
+        },
+        "map_conversion": {
+            "eastings": None,
+            "northings": None,
+            "orthogonal_height": None,
+            "scale": None,
+            "x_axis_abscissa": None,
+            "x_axis_ordinate": None
+        },
+        "world_coordinate_system": {"origin": None},
+        "true_north": {"direction_ratios": None},
+        "site": {
+            "local_placement_origin": None,
+            "ref_latitude": None,
+            "ref_longitude": None,
+            "ref_elevation": None
+        },
+        "projects": {},
+        "sites": {},
+        "contexts": [],
+        "warnings": warnings,
+        "debug": debug,
+    }
+
+    # --- IfcProject & RepresentationContexts (+ sub-contexts) ---
+    debug["projects"] = len(projects)
+    debug["contexts"] = 0
+    for project in projects:
+        project_key = entity_key(project)
+        ctx_entries = []
+        by_id = {}
+        for ctx, parent in iter_representation_contexts(project):
+            ctx_entry = _read_context(ctx, warnings, by_id.get(parent.id()) if parent is not None else None)
+            by_id[ctx.id()] = ctx_entry
+            ctx_entry["project"] = project_key
+            ctx_entry["parent_context"] = parent.id() if parent is not None else None
+            ctx_entries.append(ctx_entry)
+        debug["contexts"] += len(ctx_entries)
+
+        summary = _summarize_contexts(ctx_entries)
+        result["projects"][project_key] = {
+            "name": getattr(project, "Name", None),
+            "georeferenced": summary["georeferenced"],
+            "crs": summary["crs"],
+            "map_conversion": summary["map_conversion"],
+            "world_coordinate_system": {"origin": summary["world_origin"]},
+            "true_north": {"direction_ratios": summary["true_north"]},
+            "contexts": [f"#{c['id']}" for c in ctx_entries],
+        }
+        if project is projects[0]:
+            result["crs"] = dict(summary["crs"])
+            result["map_conversion"] = dict(summary["map_conversion"])
+            result["world_coordinate_system"]["origin"] = summary["world_origin"]
+            result["true_north"]["direction_ratios"] = summary["true_north"]
+        if include_contexts:
+            result["contexts"].extend(ctx_entries)
+    if not projects:
+        warnings.append("IfcProject entity was not found.")
+
+    # --- IfcSite (lat/long/alt local origin of placement) ---
+    try:
+        debug["sites"] = len(sites)
+        # A file has a single IfcProject: sites that are not aggregated (or whose
+        # relationships were not read, e.g. in path scans) are attributed to it
+        only_project = entity_key(projects[0]) if len(projects) == 1 else None
+        for site in sites:
+            site_entry = _read_site(site, warnings)
+            site_entry["project"] = site_entry["project"] or only_project
+            result["sites"][entity_key(site)] = site_entry
+            if site is sites[0]:
+                result["site"].update({k: site_entry[k] for k in result["site"]})
+        if not sites:
+            warnings.append("IfcSite was not found.")
+    except Exception as e:
+        warnings.append(f"Error while querying IfcSite: {str(e)}")
+
+    # --- Heuristic to determine georeferencing ---
+    geo_flags = [
+        any(result["crs"].values()),
+        any(v is not None for v in result["map_conversion"].values())
+    ]
+    result["georeferenced"] = all(geo_flags)
+
+    return result
+
+
+#---------------------------------------------------------------------------------------------------
+# Georeferencing info cache (loaded models)
+#---------------------------------------------------------------------------------------------------
+
+# Explicit invalidations per file (bumped by georeference_file and any other mutating handler)
+_GENERATIONS = {}
+_INFO_CACHE = OrderedDict()
+_INFO_CACHE_LOCK = threading.Lock()
+INFO_CACHE_SIZE = 8
+
+
+def _max_id(file):
+    try:
+        return file.get_max_id()
+    except Exception:
+        try:
+            return file.wrapped_data.getMaxId()
+        except Exception:
+            return None
+
+
+# Records read by extract_georeferencing_info, fingerprinted by their STEP text in model_revision
+_REVISION_TYPES = ("IfcProject", "IfcGeometricRepresentationContext", "IfcCoordinateOperation",
+                   "IfcCoordinateReferenceSystem", "IfcSite")
+
+
+def _georef_records(file):
+    """The georeferencing records of `file` and the placement/unit records they point to."""
+    for ifc_type in _REVISION_TYPES:
+        try:
+            entities = file.by_type(ifc_type)
+        except RuntimeError:
+            continue  # Not in this schema (IFC2X3 has no coordinate operations)
+        for entity in entities:
+            yield entity
+            if ifc_type == "IfcGeometricRepresentationContext" and not entity.is_a("IfcGeometricRepresentationSubContext"):
+                # Sub-contexts derive these from their parent (new transient entities on every read)
+                wcs = getattr(entity, "WorldCoordinateSystem", None)
+                yield from (r for r in (wcs, getattr(wcs, "Location", None), getattr(entity, "TrueNorth", None)) if r)
+            elif ifc_type == "IfcCoordinateReferenceSystem" and getattr(entity, "MapUnit", None):
+                yield entity.MapUnit
+            elif ifc_type == "IfcSite" and entity.ObjectPlacement is not None:
+                relative = getattr(entity.ObjectPlacement, "RelativePlacement", None)
+                yield from (r for r in (relative, getattr(relative, "Location", None)) if r)
+
+
+def georef_fingerprint(file):
+    """
+    Hash of the STEP text of the records the georeferencing info is read from
+    (a few dozen records, whatever the model size). It changes with any edit of
+    those attributes, including edits made outside ifcopenshell transactions.
+    """
+    try:
+        return hash(tuple(str(record) for record in _georef_records(file)))
+    except Exception:
+        return None
+
+
+def model_revision(file) -> tuple:
+    """
+    Cheap fingerprint of the state of a loaded model: explicit generation,
+    highest entity id, the undo/redo history (Bonsai wraps every edit in an
+    ifcopenshell transaction) and georef_fingerprint(), so edits of the
+    georeferencing records made outside transactions are seen as well. Other
+    edits outside transactions (e.g. element placements) and outside our
+    handlers must call invalidate_georeferencing_info().
+    """
+    history = getattr(file, "history", None) or []
+    future = getattr(file, "future", None) or []
+    return (
+        _GENERATIONS.get(id(file), 0),
+        _max_id(file),
+        len(history),
+        id(history[-1]) if history else None,
+        len(future),
+        georef_fingerprint(file),
+    )
+
+
+def invalidate_georeferencing_info(file=None):
+    """Drops the cached info of `file` (or of every file) and bumps its generation."""
+    with _INFO_CACHE_LOCK:
+        if file is None:
+            _INFO_CACHE.clear()
+            for key in _GENERATIONS:
+                _GENERATIONS[key] += 1
+            return
+        _GENERATIONS[id(file)] = _GENERATIONS.get(id(file), 0) + 1
+        _INFO_CACHE.pop(id(file), None)
+
+
+def cached_georeferencing_info(file, include_contexts: bool = False, debug: dict = None) -> dict:
+    """
+    extract_georeferencing_info for a loaded model, memoized per file and
+    model_revision(). The returned dict shares its nested values with the
+    cache entry, so callers must treat it as read-only.
+    """
+    debug = {} if debug is None else debug
+    with phase("cache_lookup"):
+        revision = model_revision(file)
+        with _INFO_CACHE_LOCK:
+            entry = _INFO_CACHE.get(id(file))
+            if entry is not None and entry[0] is file and entry[1] == revision:
+                _INFO_CACHE.move_to_end(id(file))
+                cached = entry[2]
+            else:
+                cached = None
+
+    if cached is None:
+        with phase("by_type"):
+            projects, sites = file.by_type("IfcProject"), file.by_type("IfcSite")
+        # Always build with contexts so one entry serves both variants
+        with phase("extract"):
+            cached = extract_georeferencing_info(projects, sites, True, dict(debug))
+        with _INFO_CACHE_LOCK:
+            _INFO_CACHE[id(file)] = (file, revision, cached)
+            _INFO_CACHE.move_to_end(id(file))
+            while len(_INFO_CACHE) > INFO_CACHE_SIZE:
+                _INFO_CACHE.popitem(last=False)
+        from_cache = False
+    else:
+        from_cache = True
+
+    result = dict(cached)
+    if not include_contexts:
+        result["contexts"] = []
+    result["debug"] = dict(cached["debug"], **{k: v for k, v in debug.items() if k not in cached["debug"]})
+    result["debug"]["cache_hit"] = from_cache
+    result["from_cache"] = from_cache
+    return result
+
+
+#---------------------------------------------------------------------------------------------------
+# Read-only georeferencing snapshot (read queries answered off Blender's main thread)
+#---------------------------------------------------------------------------------------------------
+
+# How often the main-thread timer checks the interactive model for edits made outside our
+# handlers (Bonsai UI, scripts); edits made by our handlers are captured as they complete
+SNAPSHOT_REFRESH_S = float(os.environ.get("BONSAI_MCP_SNAPSHOT_REFRESH", "0.5"))
+# Commands the add-on's socket thread may answer from the snapshot (no path, snapshot not disabled)
+SNAPSHOT_COMMANDS = frozenset({"get_ifc_georeferencing_info", "transform_ifc_coordinates"})
+
+
+def _freeze(value):
+    """Deep read-only copy of a JSON-like value (mappingproxy / tuple)."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    """Plain dict/list copy of a frozen value, safe to project and serialize."""
+    if isinstance(value, MappingProxyType):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+class GeorefSnapshot:
+    """
+    Immutable georeferencing state of the interactive model at one model
+    revision: projects, contexts and their coordinate operations, CRS, sites
+    and their placements (the full get_ifc_georeferencing_info, contexts
+    included). `info` is None when no IFC file was loaded.
+    """
+
+    __slots__ = ("seq", "revision", "info", "captured_at", "capture_ms")
+
+    def __init__(self, seq: int, revision, info, capture_ms: float):
+        for name, value in (("seq", seq), ("revision", revision), ("info", _freeze(info)),
+                            ("captured_at", time.time()), ("capture_ms", round(capture_ms, 3))):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("GeorefSnapshot is read-only")
+
+    def describe(self) -> dict:
+        return {"seq": self.seq, "captured_at": self.captured_at, "capture_ms": self.capture_ms,
+                "age_ms": round((time.time() - self.captured_at) * 1000.0, 3)}
+
+
+class SnapshotStore:
+    """
+    Publishes a GeorefSnapshot of the interactive model and answers read-only
+    commands from it on any thread.
+
+    Only the main thread touches the model: refresh() (after every command the
+    add-on runs there, and from a periodic bpy.app.timers callback) compares
+    model_revision() and captures a new snapshot when it changed. Publishing is
+    a single reference swap, so the socket thread reads either the old or the
+    new snapshot, never a mix, and never waits for a main-thread command in
+    progress. A client sees its own edits, since the snapshot is refreshed
+    before the add-on sends the reply of an edit.
+    """
+
+    def __init__(self):
+        self._current = None
+        self._lock = threading.Lock()
+        self._seq = 0
+        self.refreshes = 0
+        self.captures = 0
+        self.served = 0
+        self.bypassed = 0
+
+    @property
+    def current(self):
+        return self._current
+
+    def refresh(self, file, force: bool = False):
+        """Main thread only: captures a new snapshot if the model (or the loaded file) changed."""
+        self.refreshes += 1
+        current = self._current
+        revision = (id(file), model_revision(file)) if file is not None else None
+        if current is not None and not force and current.revision == revision:
+            return current
+        start = time.perf_counter()
+        info = None
+        if file is not None:
+            debug = {"entered": True, "has_ifc": True, "mode": "snapshot"}
+            info = cached_georeferencing_info(file, True, debug)
+            info.pop("from_cache", None)
+        with self._lock:
+            self._seq += 1
+            snapshot = GeorefSnapshot(self._seq, revision, info, (time.perf_counter() - start) * 1000.0)
+            self.captures += 1
+        self._current = snapshot
+        return snapshot
+
+    def after_command(self, file, command: str):
+        """
+        Main thread only, after the add-on ran `command`: any command that is not
+        a snapshot read may have edited the model without a transaction (other
+        handlers, execute_blender_code), so its cached info is dropped and a new
+        snapshot is captured unconditionally.
+        """
+        if command in SNAPSHOT_COMMANDS:
+            return self.refresh(file)
+        if file is not None:
+            invalidate_georeferencing_info(file)
+        return self.refresh(file, force=True)
+
+    def clear(self):
+        self._current = None
+
+    def timer(self, get_file, interval: float = None):
+        """A bpy.app.timers callback refreshing the snapshot every `interval` seconds."""
+        interval = SNAPSHOT_REFRESH_S if interval is None else float(interval)
+
+        def tick():
+            try:
+                self.refresh(get_file())
+            except Exception:
+                pass  # Never unregister the timer; the next tick tries again
+            return interval
+
+        return tick
+
+    def serve(self, command: str, params: dict = None):
+        """
+        Answers `command` from the current snapshot, or returns None when it must
+        run on the main thread (other command, `path` given, snapshot=False, or
+        no snapshot captured yet). Safe to call from any thread; invalid
+        parameters give an error result instead of raising into the socket loop.
+        """
+        params = dict(params or {})
+        snapshot = self._current
+        if (command not in SNAPSHOT_COMMANDS or params.get("path") or params.pop("snapshot", True) is False
+                or snapshot is None):
+            with self._lock:
+                self.bypassed += 1
+            return None
+        with self._lock:
+            self.served += 1
+        try:
+            if command == "get_ifc_georeferencing_info":
+                return snapshot_info_command(snapshot, **params)
+            return snapshot_transform_command(snapshot, **params)
+        except Exception as e:
+            import traceback
+            return {"success": False, "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}
+
+    def stats(self) -> dict:
+        snapshot = self._current
+        return {
+            "snapshot": snapshot.describe() if snapshot is not None else None,
+            "refreshes": self.refreshes,
+            "captures": self.captures,
+            "served": self.served,
+            "bypassed": self.bypassed,
+        }
+
+
+SNAPSHOTS = SnapshotStore()
+
+
+def snapshot_info_command(snapshot: GeorefSnapshot, include_contexts: bool = False, fields: list = None,
+                          timings: bool = False, profile: str = None) -> dict:
+    """`get_ifc_georeferencing_info` answered from a snapshot (no model access)."""
+    def run():
+        if snapshot.info is None:
+            return {"error": "No IFC file is currently loaded",
+                    "debug": {"entered": True, "has_ifc": False, "mode": "snapshot"}}
+        with phase("snapshot_read"):
+            result = _thaw(snapshot.info)
+        if not include_contexts:
+            result["contexts"] = []
+        result["from_cache"] = True
+        result["snapshot"] = snapshot.describe()
+        return project_fields(result, fields)
+
+    return run_instrumented("get_ifc_georeferencing_info", run, timings=timings, profile=profile)
+
+
+def snapshot_transform_command(snapshot: GeorefSnapshot, map_conversion: dict = None, map_crs: str = None,
+                               timings: bool = False, profile: str = None, **params) -> dict:
+    """`transform_ifc_coordinates` with the MapConversion/CRS of a snapshot (no model access)."""
+    def run():
+        mc, crs = map_conversion, map_crs
+        if mc is None:
+            if snapshot.info is None:
+                return {"success": False, "error": "No IFC file is currently loaded"}
+            info = snapshot.info
+            if info["map_conversion"].get("eastings") is not None:
+                mc = _thaw(info["map_conversion"])
+            crs = crs or (info.get("crs") or {}).get("name")
+        try:
+            result = transform_points(map_conversion=mc, map_crs=crs, **params)
+        except (ValueError, RuntimeError) as e:
+            # Ragged points, unknown CRS (pyproj's CRSError is a RuntimeError)
+            import traceback
+            return {"success": False, "error": str(e), "traceback": traceback.format_exc(),
+                    "snapshot": snapshot.describe()}
+        if isinstance(result, dict):
+            result["snapshot"] = snapshot.describe()
+        return result
+
+    return run_instrumented("transform_ifc_coordinates", run, timings=timings, profile=profile)
+
+
+#---------------------------------------------------------------------------------------------------
+# Header-only STEP scanner (IFC on disk, no full parse)
+#---------------------------------------------------------------------------------------------------
+
+# Record types located by the single scan pass; everything else is resolved on demand by id
+_SCAN_ROOT_TYPES = (
+    "IFCPROJECT", "IFCGEOMETRICREPRESENTATIONCONTEXT", "IFCGEOMETRICREPRESENTATIONSUBCONTEXT",
+    "IFCMAPCONVERSION", "IFCPROJECTEDCRS", "IFCSITE", "IFCRELAGGREGATES", "IFCSIUNIT",
+)
+# Starts with the literal "IFC" so the regex engine can use its fast prefix search;
+# the `#id=` in front of each hit is checked afterwards with _SCAN_ID_RE.
+_SCAN_ROOT_RE = re.compile(
+    rb"IFC(" + b"|".join(t[3:].encode() for t in _SCAN_ROOT_TYPES) + rb")[ \t]*\("
+)
+_SCAN_ID_RE = re.compile(rb"(?:^|[\r\n;])[ \t]*#(\d+)[ \t]*=[ \t]*$")
+_RECORD_START_RE = re.compile(rb"(?m)^[ \t]*#(\d+)[ \t]*=[ \t]*([A-Z0-9_]+)[ \t]*\(")
+
+# Explicit attribute names (same positions in IFC2X3, IFC4 and IFC4X3) of the records we read
+_STEP_ATTRIBUTES = {
+    "IFCPROJECT": ("IfcProject", ("GlobalId", "OwnerHistory", "Name", "Description", "ObjectType",
+                                  "LongName", "Phase", "RepresentationContexts", "UnitsInContext")),
+    "IFCSITE": ("IfcSite", ("GlobalId", "OwnerHistory", "Name", "Description", "ObjectType",
+                            "ObjectPlacement", "Representation", "LongName", "CompositionType",
+                            "RefLatitude", "RefLongitude", "RefElevation", "LandTitleNumber", "SiteAddress")),
+    "IFCGEOMETRICREPRESENTATIONCONTEXT": ("IfcGeometricRepresentationContext",
+                                          ("ContextIdentifier", "ContextType", "CoordinateSpaceDimension",
+                                           "Precision", "WorldCoordinateSystem", "TrueNorth")),
+    "IFCGEOMETRICREPRESENTATIONSUBCONTEXT": ("IfcGeometricRepresentationSubContext",
+                                             ("ContextIdentifier", "ContextType", "CoordinateSpaceDimension",
+                                              "Precision", "WorldCoordinateSystem", "TrueNorth", "ParentContext",
+                                              "TargetScale", "TargetView", "UserDefinedTargetView")),
+    "IFCRELAGGREGATES": ("IfcRelAggregates", ("GlobalId", "OwnerHistory", "Name", "Description",
+                                              "RelatingObject", "RelatedObjects")),
+    "IFCMAPCONVERSION": ("IfcMapConversion", ("SourceCRS", "TargetCRS", "Eastings", "Northings",
+                                              "OrthogonalHeight", "XAxisAbscissa", "XAxisOrdinate", "Scale")),
+    "IFCPROJECTEDCRS": ("IfcProjectedCRS", ("Name", "Description", "GeodeticDatum", "VerticalDatum",
+                                            "MapProjection", "MapZone", "MapUnit")),
+    "IFCLOCALPLACEMENT": ("IfcLocalPlacement", ("PlacementRelTo", "RelativePlacement")),
+    "IFCAXIS2PLACEMENT3D": ("IfcAxis2Placement3D", ("Location", "Axis", "RefDirection")),
+    "IFCAXIS2PLACEMENT2D": ("IfcAxis2Placement2D", ("Location", "RefDirection")),
+    "IFCCARTESIANPOINT": ("IfcCartesianPoint", ("Coordinates",)),
+    "IFCDIRECTION": ("IfcDirection", ("DirectionRatios",)),
+    "IFCSIUNIT": ("IfcSIUnit", ("Dimensions", "UnitType", "Prefix", "Name")),
+    "IFCCONVERSIONBASEDUNIT": ("IfcConversionBasedUnit", ("Dimensions", "UnitType", "Name", "ConversionFactor")),
+}
+
+
+class _StepRef(int):
+    """An unresolved `#id` reference inside a parsed STEP record."""
+
+
+def _decode_step_string(raw: str) -> str:
+    """Decodes the ISO 10303-21 escapes used by IFC writers (\\X2\\..\\X0\\, \\X\\hh, \\S\\c, '')."""
+    out, i, n = [], 0, len(raw)
+    while i < n:
+        if raw.startswith("\\X2\\", i):
+            end = raw.find("\\X0\\", i + 4)
+            hexs = raw[i + 4:end if end != -1 else n]
+            out.append("".join(chr(int(hexs[k:k + 4], 16)) for k in range(0, len(hexs) - 3, 4)))
+            i = (end + 4) if end != -1 else n
+        elif raw.startswith("\\X\\", i):
+            out.append(chr(int(raw[i + 3:i + 5], 16)))
+            i += 5
+        elif raw.startswith("\\S\\", i):
+            out.append(chr(ord(raw[i + 3]) + 128))
+            i += 4
+        elif raw.startswith("''", i):
+            out.append("'")
+            i += 2
+        else:
+            out.append(raw[i])
+            i += 1
+    return "".join(out)
+
+
+def _parse_step_args(text: str):
+    """Parses the parameter list of one STEP record (text between the outer parentheses)."""
+    pos = 0
+    n = len(text)
+
+    def value():
+        nonlocal pos
+        while pos < n and text[pos] in " \t\r\n":
+            pos += 1
+        c = text[pos]
+        if c == "'":
+            end = pos + 1
+            while True:
+                end = text.index("'", end)
+                if end + 1 < n and text[end + 1] == "'":
+                    end += 2
+                    continue
+                break
+            raw = text[pos + 1:end]
+            pos = end + 1
+            return _decode_step_string(raw)
+        if c == "(":
+            pos += 1
+            items = []
+            while True:
+                while text[pos] in " \t\r\n":
+                    pos += 1
+                if text[pos] == ")":
+                    pos += 1
+                    return tuple(items)
+                items.append(value())
+                while text[pos] in " \t\r\n":
+                    pos += 1
+                if text[pos] == ",":
+                    pos += 1
+        if c == "#":
+            end = pos + 1
+            while end < n and text[end].isdigit():
+                end += 1
+            ref = _StepRef(int(text[pos + 1:end]))
+            pos = end
+            return ref
+        if c in "$*":
+            pos += 1
+            return None
+        if c == ".":
+            end = text.index(".", pos + 1)
+            token = text[pos + 1:end]
+            pos = end + 1
+            return {"T": True, "F": False, "U": None}.get(token, token)
+        end = pos
+        while end < n and text[end] not in ",)( \t\r\n":
+            end += 1
+        token = text[pos:end]
+        pos = end
+        if pos < n and text[pos] == "(":
+            # Typed value such as IFCLABEL('x') or IFCLENGTHMEASURE(1.)
+            pos += 1
+            inner = value()
+            while text[pos] != ")":
+                pos += 1
+            pos += 1
+            return inner
+        try:
+            return int(token)
+        except ValueError:
+            return float(token)
+
+    args = []
+    while pos < n:
+        while pos < n and text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= n:
+            break
+        args.append(value())
+    return args
+
+
+class _StepEntity:
+    """Lazy, read-only stand-in for an ifcopenshell entity backed by a StepGeorefScanner."""
+
+    __slots__ = ("_scanner", "_id", "_type", "_args", "_span", "HasCoordinateOperation", "HasSubContexts",
+                 "Decomposes")
+
+    def __init__(self, scanner, eid, step_type, args, span=None):
+        self._scanner = scanner
+        self._id = eid
+        self._type = step_type
+        self._args = args
+        self._span = span  # (start, end) offsets of the argument text, between the outer parentheses
+        self.HasCoordinateOperation = ()
+        self.HasSubContexts = ()
+        self.Decomposes = ()
+
+    def id(self):
+        return self._id
+
+    def is_a(self, name: str = None):
+        canonical = _STEP_ATTRIBUTES.get(self._type, (self._type.title(), ()))[0]
+        if name is None:
+            return canonical
+        return name.upper() == self._type
+
+    def __getattr__(self, name):
+        names = _STEP_ATTRIBUTES.get(self._type, (None, ()))[1]
+        if name not in names:
+            raise AttributeError(name)
+        index = names.index(name)
+        if index >= len(self._args):
+            return None
+        return self._scanner.resolve(self._args[index])
+
+    def __repr__(self):
+        return f"#{self._id}={self._type}(...)"
+
+
+class StepGeorefScanner:
+    """
+    Reads only the georeferencing-relevant records of an IFC-SPF file.
+
+    One regex pass over the memory-mapped DATA section locates IfcProject,
+    IfcGeometricRepresentationContext (and sub-contexts), IfcMapConversion,
+    IfcProjectedCRS, IfcSite and IfcRelAggregates records. Any other record (placements, points, directions, units)
+    is fetched only when an attribute is read, via a binary search on `#id`
+    (writers emit ids in ascending order) with a linear-scan fallback.
+    Memory stays bounded by the handful of records actually touched.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fh = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._fh.close()
+            raise ValueError(f"Empty file: {path}") from None
+        data = self._mm.find(b"DATA;")
+        if data == -1:
+            self.close()
+            raise ValueError(f"Not an IFC-SPF (STEP) file: {path}")
+        self._data_start = data + 5
+        end = self._mm.find(b"ENDSEC;", self._data_start)
+        self._data_end = end if end != -1 else len(self._mm)
+        self._cache = {}
+        self._max_id = None
+        self.roots = {t: [] for t in _SCAN_ROOT_TYPES}
+        self.stats = {"bytes": len(self._mm), "records_parsed": 0, "bisect_lookups": 0, "linear_lookups": 0}
+
+    def close(self):
+        try:
+            self._mm.close()
+        finally:
+            self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- scanning ----------
+    def scan(self):
+        """
+        Single pass collecting the root records; links contexts to their coordinate
+        operations and sub-contexts, and sites to their IfcRelAggregates.
+        """
+        mm = self._mm
+        for m in _SCAN_ROOT_RE.finditer(mm, self._data_start, self._data_end):
+            head = _SCAN_ID_RE.search(mm[max(self._data_start - 1, m.start() - 40):m.start()])
+            if head is None:
+                continue  # Type name inside a string or a nested typed value, not a record
+            entity = self._parse_at(int(head.group(1)), "IFC" + m.group(1).decode(), m.end())
+            self.roots[entity._type].append(entity)
+
+        operations = {}
+        for op in self.roots["IFCMAPCONVERSION"]:
+            source = op._args[0] if op._args else None
+            if isinstance(source, _StepRef):
+                operations.setdefault(int(source), []).append(op)
+        sub_contexts = {}
+        for sub in self.roots["IFCGEOMETRICREPRESENTATIONSUBCONTEXT"]:
+            parent = sub._args[6] if len(sub._args) > 6 else None
+            if isinstance(parent, _StepRef):
+                sub_contexts.setdefault(int(parent), []).append(sub)
+        for ctx in self.roots["IFCGEOMETRICREPRESENTATIONCONTEXT"] + self.roots["IFCGEOMETRICREPRESENTATIONSUBCONTEXT"]:
+            ctx.HasCoordinateOperation = tuple(operations.get(ctx._id, ()))
+            ctx.HasSubContexts = tuple(sub_contexts.get(ctx._id, ()))
+
+        sites = {site._id: site for site in self.roots["IFCSITE"]}
+        for rel in self.roots["IFCRELAGGREGATES"]:
+            related = rel._args[5] if len(rel._args) > 5 else ()
+            for ref in related if isinstance(related, tuple) else ():
+                if isinstance(ref, _StepRef) and int(ref) in sites:
+                    sites[int(ref)].Decomposes = (rel,)
+        return self
+
+    def _parse_at(self, eid, step_type, args_start):
+        cached = self._cache.get(eid)
+        if cached is not None:
+            return cached
+        end = self._record_end(args_start)
+        text = self._mm[args_start:end].decode("latin-1")
+        entity = _StepEntity(self, eid, step_type, _parse_step_args(text), (args_start, end))
+        self._cache[eid] = entity
+        self.stats["records_parsed"] += 1
+        return entity
+
+    def _record_end(self, pos):
+        """Offset of the closing parenthesis of the record whose arguments start at `pos`."""
+        mm = self._mm
+        depth = 1
+        in_string = False
+        while True:
+            c = mm[pos]
+            if in_string:
+                if c == 0x27:  # '
+                    in_string = False
+            elif c == 0x27:
+                in_string = True
+            elif c == 0x28:  # (
+                depth += 1
+            elif c == 0x29:  # )
+                depth -= 1
+                if depth == 0:
+                    return pos
+            pos += 1
+
+    # ---------- reference resolution ----------
+    def resolve(self, value):
+        if isinstance(value, _StepRef):
+            return self.entity(int(value))
+        if isinstance(value, tuple):
+            return tuple(self.resolve(v) for v in value)
+        return value
+
+    def entity(self, eid: int):
+        cached = self._cache.get(eid)
+        if cached is not None:
+            return cached
+        m = self._bisect(eid)
+        if m is None:
+            self.stats["linear_lookups"] += 1
+            # "#<id>=" only ever occurs at a record start (references are never followed by "=")
+            pattern = re.compile(rb"#" + str(eid).encode() + rb"[ \t]*=[ \t]*([A-Z0-9_]+)[ \t]*\(")
+            found = pattern.search(self._mm, self._data_start, self._data_end)
+            if found is None:
+                return None
+            return self._parse_at(eid, found.group(1).decode(), found.end())
+        return self._parse_at(eid, m.group(2).decode(), m.end())
+
+    def _bisect(self, eid: int):
+        self.stats["bisect_lookups"] += 1
+        # Invariant: the wanted record starts in [lo, hi)
+        lo, hi = self._data_start, self._data_end
+        search = _RECORD_START_RE.search
+        while lo < hi:
+            mid = (lo + hi) // 2
+            m = search(self._mm, mid, self._data_end)
+            if m is None or m.start() >= hi:
+                hi = mid
+                continue
+            current = int(m.group(1))
+            if current == eid:
+                return m
+            if current < eid:
+                lo = m.end()
+            else:
+                hi = mid
+        m = search(self._mm, lo, self._data_end)
+        if m is not None and int(m.group(1)) == eid:
+            return m
+        return None
+
+    # ---------- whole-file passes (regex over the mapping, constant memory) ----------
+    def max_id(self) -> int:
+        """Highest `#id` defined in the DATA section, read window by window."""
+        if self._max_id is None:
+            # Records start after the ";" ending the previous one (or "DATA;"), which is
+            # about twice as fast to match as every "#id=". Comments may sit in between.
+            if self._mm.find(b"/*", self._data_start, self._data_end) == -1:
+                pattern = re.compile(rb";\s*#(\d+)")
+            else:
+                pattern = re.compile(rb"#(\d+)[ \t]*=")
+            best, pos, window = 0, self._data_start - 1, 16 << 20
+            while pos < self._data_end:
+                end = min(pos + window, self._data_end)
+                found = pattern.findall(self._mm, pos, end)
+                if found:
+                    best = max(best, max(map(int, found)))
+                # A definition token is far shorter than the overlap, so none is cut in two
+                pos = end if end == self._data_end else end - 64
+            self._max_id = best
+        return self._max_id
+
+    def referrers(self, eid: int) -> list:
+        """
+        Records referencing `#eid` (the ifcopenshell get_inverse of the scanned file).
+        A reference whose record cannot be delimited is returned as an opaque
+        entity, so callers never take a used entity for unused.
+        """
+        pattern = re.compile(rb"#" + str(eid).encode() + rb"(?![0-9])(?![ \t]*=)")
+        found = {}
+        for m in pattern.finditer(self._mm, self._data_start, self._data_end):
+            start = max(self._data_start, self._mm.rfind(b";", self._data_start, m.start()) + 1)
+            record = _RECORD_START_RE.search(self._mm, start, m.start())
+            if record is None:
+                found[-m.start()] = _StepEntity(self, -m.start(), "UNKNOWN", [])
+            elif int(record.group(1)) not in found:
+                found[int(record.group(1))] = self.entity(int(record.group(1)))
+        return list(found.values())
+
+
+def scan_georeferencing_info(path: str, include_contexts: bool = False) -> dict:
+    """
+    `get_ifc_georeferencing_info` for an IFC file on disk, without loading it.
+    Returns the same structure as the loaded-model path, with scan statistics in `debug`.
+    """
+    start = time.perf_counter()
+    debug = {"entered": True, "has_ifc": True, "projects": 0, "sites": 0, "contexts": 0, "mode": "scan", "path": path}
+    with StepGeorefScanner(path) as scanner:
+        with phase("scan"):
+            scanner.scan()
+        with phase("extract"):
+            result = extract_georeferencing_info(
+                scanner.roots["IFCPROJECT"], scanner.roots["IFCSITE"], include_contexts, debug
+            )
+        debug.update(scanner.stats)
+    debug["elapsed_ms"] = round((time.perf_counter() - start) * 1000.0, 3)
+    return result
+
+
+#---------------------------------------------------------------------------------------------------
+# Georeferencing (shared by georeference_ifc_model and the headless/batch paths)
+#---------------------------------------------------------------------------------------------------
+
+def ifc_dms_to_dd(dms):
+    """IfcCompoundPlaneAngleMeasure [deg, min, sec(, millionth)] → decimal degrees (None passes through)."""
+    if not dms:
+        return None
+    parts = [float(v) for v in list(dms)[:4]] + [0.0] * (4 - min(len(dms), 4))
+    # All components carry the sign in IFC; a negative degree alone is also accepted
+    sign = -1.0 if any(v < 0 for v in parts) else 1.0
+    deg, minutes, seconds, millionth = (abs(v) for v in parts)
+    return sign * (deg + minutes / 60.0 + (seconds + millionth / 1e6) / 3600.0)
+
+
+def georeference_file(
+    file,
+    crs_mode: str,
+    epsg: int = None,
+    crs_name: str = None,
+    geodetic_datum: str = None,
+    map_projection: str = None,
+    map_zone: str = None,
+    eastings: float = None,
+    northings: float = None,
+    orthogonal_height: float = 0.0,
+    scale: float = 1.0,
+    x_axis_abscissa: float = None,
+    x_axis_ordinate: float = None,
+    true_north_azimuth_deg: float = None,
+    context_filter: str = "Model",
+    context_index: int = None,
+    site_ref_latitude: list = None,         # IFC format [deg, min, sec, millionth]
+    site_ref_longitude: list = None,        # IFC format [deg, min, sec, millionth]
+    site_ref_elevation: float = None,
+    site_ref_latitude_dd: float = None,     # Decimal degrees (optional)
+    site_ref_longitude_dd: float = None,    # Decimal degrees (optional)
+    site_global_id: str = None,
+    sites: dict = None,
+    all_contexts: bool = False,
+    overwrite: bool = False,
+    ellipsoidal_height: float = None,       # GNSS height of the origin; needs geoid_grid
+    geoid_grid: str = None,
+    update_mode: str = "replace",
+    gc: bool = False,
+    dry_run: bool = False,
+    write_path: str = None,
+    async_write: bool = False,
+):
+    """
+    Creates/updates IfcProjectedCRS + IfcMapConversion in `file` (an ifcopenshell
+    file, e.g. IfcStore.get_file() or ifcopenshell.open(path)).
+    Optionally updates IfcSite.RefLatitude/RefLongitude/RefElevation (the first
+    site, `site_global_id`, and/or every site in `sites`) and writes the file to
+    `write_path` (in the background when `async_write`, see start_async_write).
+    With `all_contexts`, every top-level context of the project gets its own
+    MapConversion to one shared CRS. update_mode="incremental" edits the existing
+    MapConversion/CRS in place (only the attributes that differ) instead of
+    replacing them; gc removes unreferenced georeferencing entities. With
+    `geoid_grid`, OrthogonalHeight is derived from `ellipsoidal_height`. See
+    `georeference_ifc_model` for the parameters.
+    """
+    import math
+
+    warnings = []
+    actions = {"created_crs": False, "created_map_conversion": False,
+            "updated_map_conversion": False, "updated_site": False,
+            "updated_crs": False, "reused_crs": False,
+            "overwrote": False, "gc_removed": 0, "wrote_file": False}
+    debug = {}
+
+    # ---------- helpers ----------
+    def dd_to_ifc_dms(dd: float):
+        """Converts decimal degrees to [deg, min, sec, millionth] (sign carried by degrees)."""
+        if dd is None:
+            return None
+        sign = -1 if dd < 0 else 1
+        v = abs(dd)
+        deg = int(v)
+        rem = (v - deg) * 60
+        minutes = int(rem)
+        sec_float = (rem - minutes) * 60
+        seconds = int(sec_float)
+        millionth = int(round((sec_float - seconds) * 1_000_000))
+        # Normalizes rounding (e.g. 59.999999 → 60)
+        if millionth == 1_000_000:
+            seconds += 1
+            millionth = 0
+        if seconds == 60:
+            minutes += 1
+            seconds = 0
+        if minutes == 60:
+            deg += 1
+            minutes = 0
+        return [sign * deg, minutes, seconds, millionth]
+
+    def select_context():
+        ctxs = file.by_type("IfcGeometricRepresentationContext") or []
+        if not ctxs:
+            return None, "No IfcGeometricRepresentationContext found"
+        if context_index is not None and 0 <= context_index < len(ctxs):
+            return ctxs[context_index], None
+        # By filter (default "Model", case-insensitive)
+        if context_filter:
+            for c in ctxs:
+                if (getattr(c, "ContextType", None) or "").lower() == context_filter.lower():
+                    return c, None
+        # Fallback to the first one
+        return ctxs[0], None
+
+    def select_contexts():
+        if not all_contexts:
+            context, err = select_context()
+            return ([context] if context else []), err
+        # Top-level contexts only: sub-contexts inherit their parent's coordinate operation
+        ctxs = [
+            ctx
+            for project in file.by_type("IfcProject")
+            for ctx, parent in iter_representation_contexts(project)
+            if parent is None and ctx.is_a("IfcGeometricRepresentationContext")
+        ]
+        if not ctxs:
+            return [], "No IfcGeometricRepresentationContext found"
+        return ctxs, None
+
+    # ---------- 1) CRS Validation ----------
+    if crs_mode not in ("epsg", "custom"):
+        return {"success": False, "error": "crs_mode must be 'epsg' or 'custom'"}
+    if update_mode not in ("replace", "incremental"):
+        return {"success": False, "error": "update_mode must be 'replace' or 'incremental'"}
+    incremental = update_mode == "incremental"
+    # Editing in place is an overwrite that keeps the entities
+    overwrite = overwrite or incremental
+    epsg_info = None
+
+    if crs_mode == "epsg":
+        if not epsg:
+            return {"success": False, "error": "epsg code required when crs_mode='epsg'"}
+        crs_name_final = f"EPSG:{epsg}"
+        # Datum, projection, zone and unit from the offline EPSG index (no pyproj needed);
+        # explicit arguments still win
+        with phase("epsg_lookup"):
+            epsg_info = epsg_crs_info(epsg)
+        if epsg_info is None:
+            reason = EPSG_INDEX.error or f"EPSG:{epsg} is not a projected CRS of the offline EPSG index"
+            warnings.append(f"{reason}; GeodeticDatum/MapProjection default to WGS84/TransverseMercator.")
+            epsg_info = {}
+        geodetic_datum = geodetic_datum or epsg_info.get("geodetic_datum") or "WGS84"
+        map_projection = map_projection or epsg_info.get("map_projection") or "TransverseMercator"
+        map_zone = map_zone or epsg_info.get("map_zone")
+    else:
+        # custom
+        missing = [k for k in ("crs_name", "geodetic_datum", "map_projection") if locals().get(k) in (None, "")]
+        if missing:
+            return {"success": False, "error": f"Missing fields for custom CRS: {', '.join(missing)}"}
+        crs_name_final = crs_name
+
+    # ---------- 2) Complete E/N from Lat/Long (if missing and pyproj is available) ----------
+    proj_used = None
+    try:
+        if (eastings is None or northings is None) and (site_ref_latitude_dd is not None and site_ref_longitude_dd is not None) and crs_mode == "epsg":
+            try:
+                # Assume lat/long in WGS84; if the EPSG is not WGS84-derived, pyproj handles the conversion.
+                # Transformers are shared process-wide (see TransformerPool).
+                with phase("pyproj_transform"):
+                    transformer, hit = get_transformer("EPSG:4326", f"EPSG:{epsg}", always_xy=True)
+                    debug["transformer_cache_hit"] = hit
+                    e, n = transformer.transform(site_ref_longitude_dd, site_ref_latitude_dd)
+                eastings = e if eastings is None else eastings
+                northings = n if northings is None else northings
+                proj_used = f"EPSG:4326->EPSG:{epsg}"
+            except Exception as _e:
+                warnings.append(f"Could not convert Lat/Long to E/N: {_e}. Provide eastings/northings manually.")
+    except Exception as _e:
+        warnings.append(f"pyproj not available to compute E/N: {_e}. Provide eastings/northings manually.")
+
+    # ---------- E/N Validation ----------
+    if eastings is None or northings is None:
+        return {"success": False, "error": "eastings and northings are required (or provide lat/long + EPSG with pyproj installed)"}
+    if crs_mode == "epsg" and epsg_info:
+        warnings.extend(check_area_of_use(
+            epsg_info, float(eastings), float(northings),
+            site_ref_latitude_dd if site_ref_latitude_dd is not None else ifc_dms_to_dd(site_ref_latitude),
+            site_ref_longitude_dd if site_ref_longitude_dd is not None else ifc_dms_to_dd(site_ref_longitude),
+        ))
+
+    # ---------- 3) Select context(s) ----------
+    with phase("select_context"):
+        contexts, ctx_err = select_contexts()
+    if not contexts:
+        return {"success": False, "error": ctx_err or "No context found"}
+    context = contexts[0]
+
+    # ---------- 4) Detect existing ones and handle overwrite ----------
+    # Inverse: context.HasCoordinateOperation is already handled by ifcopenshell as an attribute
+    existing = OrderedDict()  # context id → (existing MapConversion, its TargetCRS)
+    for ctx in contexts:
+        for op in getattr(ctx, "HasCoordinateOperation", None) or []:
+            if op.is_a("IfcMapConversion"):
+                existing[ctx.id()] = (op, getattr(op, "TargetCRS", None))
+                break
+
+    if existing and not overwrite and len(existing) == len(contexts):
+        context = next(c for c in contexts if c.id() in existing)
+        existing_map, existing_crs = existing[context.id()]
+        return {
+            "success": True,
+            "georeferenced": True,
+            "message": "MapConversion already exists. Use overwrite=True to replace it.",
+            "context_used": {"identifier": getattr(context, "ContextIdentifier", None), "type": getattr(context, "ContextType", None)},
+            "map_conversion": {
+                "eastings": getattr(existing_map, "Eastings", None),
+                "northings": getattr(existing_map, "Northings", None),
+                "orthogonal_height": getattr(existing_map, "OrthogonalHeight", None),
+                "scale": getattr(existing_map, "Scale", None),
+                "x_axis_abscissa": getattr(existing_map, "XAxisAbscissa", None),
+                "x_axis_ordinate": getattr(existing_map, "XAxisOrdinate", None),
+            },
+            "crs": {
+                "name": getattr(existing_crs, "Name", None) if existing_crs else None,
+                "geodetic_datum": getattr(existing_crs, "GeodeticDatum", None) if existing_crs else None,
+                "map_projection": getattr(existing_crs, "MapProjection", None) if existing_crs else None,
+                "map_zone": getattr(existing_crs, "MapZone", None) if existing_crs else None,
+            },
+            "warnings": warnings,
+            "actions": actions,
+        }
+    if existing and not overwrite:
+        # all_contexts: only the contexts without a MapConversion are georeferenced
+        warnings.append(
+            f"{len(existing)} context(s) already have a MapConversion and were left unchanged "
+            "(use overwrite=True to replace them)."
+        )
+        contexts = [c for c in contexts if c.id() not in existing]
+        context = contexts[0]
+        existing = OrderedDict()
+
+    # Steps 5-8 only *plan* the edits (see apply_georeference_plan); nothing in the
+    # model changes until the plan is applied, so dry_run never touches the live model.
+    plan = []
+
+    # ---------- 5) Build/Update CRS ----------
+    replaced_maps = {existing_map.id() for existing_map, _ in existing.values()}
+
+    # If custom, use the provided values; if EPSG, build the name and defaults
+    crs_kwargs = {
+        "Name": crs_name_final,
+        "Description": None,
+        "GeodeticDatum": geodetic_datum,
+        "MapProjection": map_projection,
+        "MapZone": map_zone or None,
+        "MapUnit": None,
+    }
+    if crs_mode == "epsg" and epsg_info:
+        crs_kwargs["Description"] = epsg_info.get("name")
+        if epsg_info.get("map_unit") == "metre":
+            metre = next((u for u in file.by_type("IfcSIUnit")
+                          if u.UnitType == "LENGTHUNIT" and u.Name == "METRE" and u.Prefix is None), None)
+            if metre is None:
+                plan.append(plan_create("map_unit", "IfcSIUnit", {"UnitType": "LENGTHUNIT", "Name": "METRE"}))
+            crs_kwargs["MapUnit"] = plan_ref(metre) if metre is not None else {"new": "map_unit"}
+        elif epsg_info.get("map_unit"):
+            warnings.append(f"MapUnit left empty: EPSG:{epsg} uses '{epsg_info['map_unit']}'.")
+
+    # A CRS identical to the requested one (e.g. shared by the other contexts) is reused as is
+    with phase("match_crs"):
+        target_crs = next(
+            (c for c in _by_type(file, "IfcProjectedCRS")
+             if not any(attribute_differs(c, k, v) for k, v in crs_kwargs.items())),
+            None,
+        )
+    actions["reused_crs"] = target_crs is not None
+
+    # Existing CRS used only by the MapConversions that are replaced/updated here
+    # (contexts of a federated model often share one): they are edited or removed once
+    owned_crs = OrderedDict()
+    for _, existing_crs in existing.values():
+        actions["overwrote"] = True
+        if existing_crs and all(e.id() in replaced_maps for e in file.get_inverse(existing_crs)):
+            owned_crs[existing_crs.id()] = existing_crs
+
+    if target_crs is None and incremental and owned_crs:
+        # Edit the first owned CRS in place rather than creating a new one
+        target_crs = next(iter(owned_crs.values()))
+        actions["updated_crs"] = bool(plan_update_changed(plan, target_crs, crs_kwargs))
+
+    for crs_id, existing_crs in owned_crs.items():
+        if target_crs is None or crs_id != target_crs.id():
+            plan.append(plan_remove(existing_crs, "Could not remove the existing CRS; a new one will be created anyway."))
+
+    if target_crs is None:
+        # One IfcProjectedCRS shared by every MapConversion created below
+        plan.append(plan_create("crs", "IfcProjectedCRS", {k: v for k, v in crs_kwargs.items() if v is not None}))
+        actions["created_crs"] = True
+    crs_value = plan_ref(target_crs) if target_crs is not None else {"new": "crs"}
+
+    # ---------- 6) Calculate orientation (optional) ----------
+    # If true_north_azimuth_deg is given as the azimuth from North (model +Y axis) towards East (clockwise),
+    # We can derive an approximate X vector: X = (cos(az+90°), sin(az+90°)).
+    if (x_axis_abscissa is None or x_axis_ordinate is None) and (true_north_azimuth_deg is not None):
+        az = math.radians(true_north_azimuth_deg)
+        # Estimated X vector rotated 90° from North:
+        x_axis_abscissa = math.cos(az + math.pi / 2.0)
+        x_axis_ordinate = math.sin(az + math.pi / 2.0)
+
+    # Defaults if still missing
+    x_axis_abscissa = 1.0 if x_axis_abscissa is None else float(x_axis_abscissa)
+    x_axis_ordinate = 0.0 if x_axis_ordinate is None else float(x_axis_ordinate)
+    scale = 1.0 if scale is None else float(scale)
+    orthogonal_height = 0.0 if orthogonal_height is None else float(orthogonal_height)
+
+    # ---------- 6b) (Optional) OrthogonalHeight from a GNSS ellipsoidal height: H = h − N ----------
+    geoid = None
+    if ellipsoidal_height is not None and geoid_grid:
+        lat_dd = site_ref_latitude_dd if site_ref_latitude_dd is not None else ifc_dms_to_dd(site_ref_latitude)
+        lon_dd = site_ref_longitude_dd if site_ref_longitude_dd is not None else ifc_dms_to_dd(site_ref_longitude)
+        try:
+            if lat_dd is None or lon_dd is None:
+                # The origin of the MapConversion, back to lat/long with the target CRS
+                if crs_mode != "epsg" and not str(crs_name_final).upper().startswith("EPSG:"):
+                    raise ValueError("give the site latitude/longitude (the CRS is not an EPSG code)")
+                with phase("pyproj_transform"):
+                    transformer, _ = get_transformer(crs_name_final, "EPSG:4326", always_xy=True)
+                    lon_dd, lat_dd = transformer.transform(float(eastings), float(northings))
+            undulation = float(geoid_undulations(geoid_grid, [lon_dd], [lat_dd])[0])
+            if undulation != undulation:
+                raise ValueError(f"({lat_dd:.6f}, {lon_dd:.6f}) is outside the grid")
+            if orthogonal_height:
+                warnings.append(f"orthogonal_height={orthogonal_height} replaced by the value derived from ellipsoidal_height.")
+            orthogonal_height = float(ellipsoidal_height) - undulation
+            geoid = {"grid": os.path.basename(geoid_grid_path(geoid_grid)), "undulation": round(undulation, 4),
+                     "ellipsoidal_height": float(ellipsoidal_height), "latitude": lat_dd, "longitude": lon_dd}
+            if (site_ref_elevation is not None and abs(undulation) > 1.0
+                    and abs(float(site_ref_elevation) - float(ellipsoidal_height)) < abs(undulation) / 2):
+                warnings.append(
+                    f"site_ref_elevation={site_ref_elevation} looks like an ellipsoidal height; IfcSite.RefElevation "
+                    f"is above sea level (about {orthogonal_height:.3f} here)."
+                )
+        except Exception as e:
+            warnings.append(f"Could not derive OrthogonalHeight from the geoid grid: {e}. orthogonal_height was kept.")
+    elif ellipsoidal_height is not None:
+        warnings.append("ellipsoidal_height needs geoid_grid to derive OrthogonalHeight; it was ignored.")
+
+    # ---------- 7) Build/Update IfcMapConversion ----------
+    if not incremental:
+        for existing_map, _ in existing.values():
+            plan.append(plan_remove(existing_map, "Could not remove the existing MapConversion; another one will be created anyway."))
+
+    for ctx in contexts:
+        map_kwargs = {
+            "SourceCRS": plan_ref(ctx),
+            "TargetCRS": crs_value,
+            "Eastings": float(eastings),
+            "Northings": float(northings),
+            "OrthogonalHeight": float(orthogonal_height),
+            "XAxisAbscissa": float(x_axis_abscissa),
+            "XAxisOrdinate": float(x_axis_ordinate),
+            "Scale": float(scale),
+        }
+        if incremental and ctx.id() in existing:
+            if plan_update_changed(plan, existing[ctx.id()][0], map_kwargs):
+                actions["updated_map_conversion"] = True
+            continue
+        key = "map_conversion" if ctx is context else f"map_conversion_{ctx.id()}"
+        plan.append(plan_create(key, "IfcMapConversion", map_kwargs))
+        actions["created_map_conversion"] = True
+
+    # ---------- 8) (Optional) Update IfcSite(s) ----------
+    sites_updated = {}
+
+    def plan_site(site, lat, lon, ele, lat_dd, lon_dd):
+        # If no IFC lists are provided but decimal degrees are, convert them
+        if lat is None and lat_dd is not None:
+            lat = dd_to_ifc_dms(lat_dd)
+        if lon is None and lon_dd is not None:
+            lon = dd_to_ifc_dms(lon_dd)
+
+        values = {}
+        if lat is not None:
+            values["RefLatitude"] = list(lat)
+        if lon is not None:
+            values["RefLongitude"] = list(lon)
+        if ele is not None:
+            values["RefElevation"] = float(ele)
+        if incremental:
+            changed = bool(plan_update_changed(plan, site, values))
+        else:
+            plan.extend(plan_update(site, k, v) for k, v in values.items())
+            changed = bool(values)
+        if changed:
+            actions["updated_site"] = True
+            sites_updated[entity_key(site)] = {"ref_latitude": lat, "ref_longitude": lon, "ref_elevation": ele}
+        return lat, lon
+
+    def find_site(global_id):
+        try:
+            site = file.by_guid(global_id)
+        except Exception:
+            site = None
+        if site is None or not site.is_a("IfcSite"):
+            warnings.append(f"IfcSite {global_id} not found; its lat/long/elevation were not updated.")
+            return None
+        return site
+
+    try:
+        if site_global_id:
+            site = find_site(site_global_id)
+        else:
+            with phase("by_type"):
+                site = next(iter(file.by_type("IfcSite") or []), None)
+            if site is None:
+                warnings.append("No IfcSite found; lat/long/elevation were not updated.")
+        if site is not None:
+            site_ref_latitude, site_ref_longitude = plan_site(
+                site, site_ref_latitude, site_ref_longitude, site_ref_elevation,
+                site_ref_latitude_dd, site_ref_longitude_dd,
+            )
+
+        # Per-site values for federated models, keyed by GlobalId
+        for global_id, values in (sites or {}).items():
+            site = find_site(global_id)
+            if site is None:
+                continue
+            values = values or {}
+            plan_site(
+                site, values.get("ref_latitude"), values.get("ref_longitude"), values.get("ref_elevation"),
+                values.get("ref_latitude_dd"), values.get("ref_longitude_dd"),
+            )
+    except Exception as e:
+        warnings.append(f"Could not update IfcSite: {e}")
+
+    # ---------- 8b) (Optional) Remove unreferenced georeferencing entities ----------
+    if gc:
+        planned = {op["ref"] for op in plan if op["op"] in ("remove", "update")}
+        keep = planned | ({target_crs.id()} if target_crs is not None else set())
+        if isinstance(crs_kwargs.get("MapUnit"), dict) and "ref" in crs_kwargs["MapUnit"]:
+            keep.add(crs_kwargs["MapUnit"]["ref"])
+        with phase("gc"):
+            garbage = georeferencing_garbage(file, keep)
+        plan.extend(plan_remove(e) for e in garbage)
+        actions["gc_removed"] = len(garbage)
+
+    write_job = None
+    if dry_run:
+        # Keep the plan so it can be committed later without recomputing it
+        plan_id = store_georeference_plan(file, plan, write_path)
+    else:
+        plan_id = None
+        with phase("apply_plan"):
+            applied = apply_georeference_plan(file, plan)
+        warnings.extend(applied["warnings"])
+        if not applied["success"]:
+            return {"success": False, "error": applied["error"], "plan": plan, "warnings": warnings, "actions": actions}
+
+        # ---------- 9) (Optional) Save ----------
+        if write_path:
+            try:
+                with phase("write"):
+                    written = write_ifc(file, write_path, async_write, warnings)
+                actions["wrote_file"] = written["wrote_file"]
+                write_job = written["write_job"]
+            except Exception as e:
+                warnings.append(f"Could not write IFC to'{write_path}': {e}")
+
+    # ---------- 10) Response ----------
+    debug["transformer_cache"] = TRANSFORMERS.stats()
+    return {
+        "success": True,
+        "georeferenced": not dry_run,
+        "dry_run": bool(dry_run),
+        "crs": {
+            "name": crs_kwargs.get("Name"),
+            "geodetic_datum": crs_kwargs.get("GeodeticDatum"),
+            "map_projection": crs_kwargs.get("MapProjection"),
+            "map_zone": crs_kwargs.get("MapZone"),
+            "description": crs_kwargs.get("Description"),
+            "map_unit": "METRE" if crs_kwargs.get("MapUnit") else None,
+        },
+        "map_conversion": {
+            "eastings": float(eastings),
+            "northings": float(northings),
+            "orthogonal_height": float(orthogonal_height),
+            "scale": float(scale),
+            "x_axis_abscissa": float(x_axis_abscissa),
+            "x_axis_ordinate": float(x_axis_ordinate),
+        },
+        "context_used": {
+            "identifier": getattr(context, "ContextIdentifier", None),
+            "type": getattr(context, "ContextType", None),
+        },
+        "contexts_used": [
+            {"id": c.id(), "identifier": getattr(c, "ContextIdentifier", None), "type": getattr(c, "ContextType", None)}
+            for c in contexts
+        ],
+        "site": {
+            "ref_latitude": site_ref_latitude,
+            "ref_longitude": site_ref_longitude,
+            "ref_elevation": site_ref_elevation,
+        },
+        "sites_updated": sites_updated,
+        "proj_used": proj_used,
+        "geoid": geoid,
+        # Exactly what changed on existing entities (attribute, old and new value)
+        "changes": [op for op in plan if op["op"] == "update"],
+        "removed": [{"ref": op["ref"], "type": op["type"]} for op in plan if op["op"] == "remove"],
+        "plan": plan,
+        "plan_id": plan_id,
+        "write_job": write_job,
+        "warnings": warnings,
+        "actions": actions,
+        "debug": debug,
+    }
+
+
+#---------------------------------------------------------------------------------------------------
+# Edit plans (dry-run diffs that can be committed or discarded)
+#---------------------------------------------------------------------------------------------------
+
+# Plan operations are plain JSON: entity references are {"ref": <id>} for existing
+# entities and {"new": <key>} for entities created earlier in the same plan.
+
+def plan_ref(entity) -> dict:
+    return {"ref": entity.id()}
+
+
+def plan_create(key: str, ifc_class: str, attributes: dict) -> dict:
+    return {"op": "create", "key": key, "type": ifc_class, "attributes": attributes}
+
+
+def plan_remove(entity, warning: str = None) -> dict:
+    op = {"op": "remove", "ref": entity.id(), "type": entity.is_a()}
+    if warning:
+        op["on_error"] = warning
+    return op
+
+
+def plan_update(entity, attribute: str, value) -> dict:
+    old = getattr(entity, attribute, None)
+    if isinstance(old, tuple):
+        old = list(old)
+    elif hasattr(old, "is_a"):
+        old = plan_ref(old)
+    return {"op": "update", "ref": entity.id(), "type": entity.is_a(), "attribute": attribute, "old": old, "new": value}
+
+
+def attribute_differs(entity, attribute: str, value) -> bool:
+    """True when setting `value` (a plan value) on `entity` would change it."""
+    old = getattr(entity, attribute, None)
+    if isinstance(value, dict):
+        # {"ref": id} is unchanged when it is the current entity; {"new": key} always changes
+        return "ref" not in value or old is None or not hasattr(old, "id") or old.id() != value["ref"]
+    if isinstance(old, tuple):
+        old = list(old)
+    if isinstance(value, float) and isinstance(old, (int, float)):
+        return float(old) != value
+    return old != value
+
+
+def plan_update_changed(plan: list, entity, attributes: dict) -> list:
+    """Appends an update only for the attributes whose value differs; returns the new operations."""
+    ops = [plan_update(entity, k, v) for k, v in attributes.items() if attribute_differs(entity, k, v)]
+    plan.extend(ops)
+    return ops
+
+
+def _by_type(file, ifc_class: str) -> list:
+    try:
+        return file.by_type(ifc_class)
+    except RuntimeError:
+        # Class not in this schema (e.g. IfcCoordinateOperation in IFC2X3)
+        return []
+
+
+def georeferencing_garbage(file, keep=()) -> list:
+    """
+    Georeferencing entities nothing uses any more, in a safe removal order:
+    coordinate operations whose SourceCRS or TargetCRS is gone, then
+    IfcCoordinateReferenceSystem (e.g. IfcProjectedCRS) and their MapUnit
+    once only such garbage still points to them. Ids in `keep` are spared.
+    """
+    keep = set(keep)
+    garbage = OrderedDict()
+    for op in _by_type(file, "IfcCoordinateOperation"):
+        if op.id() not in keep and (op.SourceCRS is None or op.TargetCRS is None):
+            garbage[op.id()] = op
+
+    def unused(entity):
+        return entity.id() not in keep and all(e.id() in garbage for e in file.get_inverse(entity))
+
+    for crs in _by_type(file, "IfcCoordinateReferenceSystem"):
+        if crs.id() not in garbage and unused(crs):
+            garbage[crs.id()] = crs
+            unit = getattr(crs, "MapUnit", None)
+            if unit is not None and unit.id() not in garbage and unused(unit):
+                garbage[unit.id()] = unit
+    return list(garbage.values())
+
+
+def _plan_value(file, value, created: dict):
+    if isinstance(value, dict):
+        if "ref" in value:
+            return file.by_id(value["ref"])
+        if "new" in value:
+            return created[value["new"]]
+    if isinstance(value, list):
+        return [_plan_value(file, v, created) for v in value]
+    return value
+
+
+def apply_georeference_plan(file, plan: list) -> dict:
+    """
+    Applies plan operations in order as one ifcopenshell transaction (rolled
+    back if an operation fails). Removals carrying `on_error` only warn.
+    Returns {"success", "error", "warnings", "created": {key: id}}.
+    """
+    warnings = []
+    created = {}
+    # The whole plan is a single transaction (one undo step); drop the cached info first
+    invalidate_georeferencing_info(file)
+    own_transaction = getattr(file, "transaction", None) is None and hasattr(file, "begin_transaction")
+    if own_transaction:
+        file.begin_transaction()
+    try:
+        for op in plan:
+            if op["op"] == "remove":
+                try:
+                    with phase("remove"):
+                        file.remove(file.by_id(op["ref"]))
+                except Exception:
+                    if not op.get("on_error"):
+                        raise
+                    warnings.append(op["on_error"])
+            elif op["op"] == "create":
+                attributes = {k: _plan_value(file, v, created) for k, v in op["attributes"].items()}
+                with phase("create_entity"):
+                    created[op["key"]] = file.create_entity(op["type"], **attributes)
+            elif op["op"] == "update":
+                with phase("update_attribute"):
+                    setattr(file.by_id(op["ref"]), op["attribute"], _plan_value(file, op["new"], created))
+            else:
+                raise ValueError(f"Unknown plan operation: {op['op']}")
+    except Exception as e:
+        if own_transaction:
+            file.discard_transaction()
+        invalidate_georeferencing_info(file)
+        return {"success": False, "error": f"{type(e).__name__}: {e}", "warnings": warnings, "created": {}}
+    if own_transaction:
+        file.end_transaction()
+    return {"success": True, "error": None, "warnings": warnings,
+            "created": {k: v.id() for k, v in created.items()}}
+
+
+_PLANS = OrderedDict()
+_PLANS_LOCK = threading.Lock()
+MAX_PLANS = 16
+
+
+def store_georeference_plan(file, plan: list, write_path: str = None) -> str:
+    """Keeps a dry-run plan together with the model revision it was computed against."""
+    plan_id = uuid.uuid4().hex[:12]
+    with _PLANS_LOCK:
+        _PLANS[plan_id] = {"file": file, "revision": model_revision(file), "plan": plan, "write_path": write_path}
+        while len(_PLANS) > MAX_PLANS:
+            _PLANS.popitem(last=False)
+    return plan_id
+
+
+def resolve_georeference_plan(file, plan_id: str, action: str = "commit", write_path: str = None,
+                              async_write: bool = False) -> dict:
+    """
+    action="commit": applies a stored dry-run plan in one step, provided the
+    model has not changed since the plan was made (otherwise re-run the dry run).
+    action="discard": forgets it. Optionally writes the file after committing.
+    """
+    with _PLANS_LOCK:
+        entry = _PLANS.pop(plan_id, None)
+    if entry is None:
+        return {"success": False, "error": f"Unknown or expired plan id: {plan_id}"}
+    if action == "discard":
+        return {"success": True, "plan_id": plan_id, "discarded": True}
+    if action != "commit":
+        with _PLANS_LOCK:
+            _PLANS[plan_id] = entry
+        return {"success": False, "error": "action must be 'commit' or 'discard'"}
+    if entry["file"] is not file or entry["revision"] != model_revision(file):
+        return {"success": False, "error": "The model changed since the dry run; run it again to get a fresh plan"}
+
+    with phase("apply_plan"):
+        applied = apply_georeference_plan(file, entry["plan"])
+    result = {"success": applied["success"], "plan_id": plan_id, "committed": applied["success"],
+              "created": applied["created"], "warnings": applied["warnings"], "wrote_file": False,
+              "write_job": None}
+    if not applied["success"]:
+        result["error"] = applied["error"]
+        return result
+    write_path = write_path or entry["write_path"]
+    if write_path:
+        try:
+            with phase("write"):
+                result.update(write_ifc(file, write_path, async_write, result["warnings"]))
+            result["write_path"] = write_path
+        except Exception as e:
+            result["warnings"].append(f"Could not write IFC to'{write_path}': {e}")
+    return result
+
+
+#---------------------------------------------------------------------------------------------------
+# Background jobs
+#---------------------------------------------------------------------------------------------------
+
+
+class Job:
+    """A background task whose progress and per-item results can be polled by id."""
+
+    def __init__(self, kind: str, total: int = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.state = "running"  # running | done | failed | cancelled
+        self.total = total
+        self.error = None
+        self.results = []
+        self.progress = {}
+        self.created = time.time()
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def add_result(self, item: dict):
+        with self._lock:
+            self.results.append(item)
+
+    def finish(self, state: str = "done", error: str = None):
+        with self._lock:
+            if self.state == "running":
+                self.state = "cancelled" if self.cancel_event.is_set() and state == "done" else state
+            self.error = error
+            self.finished = time.time()
+
+    def snapshot(self, since: int = 0) -> dict:
+        """Job state plus the results appended after index `since` (use `next` as the following cursor)."""
+        with self._lock:
+            since = max(0, int(since or 0))
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "state": self.state,
+                "total": self.total,
+                "completed": len(self.results),
+                "progress": dict(self.progress),
+                "error": self.error,
+                "elapsed_s": round((self.finished or time.time()) - self.created, 3),
+                "results": self.results[since:],
+                "next": len(self.results),
+            }
+
+
+JOBS = {}
+_JOBS_LOCK = threading.Lock()
+MAX_FINISHED_JOBS = 50
+
+
+def register_job(job: Job) -> Job:
+    with _JOBS_LOCK:
+        finished = [j for j in JOBS.values() if j.state != "running"]
+        for old in sorted(finished, key=lambda j: j.created)[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            JOBS.pop(old.id, None)
+        JOBS[job.id] = job
+    return job
+
+
+def get_job(job_id: str):
+    with _JOBS_LOCK:
+        return JOBS.get(job_id)
+
+
+#---------------------------------------------------------------------------------------------------
+# Batch georeferencing (headless, worker processes)
+#---------------------------------------------------------------------------------------------------
+
+
+def georeference_path(path: str, params: dict, output_path: str = None) -> dict:
+    """
+    Worker entry point: opens `path` with ifcopenshell, applies `georeference_file`
+    with `params` and writes the result to `output_path` (params["stream"]:
+    patches the file on disk instead, see stream_georeference_file). Never raises.
+    """
+    start = time.perf_counter()
+    item = {"path": path, "output_path": output_path, "success": False}
+    try:
+        kwargs = dict(params or {})
+        kwargs["write_path"] = output_path
+        if kwargs.pop("stream", False):
+            result = stream_georeference_file(path, **kwargs)
+        else:
+            import ifcopenshell
+            result = georeference_file(ifcopenshell.open(path), **kwargs)
+        item["success"] = bool(result.get("success"))
+        item["result"] = result
+        if not item["success"]:
+            item["error"] = result.get("error")
+        elif output_path and not kwargs.get("dry_run") and not result.get("actions", {}).get("wrote_file"):
+            item["success"] = False
+            item["error"] = "; ".join(result.get("warnings", [])) or "File was not written"
+    except Exception as e:
+        item["error"] = f"{type(e).__name__}: {e}"
+    item["elapsed_ms"] = round((time.perf_counter() - start) * 1000.0, 3)
+    return item
+
+
+def resolve_batch_paths(paths=None, glob_pattern: str = None) -> list:
+    """Explicit paths first, then the (recursive) glob matches; duplicates removed, order kept."""
+    found = list(paths or [])
+    if glob_pattern:
+        found.extend(sorted(_glob.glob(glob_pattern, recursive=True)))
+    seen = set()
+    unique = []
+    for p in found:
+        key = os.path.abspath(p)
+        if key not in seen:
+            seen.add(key)
+            unique.append(p)
+    return unique
+
+
+def batch_output_path(path: str, output_dir: str = None, suffix: str = "_georef", in_place: bool = False) -> str:
+    if in_place:
+        return path
+    stem, ext = os.path.splitext(os.path.basename(path))
+    folder = output_dir or os.path.dirname(path)
+    return os.path.join(folder, f"{stem}{suffix}{ext or '.ifc'}")
+
+
+def start_georeference_batch(
+    paths: list = None,
+    glob_pattern: str = None,
+    shared_params: dict = None,
+    per_file_params: dict = None,
+    output_dir: str = None,
+    suffix: str = "_georef",
+    in_place: bool = False,
+    max_workers: int = None,
+    log_path: str = None,
+) -> dict:
+    """
+    Georeferences many IFC files in a pool of worker processes.
+
+    Each file gets `shared_params` updated with `per_file_params[path]` (keys are
+    matched as given and as absolute paths). Returns immediately with a job id;
+    per-file results are appended to the job as they complete (and to `log_path`
+    as NDJSON when given). A failing file never stops the batch.
+    """
+    import concurrent.futures
+    import json
+    import multiprocessing
+
+    files = resolve_batch_paths(paths, glob_pattern)
+    if not files:
+        return {"success": False, "error": "No IFC files matched the given paths/glob"}
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    per_file_params = per_file_params or {}
+    per_file_abs = {os.path.abspath(k): v for k, v in per_file_params.items()}
+    tasks = []
+    for path in files:
+        params = dict(shared_params or {})
+        params.update(per_file_params.get(path) or per_file_abs.get(os.path.abspath(path)) or {})
+        params.pop("write_path", None)
+        tasks.append((path, params, batch_output_path(path, output_dir, suffix, in_place)))
+
+    missing = [p for p, params, _ in tasks if not params.get("crs_mode")]
+    if missing:
+        return {"success": False, "error": f"crs_mode missing for {len(missing)} file(s), e.g. {missing[0]}"}
+
+    workers = max(1, min(int(max_workers or max(1, (os.cpu_count() or 2) - 1)), len(tasks)))
+    job = register_job(Job("georeference_batch", total=len(tasks)))
+    job.progress.update({"succeeded": 0, "failed": 0, "workers": workers})
+
+    def _run():
+        log = open(log_path, "a", encoding="utf-8") if log_path else None
+        # "spawn" keeps workers independent of the host process state (Blender is not fork-safe)
+        ctx = multiprocessing.get_context("spawn")
+        try:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+                futures = {pool.submit(georeference_path, *task): task for task in tasks}
+                for future in concurrent.futures.as_completed(futures):
+                    path, _, output_path = futures[future]
+                    try:
+                        item = future.result()
+                    except Exception as e:
+                        # Worker crashed (e.g. killed); report and go on with the rest
+                        item = {"path": path, "output_path": output_path, "success": False,
+                                "error": f"{type(e).__name__}: {e}"}
+                    job.progress["succeeded" if item["success"] else "failed"] += 1
+                    job.add_result(item)
+                    if log:
+                        log.write(json.dumps(item, ensure_ascii=False, default=str) + "\n")
+                        log.flush()
+                    if job.cancel_event.is_set():
+                        for pending in futures:
+                            pending.cancel()
+                        break
+            job.finish()
+        except Exception as e:
+            job.finish("failed", f"{type(e).__name__}: {e}")
+        finally:
+            if log:
+                log.close()
+
+    threading.Thread(target=_run, name=f"georef-batch-{job.id}", daemon=True).start()
+    return {"success": True, "job_id": job.id, "total": len(tasks), "workers": workers}
+
+
+def get_job_status(job_id: str, since: int = 0, cancel: bool = False) -> dict:
+    job = get_job(job_id)
+    if job is None:
+        return {"success": False, "error": f"Unknown job id: {job_id}"}
+    if cancel:
+        job.cancel_event.set()
+    status = job.snapshot(since)
+    status["success"] = True
+    return status
+
+
+#---------------------------------------------------------------------------------------------------
+# Streaming georeference patch (IFC on disk, no full load)
+#---------------------------------------------------------------------------------------------------
+
+STREAM_COPY_CHUNK = 16 << 20
+# Attributes written as enumerations / derived ("*") when a plan creates these records
+_STEP_ENUM_ATTRIBUTES = {"IFCSIUNIT": ("UnitType", "Prefix", "Name")}
+_STEP_DERIVED_ATTRIBUTES = {"IFCSIUNIT": ("Dimensions",)}
+# Trailing optional attributes some schemas add to the records we create (IfcMapConversion.ScaleY/ScaleZ
+# of the IFC4X3 draft and TC1, not of IFC4X3_ADD1/ADD2). Used when ifcopenshell cannot describe the schema.
+_STEP_EXTRA_ATTRIBUTES = {("IFC4X3", "IFCMAPCONVERSION"): 2, ("IFC4X3_TC1", "IFCMAPCONVERSION"): 2}
+_STEP_ATTRIBUTE_COUNTS = {}
+
+
+def _step_attribute_count(schema: str, step_type: str, default: int) -> int:
+    """Number of attributes of `step_type` in the exact `schema` identifier of the file."""
+    key = ((schema or "").upper(), step_type)
+    if key not in _STEP_ATTRIBUTE_COUNTS:
+        try:
+            import ifcopenshell.ifcopenshell_wrapper as wrapper
+            declaration = wrapper.schema_by_name(key[0]).declaration_by_name(_STEP_ATTRIBUTES[step_type][0])
+            count = len(declaration.all_attributes())
+        except (ImportError, RuntimeError, KeyError):
+            count = default + _STEP_EXTRA_ATTRIBUTES.get(key, 0)
+        _STEP_ATTRIBUTE_COUNTS[key] = count
+    return _STEP_ATTRIBUTE_COUNTS[key]
+
+
+class StepGeorefModel:
+    """
+    The part of the ifcopenshell file API used by georeference_file (by_type,
+    by_id, by_guid, get_inverse, get_max_id), backed by a scanned
+    StepGeorefScanner. georeference_file(..., dry_run=True) on it plans the
+    edits of a file on disk without loading the model.
+    """
+
+    _SUBTYPES = {
+        "IFCGEOMETRICREPRESENTATIONCONTEXT": ("IFCGEOMETRICREPRESENTATIONCONTEXT", "IFCGEOMETRICREPRESENTATIONSUBCONTEXT"),
+        "IFCCOORDINATEOPERATION": ("IFCMAPCONVERSION",),
+        "IFCCOORDINATEREFERENCESYSTEM": ("IFCPROJECTEDCRS",),
+    }
+
+    def __init__(self, scanner: StepGeorefScanner):
+        self.scanner = scanner
+
+    def by_type(self, ifc_class: str) -> list:
+        types = self._SUBTYPES.get(ifc_class.upper(), (ifc_class.upper(),))
+        if any(t not in self.scanner.roots for t in types):
+            raise RuntimeError(f"{ifc_class} is not read by the STEP scanner")
+        return sorted((e for t in types for e in self.scanner.roots[t]), key=lambda e: e.id())
+
+    def by_id(self, eid: int):
+        entity = self.scanner.entity(int(eid))
+        if entity is None:
+            raise RuntimeError(f"Instance #{eid} not found")
+        return entity
+
+    def by_guid(self, global_id: str):
+        for root in self.scanner.roots.values():
+            for entity in root:
+                if entity._type in _STEP_ATTRIBUTES and "GlobalId" in _STEP_ATTRIBUTES[entity._type][1] \
+                        and entity.GlobalId == global_id:
+                    return entity
+        raise RuntimeError(f"Instance {global_id} not found")
+
+    def get_inverse(self, entity) -> list:
+        return self.scanner.referrers(entity.id())
+
+    def get_max_id(self) -> int:
+        return self.scanner.max_id()
+
+
+def _step_real(value: float) -> str:
+    import math
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(f"{value} cannot be written to IFC")
+    text = repr(value).upper()
+    mantissa, _, exponent = text.partition("E")
+    if "." not in mantissa:
+        mantissa += "."
+    return mantissa + (f"E{exponent}" if exponent else "")
+
+
+def _step_string(value: str) -> str:
+    """ISO 10303-21 string literal (\\X2\\ / \\X4\\ escapes for non-ASCII)."""
+    out = []
+    for char in str(value):
+        code = ord(char)
+        if char == "'":
+            out.append("''")
+        elif char == "\\":
+            out.append("\\\\")
+        elif 32 <= code < 127:
+            out.append(char)
+        elif code <= 0xFFFF:
+            out.append(f"\\X2\\{code:04X}\\X0\\")
+        else:
+            out.append(f"\\X4\\{code:08X}\\X0\\")
+    return "'" + "".join(out) + "'"
+
+
+def _step_value(value, created: dict, enum: bool = False) -> str:
+    """A plan value ({"ref"}, {"new"}, lists, numbers, strings) as STEP text."""
+    if value is None:
+        return "$"
+    if isinstance(value, dict):
+        if "ref" in value:
+            return f"#{int(value['ref'])}"
+        return f"#{created[value['new']]}"
+    if isinstance(value, bool):
+        return ".T." if value else ".F."
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return _step_real(value)
+    if isinstance(value, (list, tuple)):
+        return "(" + ",".join(_step_value(v, created) for v in value) + ")"
+    return f".{str(value).upper()}." if enum else _step_string(value)
+
+
+def _split_step_args(text: str) -> list:
+    """(start, end) of each top-level argument of a record's argument text, whitespace excluded."""
+    spans, depth, start, i, n = [], 0, 0, 0, len(text)
+    in_string = False
+    while i < n:
+        c = text[i]
+        if in_string:
+            if c == "'":
+                if i + 1 < n and text[i + 1] == "'":
+                    i += 2
+                    continue
+                in_string = False
+        elif c == "'":
+            in_string = True
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "," and depth == 0:
+            spans.append((start, i))
+            start = i + 1
+        i += 1
+    spans.append((start, n))
+    trimmed = []
+    for a, b in spans:
+        while a < b and text[a] in " \t\r\n":
+            a += 1
+        while b > a and text[b - 1] in " \t\r\n":
+            b -= 1
+        trimmed.append((a, b))
+    return trimmed
+
+
+def _step_record(eid: int, op: dict, created: dict, schema: str) -> bytes:
+    step_type = op["type"].upper()
+    names = _STEP_ATTRIBUTES[step_type][1]
+    enums = _STEP_ENUM_ATTRIBUTES.get(step_type, ())
+    derived = _STEP_DERIVED_ATTRIBUTES.get(step_type, ())
+    values = ["*" if name in derived else _step_value(op["attributes"].get(name), created, name in enums)
+              for name in names]
+    values += ["$"] * max(0, _step_attribute_count(schema, step_type, len(names)) - len(names))
+    return f"#{eid}={step_type}({','.join(values)});\n".encode("ascii")
+
+
+def write_patched_step(scanner: StepGeorefScanner, plan: list, output_path: str, schema: str = None) -> dict:
+    """
+    Writes the scanned file to `output_path` with `plan` applied to the STEP
+    text: updated records are rewritten in place (only the changed arguments,
+    the rest of the record byte for byte), removed records are dropped and
+    created ones are appended with fresh ids before the ENDSEC of the DATA
+    section. Everything else is copied straight from the memory map in
+    STREAM_COPY_CHUNK slices. `output_path` must not be the scanned file: the
+    caller writes a temporary file and renames it once the scanner is closed.
+    """
+    updates, removed, creates = OrderedDict(), set(), []
+    for op in plan:
+        if op["op"] == "update":
+            updates.setdefault(op["ref"], {})[op["attribute"]] = op["new"]
+        elif op["op"] == "remove":
+            removed.add(op["ref"])
+        elif op["op"] == "create":
+            creates.append(op)
+        else:
+            raise ValueError(f"Unknown plan operation: {op['op']}")
+
+    mm = scanner._mm
+    with phase("max_id"):
+        next_id = scanner.max_id() + 1
+    created = {}
+    for op in creates:
+        created[op["key"]] = next_id
+        next_id += 1
+
+    edits = []
+    for eid in list(removed) + [e for e in updates if e not in removed]:
+        entity = scanner.entity(eid)
+        if entity is None or entity._span is None:
+            raise ValueError(f"Record #{eid} not found in {scanner.path}")
+        args_start, args_end = entity._span
+        start = mm.rfind(b"#", scanner._data_start, args_start)
+        end = mm.find(b";", args_end) + 1
+        if eid in removed:
+            end += 2 if mm[end:end + 2] == b"\r\n" else 1 if mm[end:end + 1] == b"\n" else 0
+            edits.append((start, end, b""))
+            continue
+        text = mm[args_start:args_end].decode("latin-1")
+        spans = _split_step_args(text)
+        names = _STEP_ATTRIBUTES[entity._type][1]
+        replaced = {names.index(k): _step_value(v, created) for k, v in updates[eid].items()}
+        if max(replaced) >= len(spans):
+            raise ValueError(f"Record #{eid} has fewer arguments than {entity.is_a()} needs")
+        parts, pos = [], 0
+        for index, (a, b) in enumerate(spans):
+            if index in replaced:
+                parts.append(text[pos:a] + replaced[index])
+                pos = b
+        parts.append(text[pos:])
+        edits.append((start, end, mm[start:args_start] + "".join(parts).encode("latin-1") + mm[args_end:end]))
+    edits.sort()
+    insert_at = scanner._data_end
+
+    written = 0
+    with open(output_path, "wb") as out, memoryview(mm) as view:
+        def copy(a, b):
+            nonlocal written
+            while a < b:
+                n = min(b, a + STREAM_COPY_CHUNK)
+                written += out.write(view[a:n])
+                a = n
+
+        pos = 0
+        with phase("stream_copy"):
+            for start, end, record in edits:
+                copy(pos, start)
+                written += out.write(record)
+                pos = end
+            copy(pos, insert_at)
+            if creates:
+                if insert_at and mm[insert_at - 1:insert_at] not in (b"\n", b"\r"):
+                    written += out.write(b"\n")
+                for op in creates:
+                    written += out.write(_step_record(created[op["key"]], op, created, schema))
+            copy(insert_at, len(mm))
+    return {
+        "bytes_in": len(mm),
+        "bytes_out": written,
+        "records_updated": len(updates),
+        "records_removed": len(removed),
+        "records_created": len(creates),
+        "created": created,
+    }
+
+
+def stream_georeference_file(path: str, write_path: str = None, dry_run: bool = False,
+                             async_write: bool = False, **params) -> dict:
+    """
+    georeference_file for an IFC file on disk without loading it: the plan is
+    computed on the StepGeorefScanner records (StepGeorefModel) and written
+    with write_patched_step to `write_path` (the input itself when equal).
+    Memory stays constant; time is about that of copying the file. `params`
+    are the georeference_file parameters.
+    """
+    start = time.perf_counter()
+    schema = _spf_schema(path)
+    if (schema or "").upper().startswith("IFC2X3"):
+        return {"success": False, "error": "IFC2X3 has no IfcMapConversion/IfcProjectedCRS; "
+                                           "georeference it without stream (ePSet_MapConversion) or upgrade it"}
+    if not dry_run and not write_path:
+        return {"success": False, "error": "stream needs write_path (may be the input path) unless dry_run"}
+    with StepGeorefScanner(path) as scanner:
+        with phase("scan"):
+            scanner.scan()
+        model = StepGeorefModel(scanner)
+        result = georeference_file(model, dry_run=True, **params)
+        if result.get("plan_id"):
+            # Plans on a scanned file cannot be committed later; they are only written here
+            resolve_georeference_plan(model, result["plan_id"], action="discard")
+            result["plan_id"] = None
+        if not result.get("success") or "plan" not in result:
+            return result
+        if async_write:
+            result["warnings"].append("async_write is ignored with stream; the file was written synchronously.")
+        stream = {"mode": "stream", "schema": schema, "scan": dict(scanner.stats)}
+        if not dry_run:
+            temp_path = write_path + ".tmp"
+            try:
+                with phase("stream_write"):
+                    stream.update(write_patched_step(scanner, result["plan"], temp_path, schema))
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+    if not dry_run:
+        # Renamed only now that the input is unmapped and closed (Windows refuses to replace a mapped file)
+        os.replace(temp_path, write_path)
+        result.update(dry_run=False, georeferenced=True, write_path=write_path)
+        result["actions"]["wrote_file"] = True
+    stream["elapsed_ms"] = round((time.perf_counter() - start) * 1000.0, 3)
+    if "bytes_in" in stream and stream["elapsed_ms"]:
+        stream["mb_per_s"] = round(stream["bytes_in"] / 1e6 / (stream["elapsed_ms"] / 1000.0), 1)
+    result["stream"] = stream
+    return result
+
+
+#---------------------------------------------------------------------------------------------------
+# Bulk coordinate transforms (local ⇄ map ⇄ WGS84)
+#---------------------------------------------------------------------------------------------------
+
+COORDINATE_SPACES = ("local", "map", "wgs84")
+
+
+def helmert_parameters(map_conversion: dict) -> dict:
+    """
+    Normalized Helmert 2D + height parameters from a `map_conversion` dict as
+    returned by get_ifc_georeferencing_info (missing values take IFC defaults).
+    """
+    import math
+    if not map_conversion or map_conversion.get("eastings") is None or map_conversion.get("northings") is None:
+        raise ValueError("MapConversion needs at least eastings and northings")
+    a = map_conversion.get("x_axis_abscissa")
+    b = map_conversion.get("x_axis_ordinate")
+    a = 1.0 if a is None else float(a)
+    b = 0.0 if b is None else float(b)
+    norm = math.hypot(a, b)
+    if norm == 0.0:
+        raise ValueError("XAxisAbscissa/XAxisOrdinate cannot both be 0")
+    scale = map_conversion.get("scale")
+    return {
+        "eastings": float(map_conversion["eastings"]),
+        "northings": float(map_conversion["northings"]),
+        "orthogonal_height": float(map_conversion.get("orthogonal_height") or 0.0),
+        "cos": a / norm,
+        "sin": b / norm,
+        "scale": 1.0 if scale in (None, 0) else float(scale),
+    }
+
+
+def local_to_map(points, map_conversion: dict):
+    """(N, 2|3) local engineering coordinates → (N, 2|3) eastings, northings[, height]."""
+    import numpy as np
+    h = helmert_parameters(map_conversion)
+    pts = np.asarray(points, dtype=np.float64)
+    out = np.empty_like(pts)
+    x, y = pts[:, 0], pts[:, 1]
+    sc, ss = h["scale"] * h["cos"], h["scale"] * h["sin"]
+    out[:, 0] = sc * x - ss * y + h["eastings"]
+    out[:, 1] = ss * x + sc * y + h["northings"]
+    if pts.shape[1] > 2:
+        out[:, 2] = h["scale"] * pts[:, 2] + h["orthogonal_height"]
+    return out
+
+
+def map_to_local(points, map_conversion: dict):
+    """Inverse of local_to_map."""
+    import numpy as np
+    h = helmert_parameters(map_conversion)
+    pts = np.asarray(points, dtype=np.float64)
+    out = np.empty_like(pts)
+    de = pts[:, 0] - h["eastings"]
+    dn = pts[:, 1] - h["northings"]
+    out[:, 0] = (h["cos"] * de + h["sin"] * dn) / h["scale"]
+    out[:, 1] = (-h["sin"] * de + h["cos"] * dn) / h["scale"]
+    if pts.shape[1] > 2:
+        out[:, 2] = (pts[:, 2] - h["orthogonal_height"]) / h["scale"]
+    return out
+
+
+def decode_points(points=None, points_b64: str = None, points_path: str = None, dims: int = 3):
+    """
+    Points from a JSON list of [x, y(, z)], a base64 packed little-endian float64
+    buffer, or a raw little-endian float64 file (memory-mapped). Returns (N, dims).
+    """
+    import numpy as np
+    if points is not None:
+        arr = np.asarray(points, dtype=np.float64)
+        if arr.ndim == 1:
+            arr = arr.reshape(-1, dims)
+    elif points_b64:
+        import base64
+        arr = np.frombuffer(base64.b64decode(points_b64), dtype="<f8").reshape(-1, dims)
+    elif points_path:
+        arr = np.memmap(points_path, dtype="<f8", mode="r").reshape(-1, dims)
+    else:
+        raise ValueError("Provide points, points_b64 or points_path")
+    if arr.ndim != 2 or arr.shape[1] not in (2, 3):
+        raise ValueError(f"Points must have 2 or 3 coordinates, got shape {arr.shape}")
+    return arr
+
+
+def transform_points(
+    points=None,
+    points_b64: str = None,
+    points_path: str = None,
+    dims: int = 3,
+    source: str = "local",
+    target: str = "map",
+    map_conversion: dict = None,
+    map_crs: str = None,
+    output_format: str = "json",
+    output_path: str = None,
+) -> dict:
+    """
+    Transforms a whole point array in one batched NumPy operation.
+
+    local ⇄ map uses the IfcMapConversion (Helmert 2D + height); map ⇄ wgs84
+    goes through the shared pyproj Transformer for `map_crs` (WGS84 points are
+    [longitude, latitude(, height)]). Output is a JSON list, a base64 packed
+    float64 buffer (output_format="binary") or a raw float64 file (output_path).
+    """
+    start = time.perf_counter()
+    debug = {}
+    if source not in COORDINATE_SPACES or target not in COORDINATE_SPACES:
+        return {"success": False, "error": f"source/target must be one of {', '.join(COORDINATE_SPACES)}"}
+    if output_format not in ("json", "binary"):
+        return {"success": False, "error": "output_format must be 'json' or 'binary'"}
+
+    import numpy as np
+    with phase("decode"):
+        pts = decode_points(points, points_b64, points_path, dims)
+    debug["decode_ms"] = round((time.perf_counter() - start) * 1000.0, 3)
+
+    order = {"local": 0, "map": 1, "wgs84": 2}
+    path = [s for s in COORDINATE_SPACES if min(order[source], order[target]) <= order[s] <= max(order[source], order[target])]
+    if order[source] > order[target]:
+        path.reverse()
+
+    if "local" in path and len(path) > 1 and map_conversion is None:
+        return {"success": False, "error": "No IfcMapConversion available to transform local coordinates"}
+    if "wgs84" in path and len(path) > 1 and not map_crs:
+        return {"success": False, "error": "map_crs (e.g. 'EPSG:25830') is required to transform to/from WGS84"}
+
+    out = pts
+    for a, b in zip(path, path[1:]):
+        step = time.perf_counter()
+        if (a, b) == ("local", "map"):
+            with phase("helmert"):
+                out = local_to_map(out, map_conversion)
+        elif (a, b) == ("map", "local"):
+            with phase("helmert"):
+                out = map_to_local(out, map_conversion)
+        else:
+            src, dst = (map_crs, "EPSG:4326") if (a, b) == ("map", "wgs84") else ("EPSG:4326", map_crs)
+            with phase("pyproj_transform"):
+                transformer, hit = get_transformer(src, dst, always_xy=True)
+                debug["transformer_cache_hit"] = hit
+                coords = transformer.transform(*(np.ascontiguousarray(out[:, i]) for i in range(out.shape[1])))
+                out = np.column_stack(coords)
+        debug[f"{a}_to_{b}_ms"] = round((time.perf_counter() - step) * 1000.0, 3)
+
+    result = {
+        "success": True,
+        "count": int(out.shape[0]),
+        "dims": int(out.shape[1]),
+        "source": source,
+        "target": target,
+        "map_crs": map_crs,
+        "map_conversion": map_conversion,
+    }
+    with phase("encode"):
+        if output_path:
+            np.ascontiguousarray(out, dtype="<f8").tofile(output_path)
+            result["output_path"] = output_path
+        elif output_format == "binary":
+            import base64
+            result["points_b64"] = base64.b64encode(np.ascontiguousarray(out, dtype="<f8").tobytes()).decode("ascii")
+        else:
+            result["points"] = out.tolist()
+    debug["elapsed_ms"] = round((time.perf_counter() - start) * 1000.0, 3)
+    result["debug"] = debug
+    return result
+
+
+#---------------------------------------------------------------------------------------------------
+# Response projection and encoding
+#---------------------------------------------------------------------------------------------------
+
+RESPONSE_FORMATS = ("pretty", "compact", "binary")
+_FRAME_MAGIC = b"GEO1"
+
+
+def project_fields(result: dict, fields=None) -> dict:
+    """
+    Keeps only the requested keys of a handler result. `fields` entries are
+    top-level keys ("map_conversion") or dotted paths ("crs.name").
+    "success" and "error" are always kept so failures stay visible.
+    """
+    if not fields or not isinstance(result, dict):
+        return result
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+    out = {k: result[k] for k in ("success", "error") if k in result}
+    for path in fields:
+        parts = path.split(".")
+        src = result
+        for part in parts[:-1]:
+            src = src.get(part) if isinstance(src, dict) else None
+        if not isinstance(src, dict) or parts[-1] not in src:
+            continue
+        dst = out
+        for part in parts[:-1]:
+            nxt = dst.get(part)
+            if nxt is None:
+                nxt = dst[part] = {}
+            elif nxt is src or not isinstance(nxt, dict):
+                break  # the whole parent was already requested
+            dst = nxt
+        else:
+            dst[parts[-1]] = src[parts[-1]]
+    return out
+
+
+def encode_response(result, format: str = "pretty") -> str:
+    """
+    Serializes a tool result:
+    - "pretty": indented JSON (default, easiest to read)
+    - "compact": JSON without whitespace
+    - "binary": base64 of a frame  b"GEO1" + uint32 BE length + zlib(compact JSON),
+      for programmatic clients (see decode_response)
+    """
+    import json
+    if format == "compact":
+        return json.dumps(result, ensure_ascii=False, separators=(",", ":"), default=str)
+    if format == "binary":
+        import base64
+        import struct
+        import zlib
+        payload = zlib.compress(json.dumps(result, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8"))
+        return base64.b64encode(_FRAME_MAGIC + struct.pack(">I", len(payload)) + payload).decode("ascii")
+    return json.dumps(result, ensure_ascii=False, indent=2, default=str)
+
+
+def decode_response(text: str):
+    """Inverse of encode_response for any of the formats."""
+    import json
+    stripped = text.lstrip()
+    if stripped.startswith(("{", "[")):
+        return json.loads(stripped)
+    import base64
+    import struct
+    import zlib
+    frame = base64.b64decode(stripped)
+    if frame[:4] != _FRAME_MAGIC:
+        raise ValueError("Not a georeferencing response frame")
+    (length,) = struct.unpack(">I", frame[4:8])
+    return json.loads(zlib.decompress(frame[8:8 + length]).decode("utf-8"))
+
+
+#---------------------------------------------------------------------------------------------------
+# Non-blocking IFC write
+#---------------------------------------------------------------------------------------------------
+
+# ifcopenshell keeps the GIL for the whole of file.write(), so a plain worker thread
+# would still freeze Blender. Instead the file is serialized record by record in short
+# time slices on the main thread (bpy.app.timers), which keeps the UI and the socket alive.
+WRITE_SLICE_MS = 20
+
+
+def _entity_ids(file):
+    """All entity ids in ascending order (the order file.write() uses)."""
+    names = getattr(file, "entity_names", None)
+    if names is None:
+        names = file.wrapped_data.entity_names
+    return sorted(names())
+
+
+def _entity_spf(entity) -> str:
+    """One valid SPF record (upper-case type names), without the trailing ';'."""
+    try:
+        return entity.to_string(True)
+    except TypeError:
+        return entity.wrapped_data.to_string(True)
+
+
+def _spf_header(file) -> str:
+    import ifcopenshell
+    empty = ifcopenshell.file(schema=getattr(file, "schema_identifier", None) or file.schema)
+    try:
+        empty.assign_header_from(file)
+    except Exception:
+        pass  # Keep the default header
+    text = empty.to_string()
+    return text[:text.index("DATA;") + 5] + "\n"
+
+
+def _blender_timers():
+    """bpy.app.timers when running inside Blender, else None."""
+    try:
+        import bpy
+    except ImportError:
+        return None
+    return bpy.app.timers
+
+
+def _default_scheduler(step):
+    """Runs step() until it returns None: on Blender's main-thread timers when available, else on a thread."""
+    timers = _blender_timers()
+    if timers is not None:
+        # persistent: loading another .blend/IFC must not drop the timer (the job would stay
+        # "running" with its temporary file); step() then aborts on the model change itself
+        timers.register(step, first_interval=0.0, persistent=True)
+        return
+
+    def _loop():
+        while True:
+            delay = step()
+            if delay is None:
+                return
+            time.sleep(delay)
+
+    threading.Thread(target=_loop, name="georef-ifc-writer", daemon=True).start()
+
+
+def start_async_write(file, path: str, slice_ms: float = WRITE_SLICE_MS, scheduler=None) -> Job:
+    """
+    Writes `file` to `path` without blocking the caller for the whole serialization.
+
+    The output goes to a temporary file in the same folder and is renamed over
+    `path` atomically when complete. The job aborts (and leaves `path` untouched)
+    if the model revision changes while writing, so the result is always a
+    consistent snapshot. Poll it with get_job_status(job.id); cancel with
+    get_job_status(job.id, cancel=True).
+    """
+    path = os.path.abspath(path)
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+
+    job = register_job(Job("ifc_write"))
+    temp_path = os.path.join(folder, f".{os.path.basename(path)}.{job.id}.tmp")
+    revision = model_revision(file)
+    ids = _entity_ids(file)
+    job.total = len(ids)
+    job.progress.update({"path": path, "temp_path": temp_path, "entities_written": 0,
+                         "entities_total": len(ids), "bytes_written": 0, "percent": 0.0})
+    state = {"out": None, "index": 0}
+
+    def _abort(final_state, error=None):
+        if state["out"]:
+            state["out"].close()
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        job.finish(final_state, error)
+        return None
+
+    def step():
+        try:
+            if job.cancel_event.is_set():
+                return _abort("cancelled")
+            if model_revision(file) != revision:
+                return _abort("failed", "The model changed while writing; output discarded, nothing was replaced")
+            if state["out"] is None:
+                state["out"] = open(temp_path, "w", encoding="utf-8", newline="\n")
+                state["out"].write(_spf_header(file))
+
+            out = state["out"]
+            deadline = time.perf_counter() + slice_ms / 1000.0
+            i = state["index"]
+            by_id = file.by_id
+            while i < len(ids):
+                out.write(_entity_spf(by_id(ids[i])) + ";\n")
+                i += 1
+                if (i & 255) == 0 and time.perf_counter() >= deadline:
+                    break
+            state["index"] = i
+            job.progress.update({"entities_written": i, "bytes_written": out.tell(),
+                                 "percent": round(100.0 * i / max(1, len(ids)), 2)})
+            if i < len(ids):
+                return 0.0
+
+            out.write("ENDSEC;\nEND-ISO-10303-21;\n")
+            out.flush()
+            os.fsync(out.fileno())
+            job.progress["bytes_written"] = out.tell()
+            out.close()
+            state["out"] = None
+            os.replace(temp_path, path)
+            job.add_result({"path": path, "bytes": job.progress["bytes_written"]})
+            job.finish()
+            return None
+        except Exception as e:
+            return _abort("failed", f"{type(e).__name__}: {e}")
+
+    (scheduler or _default_scheduler)(step)
+    return job
+
+
+def write_ifc(file, path: str, async_write: bool = False, warnings: list = None) -> dict:
+    """Writes synchronously, or starts a background write job. Returns {"wrote_file", "write_job"}."""
+    if async_write and _blender_timers() is None and HOT_FILES.holds(file):
+        # Outside Blender the job would run on a thread while other commands edit the same hot file
+        async_write = False
+        if warnings is not None:
+            warnings.append("async_write is not available for files loaded from a path outside Blender; "
+                            "the file was written synchronously.")
+    if async_write:
+        job = start_async_write(file, path)
+        return {"wrote_file": False, "write_job": {"job_id": job.id, "state": job.state, "path": os.path.abspath(path)}}
+    file.write(path)
+    return {"wrote_file": True, "write_job": None}
+
+
+#---------------------------------------------------------------------------------------------------
+# Command bodies (shared by the Blender handlers and the headless workers)
+#---------------------------------------------------------------------------------------------------
+
+# `get_file` returns the interactive model (IfcStore.get_file in Blender); commands
+# given a `path` work on HOT_FILES instead, so the same code runs without bpy.
+
+def georeferencing_info_command(get_file, include_contexts: bool = False, path: str = None, fields: list = None,
+                                timings: bool = False, profile: str = None) -> dict:
+    """Body of `get_ifc_georeferencing_info`."""
+    def run():
+        if path:
+            hot = HOT_FILES.peek(path)
+            if hot is None:
+                # Header-only scan of the file on disk: bounded memory, no IfcStore involved
+                return project_fields(scan_georeferencing_info(path, include_contexts), fields)
+            # Already loaded (and possibly edited) in this process: serve it from the info cache
+            result = cached_georeferencing_info(hot, include_contexts, {"entered": True, "has_ifc": True, "mode": "hot"})
+            result["hot_file"] = HOT_FILES.describe(path)
+            return project_fields(result, fields)
+
+        file = get_file()
+        debug = {"entered": True, "has_ifc": file is not None, "projects": 0, "sites": 0, "contexts": 0}
+        if file is None:
+            return {"error": "No IFC file is currently loaded", "debug": debug}
+
+        # Memoized per file until the model changes; `from_cache` tells whether it was reused
+        return project_fields(cached_georeferencing_info(file, include_contexts, debug), fields)
+
+    return run_instrumented("get_ifc_georeferencing_info", run, timings=timings, profile=profile)
+
+
+def georeference_command(get_file, path: str = None, fields: list = None, timings: bool = False,
+                         profile: str = None, stream: bool = False, **params) -> dict:
+    """
+    Body of `georeference_ifc_model`; `params` are the georeference_file parameters.
+    `stream` patches the file at `path` on disk without loading it (stream_georeference_file).
+    """
+    def run():
+        if stream:
+            if not path:
+                return {"success": False, "error": "stream needs path (an IFC file on disk)"}
+            return project_fields(stream_georeference_file(path, **params), fields)
+        if path:
+            file = HOT_FILES.get(path)
+        else:
+            file = get_file()
+            if file is None:
+                return {"success": False, "error": "No IFC file is currently loaded"}
+
+        result = georeference_file(file, **params)
+        if path and result.get("success") and not params.get("dry_run"):
+            HOT_FILES.edited(path, params.get("write_path") if result.get("actions", {}).get("wrote_file") else None)
+            result["hot_file"] = HOT_FILES.describe(path)
+        return project_fields(result, fields)
+
+    return run_instrumented("georeference_ifc_model", run, timings=timings, profile=profile)
+
+
+def transform_command(get_file, map_conversion: dict = None, map_crs: str = None, path: str = None,
+                      timings: bool = False, profile: str = None, **params) -> dict:
+    """Body of `transform_ifc_coordinates`; `params` are the transform_points point/format parameters."""
+    def run():
+        mc, crs = map_conversion, map_crs
+        if mc is None:
+            if path:
+                hot = HOT_FILES.peek(path)
+                info = cached_georeferencing_info(hot) if hot is not None else scan_georeferencing_info(path)
+            else:
+                file = get_file()
+                if file is None:
+                    return {"success": False, "error": "No IFC file is currently loaded"}
+                info = cached_georeferencing_info(file)
+            if info.get("map_conversion", {}).get("eastings") is not None:
+                mc = info["map_conversion"]
+            crs = crs or (info.get("crs") or {}).get("name")
+
+        return transform_points(map_conversion=mc, map_crs=crs, **params)
+
+    return run_instrumented("transform_ifc_coordinates", run, timings=timings, profile=profile)
+
+
+def apply_plan_command(get_file, plan_id: str, action: str = "commit", write_path: str = None,
+                       async_write: bool = False, path: str = None, timings: bool = False,
+                       profile: str = None) -> dict:
+    """Body of `apply_georeference_plan`; `path` selects a plan made on a hot file."""
+    def run():
+        file = HOT_FILES.peek(path) if path else get_file()
+        if file is None and action == "commit":
+            return {"success": False, "error": f"{path} is not loaded" if path else "No IFC file is currently loaded"}
+        result = resolve_georeference_plan(file, plan_id, action=action, write_path=write_path, async_write=async_write)
+        if path and result.get("committed"):
+            HOT_FILES.edited(path, result.get("write_path") if result.get("wrote_file") else None)
+        return result
+
+    return run_instrumented("apply_georeference_plan", run, timings=timings, profile=profile)
+
+
+#---------------------------------------------------------------------------------------------------
+# Hot-loaded files and headless ifcopenshell workers
+#---------------------------------------------------------------------------------------------------
+
+HOT_FILES_MAX = int(os.environ.get("BONSAI_MCP_HOT_FILES", "4"))
+HEADLESS_WORKERS = int(os.environ.get("BONSAI_MCP_HEADLESS_WORKERS", "2"))
+
+
+class HotFileCache:
+    """
+    Keeps up to `max_files` IFC files opened with ifcopenshell, keyed by absolute
+    path. An entry is reused while the file on disk keeps the (mtime, size) it
+    had when it was loaded or last written by us; edits that were not written
+    back make the entry "dirty" and are kept until the file changes on disk.
+    Only clean entries are evicted (least recently used first), so unsaved
+    edits are never dropped silently; dirty entries may keep the cache above
+    `max_files` until they are written back.
+    """
+
+    def __init__(self, max_files: int = HOT_FILES_MAX):
+        self.max_files = max(1, int(max_files))
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.loads = 0
+        self.hits = 0
+
+    @staticmethod
+    def _stamp(path: str):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def peek(self, path: str):
+        """The loaded file for `path` if it is still current, without loading it."""
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            try:
+                current = self._stamp(key) == entry["stamp"]
+            except OSError:
+                current = False
+            if not current:
+                self._entries.pop(key, None)
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry["file"]
+
+    def get(self, path: str):
+        """The loaded file for `path`, (re)loading it when missing or changed on disk."""
+        file = self.peek(path)
+        if file is not None:
+            return file
+        import ifcopenshell
+        key = os.path.abspath(path)
+        stamp = self._stamp(key)
+        file = ifcopenshell.open(key)
+        with self._lock:
+            self._entries[key] = {"file": file, "stamp": stamp, "dirty": False, "loaded": time.time()}
+            self._entries.move_to_end(key)
+            self.loads += 1
+            excess = len(self._entries) - self.max_files
+            if excess > 0:
+                clean = [k for k, e in self._entries.items() if not e["dirty"] and k != key]
+                for old in clean[:excess]:
+                    invalidate_georeferencing_info(self._entries.pop(old)["file"])
+        return file
+
+    def holds(self, file) -> bool:
+        """Whether `file` is one of the loaded hot files."""
+        with self._lock:
+            return any(entry["file"] is file for entry in self._entries.values())
+
+    def edited(self, path: str, written_path: str = None):
+        """Records an edit of the hot copy; writing it back to `path` makes it current again."""
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            if written_path and os.path.abspath(written_path) == key:
+                entry["stamp"] = self._stamp(key)
+                entry["dirty"] = False
+            else:
+                entry["dirty"] = True
+
+    def describe(self, path: str) -> dict:
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            return {"path": key, "loaded": entry is not None, "dirty": bool(entry and entry["dirty"])}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"files": [self.describe(k) for k in self._entries], "loads": self.loads, "hits": self.hits,
+                    "max_files": self.max_files, "dirty": sum(1 for e in self._entries.values() if e["dirty"])}
+
+
+HOT_FILES = HotFileCache()
+
+HEADLESS_COMMANDS = {
+    "get_ifc_georeferencing_info": georeferencing_info_command,
+    "georeference_ifc_model": georeference_command,
+    "transform_ifc_coordinates": transform_command,
+    "apply_georeference_plan": apply_plan_command,
+}
+
+
+def headless_execute(command: str, params: dict) -> dict:
+    """Runs a georeferencing command on a file on disk (`params["path"]`) in this process."""
+    handler = HEADLESS_COMMANDS.get(command)
+    if handler is None:
+        return {"success": False, "error": f"Command not available headless: {command}"}
+    params = dict(params or {})
+    if not params.get("path"):
+        return {"success": False, "error": "Headless commands need a `path`"}
+    warning = None
+    if params.get("async_write"):
+        # Nothing else runs in a worker, and job ids would not be visible to Blender
+        params["async_write"] = False
+        warning = "async_write is ignored by the headless workers; the file was written synchronously."
+    try:
+        result = handler(lambda: None, **params)
+    except Exception as e:
+        import traceback
+        return {"success": False, "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}
+    if warning and isinstance(result, dict):
+        result.setdefault("warnings", []).append(warning)
+    return result
+
+
+def _headless_worker_main(conn):
+    """Worker process loop: (command, params) in, result dict out, files kept hot between requests."""
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            return
+        if request is None:
+            return
+        command, params = request
+        result = headless_execute(command, params)
+        if isinstance(result, dict):
+            result["worker"] = {"pid": os.getpid(), "hot_files": HOT_FILES.stats()}
+        conn.send(result)
+
+
+def headless_available() -> bool:
+    """True when path-based commands can run outside Blender (ifcopenshell importable, not disabled)."""
+    if os.environ.get("BONSAI_MCP_HEADLESS", "1").strip().lower() in ("0", "false", "no", "off"):
+        return False
+    import importlib.util
+    return importlib.util.find_spec("ifcopenshell") is not None
+
+
+class HeadlessWorkerPool:
+    """
+    Pool of ifcopenshell worker processes for path-based commands. Requests for
+    the same path always go to the same worker, which keeps the file hot
+    (HOT_FILES) between calls; Blender is not involved.
+    """
+
+    def __init__(self, workers: int = HEADLESS_WORKERS):
+        self.size = max(1, int(workers))
+        self._workers = [None] * self.size
+        self._locks = [threading.Lock() for _ in range(self.size)]
+
+    def _slot(self, path: str) -> int:
+        import zlib
+        return zlib.crc32(os.path.normcase(os.path.abspath(path)).encode("utf-8")) % self.size
+
+    def _start(self, slot: int):
+        import multiprocessing
+        ctx = multiprocessing.get_context("spawn")
+        parent, child = ctx.Pipe()
+        process = ctx.Process(target=_headless_worker_main, args=(child,), daemon=True,
+                              name=f"georef-headless-{slot}")
+        process.start()
+        child.close()
+        self._workers[slot] = (process, parent)
+        return self._workers[slot]
+
+    def execute(self, command: str, params: dict, timeout: float = None) -> dict:
+        path = (params or {}).get("path")
+        if not path:
+            return {"success": False, "error": "Headless commands need a `path`"}
+        slot = self._slot(path)
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        lock = self._locks[slot]
+        if not lock.acquire(timeout=-1 if timeout is None else max(0.0, timeout)):
+            return {"success": False, "error": f"Headless worker busy for more than {timeout}s"}
+        try:
+            worker = self._workers[slot]
+            if worker is None or not worker[0].is_alive():
+                worker = self._start(slot)
+            process, conn = worker
+            try:
+                conn.send((command, params))
+                if deadline is not None and not conn.poll(max(0.0, deadline - time.monotonic())):
+                    # The worker is busy with a request we no longer wait for: replace it
+                    process.terminate()
+                    self._workers[slot] = None
+                    return {"success": False, "error": f"Headless worker timed out after {timeout}s"}
+                return conn.recv()
+            except (EOFError, OSError) as e:
+                self._workers[slot] = None
+                return {"success": False, "error": f"Headless worker failed: {type(e).__name__}: {e}"}
+        finally:
+            lock.release()
+
+    def shutdown(self):
+        for slot, worker in enumerate(self._workers):
+            if worker is None:
+                continue
+            process, conn = worker
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+            self._workers[slot] = None
+
+
+_HEADLESS_POOL = None
+_HEADLESS_POOL_LOCK = threading.Lock()
+
+
+def headless_pool() -> HeadlessWorkerPool:
+    global _HEADLESS_POOL
+    with _HEADLESS_POOL_LOCK:
+        if _HEADLESS_POOL is None:
+            _HEADLESS_POOL = HeadlessWorkerPool()
+        return _HEADLESS_POOL
+
+
+#---------------------------------------------------------------------------------------------------
+# Pipelined commands and pooled Blender connections
+#---------------------------------------------------------------------------------------------------
+
+PIPELINE_MAX_STEPS = 64
+
+
+def _pipeline_step(step, index: int):
+    """Normalizes {"command", "params"} or [command, params] to (command, params)."""
+    if isinstance(step, dict):
+        command, params = step.get("command"), step.get("params")
+    elif isinstance(step, (list, tuple)) and len(step) in (1, 2):
+        command, params = step[0], (step[1] if len(step) == 2 else None)
+    else:
+        raise ValueError(f"steps[{index}] must be {{'command', 'params'}} or [command, params]")
+    if params is not None and not isinstance(params, dict):
+        raise ValueError(f"steps[{index}].params must be an object")
+    return command, dict(params or {})
+
+
+def pipeline_command(get_file, steps: list, stop_on_error: bool = True, path: str = None,
+                     timings: bool = False, profile: str = None) -> dict:
+    """
+    Body of `run_georeferencing_pipeline`: runs the georeferencing commands in
+    `steps` in order, in this single call (one main-thread slot in Blender,
+    one request to a headless worker), and returns every result together.
+    Steps without their own `path` inherit the envelope `path`.
+    """
+    def run():
+        if not isinstance(steps, (list, tuple)) or not steps:
+            return {"success": False, "error": "steps must be a non-empty list"}
+        if len(steps) > PIPELINE_MAX_STEPS:
+            return {"success": False, "error": f"At most {PIPELINE_MAX_STEPS} steps per pipeline"}
+        try:
+            parsed = [_pipeline_step(step, i) for i, step in enumerate(steps)]
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
+
+        results = []
+        stopped = False
+        for index, (command, params) in enumerate(parsed):
+            handler = HEADLESS_COMMANDS.get(command)
+            if handler is None or handler is pipeline_command:
+                result = {"success": False, "error": f"Command not allowed in a pipeline: {command}"}
+            else:
+                if path and not params.get("path"):
+                    params["path"] = path
+                try:
+                    with phase(command):
+                        result = handler(get_file, **params)
+                except TypeError as e:
+                    result = {"success": False, "error": f"Invalid parameters: {e}"}
+            ok = not _is_error_result(result)
+            results.append({"index": index, "command": command, "success": ok, "result": result})
+            if not ok and stop_on_error:
+                stopped = index < len(parsed) - 1
+                break
+
+        return {
+            "success": all(r["success"] for r in results) and len(results) == len(parsed),
+            "completed": len(results),
+            "total": len(parsed),
+            "stopped_on_error": stopped,
+            "results": results,
+        }
+
+    return run_instrumented("run_georeferencing_pipeline", run, timings=timings, profile=profile)
+
+
+HEADLESS_COMMANDS["run_georeferencing_pipeline"] = pipeline_command
+
+
+# MCP server side: where the Blender add-on listens and how many sockets are kept open
+BLENDER_HOST = os.environ.get("BLENDER_HOST", "localhost")
+BLENDER_PORT = int(os.environ.get("BLENDER_PORT", "9876"))
+BLENDER_CONNECTIONS = int(os.environ.get("BONSAI_MCP_CONNECTIONS", "2"))
+CONNECTION_WAIT_S = 120.0
+
+
+class ConnectionPool:
+    """
+    Keeps up to `size` connections made by `factory()` open across tool calls
+    and lends each one to a single caller at a time (the add-on answers one
+    request per socket in order). Idle connections closed by the peer are
+    detected locally, without a round trip, and replaced.
+    """
+
+    def __init__(self, factory, size: int = BLENDER_CONNECTIONS):
+        self._factory = factory
+        self.size = max(1, int(size))
+        self._idle = deque()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    @staticmethod
+    def _alive(conn) -> bool:
+        sock = getattr(conn, "sock", None)
+        if sock is None:
+            return False
+        timeout = sock.gettimeout()
+        try:
+            sock.settimeout(0.0)
+            # b"" means the peer closed it; unread bytes mean a stale reply: both unusable
+            sock.recv(1, socket.MSG_PEEK)
+            return False
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+        finally:
+            try:
+                sock.settimeout(timeout)
+            except OSError:
+                pass
+
+    def _close(self, conn):
+        self.discarded += 1
+        close = getattr(conn, "disconnect", None) or getattr(conn, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception:
+                pass
+
+    @contextmanager
+    def connection(self):
+        if not self._slots.acquire(timeout=CONNECTION_WAIT_S):
+            raise TimeoutError(f"No free Blender connection after {CONNECTION_WAIT_S:.0f}s")
+        conn = None
+        try:
+            with self._lock:
+                while self._idle and conn is None:
+                    candidate = self._idle.pop()
+                    if self._alive(candidate):
+                        conn = candidate
+                        self.reused += 1
+                    else:
+                        self._close(candidate)
+            if conn is None:
+                conn = self._factory()
+                self.created += 1
+            try:
+                yield conn
+            except Exception as e:
+                # Socket errors, timeouts and garbled replies may leave a reply in flight:
+                # never hand that socket out again. An error *reply* leaves it usable.
+                if isinstance(e, (OSError, ValueError)) or not self._alive(conn):
+                    self._close(conn)
+                    conn = None
+                raise
+            except BaseException:
+                self._close(conn)
+                conn = None
+                raise
+        finally:
+            if conn is not None:
+                with self._lock:
+                    self._idle.append(conn)
+            self._slots.release()
+
+    def send(self, command: str, params: dict):
+        with self.connection() as conn:
+            return conn.send_command(command, params)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": self.size, "idle": len(self._idle), "created": self.created,
+                    "reused": self.reused, "discarded": self.discarded}
+
+    def close(self):
+        with self._lock:
+            while self._idle:
+                self._close(self._idle.pop())
+
+
+# Async tool calls: default per-call timeout, calls in flight towards Blender at once
+# (more would only wait for a pooled connection), and read-only commands whose
+# identical in-flight calls share one round trip
+COMMAND_TIMEOUT_S = float(os.environ.get("BONSAI_MCP_COMMAND_TIMEOUT", "300"))
+MAX_CONCURRENT_COMMANDS = int(os.environ.get("BONSAI_MCP_MAX_CONCURRENT", str(BLENDER_CONNECTIONS)))
+COALESCED_COMMANDS = frozenset({
+    "get_ifc_georeferencing_info",
+    "get_ifc_model_extent",
+    "transform_ifc_coordinates",
+    "get_geoid_heights",
+    "query_ifc_portfolio",
+    "find_ifc_elements_by_location",
+})
+
+
+class _Flight:
+    """One add-on call in progress and the number of tool calls awaiting it."""
+
+    def __init__(self):
+        self.task = None
+        self.waiters = 0
+        self.started = False
+
+
+class AsyncCommandGate:
+    """
+    Awaitable front of a blocking `send(command, params, timeout)` (e.g.
+    send_georef_command) for async MCP tools:
+
+    - at most `limit` calls run at once, in executor threads, so the event
+      loop never blocks and Blender is not flooded;
+    - identical in-flight calls of `coalesce` commands share one call;
+    - each caller waits at most `timeout` seconds. A caller that times out or
+      is cancelled stops waiting; the call itself is cancelled only if it has
+      not reached the add-on yet (a started one finishes and keeps its slot).
+      The same timeout is passed to `send`, so a sender that can abort (the
+      headless workers) frees its worker and executor thread as well.
+
+    `unlimited(command, params)` selects calls that skip the limit (e.g. the
+    ones served by the headless workers instead of Blender).
+    """
+
+    def __init__(self, send, limit: int = MAX_CONCURRENT_COMMANDS, timeout: float = COMMAND_TIMEOUT_S,
+                 coalesce=COALESCED_COMMANDS, unlimited=None):
+        self._send = send
+        self.limit = max(1, int(limit))
+        self.timeout = timeout
+        self.coalesce = frozenset(coalesce)
+        self._unlimited = unlimited
+        self._loop = None
+        self._slots = None
+        self._inflight = {}
+        self._active = set()
+        self._stats = {"calls": 0, "coalesced": 0, "timeouts": 0, "cancelled": 0, "abandoned": 0}
+
+    def _bind(self, loop):
+        import asyncio
+        # Semaphores and tasks belong to one event loop (a new loop, e.g. in tests, starts afresh)
+        if loop is not self._loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.limit)
+            self._inflight = {}
+            self._active = set()
+
+    def _key(self, command: str, params: dict):
+        if command not in self.coalesce:
+            return None
+        import json
+        return command, json.dumps(params, sort_keys=True, default=str)
+
+    async def _run(self, flight: _Flight, command: str, params: dict, timeout: float = None):
+        import asyncio
+        limited = self._unlimited is None or not self._unlimited(command, params)
+        if limited:
+            await self._slots.acquire()
+        try:
+            flight.started = True
+            return await asyncio.get_running_loop().run_in_executor(None, self._send, command, params, timeout)
+        finally:
+            if limited:
+                self._slots.release()
+
+    async def call(self, command: str, params: dict, timeout: float = None):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        self._bind(loop)
+        key = self._key(command, params)
+        wait = self.timeout if timeout is None else float(timeout)
+        wait = wait if wait and wait > 0 else None
+        flight = self._inflight.get(key) if key is not None else None
+        if flight is None:
+            flight = _Flight()
+            flight.task = loop.create_task(self._run(flight, command, params, wait))
+            self._active.add(flight)
+            flight.task.add_done_callback(lambda _, flight=flight: self._active.discard(flight))
+            self._stats["calls"] += 1
+            if key is not None:
+                self._inflight[key] = flight
+                flight.task.add_done_callback(
+                    lambda _, key=key, flight=flight: self._inflight.get(key) is flight and self._inflight.pop(key))
+        else:
+            self._stats["coalesced"] += 1
+
+        flight.waiters += 1
+        try:
+            # shield: one caller giving up must not cancel the call shared with the others
+            return await asyncio.wait_for(asyncio.shield(flight.task), wait)
+        except asyncio.TimeoutError:
+            self._stats["timeouts"] += 1
+            raise TimeoutError(f"{command} did not answer within {wait:g}s") from None
+        except asyncio.CancelledError:
+            self._stats["cancelled"] += 1
+            raise
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                if flight.started:
+                    # Already in the add-on: let it finish (the connection stays consistent), drop the result
+                    self._stats["abandoned"] += 1
+                    flight.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+                else:
+                    flight.task.cancel()
+
+    def stats(self) -> dict:
+        running = sum(1 for f in self._active if f.started)
+        return dict(self._stats, limit=self.limit, running=running, waiting=len(self._active) - running)
+
+
+#---------------------------------------------------------------------------------------------------
+# Placement tree and model extent
+#---------------------------------------------------------------------------------------------------
+
+_PLACEMENT_CACHE = OrderedDict()
+_PLACEMENT_CACHE_LOCK = threading.Lock()
+
+
+def _local_frames(locations, axes, ref_directions):
+    """(N, 4, 4) matrices of IfcAxis2Placement3D from (N, 3) location, Z axis and X reference arrays."""
+    import numpy as np
+    z = axes / np.linalg.norm(axes, axis=1, keepdims=True)
+    x = ref_directions - np.sum(ref_directions * z, axis=1, keepdims=True) * z
+    norm = np.linalg.norm(x, axis=1, keepdims=True)
+    # RefDirection parallel to Axis: fall back to any perpendicular direction
+    degenerate = norm[:, 0] < 1e-12
+    if degenerate.any():
+        alt = np.where(np.abs(z[degenerate, :1]) < 0.9, [[1.0, 0.0, 0.0]], [[0.0, 1.0, 0.0]])
+        alt = alt - np.sum(alt * z[degenerate], axis=1, keepdims=True) * z[degenerate]
+        x[degenerate] = alt
+        norm[degenerate] = np.linalg.norm(alt, axis=1, keepdims=True)
+    x = x / norm
+    y = np.cross(z, x)
+    frames = np.zeros((len(locations), 4, 4))
+    frames[:, :3, 0] = x
+    frames[:, :3, 1] = y
+    frames[:, :3, 2] = z
+    frames[:, :3, 3] = locations
+    frames[:, 3, 3] = 1.0
+    return frames
+
+
+# "#12=IfcLocalPlacement(#6,#11)", "#11=IfcAxis2Placement3D(#7,$,$)": up to three reference arguments
+_REFERENCE_RECORD = re.compile(r"#(\d+)=(\w+)\((?:#(\d+)|\$)(?:,(?:#(\d+)|\$))?(?:,(?:#(\d+)|\$))?\)")
+
+
+def _reference_records(entities):
+    """
+    Serializes `entities` in one pass and returns (ids, types, refs): int64 ids,
+    the type names, and an (N, 3) int64 array of referenced ids (-1 for $ or
+    a missing argument). Much cheaper than one attribute access per reference.
+    """
+    import numpy as np
+    found = _REFERENCE_RECORD.findall("\n".join(map(str, entities)))
+    if not found:
+        return np.zeros(0, dtype=np.int64), [], np.zeros((0, 3), dtype=np.int64)
+    table = np.array(found)
+    types = table[:, 1].tolist()
+    numbers = np.delete(table, 1, axis=1)
+    numbers[numbers == ""] = "-1"
+    numbers = numbers.astype(np.int64)
+    return numbers[:, 0], types, numbers[:, 1:]
+
+
+def _read_ratios(file, ids, width: int, default):
+    """(len(ids), width) array of Coordinates/DirectionRatios, each distinct id read once; -1 → default."""
+    import numpy as np
+    out = np.tile(np.asarray(default, dtype=np.float64), (len(ids), 1))
+    if not len(ids):
+        return out
+    unique, inverse = np.unique(ids, return_inverse=True)
+    values = np.tile(np.asarray(default, dtype=np.float64), (len(unique), 1))
+    for i, eid in enumerate(unique.tolist()):
+        if eid >= 0:
+            ratios = file.by_id(eid)[0]
+            values[i, :min(len(ratios), width)] = ratios[:width]
+    return values[inverse.reshape(-1)]
+
+
+def resolve_placements(file, warnings: list = None) -> dict:
+    """
+    World matrices of every IfcLocalPlacement of a loaded model.
+
+    The placement and IfcAxis2Placement records are read in bulk from their
+    STEP serialization (one Python object per placement instead of one per
+    attribute), and each point/direction instance is read once. The
+    PlacementRelTo tree is then resolved level by level: all placements whose
+    parent is already known are composed with one batched NumPy matmul, so
+    shared parents are computed once however many children they have.
+    Returns {"index": {placement id: row}, "matrices": (N, 4, 4), "unresolved": int}.
+    """
+    import numpy as np
+    warnings = [] if warnings is None else warnings
+    with phase("by_type"):
+        placements = file.by_type("IfcLocalPlacement")
+
+    with phase("read_placements"):
+        ids, _, refs = _reference_records(placements)
+        n = len(ids)
+        index = dict(zip(ids.tolist(), range(n)))
+        axis_ids, axis_types, axis_refs = _reference_records(
+            file.by_id(eid) for eid in refs[:, 1].tolist() if eid >= 0)
+
+    if len(axis_ids) != int((refs[:, 1] >= 0).sum()):
+        raise ValueError("Unexpected IfcLocalPlacement.RelativePlacement records")
+
+    with phase("read_axes"):
+        # Parents: rows of the placements, -1 for roots and for non-local parents (grid placements)
+        order = np.argsort(ids)
+        parent_ids = refs[:, 0]
+        pos = np.clip(np.searchsorted(ids, parent_ids, sorter=order), 0, max(n - 1, 0))
+        parents = np.where((parent_ids >= 0) & (ids[order][pos] == parent_ids), order[pos], -1) if n else parent_ids
+        skipped = {}
+        for eid in parent_ids[(parent_ids >= 0) & (parents < 0)].tolist():
+            name = file.by_id(eid).is_a()
+            skipped[name] = skipped.get(name, 0) + 1
+
+        rows = np.flatnonzero(refs[:, 1] >= 0)
+        types = np.array(axis_types) if axis_types else np.zeros(0, dtype=str)
+        is_3d, is_2d = types == "IfcAxis2Placement3D", types == "IfcAxis2Placement2D"
+        # IFC4X3 linear placements (IfcAxis2PlacementLinear on a curve) are not evaluated
+        for name in types[~(is_3d | is_2d)].tolist():
+            skipped[name] = skipped.get(name, 0) + 1
+        usable = (is_3d | is_2d) & (axis_refs[:, 0] >= 0)
+        refs_3d = np.where(is_3d[:, None], axis_refs, -1)
+        # Axis2Placement2D(Location, RefDirection): the 2D RefDirection is the second argument
+        ref_dirs = np.where(is_2d, axis_refs[:, 1], refs_3d[:, 2])
+
+        locations = np.zeros((n, 3))
+        axes = np.tile([0.0, 0.0, 1.0], (n, 1))
+        refs_x = np.tile([1.0, 0.0, 0.0], (n, 1))
+        target = rows[usable]
+        locations[target] = _read_ratios(file, axis_refs[usable, 0], 3, [0.0, 0.0, 0.0])
+        axes[target] = _read_ratios(file, refs_3d[usable, 1], 3, [0.0, 0.0, 1.0])
+        refs_x[target] = _read_ratios(file, ref_dirs[usable], 3, [1.0, 0.0, 0.0])
+
+    for name, count in sorted(skipped.items()):
+        warnings.append(f"{count} placement(s) relative to / located by {name} were treated as local origin.")
+
+    with phase("compose"):
+        local = _local_frames(locations, axes, refs_x)
+        world = np.empty_like(local)
+        known = parents < 0
+        world[known] = local[known]
+        while not known.all():
+            ready = ~known & known[np.maximum(parents, 0)]
+            if not ready.any():
+                break
+            world[ready] = np.matmul(world[parents[ready]], local[ready])
+            known |= ready
+        unresolved = int((~known).sum())
+        if unresolved:
+            # Only possible with cyclic PlacementRelTo chains (invalid IFC)
+            world[~known] = local[~known]
+            warnings.append(f"{unresolved} placement(s) are in a PlacementRelTo cycle; their local placement was used.")
+
+    return {"index": index, "matrices": world, "unresolved": unresolved}
+
+
+def cached_placements(file, warnings: list = None) -> tuple:
+    """resolve_placements memoized per file and model_revision(); returns (placements, from_cache)."""
+    revision = model_revision(file)
+    with _PLACEMENT_CACHE_LOCK:
+        entry = _PLACEMENT_CACHE.get(id(file))
+        if entry is not None and entry[0] is file and entry[1] == revision:
+            _PLACEMENT_CACHE.move_to_end(id(file))
+            if warnings is not None:
+                warnings.extend(entry[3])
+            return entry[2], True
+    own_warnings = []
+    resolved = resolve_placements(file, own_warnings)
+    if warnings is not None:
+        warnings.extend(own_warnings)
+    with _PLACEMENT_CACHE_LOCK:
+        _PLACEMENT_CACHE[id(file)] = (file, revision, resolved, own_warnings)
+        _PLACEMENT_CACHE.move_to_end(id(file))
+        while len(_PLACEMENT_CACHE) > INFO_CACHE_SIZE:
+            _PLACEMENT_CACHE.popitem(last=False)
+    return resolved, False
+
+
+def convex_hull_2d(points):
+    """Convex hull (counter-clockwise, no repeated first point) of (N, 2) points, monotone chain."""
+    import numpy as np
+    pts = np.asarray(points, dtype=np.float64)[:, :2]
+    if len(pts) > 64:
+        # Akl-Toussaint: points strictly inside the quadrilateral of the extreme points cannot be on the hull
+        quad = pts[[pts[:, 0].argmin(), (pts[:, 0] + pts[:, 1]).argmin(), pts[:, 1].argmin(),
+                    (pts[:, 0] - pts[:, 1]).argmax(), pts[:, 0].argmax(), (pts[:, 0] + pts[:, 1]).argmax(),
+                    pts[:, 1].argmax(), (pts[:, 0] - pts[:, 1]).argmin()]]
+        inside = np.ones(len(pts), dtype=bool)
+        for (ax, ay), (bx, by) in zip(quad, np.roll(quad, -1, axis=0)):
+            if ax == bx and ay == by:
+                continue
+            inside &= (bx - ax) * (pts[:, 1] - ay) - (by - ay) * (pts[:, 0] - ax) > 0
+        pts = pts[~inside]
+    pts = np.unique(pts, axis=0)
+    if len(pts) < 3:
+        return pts
+
+    def half(sequence):
+        chain = []
+        for p in sequence:
+            while len(chain) >= 2:
+                (ox, oy), (ax, ay) = chain[-2], chain[-1]
+                if (ax - ox) * (p[1] - oy) - (ay - oy) * (p[0] - ox) > 0:
+                    break
+                chain.pop()
+            chain.append((p[0], p[1]))
+        return chain
+
+    listed = pts.tolist()
+    lower, upper = half(listed), half(reversed(listed))
+    return np.array(lower[:-1] + upper[:-1])
+
+
+def _polygon_area(hull) -> float:
+    if len(hull) < 3:
+        return 0.0
+    import numpy as np
+    x, y = hull[:, 0], hull[:, 1]
+    return float(abs(np.dot(x, np.roll(y, -1)) - np.dot(y, np.roll(x, -1))) / 2.0)
+
+
+def _extent_summary(points, include_hull: bool, digits: int) -> dict:
+    import numpy as np
+    summary = {
+        "min": np.round(points.min(axis=0), digits).tolist(),
+        "max": np.round(points.max(axis=0), digits).tolist(),
+        "centroid": np.round(points.mean(axis=0), digits).tolist(),
+    }
+    if include_hull:
+        hull = convex_hull_2d(points)
+        summary["hull"] = np.round(hull, digits).tolist()
+        summary["hull_area"] = round(_polygon_area(hull), 3)
+    return summary
+
+
+def model_extent(file, ifc_class: str = "IfcProduct", map_conversion: dict = None, map_crs: str = None,
+                 include_hull: bool = True) -> dict:
+    """
+    Extent of the placement origins of every `ifc_class` instance, in local,
+    map (through the IfcMapConversion) and WGS84 (through the TargetCRS)
+    coordinates: bounding box, centroid and convex hull of the footprint.
+    Only placements are evaluated, not the geometry of the representations.
+    """
+    import numpy as np
+    start = time.perf_counter()
+    warnings = []
+    resolved, from_cache = cached_placements(file, warnings)
+    index, matrices = resolved["index"], resolved["matrices"]
+
+    with phase("by_type"):
+        try:
+            products = file.by_type(ifc_class)
+        except RuntimeError:
+            return {"success": False, "error": f"Unknown IFC class for this schema: {ifc_class}"}
+    with phase("collect"):
+        # ObjectPlacement is attribute 5 of IfcProduct in every schema; by position it is ~2x faster
+        placed = (product[5] for product in products)
+        rows = [row for row in (index.get(p.id()) for p in placed if p is not None) if row is not None]
+    if not rows:
+        return {"success": False, "error": f"No placed {ifc_class} instances in the model"}
+
+    local = matrices[np.asarray(rows, dtype=np.int64), :3, 3]
+    result = {
+        "success": True,
+        "ifc_class": ifc_class,
+        "count": len(rows),
+        "placements": len(index),
+        "local": _extent_summary(local, include_hull, 4),
+    }
+
+    if map_conversion is None or map_crs is None:
+        info = cached_georeferencing_info(file)
+        if map_conversion is None and info.get("map_conversion", {}).get("eastings") is not None:
+            map_conversion = info["map_conversion"]
+        map_crs = map_crs or (info.get("crs") or {}).get("name")
+
+    if map_conversion is None:
+        warnings.append("The model has no IfcMapConversion: only local coordinates are returned.")
+    else:
+        with phase("helmert"):
+            mapped = local_to_map(local, map_conversion)
+        result["map"] = dict(_extent_summary(mapped, include_hull, 3), crs=map_crs)
+        if map_crs:
+            try:
+                with phase("pyproj_transform"):
+                    transformer, _ = get_transformer(map_crs, "EPSG:4326", always_xy=True)
+                    # The footprint corners are enough: project the map hull, bbox corners and centroid
+                    summary = result["map"]
+                    corners = [summary["min"][:2], [summary["max"][0], summary["min"][1]], summary["max"][:2],
+                               [summary["min"][0], summary["max"][1]], summary["centroid"][:2]]
+                    ring = np.array((summary.get("hull") or []) + corners, dtype=np.float64)
+                    lon, lat = transformer.transform(ring[:, 0], ring[:, 1])
+                wgs = {
+                    "min": [round(float(np.min(lon)), 8), round(float(np.min(lat)), 8)],
+                    "max": [round(float(np.max(lon)), 8), round(float(np.max(lat)), 8)],
+                    "centroid": [round(float(lon[-1]), 8), round(float(lat[-1]), 8)],
+                }
+                if include_hull:
+                    n_hull = len(summary.get("hull") or [])
+                    wgs["hull"] = [[round(float(a), 8), round(float(b), 8)] for a, b in zip(lon[:n_hull], lat[:n_hull])]
+                result["wgs84"] = wgs
+            except Exception as e:
+                warnings.append(f"Could not transform to WGS84 with {map_crs}: {e}")
+        else:
+            warnings.append("No TargetCRS name: WGS84 coordinates are not returned.")
+
+    result["warnings"] = warnings
+    result["debug"] = {
+        "placements_from_cache": from_cache,
+        "unresolved_placements": resolved["unresolved"],
+        "elapsed_ms": round((time.perf_counter() - start) * 1000.0, 3),
+    }
+    return result
+
+
+def extent_command(get_file, ifc_class: str = "IfcProduct", map_conversion: dict = None, map_crs: str = None,
+                   include_hull: bool = True, path: str = None, fields: list = None,
+                   timings: bool = False, profile: str = None) -> dict:
+    """Body of `get_ifc_model_extent`; `path` loads the file hot like georeference_command."""
+    def run():
+        file = HOT_FILES.get(path) if path else get_file()
+        if file is None:
+            return {"success": False, "error": "No IFC file is currently loaded"}
+        return project_fields(model_extent(file, ifc_class, map_conversion, map_crs, include_hull), fields)
+
+    return run_instrumented("get_ifc_model_extent", run, timings=timings, profile=profile)
+
+
+HEADLESS_COMMANDS["get_ifc_model_extent"] = extent_command
+
+
+#---------------------------------------------------------------------------------------------------
+# GeoJSON / NDJSON export
+#---------------------------------------------------------------------------------------------------
+
+EXPORT_FORMATS = ("geojson", "ndjson")
+EXPORT_GEOMETRIES = ("point", "footprint")
+EXPORT_BATCH_SIZE = 5000
+
+
+def element_storeys(file) -> dict:
+    """
+    {element id: storey entity} from the spatial containment relationships,
+    including elements aggregated into contained ones and elements of
+    spaces/zones inside a storey. Elements outside any storey are absent.
+    """
+    memo = {}
+
+    def storey_of(structure):
+        key = structure.id()
+        if key not in memo:
+            current, seen = structure, set()
+            while current is not None and current.id() not in seen and not current.is_a("IfcBuildingStorey"):
+                seen.add(current.id())
+                decomposes = getattr(current, "Decomposes", None) or ()
+                current = decomposes[0].RelatingObject if decomposes else None
+            memo[key] = current
+        return memo[key]
+
+    storeys = {}
+    for rel in file.by_type("IfcRelContainedInSpatialStructure"):
+        storey = storey_of(rel.RelatingStructure) if rel.RelatingStructure is not None else None
+        if storey is not None:
+            for element in rel.RelatedElements or ():
+                storeys.setdefault(element.id(), storey)
+    # Parts (stair flights, curtain wall panels...) inherit the storey of their whole
+    aggregates = file.by_type("IfcRelAggregates")
+    for _ in range(4):
+        changed = False
+        for rel in aggregates:
+            storey = storeys.get(rel.RelatingObject.id())
+            if storey is None:
+                continue
+            for part in rel.RelatedObjects or ():
+                if part.id() not in storeys:
+                    storeys[part.id()] = storey
+                    changed = True
+        if not changed:
+            break
+    return storeys
+
+
+def _crs_member(map_crs: str):
+    """Legacy GeoJSON 2008 "crs" member for a projected CRS (RFC 7946 itself only allows WGS84)."""
+    match = re.match(r"^\s*EPSG\s*:\s*(\d+)\s*$", str(map_crs or ""), re.IGNORECASE)
+    name = f"urn:ogc:def:crs:EPSG::{match.group(1)}" if match else map_crs
+    return {"type": "name", "properties": {"name": name}} if name else None
+
+
+def _export_products(file, ifc_class: str, storeys: list, warnings: list):
+    """(products, storey_of) for the export filters; storey_of maps element id → storey entity."""
+    products = file.by_type(ifc_class)
+    storey_of = element_storeys(file)
+    if storeys:
+        wanted = {str(s) for s in storeys}
+        matched, found = set(), set()
+        for storey in file.by_type("IfcBuildingStorey"):
+            hits = wanted & {storey.GlobalId, storey.Name}
+            if hits:
+                matched.add(storey.id())
+                found |= hits
+        missing = sorted(wanted - found)
+        if missing:
+            warnings.append(f"Storeys not found (by GlobalId or Name): {', '.join(missing)}")
+        products = [p for p in products if storey_of.get(p.id()) is not None and storey_of[p.id()].id() in matched]
+    return products, storey_of
+
+
+def _feature_properties(product, storey) -> dict:
+    # IfcRoot.GlobalId / .Name by position: attribute access by name costs ~3x more per element
+    return {
+        "GlobalId": product[0],
+        "ifc_class": product.is_a(),
+        "Name": product[2],
+        "storey": storey.Name if storey is not None else None,
+        "ifc_id": product.id(),
+    }
+
+
+def iter_placement_features(file, products, storey_of):
+    """Yields (properties, (1, 3) local point) for the placement origin of each placed product."""
+    resolved, _ = cached_placements(file)
+    index, matrices = resolved["index"], resolved["matrices"]
+    for product in products:
+        placement = product[5]  # IfcProduct.ObjectPlacement
+        row = index.get(placement.id()) if placement is not None else None
+        if row is None:
+            continue
+        yield _feature_properties(product, storey_of.get(product.id())), matrices[row, :3, 3][None, :]
+
+
+def iter_footprint_features(file, products, storey_of, threads: int = None):
+    """
+    Yields (properties, (K, 2|3) local polygon ring) with the 2D convex hull of
+    each product's triangulated geometry (ifcopenshell.geom, world coordinates
+    in project units). Products without geometry are not yielded.
+    """
+    import numpy as np
+    import ifcopenshell.geom
+    if not products:
+        return
+    settings = ifcopenshell.geom.settings()
+    settings.set("use-world-coords", True)
+    settings.set("convert-back-units", True)
+    by_id = {p.id(): p for p in products}
+    iterator = ifcopenshell.geom.iterator(settings, file, max(1, threads or (os.cpu_count() or 1)), include=products)
+    if not iterator.initialize():
+        return
+    while True:
+        shape = iterator.get()
+        product = by_id.get(shape.id)
+        verts = np.asarray(shape.geometry.verts, dtype=np.float64).reshape(-1, 3)
+        if product is not None and len(verts):
+            hull = convex_hull_2d(verts)
+            ring = np.column_stack([hull, np.full(len(hull), verts[:, 2].min())]) if len(hull) else hull
+            yield _feature_properties(product, storey_of.get(product.id())), ring
+        if not iterator.next():
+            break
+
+
+def _geometry_json(points: list) -> dict:
+    if len(points) == 1:
+        return {"type": "Point", "coordinates": points[0]}
+    if len(points) == 2:
+        return {"type": "LineString", "coordinates": points}
+    return {"type": "Polygon", "coordinates": [[p[:2] for p in points] + [points[0][:2]]]}
+
+
+def export_features(file, output_path: str, format: str = "geojson", geometry: str = "point",
+                    ifc_class: str = "IfcElement", storeys: list = None, target: str = "map",
+                    map_conversion: dict = None, map_crs: str = None, batch_size: int = EXPORT_BATCH_SIZE,
+                    threads: int = None) -> dict:
+    """
+    Streams one GeoJSON feature per `ifc_class` element to `output_path`, as
+    a FeatureCollection (format="geojson") or one feature per line
+    (format="ndjson"). Geometries are the placement origins (geometry="point")
+    or the 2D convex hull of the element geometry ("footprint"), transformed
+    in batches of `batch_size` features through the IfcMapConversion to map
+    coordinates (target="map", in map_crs) or on to WGS84 (target="wgs84").
+    Features are written as soon as their batch is transformed, so memory
+    does not grow with the number of elements. The file is written under a
+    temporary name and renamed when complete.
+    """
+    import json
+    import numpy as np
+    start = time.perf_counter()
+    if format not in EXPORT_FORMATS:
+        return {"success": False, "error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}
+    if geometry not in EXPORT_GEOMETRIES:
+        return {"success": False, "error": f"geometry must be one of {', '.join(EXPORT_GEOMETRIES)}"}
+    if target not in ("map", "wgs84"):
+        return {"success": False, "error": "target must be 'map' or 'wgs84'"}
+    if not output_path:
+        return {"success": False, "error": "output_path is required"}
+
+    if map_conversion is None or map_crs is None:
+        info = cached_georeferencing_info(file)
+        if map_conversion is None and info.get("map_conversion", {}).get("eastings") is not None:
+            map_conversion = info["map_conversion"]
+        map_crs = map_crs or (info.get("crs") or {}).get("name")
+    if map_conversion is None:
+        return {"success": False, "error": "The model has no IfcMapConversion; georeference it first"}
+    if target == "wgs84" and not map_crs:
+        return {"success": False, "error": "map_crs (e.g. 'EPSG:25830') is required for WGS84 output"}
+
+    warnings = []
+    with phase("select"):
+        try:
+            products, storey_of = _export_products(file, ifc_class, storeys, warnings)
+        except RuntimeError:
+            return {"success": False, "error": f"Unknown IFC class for this schema: {ifc_class}"}
+    features = (iter_footprint_features(file, products, storey_of, threads) if geometry == "footprint"
+                else iter_placement_features(file, products, storey_of))
+
+    transformer = get_transformer(map_crs, "EPSG:4326", always_xy=True)[0] if target == "wgs84" else None
+    digits = 8 if target == "wgs84" else 3
+    batch_size = max(1, int(batch_size or EXPORT_BATCH_SIZE))
+    dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+    folder = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(folder, exist_ok=True)
+    temp_path = os.path.join(folder, f".{os.path.basename(output_path)}.{uuid.uuid4().hex[:8]}.tmp")
+    written = 0
+    try:
+        with open(temp_path, "w", encoding="utf-8", newline="\n") as out:
+            if format == "geojson":
+                header = {"type": "FeatureCollection", "name": os.path.splitext(os.path.basename(output_path))[0]}
+                if target == "map" and _crs_member(map_crs):
+                    header["crs"] = _crs_member(map_crs)
+                out.write(dumps(header)[:-1] + ',"features":[\n')
+
+            def flush(batch):
+                nonlocal written
+                with phase("transform"):
+                    sizes = [len(coords) for _, coords in batch]
+                    points = local_to_map(np.concatenate([coords for _, coords in batch]), map_conversion)
+                    if transformer is not None:
+                        lon, lat = transformer.transform(points[:, 0], points[:, 1])
+                        points = np.column_stack([lon, lat, points[:, 2]])
+                    points = np.round(points, digits).tolist()
+                with phase("encode"):
+                    lines = []
+                    offset = 0
+                    for (properties, _), size in zip(batch, sizes):
+                        lines.append(dumps({"type": "Feature", "id": properties["GlobalId"],
+                                            "geometry": _geometry_json(points[offset:offset + size]),
+                                            "properties": properties}))
+                        offset += size
+                    separator = ",\n" if format == "geojson" else "\n"
+                    out.write((separator if format == "geojson" and written else "") + separator.join(lines)
+                              + ("\n" if format == "ndjson" else ""))
+                    written += len(lines)
+
+            batch = []
+            with phase("iterate"):
+                for feature in features:
+                    batch.append(feature)
+                    if len(batch) >= batch_size:
+                        flush(batch)
+                        batch = []
+            if batch:
+                flush(batch)
+            if format == "geojson":
+                out.write("\n]}\n")
+        with phase("write"):
+            os.replace(temp_path, output_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+    if geometry == "footprint" and written < len(products):
+        warnings.append(f"{len(products) - written} element(s) without geometry were not exported.")
+    return {
+        "success": True,
+        "output_path": os.path.abspath(output_path),
+        "format": format,
+        "geometry": geometry,
+        "target": target,
+        "crs": map_crs if target == "map" else "EPSG:4326",
+        "features": written,
+        "selected": len(products),
+        "bytes": os.path.getsize(output_path),
+        "warnings": warnings,
+        "debug": {"elapsed_ms": round((time.perf_counter() - start) * 1000.0, 3)},
+    }
+
+
+def export_command(get_file, output_path: str, format: str = "geojson", geometry: str = "point",
+                   ifc_class: str = "IfcElement", storeys: list = None, target: str = "map",
+                   map_conversion: dict = None, map_crs: str = None, batch_size: int = EXPORT_BATCH_SIZE,
+                   threads: int = None, path: str = None, timings: bool = False, profile: str = None) -> dict:
+    """Body of `export_ifc_geojson`; `path` loads the file hot like georeference_command."""
+    def run():
+        file = HOT_FILES.get(path) if path else get_file()
+        if file is None:
+            return {"success": False, "error": "No IFC file is currently loaded"}
+        return export_features(file, output_path, format=format, geometry=geometry, ifc_class=ifc_class,
+                               storeys=storeys, target=target, map_conversion=map_conversion,
+                               map_crs=map_crs, batch_size=batch_size, threads=threads)
+
+    return run_instrumented("export_ifc_geojson", run, timings=timings, profile=profile)
+
+
+HEADLESS_COMMANDS["export_ifc_geojson"] = export_command
+
+
+#---------------------------------------------------------------------------------------------------
+# Mesh export in map coordinates (glTF / GLB / PLY / OBJ)
+#---------------------------------------------------------------------------------------------------
+
+MESH_FORMATS = ("glb", "gltf", "ply", "obj")
+# Vertices gathered from the geometry iterator before one NumPy transform + write
+MESH_BATCH_VERTICES = 1 << 20
+_GLB_MAX_BYTES = (1 << 32) - 1
+
+
+def _temp_output(output_path: str, tag: str = "") -> str:
+    folder = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f".{os.path.basename(output_path)}{tag}.{uuid.uuid4().hex[:8]}.tmp")
+
+
+def _copy_file(source: str, out) -> int:
+    """Appends the file `source` to the open binary stream `out` in STREAM_COPY_CHUNK pieces."""
+    copied = 0
+    with open(source, "rb") as src:
+        while True:
+            chunk = src.read(STREAM_COPY_CHUNK)
+            if not chunk:
+                return copied
+            copied += out.write(chunk)
+
+
+class _MeshWriter:
+    """
+    Streams element meshes to one output file. `add` receives a batch of
+    (properties, (N, 3) float vertices relative to the origin, (M, 3) int32
+    triangles) and writes it at once; `close` completes the file under a
+    temporary name and renames it.
+    """
+
+    def __init__(self, output_path: str, origin, map_crs: str, precision: str):
+        self.output_path = output_path
+        self.origin = origin
+        self.map_crs = map_crs
+        self.dtype = "<f8" if precision == "float64" else "<f4"
+        self.elements = 0
+        self.vertices = 0
+        self.triangles = 0
+        self._temps = []
+
+    def _temp(self, tag: str = "") -> str:
+        path = _temp_output(self.output_path, tag)
+        self._temps.append(path)
+        return path
+
+    def discard(self):
+        for path in self._temps:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _comments(self) -> list:
+        lines = ["Bonsai MCP georef_core mesh export, map coordinates (eastings, northings, height)"]
+        if self.map_crs:
+            lines.append(f"crs {self.map_crs}")
+        if self.origin is not None:
+            lines.append("origin {:.6f} {:.6f} {:.6f} (add to every vertex)".format(*self.origin))
+        return lines
+
+
+class _PlyWriter(_MeshWriter):
+    """Binary little-endian PLY; faces carry the STEP id of their element (`ifc_id`)."""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._vertex_path, self._face_path = self._temp(".v"), self._temp(".f")
+        self._vertex_out, self._face_out = open(self._vertex_path, "wb"), open(self._face_path, "wb")
+
+    def add(self, batch):
+        import numpy as np
+        face_dtype = np.dtype([("n", "u1"), ("v", "<i4", 3), ("ifc_id", "<i4")])
+        for properties, verts, faces in batch:
+            self._vertex_out.write(np.ascontiguousarray(verts, dtype=self.dtype).tobytes())
+            records = np.empty(len(faces), dtype=face_dtype)
+            records["n"] = 3
+            records["v"] = faces + self.vertices
+            records["ifc_id"] = properties["ifc_id"]
+            self._face_out.write(records.tobytes())
+            self.elements += 1
+            self.vertices += len(verts)
+            self.triangles += len(faces)
+
+    def close(self) -> int:
+        self._vertex_out.close()
+        self._face_out.close()
+        scalar = "double" if self.dtype == "<f8" else "float"
+        header = ["ply", "format binary_little_endian 1.0"]
+        header += [f"comment {line}" for line in self._comments()]
+        header += [f"element vertex {self.vertices}", f"property {scalar} x", f"property {scalar} y",
+                   f"property {scalar} z", f"element face {self.triangles}",
+                   "property list uchar int vertex_indices", "property int ifc_id", "end_header"]
+        temp_path = self._temp()
+        with open(temp_path, "wb") as out:
+            out.write(("\n".join(header) + "\n").encode("ascii"))
+            _copy_file(self._vertex_path, out)
+            _copy_file(self._face_path, out)
+        os.replace(temp_path, self.output_path)
+        self.discard()
+        return os.path.getsize(self.output_path)
+
+
+class _ObjWriter(_MeshWriter):
+    """Wavefront OBJ, one `o <GlobalId>` object per element."""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._temp_path = self._temp()
+        self._out = open(self._temp_path, "w", encoding="utf-8", newline="\n")
+        self._out.write("".join(f"# {line}\n" for line in self._comments()))
+        self._digits = 8 if self.dtype == "<f8" else 4
+
+    def add(self, batch):
+        vertex = "v %.{0}f %.{0}f %.{0}f\n".format(self._digits)
+        for properties, verts, faces in batch:
+            name = str(properties["Name"] or "").replace("\n", " ")
+            self._out.write(f"o {properties['GlobalId']}\n# {properties['ifc_class']} {name}\n")
+            self._out.write((vertex * len(verts)) % tuple(verts.ravel().tolist()))
+            self._out.write(("f %d %d %d\n" * len(faces)) % tuple((faces + self.vertices + 1).ravel().tolist()))
+            self.elements += 1
+            self.vertices += len(verts)
+            self.triangles += len(faces)
+
+    def close(self) -> int:
+        self._out.close()
+        os.replace(self._temp_path, self.output_path)
+        return os.path.getsize(self.output_path)
+
+
+class _GltfWriter(_MeshWriter):
+    """
+    glTF 2.0, one node + mesh per element (extras: GlobalId, class, Name,
+    storey) under a root node translated to the origin. glTF is Y-up, so map
+    (E, N, H) is stored as (E, H, -N). Vertex and index data stream to the
+    binary buffer as they come; the JSON (element metadata only) is written
+    at the end: embedded in a .glb, or next to a .bin sidecar for .gltf.
+    """
+
+    def __init__(self, output_path: str, origin, map_crs: str, precision: str, binary: bool = True):
+        super().__init__(output_path, origin, map_crs, "float32")
+        self.binary = binary
+        if binary:
+            self._bin_path = self._temp(".bin")
+            self._bin_final = None
+        else:
+            self._bin_final = os.path.splitext(output_path)[0] + ".bin"
+            self._bin_path = _temp_output(self._bin_final)
+            self._temps.append(self._bin_path)
+        self._bin = open(self._bin_path, "wb")
+        self._offset = 0
+        self.json = {"accessors": [], "bufferViews": [], "meshes": [], "nodes": []}
+
+    def add(self, batch):
+        import numpy as np
+        js = self.json
+        positions = [np.ascontiguousarray(verts[:, [0, 2, 1]] * (1.0, 1.0, -1.0), dtype="<f4")
+                     for _, verts, _ in batch]
+        indices = [np.ascontiguousarray(faces, dtype="<u4") for _, _, faces in batch]
+        views = []
+        for arrays, target in ((positions, 34962), (indices, 34963)):
+            length = sum(a.nbytes for a in arrays)
+            views.append(len(js["bufferViews"]))
+            js["bufferViews"].append({"buffer": 0, "byteOffset": self._offset, "byteLength": length, "target": target})
+            for a in arrays:
+                self._bin.write(a.tobytes())
+            self._offset += length
+        position_offset = index_offset = 0
+        for (properties, _, _), pos, idx in zip(batch, positions, indices):
+            accessor = len(js["accessors"])
+            js["accessors"].append({"bufferView": views[0], "byteOffset": position_offset, "componentType": 5126,
+                                    "count": len(pos), "type": "VEC3",
+                                    "min": pos.min(axis=0).tolist(), "max": pos.max(axis=0).tolist()})
+            js["accessors"].append({"bufferView": views[1], "byteOffset": index_offset, "componentType": 5125,
+                                    "count": idx.size, "type": "SCALAR"})
+            js["meshes"].append({"name": properties["GlobalId"], "primitives": [
+                {"attributes": {"POSITION": accessor}, "indices": accessor + 1, "material": 0}]})
+            js["nodes"].append({"name": properties["GlobalId"], "mesh": len(js["meshes"]) - 1, "extras": properties})
+            position_offset += pos.nbytes
+            index_offset += idx.nbytes
+            self.elements += 1
+            self.vertices += len(pos)
+            self.triangles += len(idx)
+
+    def close(self) -> int:
+        import json
+        self._bin.close()
+        js = self.json
+        root = {"name": os.path.splitext(os.path.basename(self.output_path))[0],
+                "extras": {"crs": self.map_crs, "origin": list(self.origin) if self.origin is not None else None,
+                           "axes": "x=eastings, y=height, z=-northings"}}
+        if js["nodes"]:
+            root["children"] = list(range(len(js["nodes"])))
+        if self.origin is not None:
+            root["translation"] = [self.origin[0], self.origin[2], -self.origin[1]]
+        js["nodes"].append(root)
+        js.update({
+            "asset": {"version": "2.0", "generator": "Bonsai MCP georef_core"},
+            "scene": 0,
+            "scenes": [{"nodes": [len(js["nodes"]) - 1]}],
+            "materials": [{"pbrMetallicRoughness": {"baseColorFactor": [0.8, 0.8, 0.8, 1.0],
+                                                    "metallicFactor": 0.0, "roughnessFactor": 1.0},
+                           "doubleSided": True}],
+            "buffers": [{"byteLength": self._offset}],
+        })
+        if not js["accessors"]:
+            for key in ("accessors", "bufferViews", "meshes", "buffers"):
+                js.pop(key)
+        temp_path = self._temp()
+        if self.binary:
+            text = json.dumps(js, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            text += b" " * (-len(text) % 4)
+            total = 12 + 8 + len(text) + (8 + self._offset if self._offset else 0)
+            if total > _GLB_MAX_BYTES:
+                self.discard()
+                raise ValueError("The GLB would exceed 4 GB; use part_vertices to split it")
+            with open(temp_path, "wb") as out:
+                out.write(b"glTF" + (2).to_bytes(4, "little") + total.to_bytes(4, "little"))
+                out.write(len(text).to_bytes(4, "little") + b"JSON" + text)
+                if self._offset:
+                    out.write(self._offset.to_bytes(4, "little") + b"BIN\x00")
+                    _copy_file(self._bin_path, out)
+        else:
+            if "buffers" in js:
+                js["buffers"][0]["uri"] = os.path.basename(self._bin_final)
+            with open(temp_path, "w", encoding="utf-8") as out:
+                json.dump(js, out, ensure_ascii=False, separators=(",", ":"))
+            if self._offset:
+                os.replace(self._bin_path, self._bin_final)
+        os.replace(temp_path, self.output_path)
+        self.discard()
+        return os.path.getsize(self.output_path) + (os.path.getsize(self._bin_final) if self._bin_final and self._offset else 0)
+
+
+_MESH_WRITERS = {
+    "glb": lambda path, origin, crs, precision: _GltfWriter(path, origin, crs, precision, binary=True),
+    "gltf": lambda path, origin, crs, precision: _GltfWriter(path, origin, crs, precision, binary=False),
+    "ply": _PlyWriter,
+    "obj": _ObjWriter,
+}
+
+
+def iter_element_meshes(file, products, threads: int = None):
+    """
+    Yields (product, (N, 3) float64 vertices, (M, 3) int32 triangles) for each
+    product with a triangulated body, from ifcopenshell's geometry iterator
+    running on `threads` threads (world coordinates in project units).
+    """
+    import numpy as np
+    import ifcopenshell.geom
+    if not products:
+        return
+    settings = ifcopenshell.geom.settings()
+    settings.set("use-world-coords", True)
+    settings.set("convert-back-units", True)
+    by_id = {p.id(): p for p in products}
+    iterator = ifcopenshell.geom.iterator(settings, file, max(1, threads or (os.cpu_count() or 1)), include=products)
+    if not iterator.initialize():
+        return
+    while True:
+        shape = iterator.get()
+        product = by_id.get(shape.id)
+        geometry = shape.geometry
+        try:
+            verts = np.frombuffer(geometry.verts_buffer, dtype=np.float64).reshape(-1, 3)
+            faces = np.frombuffer(geometry.faces_buffer, dtype=np.int32).reshape(-1, 3)
+        except AttributeError:
+            verts = np.asarray(geometry.verts, dtype=np.float64).reshape(-1, 3)
+            faces = np.asarray(geometry.faces, dtype=np.int32).reshape(-1, 3)
+        if product is not None and len(verts) and len(faces):
+            yield product, verts, faces
+        if not iterator.next():
+            break
+
+
+def export_mesh(file, output_path: str, format: str = "glb", ifc_class: str = "IfcElement", storeys: list = None,
+                map_conversion: dict = None, map_crs: str = None, origin="auto", precision: str = "float32",
+                part_vertices: int = None, batch_vertices: int = MESH_BATCH_VERTICES, threads: int = None) -> dict:
+    """
+    Writes the triangulated geometry of every `ifc_class` element in map
+    coordinates (eastings, northings, height of the IfcMapConversion).
+    Geometry comes from the multithreaded ifcopenshell iterator; up to
+    `batch_vertices` vertices are transformed in one NumPy operation and
+    written before the next ones are read, so memory stays bounded.
+
+    `origin` is subtracted from every vertex (and recorded in the file):
+    "auto" uses the MapConversion origin, [E, N, H] a given point, "none"
+    writes absolute coordinates. With float32 output (always for glTF) the
+    offset keeps millimetre precision that absolute projected coordinates
+    lose. `part_vertices` splits the output into numbered files.
+    """
+    import numpy as np
+    start = time.perf_counter()
+    if format not in MESH_FORMATS:
+        return {"success": False, "error": f"format must be one of {', '.join(MESH_FORMATS)}"}
+    if precision not in ("float32", "float64"):
+        return {"success": False, "error": "precision must be 'float32' or 'float64'"}
+    if not output_path:
+        return {"success": False, "error": "output_path is required"}
+
+    if map_conversion is None or map_crs is None:
+        info = cached_georeferencing_info(file)
+        if map_conversion is None and info.get("map_conversion", {}).get("eastings") is not None:
+            map_conversion = info["map_conversion"]
+        map_crs = map_crs or (info.get("crs") or {}).get("name")
+    if map_conversion is None:
+        return {"success": False, "error": "The model has no IfcMapConversion; georeference it first"}
+
+    h = helmert_parameters(map_conversion)
+    if isinstance(origin, str) and origin.lower() == "auto":
+        offset = (h["eastings"], h["northings"], h["orthogonal_height"])
+    elif origin is None or (isinstance(origin, str) and origin.lower() == "none"):
+        offset = None
+    else:
+        offset = tuple(float(v) for v in list(origin)[:3]) + (0.0,) * (3 - min(len(origin), 3))
+    warnings = []
+    if offset is None and (format in ("glb", "gltf") or precision == "float32"):
+        warnings.append("Absolute map coordinates in float32 lose precision (about 0.03-0.5 m at typical "
+                        "eastings/northings); keep origin='auto' for float32 output.")
+    # Transforming straight to origin-relative coordinates keeps the large terms out of the vertices
+    relative = dict(map_conversion)
+    if offset is not None:
+        relative.update(eastings=h["eastings"] - offset[0], northings=h["northings"] - offset[1],
+                        orthogonal_height=h["orthogonal_height"] - offset[2])
+
+    with phase("select"):
+        try:
+            products, storey_of = _export_products(file, ifc_class, storeys, warnings)
+        except RuntimeError:
+            return {"success": False, "error": f"Unknown IFC class for this schema: {ifc_class}"}
+
+    batch_vertices = max(1, int(batch_vertices or MESH_BATCH_VERTICES))
+    part_vertices = max(batch_vertices, int(part_vertices)) if part_vertices else None
+    stem, ext = os.path.splitext(output_path)
+    ext = ext or f".{format}"
+    parts, writer, totals = [], None, {"elements": 0, "vertices": 0, "triangles": 0, "bytes": 0}
+
+    def finish(w):
+        with phase("write"):
+            totals["bytes"] += w.close()
+        for key in ("elements", "vertices", "triangles"):
+            totals[key] += getattr(w, key)
+
+    def flush(batch, count):
+        nonlocal writer
+        if writer is not None and part_vertices and writer.vertices + count > part_vertices:
+            finish(writer)
+            writer = None
+        if writer is None:
+            part_path = f"{stem}_{len(parts) + 1:03d}{ext}" if part_vertices else stem + ext
+            writer = _MESH_WRITERS[format](part_path, offset, map_crs, precision)
+            parts.append(os.path.abspath(part_path))
+        with phase("transform"):
+            sizes = np.cumsum([len(verts) for _, verts, _ in batch])[:-1]
+            points = local_to_map(np.concatenate([verts for _, verts, _ in batch]), relative)
+            batch = [(props, verts, faces) for (props, _, faces), verts in zip(batch, np.split(points, sizes))]
+        with phase("encode"):
+            writer.add(batch)
+
+    batch, count = [], 0
+    try:
+        with phase("iterate"):
+            for product, verts, faces in iter_element_meshes(file, products, threads):
+                batch.append((_feature_properties(product, storey_of.get(product.id())), verts, faces))
+                count += len(verts)
+                if count >= batch_vertices:
+                    flush(batch, count)
+                    batch, count = [], 0
+        if batch:
+            flush(batch, count)
+        if writer is None:
+            writer = _MESH_WRITERS[format](stem + ext, offset, map_crs, precision)
+            parts.append(os.path.abspath(stem + ext))
+        finish(writer)
+    except BaseException:
+        if writer is not None:
+            writer.discard()
+        raise
+
+    if totals["elements"] < len(products):
+        warnings.append(f"{len(products) - totals['elements']} element(s) without triangulated geometry were not exported.")
+    return {
+        "success": True,
+        "output_path": parts[0] if len(parts) == 1 else None,
+        "parts": parts,
+        "format": format,
+        "crs": map_crs,
+        "origin": list(offset) if offset is not None else None,
+        "up_axis": "Y" if format in ("glb", "gltf") else "Z",
+        "precision": "float32" if format in ("glb", "gltf") else precision,
+        "selected": len(products),
+        **totals,
+        "warnings": warnings,
+        "debug": {"elapsed_ms": round((time.perf_counter() - start) * 1000.0, 3),
+                  "threads": max(1, threads or (os.cpu_count() or 1))},
+    }
+
+
+def mesh_export_command(get_file, output_path: str, format: str = "glb", ifc_class: str = "IfcElement",
+                        storeys: list = None, map_conversion: dict = None, map_crs: str = None, origin="auto",
+                        precision: str = "float32", part_vertices: int = None,
+                        batch_vertices: int = MESH_BATCH_VERTICES, threads: int = None, path: str = None,
+                        timings: bool = False, profile: str = None) -> dict:
+    """Body of `export_ifc_mesh`; `path` loads the file hot like georeference_command."""
+    def run():
+        file = HOT_FILES.get(path) if path else get_file()
+        if file is None:
+            return {"success": False, "error": "No IFC file is currently loaded"}
+        return export_mesh(file, output_path, format=format, ifc_class=ifc_class, storeys=storeys,
+                           map_conversion=map_conversion, map_crs=map_crs, origin=origin, precision=precision,
+                           part_vertices=part_vertices, batch_vertices=batch_vertices, threads=threads)
+
+    return run_instrumented("export_ifc_mesh", run, timings=timings, profile=profile)
+
+
+HEADLESS_COMMANDS["export_ifc_mesh"] = mesh_export_command
+
+
+#---------------------------------------------------------------------------------------------------
+# Element spatial index (map coordinates)
+#---------------------------------------------------------------------------------------------------
+
+SPATIAL_GEOMETRIES = ("origin", "bbox")
+SPATIAL_POINTS_PER_CELL = 16
+SPATIAL_MAX_CELLS_PER_AXIS = 4096
+SPATIAL_QUERY_LIMIT = 10000
+
+_SPATIAL_CACHE = OrderedDict()
+_SPATIAL_CACHE_LOCK = threading.Lock()
+
+
+class ElementSpatialIndex:
+    """
+    Uniform grid over element boxes in map coordinates (a placement origin is a
+    zero-size box). Boxes are bucketed by the cell of their centre and sorted
+    by cell key, so a query is one searchsorted per grid column over the
+    query rectangle grown by the largest half-size, then an exact NumPy test.
+    """
+
+    def __init__(self, ids, global_ids, boxes, heights, map_crs: str = None, geometry: str = "origin"):
+        import math
+        import numpy as np
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.global_ids = list(global_ids)
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.heights = np.asarray(heights, dtype=np.float64)
+        self.map_crs = map_crs
+        self.geometry = geometry
+        n = len(self.ids)
+        centres = (self.boxes[:, :2] + self.boxes[:, 2:]) / 2.0 if n else np.zeros((0, 2))
+        self.pad = np.max(self.boxes[:, 2:] - self.boxes[:, :2], axis=0) / 2.0 if n else np.zeros(2)
+        self.origin = centres.min(axis=0) if n else np.zeros(2)
+        span = centres.max(axis=0) - self.origin if n else np.zeros(2)
+        cells = max(1.0, n / SPATIAL_POINTS_PER_CELL)
+        area = float(span[0] * span[1])
+        size = math.sqrt(area / cells) if area > 0 else float(max(span)) / cells
+        self.cell = max(size, float(max(span)) / SPATIAL_MAX_CELLS_PER_AXIS, 1e-9)
+        self.nx, self.ny = (int(s // self.cell) + 1 for s in span)
+        cx = ((centres[:, 0] - self.origin[0]) // self.cell).astype(np.int64)
+        cy = ((centres[:, 1] - self.origin[1]) // self.cell).astype(np.int64)
+        keys = cx * self.ny + cy
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+        self.occupied = int(np.count_nonzero(np.diff(self.keys))) + 1 if n else 0
+        self._class_masks = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def stats(self) -> dict:
+        return {"elements": len(self), "geometry": self.geometry, "grid": [self.nx, self.ny],
+                "cell_size": round(self.cell, 6), "occupied_cells": self.occupied}
+
+    def class_mask(self, file, ifc_class: str):
+        """Boolean row mask of the `ifc_class` instances (subtypes included), computed once per class."""
+        import numpy as np
+        mask = self._class_masks.get(ifc_class)
+        if mask is None:
+            mask = np.isin(self.ids, np.fromiter((e.id() for e in file.by_type(ifc_class)), dtype=np.int64))
+            self._class_masks[ifc_class] = mask
+        return mask
+
+    def candidates(self, min_x: float, min_y: float, max_x: float, max_y: float):
+        """Rows whose box intersects [min_x, max_x] x [min_y, max_y] (exact test included)."""
+        import numpy as np
+        if not len(self) or max_x < min_x or max_y < min_y:
+            return np.zeros(0, dtype=np.int64)
+        lo = (np.array([min_x, min_y]) - self.pad - self.origin) // self.cell
+        hi = (np.array([max_x, max_y]) + self.pad - self.origin) // self.cell
+        cx0, cy0 = (int(v) for v in np.maximum(lo, 0))
+        cx1, cy1 = int(min(hi[0], self.nx - 1)), int(min(hi[1], self.ny - 1))
+        if cx0 > cx1 or cy0 > cy1:
+            return np.zeros(0, dtype=np.int64)
+        columns = np.arange(cx0, cx1 + 1, dtype=np.int64) * self.ny
+        starts = np.searchsorted(self.keys, columns + cy0, side="left")
+        ends = np.searchsorted(self.keys, columns + cy1, side="right")
+        rows = np.concatenate([self.order[s:e] for s, e in zip(starts, ends) if e > s] or [np.zeros(0, np.int64)])
+        boxes = self.boxes[rows]
+        hit = (boxes[:, 2] >= min_x) & (boxes[:, 0] <= max_x) & (boxes[:, 3] >= min_y) & (boxes[:, 1] <= max_y)
+        return np.sort(rows[hit])
+
+    def within(self, x: float, y: float, radius: float):
+        """(rows, distances) of the boxes closer than `radius` to (x, y), nearest first."""
+        import numpy as np
+        rows = self.candidates(x - radius, y - radius, x + radius, y + radius)
+        boxes = self.boxes[rows]
+        dx = np.maximum(np.maximum(boxes[:, 0] - x, x - boxes[:, 2]), 0.0)
+        dy = np.maximum(np.maximum(boxes[:, 1] - y, y - boxes[:, 3]), 0.0)
+        distance = np.hypot(dx, dy)
+        keep = distance <= radius
+        rows, distance = rows[keep], distance[keep]
+        order = np.argsort(distance, kind="stable")
+        return rows[order], distance[order]
+
+
+def _element_local_boxes(file, products, threads: int = None) -> dict:
+    """{product id: (min xyz, max xyz)} of the triangulated geometry (ifcopenshell.geom, world coordinates)."""
+    import numpy as np
+    import ifcopenshell.geom
+    boxes = {}
+    products = [p for p in products if getattr(p, "Representation", None) is not None]
+    if not products:
+        return boxes
+    settings = ifcopenshell.geom.settings()
+    settings.set("use-world-coords", True)
+    settings.set("convert-back-units", True)
+    iterator = ifcopenshell.geom.iterator(settings, file, max(1, threads or (os.cpu_count() or 1)), include=products)
+    if not iterator.initialize():
+        return boxes
+    while True:
+        shape = iterator.get()
+        verts = np.asarray(shape.geometry.verts, dtype=np.float64).reshape(-1, 3)
+        if len(verts):
+            boxes[shape.id] = (verts.min(axis=0), verts.max(axis=0))
+        if not iterator.next():
+            break
+    return boxes
+
+
+def build_spatial_index(file, map_conversion: dict, map_crs: str = None, geometry: str = "origin",
+                        warnings: list = None, threads: int = None) -> ElementSpatialIndex:
+    """
+    ElementSpatialIndex of every placed IfcProduct (spatial structure included)
+    in map coordinates. geometry="bbox" indexes the map envelope of each
+    element's triangulated geometry (elements without one keep their origin),
+    tessellated with `threads` geometry iterator threads.
+    """
+    import numpy as np
+    resolved, _ = cached_placements(file, warnings)
+    index, matrices = resolved["index"], resolved["matrices"]
+    with phase("spatial_collect"):
+        products, rows, global_ids = [], [], []
+        for product in file.by_type("IfcProduct"):
+            placement = product[5]  # IfcProduct.ObjectPlacement
+            row = index.get(placement.id()) if placement is not None else None
+            if row is not None:
+                products.append(product)
+                rows.append(row)
+                global_ids.append(product[0])
+    with phase("helmert"):
+        origins = local_to_map(matrices[np.asarray(rows, dtype=np.int64), :3, 3], map_conversion) \
+            if rows else np.zeros((0, 3))
+    boxes = np.column_stack([origins[:, :2], origins[:, :2]])
+    if geometry == "bbox" and products:
+        with phase("spatial_geometry"):
+            local_boxes = _element_local_boxes(file, products, threads)
+        with_box = [i for i, p in enumerate(products) if p.id() in local_boxes]
+        if with_box:
+            lows = np.array([local_boxes[products[i].id()][0] for i in with_box])
+            highs = np.array([local_boxes[products[i].id()][1] for i in with_box])
+            # The 4 plan corners of each local box; their map envelope contains the rotated box
+            corners = np.stack([lows, np.column_stack([highs[:, 0], lows[:, 1], lows[:, 2]]), highs,
+                                np.column_stack([lows[:, 0], highs[:, 1], lows[:, 2]])], axis=1)
+            mapped = local_to_map(corners.reshape(-1, 3), map_conversion)[:, :2].reshape(-1, 4, 2)
+            boxes[with_box] = np.column_stack([mapped.min(axis=1), mapped.max(axis=1)])
+        if warnings is not None and len(with_box) < len(products):
+            warnings.append(f"{len(products) - len(with_box)} element(s) without geometry are indexed by their origin.")
+    with phase("spatial_build"):
+        return ElementSpatialIndex([p.id() for p in products], global_ids, boxes, origins[:, 2], map_crs, geometry)
+
+
+def cached_spatial_index(file, map_conversion: dict, map_crs: str = None, geometry: str = "origin",
+                         warnings: list = None, threads: int = None) -> tuple:
+    """
+    build_spatial_index memoized per file, geometry, MapConversion and
+    model_revision(); returns (index, from_cache). Any model change (or
+    invalidate_georeferencing_info) rebuilds it on the next query.
+    """
+    key = (id(file), geometry)
+    revision = (model_revision(file), repr(sorted((map_conversion or {}).items())), map_crs)
+    with _SPATIAL_CACHE_LOCK:
+        entry = _SPATIAL_CACHE.get(key)
+        if entry is not None and entry[0] is file and entry[1] == revision:
+            _SPATIAL_CACHE.move_to_end(key)
+            if warnings is not None:
+                warnings.extend(entry[3])
+            return entry[2], True
+    own_warnings = []
+    index = build_spatial_index(file, map_conversion, map_crs, geometry, own_warnings, threads)
+    if warnings is not None:
+        warnings.extend(own_warnings)
+    with _SPATIAL_CACHE_LOCK:
+        _SPATIAL_CACHE[key] = (file, revision, index, own_warnings)
+        _SPATIAL_CACHE.move_to_end(key)
+        while len(_SPATIAL_CACHE) > INFO_CACHE_SIZE:
+            _SPATIAL_CACHE.popitem(last=False)
+    return index, False
+
+
+def _to_map_xy(points, space: str, map_conversion: dict, map_crs: str):
+    """(N, 2) map coordinates of [x, y] points given in local, map or wgs84 (lon, lat) space."""
+    import numpy as np
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if space == "local":
+        return local_to_map(np.column_stack([pts, np.zeros(len(pts))]), map_conversion)[:, :2]
+    if space == "wgs84":
+        if not map_crs:
+            raise ValueError("The model has no TargetCRS name: give map_crs to query in WGS84")
+        transformer, _ = get_transformer("EPSG:4326", map_crs, always_xy=True)
+        return np.column_stack(transformer.transform(pts[:, 0], pts[:, 1]))
+    return pts
+
+
+def spatial_query(file, center: list = None, radius: float = None, bbox: list = None, space: str = "map",
+                  ifc_class: str = "IfcElement", geometry: str = "origin", map_conversion: dict = None,
+                  map_crs: str = None, limit: int = SPATIAL_QUERY_LIMIT, output: str = "elements",
+                  threads: int = None) -> dict:
+    """
+    Elements within `radius` (map units) of `center`, or intersecting `bbox`
+    ([min_x, min_y, max_x, max_y]), with both given in `space`: "map",
+    "wgs84" (lon/lat) or "local". A WGS84 or local bbox is replaced by its
+    envelope in map coordinates. `threads` is used when a geometry="bbox"
+    index has to be built.
+    """
+    start = time.perf_counter()
+    warnings = []
+    if space not in COORDINATE_SPACES:
+        return {"success": False, "error": f"space must be one of {', '.join(COORDINATE_SPACES)}"}
+    if geometry not in SPATIAL_GEOMETRIES:
+        return {"success": False, "error": f"geometry must be one of {', '.join(SPATIAL_GEOMETRIES)}"}
+    if output not in ("elements", "ids"):
+        return {"success": False, "error": "output must be 'elements' or 'ids'"}
+    if (center is None) == (bbox is None):
+        return {"success": False, "error": "Give either center + radius or bbox"}
+    if center is not None and (radius is None or float(radius) < 0 or len(center) < 2):
+        return {"success": False, "error": "center needs [x, y] and a radius >= 0 (map units)"}
+    if bbox is not None and len(bbox) != 4:
+        return {"success": False, "error": "bbox must be [min_x, min_y, max_x, max_y]"}
+
+    if map_conversion is None or map_crs is None:
+        info = cached_georeferencing_info(file)
+        if map_conversion is None and info.get("map_conversion", {}).get("eastings") is not None:
+            map_conversion = info["map_conversion"]
+        map_crs = map_crs or (info.get("crs") or {}).get("name")
+    if map_conversion is None:
+        return {"success": False, "error": "The model has no IfcMapConversion (give map_conversion explicitly)"}
+    try:
+        with phase("query_transform"):
+            if center is not None:
+                x, y = _to_map_xy([center[:2]], space, map_conversion, map_crs)[0]
+                query = {"center": [round(float(x), 4), round(float(y), 4)], "radius": float(radius)}
+            else:
+                min_x, min_y, max_x, max_y = (float(v) for v in bbox)
+                ring = [[min_x, min_y], [max_x, min_y], [max_x, max_y], [min_x, max_y],
+                        [(min_x + max_x) / 2, min_y], [max_x, (min_y + max_y) / 2],
+                        [(min_x + max_x) / 2, max_y], [min_x, (min_y + max_y) / 2]]
+                corners = _to_map_xy(ring if space != "map" else ring[:4], space, map_conversion, map_crs)
+                envelope = [float(v) for v in (*corners.min(axis=0), *corners.max(axis=0))]
+                query = {"bbox": [round(v, 4) for v in envelope]}
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+
+    index, from_cache = cached_spatial_index(file, map_conversion, map_crs, geometry, warnings, threads)
+    with phase("spatial_query"):
+        if center is not None:
+            rows, distances = index.within(x, y, float(radius))
+        else:
+            rows, distances = index.candidates(*envelope), None
+    with phase("filter"):
+        if ifc_class:
+            try:
+                keep = index.class_mask(file, ifc_class)[rows]
+            except RuntimeError:
+                return {"success": False, "error": f"Unknown IFC class for this schema: {ifc_class}"}
+            rows = rows[keep]
+            distances = distances[keep] if distances is not None else None
+    total = len(rows)
+    rows = rows[:max(0, int(limit))]
+
+    result = {
+        "success": True,
+        "query": dict(query, space=space, geometry=geometry, ifc_class=ifc_class),
+        "map_crs": map_crs,
+        "total": total,
+        "count": len(rows),
+        "truncated": total > len(rows),
+    }
+    with phase("encode"):
+        if output == "ids":
+            result["global_ids"] = [index.global_ids[row] for row in rows.tolist()]
+        else:
+            elements = []
+            for i, row in enumerate(rows.tolist()):
+                entity = file.by_id(int(index.ids[row]))
+                box = index.boxes[row]
+                item = {"GlobalId": entity[0], "ifc_class": entity.is_a(), "Name": entity[2],
+                        "map": [round(float((box[0] + box[2]) / 2), 4), round(float((box[1] + box[3]) / 2), 4),
+                                round(float(index.heights[row]), 4)]}
+                if geometry == "bbox":
+                    item["map_bbox"] = [round(float(v), 4) for v in box]
+                if distances is not None:
+                    item["distance"] = round(float(distances[i]), 4)
+                elements.append(item)
+            result["elements"] = elements
+    result["index"] = dict(index.stats(), from_cache=from_cache)
+    result["warnings"] = warnings
+    result["debug"] = {"elapsed_ms": round((time.perf_counter() - start) * 1000.0, 3)}
+    return result
+
+
+def spatial_query_command(get_file, center: list = None, radius: float = None, bbox: list = None,
+                          space: str = "map", ifc_class: str = "IfcElement", geometry: str = "origin",
+                          map_conversion: dict = None, map_crs: str = None, limit: int = SPATIAL_QUERY_LIMIT,
+                          output: str = "elements", threads: int = None, path: str = None, fields: list = None,
+                          timings: bool = False, profile: str = None) -> dict:
+    """Body of `find_ifc_elements_by_location`; `path` loads the file hot like extent_command."""
+    def run():
+        file = HOT_FILES.get(path) if path else get_file()
+        if file is None:
+            return {"success": False, "error": "No IFC file is currently loaded"}
+        return project_fields(spatial_query(file, center, radius, bbox, space, ifc_class, geometry,
+                                            map_conversion, map_crs, limit, output, threads), fields)
+
+    return run_instrumented("find_ifc_elements_by_location", run, timings=timings, profile=profile)
+
+
+HEADLESS_COMMANDS["find_ifc_elements_by_location"] = spatial_query_command
+
+
+#---------------------------------------------------------------------------------------------------
+# Offline EPSG index
+#---------------------------------------------------------------------------------------------------
+
+# Built by build_epsg_index.py from the PROJ database; copy epsg_index.bin next to this module.
+EPSG_INDEX_PATH = os.environ.get(
+    "BONSAI_MCP_EPSG_INDEX", os.path.join(os.path.dirname(os.path.abspath(__file__)), "epsg_index.bin"))
+
+# Layout: header | codes (uint32, sorted) | records | string pool (uint16 length + UTF-8)
+EPSG_INDEX_MAGIC = b"GEOEPSG1"
+EPSG_INDEX_HEADER = "<8sIIII"   # magic, count, records offset, pool offset, source string
+# name, geodetic CRS, datum, projection method, zone, unit, area name (pool offsets, NO_STRING if absent),
+# area of use in lon/lat (W, S, E, N, float32) and in CRS units (min E, min N, max E, max N, float64)
+EPSG_INDEX_RECORD = "<7I4f4d"
+EPSG_INDEX_NO_STRING = 0xFFFFFFFF
+EPSG_INDEX_FIELDS = ("name", "geodetic_datum", "datum", "map_projection", "map_zone", "map_unit", "area_name")
+
+# Eastings/northings this far outside the area of use (fraction of its size) only warn
+AREA_OF_USE_MARGIN = 0.05
+
+
+class EpsgIndex:
+    """
+    Read-only EPSG projected CRS metadata from a memory-mapped file. Nothing
+    is read until the first lookup; then code → record is a dict lookup and
+    each record is decoded on demand (no pyproj import, a few hundred kB
+    mapped, shared by the OS page cache).
+    """
+
+    def __init__(self, path: str = EPSG_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._map = None
+        self._rows = None
+        self._error = None
+        self.source = None
+
+    def _load(self):
+        import struct
+        with self._lock:
+            if self._rows is not None or self._error is not None:
+                return
+            try:
+                with open(self.path, "rb") as fh:
+                    data = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, count, records, pool, source = struct.unpack_from(EPSG_INDEX_HEADER, data, 0)
+                if magic != EPSG_INDEX_MAGIC:
+                    raise ValueError(f"{self.path} is not an EPSG index")
+                codes = memoryview(data)[struct.calcsize(EPSG_INDEX_HEADER):records].cast("I")
+                self._rows = dict(zip(codes.tolist(), range(count)))
+                codes.release()
+                self._map, self._records, self._pool = data, records, pool
+                self._record = struct.Struct(EPSG_INDEX_RECORD)
+                self.source = self._string(source)
+            except (OSError, ValueError, struct.error) as e:
+                self._error = f"EPSG index unavailable ({self.path}): {e}"
+
+    def _string(self, offset: int):
+        if offset == EPSG_INDEX_NO_STRING:
+            return None
+        start = self._pool + offset
+        length = int.from_bytes(self._map[start:start + 2], "little")
+        return self._map[start + 2:start + 2 + length].decode("utf-8")
+
+    @property
+    def available(self) -> bool:
+        self._load()
+        return self._rows is not None
+
+    @property
+    def error(self):
+        self._load()
+        return self._error
+
+    def get(self, code):
+        """Metadata of EPSG:`code` as a dict, or None when the index or the code is missing."""
+        import math
+        self._load()
+        if self._rows is None:
+            return None
+        try:
+            code = int(str(code).upper().replace("EPSG:", "").strip())
+        except ValueError:
+            return None
+        row = self._rows.get(code)
+        if row is None:
+            return None
+        values = self._record.unpack_from(self._map, self._records + row * self._record.size)
+        info = {field: self._string(offset) for field, offset in zip(EPSG_INDEX_FIELDS, values[:7])}
+        info["epsg"] = code
+        info["area_of_use"] = {
+            "lonlat": [round(v, 6) for v in values[7:11]],
+            "projected": None if any(math.isnan(v) for v in values[11:15]) else list(values[11:15]),
+        }
+        return info
+
+    def stats(self) -> dict:
+        self._load()
+        return {"path": self.path, "entries": len(self._rows or {}), "source": self.source, "error": self._error}
+
+
+EPSG_INDEX = EpsgIndex()
+
+
+def epsg_crs_info(code):
+    """Shortcut to EPSG_INDEX.get()."""
+    return EPSG_INDEX.get(code)
+
+
+def check_area_of_use(info: dict, eastings: float = None, northings: float = None,
+                      latitude: float = None, longitude: float = None) -> list:
+    """Warnings for map / geographic coordinates outside the area of use of an EPSG index entry."""
+    warnings = []
+    area = (info or {}).get("area_of_use") or {}
+    label = f"EPSG:{info.get('epsg')} ({info.get('name')})" if info else ""
+    bounds = area.get("projected")
+    if bounds and eastings is not None and northings is not None:
+        min_e, min_n, max_e, max_n = bounds
+        margin_e, margin_n = (max_e - min_e) * AREA_OF_USE_MARGIN, (max_n - min_n) * AREA_OF_USE_MARGIN
+        if not (min_e - margin_e <= eastings <= max_e + margin_e and min_n - margin_n <= northings <= max_n + margin_n):
+            warnings.append(
+                f"Eastings/northings ({eastings:.3f}, {northings:.3f}) are outside the area of use of {label}: "
+                f"E {min_e:.0f}..{max_e:.0f}, N {min_n:.0f}..{max_n:.0f}. Check the EPSG code and the coordinates."
+            )
+    lonlat = area.get("lonlat")
+    if lonlat and latitude is not None and longitude is not None:
+        west, south, east, north = lonlat
+        inside_lon = west <= longitude <= east if west <= east else (longitude >= west or longitude <= east)
+        if not (inside_lon and south <= latitude <= north):
+            warnings.append(
+                f"Latitude/longitude ({latitude:.6f}, {longitude:.6f}) are outside the area of use of {label}"
+                f" ({info.get('area_name')}: lon {west}..{east}, lat {south}..{north})."
+            )
+    return warnings
+
+
+#---------------------------------------------------------------------------------------------------
+# Helmert fit from control points
+#---------------------------------------------------------------------------------------------------
+
+FIT_ROBUST_MODES = ("none", "huber", "tukey")
+# Tuning constants for residuals normalized by the robust sigma (95% efficiency)
+FIT_ROBUST_CONSTANTS = {"huber": 1.345, "tukey": 4.685}
+FIT_TRIALS = 256         # point pairs tried for the robust starting estimate
+FIT_SAMPLE_SIZE = 2000   # points scoring each of those pairs
+FIT_MAX_ITERATIONS = 50
+FIT_OUTLIER_SIGMAS = 3.0  # default outlier limit, in robust sigmas
+
+
+def _similarity_2d(local, target, weights, fit_scale: bool = True):
+    """
+    Weighted closed-form 2D similarity: (a, b, te, tn) with E = a·x − b·y + te
+    and N = b·x + a·y + tn (a = scale·cos, b = scale·sin).
+    """
+    import math
+    sw = weights.sum()
+    if sw <= 0:
+        raise ValueError("Every control point was rejected as an outlier")
+    lc = weights @ local / sw
+    tc = weights @ target / sw
+    dl, dt = local - lc, target - tc
+    denom = weights @ (dl * dl).sum(axis=1)
+    if denom <= 0:
+        raise ValueError("The control points share a single local position; a rotation cannot be fitted")
+    a = weights @ (dl[:, 0] * dt[:, 0] + dl[:, 1] * dt[:, 1]) / denom
+    b = weights @ (dl[:, 0] * dt[:, 1] - dl[:, 1] * dt[:, 0]) / denom
+    if not fit_scale:
+        norm = math.hypot(a, b)
+        a, b = a / norm, b / norm
+    return a, b, tc[0] - (a * lc[0] - b * lc[1]), tc[1] - (b * lc[0] + a * lc[1])
+
+
+def _robust_start(local, target, fit_scale: bool, seed: int = 0):
+    """
+    Least-median-of-squares start: the similarity through each of FIT_TRIALS
+    random point pairs is scored on a sample, all in one array operation, so
+    a large share of gross outliers does not drag the first estimate.
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    n = len(local)
+    i, j = rng.integers(0, n, FIT_TRIALS), rng.integers(0, n, FIT_TRIALS)
+    dl, dt = local[j] - local[i], target[j] - target[i]
+    d2 = (dl * dl).sum(axis=1)
+    ok = d2 > 0
+    if not ok.any():
+        return None
+    i, dl, dt, d2 = i[ok], dl[ok], dt[ok], d2[ok]
+    a = (dl[:, 0] * dt[:, 0] + dl[:, 1] * dt[:, 1]) / d2
+    b = (dl[:, 0] * dt[:, 1] - dl[:, 1] * dt[:, 0]) / d2
+    if not fit_scale:
+        norm = np.hypot(a, b)
+        a, b = a / norm, b / norm
+    te = target[i, 0] - (a * local[i, 0] - b * local[i, 1])
+    tn = target[i, 1] - (b * local[i, 0] + a * local[i, 1])
+
+    sample = rng.choice(n, FIT_SAMPLE_SIZE, replace=False) if n > FIT_SAMPLE_SIZE else np.arange(n)
+    x, y = local[sample, 0], local[sample, 1]
+    re = target[sample, 0] - (np.outer(a, x) - np.outer(b, y) + te[:, None])
+    rn = target[sample, 1] - (np.outer(b, x) + np.outer(a, y) + tn[:, None])
+    best = int(np.argmin(np.median(re * re + rn * rn, axis=1)))
+    return a[best], b[best], te[best], tn[best]
+
+
+def _robust_weights(residuals, robust: str):
+    """IRLS weights for residual magnitudes, and the robust sigma (1.4826·MAD) they were scaled by."""
+    import numpy as np
+    sigma = 1.4826 * float(np.median(residuals))
+    if robust == "none" or sigma <= 0:
+        return np.ones_like(residuals), sigma
+    u = residuals / (sigma * FIT_ROBUST_CONSTANTS[robust])
+    if robust == "huber":
+        return np.minimum(1.0, 1.0 / np.maximum(u, 1e-300)), sigma
+    return np.where(u < 1.0, (1.0 - u * u) ** 2, 0.0), sigma
+
+
+def fit_helmert(local_points, map_points, weights=None, robust: str = "huber", outlier_threshold: float = None,
+                fit_scale: bool = True, max_iterations: int = FIT_MAX_ITERATIONS, seed: int = 0) -> dict:
+    """
+    Fits the IfcMapConversion (Helmert 2D + height offset) that maps the
+    local `local_points` onto the surveyed `map_points` ((N, 2|3) arrays of
+    matching pairs) by weighted least squares.
+
+    robust="huber"|"tukey" starts from a least-median-of-squares estimate and
+    reweights iteratively (IRLS) so gross outliers lose their influence;
+    "none" is the plain least-squares solution. Points whose horizontal or
+    vertical residual exceeds `outlier_threshold` (map units; default
+    FIT_OUTLIER_SIGMAS robust sigmas when robust) are reported as outliers and excluded from the final fit.
+    The height offset uses the pairs where both sides have a Z.
+    """
+    import math
+    import numpy as np
+    if robust not in FIT_ROBUST_MODES:
+        raise ValueError(f"robust must be one of {', '.join(FIT_ROBUST_MODES)}")
+    local = np.asarray(local_points, dtype=np.float64)
+    target = np.asarray(map_points, dtype=np.float64)
+    if local.ndim != 2 or target.ndim != 2 or local.shape[1] not in (2, 3) or target.shape[1] not in (2, 3):
+        raise ValueError("local_points and map_points must be lists of [x, y] or [x, y, z]")
+    if len(local) != len(target):
+        raise ValueError(f"{len(local)} local points but {len(target)} map points")
+    if len(local) < 2:
+        raise ValueError("At least 2 control point pairs are needed")
+    prior = np.ones(len(local)) if weights is None else np.asarray(weights, dtype=np.float64)
+    if prior.shape != (len(local),) or (prior < 0).any():
+        raise ValueError("weights must be one non-negative value per control point")
+
+    with phase("fit_horizontal"):
+        start = _robust_start(local[:, :2], target[:, :2], fit_scale, seed) if robust != "none" else None
+        params = start or _similarity_2d(local[:, :2], target[:, :2], prior, fit_scale)
+        iterations, converged = 0, robust == "none"
+        while not converged and iterations < max_iterations:
+            a, b, te, tn = params
+            r = np.hypot(target[:, 0] - (a * local[:, 0] - b * local[:, 1] + te),
+                         target[:, 1] - (b * local[:, 0] + a * local[:, 1] + tn))
+            new = _similarity_2d(local[:, :2], target[:, :2], prior * _robust_weights(r, robust)[0], fit_scale)
+            iterations += 1
+            # Converged when the parameters move less than ~1e-12 of the coordinate magnitude
+            converged = max(abs(n - o) for n, o in zip(new, params)) <= 1e-12 * (1.0 + np.abs(target[:, :2]).max())
+            params = new
+
+    has_z = local.shape[1] == 3 and target.shape[1] == 3
+
+    def evaluate(params, height_weights):
+        a, b, te, tn = params
+        scale = math.hypot(a, b)
+        residuals = target[:, :2] - np.column_stack([a * local[:, 0] - b * local[:, 1] + te,
+                                                     b * local[:, 0] + a * local[:, 1] + tn])
+        if not has_z:
+            return residuals, None, 0.0, None
+        dz = target[:, 2] - scale * local[:, 2]
+        height = float(np.average(dz, weights=height_weights)) if height_weights.sum() > 0 else float(np.median(dz))
+        return residuals, dz, height, dz - height
+
+    with phase("fit_height"):
+        residuals, dz, height, vertical = evaluate(params, prior)
+        for _ in range(max_iterations if has_z and robust != "none" else 0):
+            hw = prior * _robust_weights(np.abs(vertical), robust)[0]
+            if hw.sum() <= 0:
+                break
+            new = float(np.average(dz, weights=hw))
+            vertical = dz - new
+            if abs(new - height) <= 1e-12 * (1.0 + abs(new)):
+                height = new
+                break
+            height = new
+
+    # Outliers: explicit threshold, or FIT_OUTLIER_SIGMAS robust sigmas of the robust fit's residuals
+    horizontal = np.hypot(residuals[:, 0], residuals[:, 1])
+    outliers = np.zeros(len(local), dtype=bool)
+    sigma_h = 1.4826 * float(np.median(horizontal))
+    limit_h = outlier_threshold if outlier_threshold is not None else (FIT_OUTLIER_SIGMAS * sigma_h if robust != "none" else None)
+    if limit_h is not None:
+        outliers |= horizontal > max(limit_h, 1e-12)
+    sigma_v = None
+    if vertical is not None:
+        sigma_v = 1.4826 * float(np.median(np.abs(vertical)))
+        limit_v = outlier_threshold if outlier_threshold is not None else (FIT_OUTLIER_SIGMAS * sigma_v if robust != "none" else None)
+        if limit_v is not None:
+            outliers |= np.abs(vertical) > max(limit_v, 1e-12)
+    inliers = ~outliers & (prior > 0)
+
+    # Final plain least squares on the inliers, so the parameters and RMSE describe them only
+    with phase("fit_inliers"):
+        params = _similarity_2d(local[:, :2], target[:, :2], prior * inliers, fit_scale)
+        residuals, dz, height, vertical = evaluate(params, prior * inliers)
+    a, b, te, tn = (float(v) for v in params)
+    scale = math.hypot(a, b)
+    horizontal = np.hypot(residuals[:, 0], residuals[:, 1])
+
+    def rms(values):
+        return float(np.sqrt(np.mean(values * values))) if len(values) else None
+
+    return {
+        "map_conversion": {
+            "eastings": float(te),
+            "northings": float(tn),
+            "orthogonal_height": height,
+            "scale": scale,
+            "x_axis_abscissa": a / scale,
+            "x_axis_ordinate": b / scale,
+        },
+        "rotation_deg": math.degrees(math.atan2(b, a)),
+        "residuals": np.column_stack([residuals, vertical]) if vertical is not None else residuals,
+        "outliers": outliers,
+        "rmse": {
+            "horizontal": rms(horizontal[inliers]),
+            "vertical": rms(vertical[inliers]) if vertical is not None else None,
+            "horizontal_all": rms(horizontal),
+            "vertical_all": rms(vertical) if vertical is not None else None,
+        },
+        "sigma": {"horizontal": sigma_h, "vertical": sigma_v},
+        "max_residual": {
+            "horizontal": float(horizontal[inliers].max()) if inliers.any() else None,
+            "vertical": float(np.abs(vertical[inliers]).max()) if vertical is not None and inliers.any() else None,
+        },
+        "iterations": iterations,
+        "converged": bool(converged),
+    }
+
+
+def apply_fitted_map_conversion(file, map_conversion: dict, epsg: int = None, dry_run: bool = False,
+                                write_path: str = None, async_write: bool = False) -> dict:
+    """
+    Writes fitted MapConversion values to the model: the existing
+    IfcMapConversion of every representation context is updated in place
+    (only the attributes that differ), or, when there is none, `epsg` creates
+    the CRS and MapConversion through georeference_file.
+    """
+    operations = [op for op in _by_type(file, "IfcMapConversion")
+                  if op.SourceCRS is not None and op.SourceCRS.is_a("IfcGeometricRepresentationContext")]
+    if not operations:
+        if not epsg:
+            return {"success": False, "error": "The model has no IfcMapConversion; pass epsg to create one"}
+        result = georeference_file(file, crs_mode="epsg", epsg=epsg, dry_run=dry_run, write_path=write_path,
+                                   async_write=async_write, **map_conversion)
+        applied = {k: result[k] for k in ("success", "error", "changes", "plan", "plan_id", "write_job", "warnings")
+                   if k in result}
+        applied["created"] = bool(result.get("success"))
+        applied["wrote_file"] = bool(result.get("actions", {}).get("wrote_file"))
+        return applied
+
+    values = {
+        "Eastings": map_conversion["eastings"],
+        "Northings": map_conversion["northings"],
+        "OrthogonalHeight": map_conversion["orthogonal_height"],
+        "XAxisAbscissa": map_conversion["x_axis_abscissa"],
+        "XAxisOrdinate": map_conversion["x_axis_ordinate"],
+        "Scale": map_conversion["scale"],
+    }
+    plan = []
+    for op in operations:
+        plan_update_changed(plan, op, values)
+    result = {"success": True, "created": False, "changes": plan, "plan": plan, "plan_id": None,
+              "wrote_file": False, "write_job": None, "warnings": []}
+    if dry_run:
+        result["plan_id"] = store_georeference_plan(file, plan, write_path)
+        return result
+    with phase("apply_plan"):
+        applied = apply_georeference_plan(file, plan)
+    result["warnings"].extend(applied["warnings"])
+    if not applied["success"]:
+        return {"success": False, "error": applied["error"], "plan": plan, "warnings": result["warnings"]}
+    if write_path:
+        try:
+            with phase("write"):
+                result.update(write_ifc(file, write_path, async_write, result["warnings"]))
+        except Exception as e:
+            result["warnings"].append(f"Could not write IFC to'{write_path}': {e}")
+    return result
+
+
+def fit_command(get_file, local_points: list, map_points: list, map_space: str = "map", map_crs: str = None,
+                weights: list = None, robust: str = "huber", outlier_threshold: float = None,
+                fit_scale: bool = True, include_residuals: bool = True, apply: bool = False, epsg: int = None,
+                dry_run: bool = False, write_path: str = None, async_write: bool = False, path: str = None,
+                fields: list = None, timings: bool = False, profile: str = None) -> dict:
+    """Body of `fit_ifc_georeference`; the model is only opened for WGS84 input without map_crs, or to apply."""
+    def run():
+        import numpy as np
+        if map_space not in ("map", "wgs84"):
+            return {"success": False, "error": "map_space must be 'map' or 'wgs84'"}
+
+        def model():
+            file = HOT_FILES.get(path) if path else get_file()
+            if file is None:
+                raise ValueError("No IFC file is currently loaded")
+            return file
+
+        warnings = []
+        try:
+            with phase("decode"):
+                local = decode_points(local_points)
+                target = decode_points(map_points)
+            crs = map_crs
+            if map_space == "wgs84":
+                # [lon, lat(, height)] → the projected CRS the MapConversion targets
+                crs = crs or (f"EPSG:{epsg}" if epsg else (cached_georeferencing_info(model()).get("crs") or {}).get("name"))
+                if not crs:
+                    return {"success": False, "error": "map_crs is required for WGS84 control points"}
+                with phase("pyproj_transform"):
+                    transformer, _ = get_transformer("EPSG:4326", crs, always_xy=True)
+                    target = np.column_stack(transformer.transform(*(target[:, i] for i in range(target.shape[1]))))
+            fit = fit_helmert(local, target, weights, robust, outlier_threshold, fit_scale)
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
+
+        outliers = fit["outliers"]
+        # Nanometre / nano-radian rounding: refits of the same points do not churn the model
+        fitted = {k: round(v, 9) for k, v in fit["map_conversion"].items()}
+        result = {
+            "success": True,
+            "count": int(len(local)),
+            "inliers": int((~outliers).sum()),
+            "map_conversion": fitted,
+            "rotation_deg": round(fit["rotation_deg"], 9),
+            "map_crs": crs,
+            "rmse": fit["rmse"],
+            "max_residual": fit["max_residual"],
+            "sigma": fit["sigma"],
+            "outliers": np.flatnonzero(outliers).tolist(),
+            "iterations": fit["iterations"],
+            "converged": fit["converged"],
+            "applied": False,
+            "warnings": warnings,
+        }
+        if include_residuals:
+            with phase("encode"):
+                result["residuals"] = np.round(fit["residuals"], 6).tolist()
+        if len(local) - int(outliers.sum()) < 3:
+            warnings.append("Fewer than 3 inlier control points: the fit has no redundancy to check it.")
+        if fit_scale and abs(fit["map_conversion"]["scale"] - 1.0) > 0.01:
+            warnings.append(f"Fitted scale {fit['map_conversion']['scale']:.6f} is far from 1: check the point pairs and units.")
+
+        if apply:
+            applied = apply_fitted_map_conversion(model(), fitted, epsg=epsg, dry_run=dry_run,
+                                                  write_path=write_path, async_write=async_write)
+            if not applied["success"]:
+                return dict(result, success=False, error=applied["error"])
+            warnings.extend(applied.pop("warnings", []))
+            result.update(applied=not dry_run, apply=applied)
+            if path and not dry_run:
+                HOT_FILES.edited(path, write_path if applied.get("wrote_file") else None)
+        return project_fields(result, fields)
+
+    return run_instrumented("fit_ifc_georeference", run, timings=timings, profile=profile)
+
+
+HEADLESS_COMMANDS["fit_ifc_georeference"] = fit_command
+
+
+#---------------------------------------------------------------------------------------------------
+# Geoid / height-offset grids
+#---------------------------------------------------------------------------------------------------
+
+# Grids referenced by name (e.g. "egm96_15.gtx") are looked up in this folder; absolute paths work too
+GEOID_GRID_DIR = os.environ.get(
+    "BONSAI_MCP_GEOID_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "geoid"))
+GEOID_GRID_CACHE_SIZE = int(os.environ.get("BONSAI_MCP_GEOID_CACHE_SIZE", "4"))
+GTX_HEADER = 40               # south, west, dlat, dlon (float64), rows, cols (int32)
+GTX_NODATA = -88.8888         # NOAA/PROJ "no value" marker
+
+
+class GeoidGrid:
+    """
+    A GTX geoid / height-offset grid (PROJ, NOAA and most national agencies
+    publish them) memory-mapped read-only: opening is constant time, and an
+    interpolation only pages in the cells around the requested points.
+
+    Values are the undulation N (geoid above ellipsoid, metres), so an
+    orthometric height is H = h − N. Big-endian is the GTX standard;
+    little-endian files written by other tools are detected from the size.
+    """
+
+    def __init__(self, path: str):
+        import struct
+        import numpy as np
+        self.path = os.path.abspath(path)
+        self.stamp = os.stat(self.path).st_mtime_ns
+        with open(self.path, "rb") as fh:
+            self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        size = len(self._map)
+        for order in (">", "<"):
+            south, west, dlat, dlon, rows, cols = struct.unpack_from(order + "4d2i", self._map, 0)
+            if rows > 0 and cols > 0 and dlat > 0 and dlon > 0 and GTX_HEADER + rows * cols * 4 == size:
+                break
+        else:
+            self._map.close()
+            raise ValueError(f"{self.path} is not a GTX grid")
+        self.south, self.west, self.dlat, self.dlon, self.rows, self.cols = south, west, dlat, dlon, rows, cols
+        # Rows run south → north, columns west → east
+        self.values = np.frombuffer(self._map, dtype=order + "f4", offset=GTX_HEADER).reshape(rows, cols)
+        # Global grids wrap around the antimeridian
+        self.wraps = cols * dlon >= 360.0 - 1e-9
+
+    def describe(self) -> dict:
+        return {
+            "path": self.path,
+            "rows": self.rows,
+            "cols": self.cols,
+            "lat": [self.south, self.south + (self.rows - 1) * self.dlat],
+            "lon": [self.west, self.west + (self.cols - 1) * self.dlon],
+            "spacing_deg": [self.dlat, self.dlon],
+        }
+
+    def interpolate(self, lon, lat):
+        """Bilinear undulation at arrays of lon/lat (degrees); NaN outside the grid or next to a void."""
+        import numpy as np
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        fx = np.mod(lon - self.west, 360.0) / self.dlon
+        fy = (lat - self.south) / self.dlat
+        max_x = self.cols if self.wraps else self.cols - 1
+        inside = (fy >= 0) & (fy <= self.rows - 1) & (fx >= 0) & (fx <= max_x)
+        fx = np.where(inside, fx, 0.0)
+        fy = np.where(inside, fy, 0.0)
+        # The last row/column interpolates with weight 0 on the (clamped) next one
+        i0 = np.minimum(np.floor(fy).astype(np.int64), self.rows - 1)
+        j0 = np.minimum(np.floor(fx).astype(np.int64), self.cols - 1)
+        i1 = np.minimum(i0 + 1, self.rows - 1)
+        j1 = (j0 + 1) % self.cols if self.wraps else np.minimum(j0 + 1, self.cols - 1)
+        tx, ty = fx - j0, fy - i0
+        v = self.values
+        v00, v01, v10, v11 = (v[i, j].astype(np.float64) for i, j in ((i0, j0), (i0, j1), (i1, j0), (i1, j1)))
+        n = (1 - ty) * ((1 - tx) * v00 + tx * v01) + ty * ((1 - tx) * v10 + tx * v11)
+        void = np.zeros(n.shape, dtype=bool)
+        for corner in (v00, v01, v10, v11):
+            void |= ~np.isfinite(corner) | (np.abs(corner - GTX_NODATA) < 1e-3)
+        return np.where(inside & ~void, n, np.nan)
+
+
+_GEOID_GRIDS = OrderedDict()
+_GEOID_GRIDS_LOCK = threading.Lock()
+
+
+def geoid_grid_path(grid: str) -> str:
+    """Absolute path of a grid given by path or by file name in GEOID_GRID_DIR."""
+    if os.path.isabs(grid) or os.path.exists(grid):
+        return os.path.abspath(grid)
+    return os.path.join(GEOID_GRID_DIR, grid)
+
+
+def available_geoid_grids() -> list:
+    return sorted(os.path.basename(p) for p in _glob.glob(os.path.join(GEOID_GRID_DIR, "*.gtx")))
+
+
+def get_geoid_grid(grid: str) -> GeoidGrid:
+    """Memory-mapped grid, opened once and reused until the file changes (LRU of GEOID_GRID_CACHE_SIZE)."""
+    path = geoid_grid_path(grid)
+    if not os.path.exists(path):
+        names = ", ".join(available_geoid_grids()) or "none"
+        raise ValueError(f"Geoid grid not found: {grid} (grids in {GEOID_GRID_DIR}: {names})")
+    stamp = os.stat(path).st_mtime_ns
+    with _GEOID_GRIDS_LOCK:
+        cached = _GEOID_GRIDS.get(path)
+        if cached is not None and cached.stamp == stamp:
+            _GEOID_GRIDS.move_to_end(path)
+            return cached
+    with phase("geoid_open"):
+        opened = GeoidGrid(path)
+    with _GEOID_GRIDS_LOCK:
+        _GEOID_GRIDS[path] = opened
+        _GEOID_GRIDS.move_to_end(path)
+        while len(_GEOID_GRIDS) > GEOID_GRID_CACHE_SIZE:
+            # Dropped grids are unmapped by the GC once no array view refers to them
+            _GEOID_GRIDS.popitem(last=False)
+    return opened
+
+
+def geoid_undulations(grid: str, lon, lat):
+    """Vectorized undulation N (metres) of `grid` at lon/lat arrays (NaN outside its coverage)."""
+    with phase("geoid_interpolate"):
+        return get_geoid_grid(grid).interpolate(lon, lat)
+
+
+def geoid_heights(
+    grid: str,
+    points=None,
+    points_b64: str = None,
+    points_path: str = None,
+    dims: int = 3,
+    source: str = "wgs84",
+    map_crs: str = None,
+    heights: str = "ellipsoidal",
+    output_format: str = "json",
+) -> dict:
+    """
+    Undulations for a whole point array: [lon, lat(, h)] (source="wgs84") or
+    [E, N(, h)] in `map_crs` (source="map"). With a third coordinate it is
+    converted as well: heights="ellipsoidal" returns orthometric H = h − N,
+    heights="orthometric" returns ellipsoidal h = H + N.
+    """
+    import numpy as np
+    if source not in ("wgs84", "map"):
+        return {"success": False, "error": "source must be 'wgs84' or 'map'"}
+    if heights not in ("ellipsoidal", "orthometric"):
+        return {"success": False, "error": "heights must be 'ellipsoidal' or 'orthometric'"}
+    if output_format not in ("json", "binary"):
+        return {"success": False, "error": "output_format must be 'json' or 'binary'"}
+    with phase("decode"):
+        pts = decode_points(points, points_b64, points_path, dims)
+    lon, lat = pts[:, 0], pts[:, 1]
+    if source == "map":
+        if not map_crs:
+            return {"success": False, "error": "map_crs (e.g. 'EPSG:25830') is required for map coordinates"}
+        with phase("pyproj_transform"):
+            transformer, _ = get_transformer(map_crs, "EPSG:4326", always_xy=True)
+            lon, lat = transformer.transform(np.ascontiguousarray(lon), np.ascontiguousarray(lat))
+    undulation = geoid_undulations(grid, lon, lat)
+    outside = int(np.isnan(undulation).sum())
+    result = {
+        "success": True,
+        "count": int(len(pts)),
+        "grid": get_geoid_grid(grid).describe(),
+        "outside": outside,
+        "warnings": [f"{outside} point(s) fall outside the grid or next to a void (NaN)."] if outside else [],
+    }
+    columns = [undulation]
+    if pts.shape[1] == 3:
+        columns.append(pts[:, 2] - undulation if heights == "ellipsoidal" else pts[:, 2] + undulation)
+        result["converted_heights"] = "orthometric" if heights == "ellipsoidal" else "ellipsoidal"
+    out = np.column_stack(columns)
+    with phase("encode"):
+        if output_format == "binary":
+            import base64
+            result["values_b64"] = base64.b64encode(np.ascontiguousarray(out, dtype="<f8").tobytes()).decode("ascii")
+        else:
+            # JSON has no NaN: points outside the grid are null
+            result["values"] = [[None if v != v else round(v, 4) for v in row] for row in out.tolist()]
+    result["columns"] = ["undulation"] + ([result["converted_heights"]] if pts.shape[1] == 3 else [])
+    return result
+
+
+def geoid_command(get_file, grid: str, map_crs: str = None, path: str = None, fields: list = None,
+                  timings: bool = False, profile: str = None, **params) -> dict:
+    """Body of `get_geoid_heights`; map_crs defaults to the TargetCRS of the model for source="map"."""
+    def run():
+        crs = map_crs
+        if crs is None and params.get("source") == "map":
+            if path:
+                hot = HOT_FILES.peek(path)
+                info = cached_georeferencing_info(hot) if hot is not None else scan_georeferencing_info(path)
+            else:
+                file = get_file()
+                info = cached_georeferencing_info(file) if file is not None else {}
+            crs = (info.get("crs") or {}).get("name")
+        try:
+            return project_fields(geoid_heights(grid, map_crs=crs, **params), fields)
+        except ValueError as e:
+            return {"success": False, "error": str(e)}
+
+    return run_instrumented("get_geoid_heights", run, timings=timings, profile=profile)
+
+
+HEADLESS_COMMANDS["get_geoid_heights"] = geoid_command
+
+
+#---------------------------------------------------------------------------------------------------
+# Portfolio index (SQLite + R-tree over the extents of many IFC files)
+#---------------------------------------------------------------------------------------------------
+
+PORTFOLIO_DB_PATH = os.environ.get(
+    "BONSAI_MCP_PORTFOLIO_DB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "georef_portfolio.sqlite")
+)
+PORTFOLIO_EXTENTS = ("placements", "origin")
+PORTFOLIO_COMMIT_EVERY = 200    # files per write transaction while indexing
+PORTFOLIO_QUERY_LIMIT = 1000
+PORTFOLIO_HASH_CHUNK = 1 << 20
+
+# Exact extents live in `files`; the R-trees (32-bit, rounded outwards) only pre-filter them
+_PORTFOLIO_COLUMNS = (
+    "path", "size", "mtime_ns", "content_hash", "indexed_at", "schema", "georeferenced", "crs_name", "epsg",
+    "geodetic_datum", "vertical_datum", "map_unit", "eastings", "northings", "orthogonal_height", "scale",
+    "rotation_deg", "ref_latitude", "ref_longitude", "ref_elevation", "extent_source", "elements",
+    "map_min_x", "map_min_y", "map_max_x", "map_max_y", "wgs84_min_lon", "wgs84_min_lat", "wgs84_max_lon",
+    "wgs84_max_lat", "error", "warnings",
+)
+_PORTFOLIO_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER, mtime_ns INTEGER, content_hash TEXT, indexed_at REAL, schema TEXT,
+    georeferenced INTEGER, crs_name TEXT, epsg INTEGER, geodetic_datum TEXT, vertical_datum TEXT, map_unit TEXT,
+    eastings REAL, northings REAL, orthogonal_height REAL, scale REAL, rotation_deg REAL,
+    ref_latitude REAL, ref_longitude REAL, ref_elevation REAL, extent_source TEXT, elements INTEGER,
+    map_min_x REAL, map_min_y REAL, map_max_x REAL, map_max_y REAL,
+    wgs84_min_lon REAL, wgs84_min_lat REAL, wgs84_max_lon REAL, wgs84_max_lat REAL,
+    error TEXT, warnings TEXT
+);
+CREATE INDEX IF NOT EXISTS files_crs ON files (crs_name);
+CREATE INDEX IF NOT EXISTS files_epsg ON files (epsg);
+CREATE INDEX IF NOT EXISTS files_georeferenced ON files (georeferenced);
+"""
+_PORTFOLIO_RTREES = {
+    "map_extent": ("map_min_x", "map_max_x", "map_min_y", "map_max_y"),
+    "wgs84_extent": ("wgs84_min_lon", "wgs84_max_lon", "wgs84_min_lat", "wgs84_max_lat"),
+}
+_SPF_SCHEMA_RE = re.compile(rb"FILE_SCHEMA\s*\(\s*\(\s*'([^']*)'")
+
+
+def _content_hash(path: str) -> str:
+    import hashlib
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(PORTFOLIO_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _spf_schema(path: str):
+    with open(path, "rb") as fh:
+        match = _SPF_SCHEMA_RE.search(fh.read(8192))
+    return match.group(1).decode("latin-1") if match else None
+
+
+def _dms_or_none(dms):
+    try:
+        return ifc_dms_to_dd(dms)
+    except (TypeError, ValueError):
+        return None
+
+
+def _float_or_none(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def portfolio_record(path: str, known_hash: str = None, extent: str = "placements") -> dict:
+    """
+    Worker entry point of the portfolio indexer: one `files` row for `path`.
+    With `known_hash` equal to the content hash, returns {"unchanged": True}
+    without reading the model. The georeferencing comes from the STEP scanner;
+    extent="placements" also opens the file with ifcopenshell for the extent
+    of the placement origins (as get_ifc_model_extent), "origin" only indexes
+    the MapConversion origin / site reference point. Never raises.
+    """
+    start = time.perf_counter()
+    row = {"path": path, "indexed_at": time.time(), "warnings": []}
+    try:
+        stat = os.stat(path)
+        row.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns, content_hash=_content_hash(path))
+        if known_hash and row["content_hash"] == known_hash:
+            return {"path": path, "unchanged": True, "size": row["size"], "mtime_ns": row["mtime_ns"]}
+        row["schema"] = _spf_schema(path)
+        info = scan_georeferencing_info(path)
+        row["warnings"].extend(info.get("warnings") or [])
+        crs, conversion, site = info.get("crs") or {}, info.get("map_conversion") or {}, info.get("site") or {}
+        code = re.match(r"^EPSG:(\d+)$", crs_key(crs["name"])) if crs.get("name") else None
+        row.update(
+            georeferenced=int(bool(info.get("georeferenced"))),
+            crs_name=crs.get("name"),
+            epsg=int(code.group(1)) if code else None,
+            geodetic_datum=crs.get("geodetic_datum"),
+            vertical_datum=crs.get("vertical_datum"),
+            map_unit=crs.get("map_unit"),
+            eastings=_float_or_none(conversion.get("eastings")),
+            northings=_float_or_none(conversion.get("northings")),
+            orthogonal_height=_float_or_none(conversion.get("orthogonal_height")),
+            scale=_float_or_none(conversion.get("scale")),
+            ref_latitude=_dms_or_none(site.get("ref_latitude")),
+            ref_longitude=_dms_or_none(site.get("ref_longitude")),
+            ref_elevation=_float_or_none(site.get("ref_elevation")),
+        )
+        if conversion.get("eastings") is not None:
+            import math
+            helmert = helmert_parameters(conversion)
+            row["rotation_deg"] = round(math.degrees(math.atan2(helmert["sin"], helmert["cos"])), 9)
+        _portfolio_extent(path, row, conversion if conversion.get("eastings") is not None else None, extent)
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    row["elapsed_ms"] = round((time.perf_counter() - start) * 1000.0, 3)
+    return row
+
+
+def _portfolio_extent(path: str, row: dict, map_conversion: dict, extent: str):
+    """Fills the map / WGS84 bounding boxes of `row`, falling back from placements to the origin point."""
+    if extent == "placements":
+        try:
+            import ifcopenshell
+            file = ifcopenshell.open(path)
+            try:
+                result = model_extent(file, "IfcProduct", map_conversion, row.get("crs_name"), include_hull=False)
+            finally:
+                invalidate_georeferencing_info(file)
+                with _PLACEMENT_CACHE_LOCK:
+                    _PLACEMENT_CACHE.pop(id(file), None)
+            if result.get("success"):
+                row["extent_source"] = "placements"
+                row["elements"] = result["count"]
+                if "map" in result:
+                    (row["map_min_x"], row["map_min_y"]), (row["map_max_x"], row["map_max_y"]) = \
+                        result["map"]["min"][:2], result["map"]["max"][:2]
+                if "wgs84" in result:
+                    (row["wgs84_min_lon"], row["wgs84_min_lat"]), (row["wgs84_max_lon"], row["wgs84_max_lat"]) = \
+                        result["wgs84"]["min"], result["wgs84"]["max"]
+                row["warnings"].extend(w for w in result.get("warnings", []) if w not in row["warnings"])
+            else:
+                row["warnings"].append(f"Placement extent not available: {result.get('error')}")
+        except ImportError:
+            row["warnings"].append("ifcopenshell is not available: only the origin point is indexed.")
+        except Exception as e:
+            row["warnings"].append(f"Placement extent not available: {type(e).__name__}: {e}")
+
+    if row.get("map_min_x") is None and map_conversion is not None:
+        row["extent_source"] = "origin"
+        row["map_min_x"] = row["map_max_x"] = row["eastings"]
+        row["map_min_y"] = row["map_max_y"] = row["northings"]
+    if row.get("wgs84_min_lon") is None:
+        lon, lat = row.get("ref_longitude"), row.get("ref_latitude")
+        if (lon is None or lat is None) and map_conversion is not None and row.get("crs_name"):
+            try:
+                transformer, _ = get_transformer(row["crs_name"], "EPSG:4326", always_xy=True)
+                lon, lat = transformer.transform(row["eastings"], row["northings"])
+            except Exception as e:
+                row["warnings"].append(f"Could not transform the origin to WGS84 with {row['crs_name']}: {e}")
+        if lon is not None and lat is not None:
+            row["extent_source"] = row.get("extent_source") or "origin"
+            row["wgs84_min_lon"] = row["wgs84_max_lon"] = float(lon)
+            row["wgs84_min_lat"] = row["wgs84_max_lat"] = float(lat)
+
+
+class PortfolioIndex:
+    """
+    SQLite database of the georeferencing of many IFC files: one `files` row
+    per path plus R-tree tables over the map and WGS84 bounding boxes. The
+    database is opened in WAL mode, so queries are not blocked while a
+    re-index job writes. Use one instance per thread.
+    """
+
+    def __init__(self, db_path: str = None):
+        import sqlite3
+        self.path = db_path or PORTFOLIO_DB_PATH
+        folder = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(folder, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30.0)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_PORTFOLIO_SCHEMA)
+        for table, columns in _PORTFOLIO_RTREES.items():
+            try:
+                self.conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING rtree(id, {', '.join(columns)})")
+            except sqlite3.OperationalError:
+                # SQLite built without the R-tree module: same queries on an indexed plain table
+                self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY, "
+                                  f"{', '.join(c + ' REAL' for c in columns)})")
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_x ON {table} ({columns[0]}, {columns[1]})")
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def known(self, paths) -> dict:
+        """{path: (size, mtime_ns, content_hash)} of the given paths already in the index."""
+        known = {}
+        paths = list(paths)
+        for i in range(0, len(paths), 500):
+            chunk = paths[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT path, size, mtime_ns, content_hash, error FROM files WHERE path IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            known.update((r["path"], (r["size"], r["mtime_ns"], r["content_hash"], r["error"])) for r in rows)
+        return known
+
+    def upsert(self, row: dict):
+        values = [row.get(c) for c in _PORTFOLIO_COLUMNS]
+        values[_PORTFOLIO_COLUMNS.index("warnings")] = "\n".join(row.get("warnings") or []) or None
+        self.conn.execute(
+            f"INSERT INTO files ({', '.join(_PORTFOLIO_COLUMNS)}) VALUES ({', '.join('?' * len(values))}) "
+            f"ON CONFLICT(path) DO UPDATE SET "
+            + ", ".join(f"{c} = excluded.{c}" for c in _PORTFOLIO_COLUMNS[1:]),
+            values,
+        )
+        file_id = self.conn.execute("SELECT id FROM files WHERE path = ?", (row["path"],)).fetchone()[0]
+        for table, columns in _PORTFOLIO_RTREES.items():
+            self.conn.execute(f"DELETE FROM {table} WHERE id = ?", (file_id,))
+            if all(row.get(c) is not None for c in columns):
+                self.conn.execute(f"INSERT INTO {table} VALUES (?, ?, ?, ?, ?)",
+                                  (file_id, *[row[c] for c in columns]))
+
+    def touch(self, path: str, size: int, mtime_ns: int):
+        """Records a new mtime for a file whose content did not change."""
+        self.conn.execute("UPDATE files SET size = ?, mtime_ns = ? WHERE path = ?", (size, mtime_ns, path))
+
+    def remove(self, paths) -> int:
+        removed = 0
+        for path in paths:
+            row = self.conn.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                continue
+            for table in _PORTFOLIO_RTREES:
+                self.conn.execute(f"DELETE FROM {table} WHERE id = ?", (row[0],))
+            self.conn.execute("DELETE FROM files WHERE id = ?", (row[0],))
+            removed += 1
+        return removed
+
+    def paths_under(self, root: str) -> list:
+        prefix = os.path.join(os.path.abspath(root), "")
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return [r[0] for r in self.conn.execute("SELECT path FROM files WHERE path LIKE ? ESCAPE '\\'",
+                                                (escaped + "%",))]
+
+    def commit(self):
+        self.conn.commit()
+
+    def query(self, bbox=None, bbox_space: str = "wgs84", crs: str = None, georeferenced: bool = None,
+              errors: bool = None, path_prefix: str = None, columns=None, limit: int = PORTFOLIO_QUERY_LIMIT,
+              offset: int = 0) -> dict:
+        """
+        Files matching every given filter. `bbox` is [min_x, min_y, max_x, max_y]
+        in WGS84 lon/lat (bbox_space="wgs84") or in map coordinates
+        (bbox_space="map"; combine it with `crs`, map extents of different CRS
+        are not comparable); a file matches when its extent intersects it.
+        """
+        where, args, source = [], [], "files AS f"
+        if bbox is not None:
+            if bbox_space not in ("wgs84", "map"):
+                raise ValueError(f"bbox_space must be 'wgs84' or 'map', not {bbox_space!r}")
+            if len(bbox) != 4:
+                raise ValueError("bbox must be [min_x, min_y, max_x, max_y]")
+            min_x, min_y, max_x, max_y = (float(v) for v in bbox)
+            table = f"{bbox_space}_extent"
+            lo_x, hi_x, lo_y, hi_y = _PORTFOLIO_RTREES[table]
+            source = f"{table} AS r JOIN files AS f ON f.id = r.id"
+            where.append(f"r.{hi_x} >= ? AND r.{lo_x} <= ? AND r.{hi_y} >= ? AND r.{lo_y} <= ?")
+            where.append(f"f.{hi_x} >= ? AND f.{lo_x} <= ? AND f.{hi_y} >= ? AND f.{lo_y} <= ?")
+            args.extend([min_x, max_x, min_y, max_y] * 2)
+        if crs is not None:
+            key = crs_key(crs)
+            code = re.match(r"^EPSG:(\d+)$", key)
+            if code:
+                where.append("(f.epsg = ? OR f.crs_name = ?)")
+                args.extend([int(code.group(1)), key])
+            else:
+                where.append("f.crs_name = ?")
+                args.append(key)
+        if georeferenced is not None:
+            where.append("f.georeferenced = ?")
+            args.append(int(bool(georeferenced)))
+        if errors is not None:
+            where.append("f.error IS NOT NULL" if errors else "f.error IS NULL")
+        if path_prefix:
+            escaped = os.path.abspath(path_prefix).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where.append("f.path LIKE ? ESCAPE '\\'")
+            args.append(escaped + "%")
+        columns = [c for c in (columns or _PORTFOLIO_COLUMNS) if c in _PORTFOLIO_COLUMNS] or ["path"]
+        sql_where = f" WHERE {' AND '.join(where)}" if where else ""
+        total = self.conn.execute(f"SELECT COUNT(*) FROM {source}{sql_where}", args).fetchone()[0]
+        rows = self.conn.execute(
+            f"SELECT {', '.join('f.' + c for c in columns)} FROM {source}{sql_where} ORDER BY f.path LIMIT ? OFFSET ?",
+            args + [max(0, int(limit)), max(0, int(offset or 0))],
+        ).fetchall()
+        files = []
+        for r in rows:
+            item = dict(r)
+            if "georeferenced" in item and item["georeferenced"] is not None:
+                item["georeferenced"] = bool(item["georeferenced"])
+            if item.get("warnings"):
+                item["warnings"] = item["warnings"].split("\n")
+            files.append(item)
+        return {"total": total, "count": len(files), "offset": int(offset or 0), "files": files}
+
+    def summary(self) -> dict:
+        """File counts: georeferenced, not georeferenced, failed, and per CRS."""
+        counts = self.conn.execute(
+            "SELECT COUNT(*), SUM(georeferenced = 1), SUM(georeferenced = 0 AND error IS NULL), "
+            "SUM(error IS NOT NULL), MAX(indexed_at) FROM files"
+        ).fetchone()
+        by_crs = self.conn.execute(
+            "SELECT crs_name, COUNT(*) FROM files WHERE crs_name IS NOT NULL GROUP BY crs_name ORDER BY 2 DESC"
+        ).fetchall()
+        return {
+            "files": counts[0],
+            "georeferenced": counts[1] or 0,
+            "not_georeferenced": counts[2] or 0,
+            "failed": counts[3] or 0,
+            "last_indexed_at": counts[4],
+            "by_crs": {name: count for name, count in by_crs},
+        }
+
+
+def _walk_ifc_files(roots, pattern: str) -> list:
+    """(path, size, mtime_ns) of every file under `roots` whose name matches `pattern` (case-insensitive)."""
+    import fnmatch
+    pattern = pattern.lower()
+    found, stack = [], [os.path.abspath(r) for r in roots]
+    while stack:
+        folder = stack.pop()
+        try:
+            entries = list(os.scandir(folder))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif fnmatch.fnmatchcase(entry.name.lower(), pattern) and entry.is_file():
+                    stat = entry.stat()
+                    found.append((entry.path, stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                continue
+    found.sort()
+    return found
+
+
+def start_portfolio_index(
+    roots: list = None,
+    paths: list = None,
+    pattern: str = "*.ifc",
+    db_path: str = None,
+    extent: str = "placements",
+    prune: bool = True,
+    force: bool = False,
+    retry_errors: bool = False,
+    max_workers: int = None,
+) -> dict:
+    """
+    (Re-)indexes the IFC files under `roots` (recursive) and `paths` into the
+    portfolio database. Only files whose size or mtime changed since they were
+    indexed are read, and of those only the ones whose content hash changed
+    are scanned again (force=True re-scans everything). Files that were indexed
+    under `roots` and no longer exist are removed when `prune` is set. Runs as
+    a background job like start_georeference_batch.
+    """
+    import concurrent.futures
+    import multiprocessing
+
+    if extent not in PORTFOLIO_EXTENTS:
+        return {"success": False, "error": f"extent must be one of {PORTFOLIO_EXTENTS}"}
+    roots = [roots] if isinstance(roots, str) else list(roots or [])
+    missing = [r for r in roots if not os.path.isdir(r)]
+    if missing:
+        return {"success": False, "error": f"Not a directory: {missing[0]}"}
+    files = _walk_ifc_files(roots, pattern)
+    for path in resolve_batch_paths(paths):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return {"success": False, "error": f"File not found: {path}"}
+        files.append((os.path.abspath(path), stat.st_size, stat.st_mtime_ns))
+    files = sorted({f[0]: f for f in files}.values())
+    if not files and not (roots and prune):
+        return {"success": False, "error": "No IFC files found under the given roots/paths"}
+
+    db_path = db_path or PORTFOLIO_DB_PATH
+    with PortfolioIndex(db_path) as index:
+        known = index.known(f[0] for f in files)
+        stale = set()
+        if prune:
+            seen = {f[0] for f in files}
+            for root in roots:
+                stale.update(p for p in index.paths_under(root) if p not in seen)
+
+    tasks = []
+    for path, size, mtime_ns in files:
+        previous = known.get(path)
+        if previous is None or force or (retry_errors and previous[3]):
+            tasks.append((path, None))
+        elif (previous[0], previous[1]) != (size, mtime_ns):
+            tasks.append((path, previous[2]))
+
+    workers = max(1, min(int(max_workers or max(1, (os.cpu_count() or 2) - 1)), len(tasks) or 1))
+    job = register_job(Job("georeferencing_index", total=len(tasks)))
+    job.progress.update({"files": len(files), "unchanged": len(files) - len(tasks), "indexed": 0, "touched": 0,
+                         "failed": 0, "removed": 0, "workers": workers, "db_path": db_path})
+
+    def _results():
+        if workers == 1:
+            # A few changed files: not worth spawning processes
+            for path, known_hash in tasks:
+                if job.cancel_event.is_set():
+                    return
+                yield portfolio_record(path, known_hash, extent)
+            return
+        # "spawn" keeps workers independent of the host process state (Blender is not fork-safe)
+        ctx = multiprocessing.get_context("spawn")
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            futures = {pool.submit(portfolio_record, path, known_hash, extent): path for path, known_hash in tasks}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    yield future.result()
+                except Exception as e:
+                    yield {"path": futures[future], "indexed_at": time.time(), "error": f"{type(e).__name__}: {e}"}
+                if job.cancel_event.is_set():
+                    for pending in futures:
+                        pending.cancel()
+                    return
+
+    def _run():
+        try:
+            with PortfolioIndex(db_path) as index:
+                pending = 0
+                for row in _results():
+                    if row.get("unchanged"):
+                        index.touch(row["path"], row["size"], row["mtime_ns"])
+                        job.progress["touched"] += 1
+                    else:
+                        index.upsert(row)
+                        job.progress["failed" if row.get("error") else "indexed"] += 1
+                        job.add_result({k: row.get(k) for k in
+                                        ("path", "georeferenced", "crs_name", "extent_source", "error", "elapsed_ms")})
+                    pending += 1
+                    if pending >= PORTFOLIO_COMMIT_EVERY:
+                        index.commit()
+                        pending = 0
+                if stale and not job.cancel_event.is_set():
+                    job.progress["removed"] = index.remove(sorted(stale))
+                index.commit()
+            job.finish()
+        except Exception as e:
+            job.finish("failed", f"{type(e).__name__}: {e}")
+
+    threading.Thread(target=_run, name=f"georef-index-{job.id}", daemon=True).start()
+    return {"success": True, "job_id": job.id, "files": len(files), "to_index": len(tasks),
+            "unchanged": len(files) - len(tasks), "stale": len(stale), "workers": workers, "db_path": db_path}
+
+
+def query_portfolio_index(db_path: str = None, bbox: list = None, bbox_space: str = "wgs84", crs: str = None,
+                          georeferenced: bool = None, errors: bool = None, path_prefix: str = None,
+                          columns: list = None, limit: int = PORTFOLIO_QUERY_LIMIT, offset: int = 0,
+                          summary: bool = False) -> dict:
+    """Body of `query_ifc_portfolio`: PortfolioIndex.query (and .summary) as a response dict."""
+    start = time.perf_counter()
+    db_path = db_path or PORTFOLIO_DB_PATH
+    if not os.path.exists(db_path):
+        return {"success": False, "error": f"No georeferencing index at {db_path}: run index_ifc_portfolio first"}
+    try:
+        with PortfolioIndex(db_path) as index:
+            with phase("query"):
+                result = index.query(bbox, bbox_space, crs, georeferenced, errors, path_prefix, columns, limit, offset)
+            if summary:
+                with phase("summary"):
+                    result["summary"] = index.summary()
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+    result["success"] = True
+    result["db_path"] = db_path
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000.0, 3)
+    return result
@@ -0,0 +1,203 @@
+"""
+IMPORTANT:
+
+    This file contains code snippets that must be included in the
+    addon.py and tools.py files. On their own, they do not provide
+    any functionality.
+
+    Requires `georef_core.py` (in this folder) next to addon.py, and the
+    `import georef_core` line from georeference_ifc_model.py.
+"""
+
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    These key-value pairs must be included in the `handlers` dictionary
+    inside the `_execute_command_internal` definition.
+"""
+#---------------------------------------------------------------------------------------------------
+
+"georeference_ifc_batch": self.georeference_ifc_batch,
+"get_georeference_job_status": self.get_georeference_job_status,
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    These definitions must be added inside the `BlenderMCPServer` class,
+    along with the other existing definitions.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@staticmethod
+def georeference_ifc_batch(
+    paths: list = None,
+    glob_pattern: str = None,
+    shared_params: dict = None,
+    per_file_params: dict = None,
+    output_dir: str = None,
+    suffix: str = "_georef",
+    in_place: bool = False,
+    max_workers: int = None,
+    log_path: str = None,
+):
+    """
+    Usage:
+    Georeferences a set of IFC files on disk (not the model opened in Blender).
+    Each file is opened headlessly with ifcopenshell in a pool of worker
+    processes and goes through the same logic as `georeference_ifc_model`.
+
+    Args:
+        paths (list): IFC file paths.
+        glob_pattern (str): Optional glob (recursive `**` allowed), e.g. "D:/portfolio/**/*.ifc".
+        shared_params (dict): `georeference_ifc_model` parameters applied to every file
+            (crs_mode is required, here or per file; stream=True patches the files
+            without loading them).
+        per_file_params (dict): {path: {...}} overrides merged over shared_params.
+        output_dir (str): Folder for the outputs. Default: next to each input.
+        suffix (str): Appended to the output file name (ignored when in_place=True).
+        in_place (bool): Overwrite the input files.
+        max_workers (int): Worker processes. Default: CPU count - 1.
+        log_path (str): Optional NDJSON file receiving one line per finished file.
+
+    Returns:
+        dict: {"success", "job_id", "total", "workers"}. Poll the per-file results
+        with `get_georeference_job_status(job_id, since)`.
+    """
+    try:
+        return georef_core.run_instrumented("georeference_ifc_batch", lambda: georef_core.start_georeference_batch(
+            paths=paths,
+            glob_pattern=glob_pattern,
+            shared_params=shared_params,
+            per_file_params=per_file_params,
+            output_dir=output_dir,
+            suffix=suffix,
+            in_place=in_place,
+            max_workers=max_workers,
+            log_path=log_path,
+        ))
+    except Exception as e:
+        import traceback
+        return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+
+
+@staticmethod
+def get_georeference_job_status(job_id: str, since: int = 0, cancel: bool = False):
+    """
+    Usage:
+    Returns the state of a background georeferencing job (batch runs,
+    portfolio index runs and async_write IFC writes) and the results
+    completed after index `since`.
+    Pass the returned `next` value as `since` on the following call to only
+    receive new results.
+    With cancel=True, files not yet started are skipped (batch) or the
+    write is stopped and its temporary file removed (write jobs).
+    """
+    return georef_core.get_job_status(job_id, since=since, cancel=cancel)
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN tools.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This code snippet must be included within the IFC tools block
+    of the `tool.py` file. It uses `send_georef_command_async` from
+    get_ifc_georeferencing_info.py.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@mcp.tool()
+async def georeference_ifc_batch(
+    paths: list = None,
+    glob_pattern: str = None,
+    shared_params: dict = None,
+    per_file_params: dict = None,
+    output_dir: str = None,
+    suffix: str = "_georef",
+    in_place: bool = False,
+    max_workers: int = None,
+    log_path: str = None,
+    timeout: float = None,
+) -> str:
+    """
+    Georeferences many IFC files on disk in parallel (headless ifcopenshell
+    worker processes), with the same parameters as `georeference_ifc_model`.
+
+    Parameters
+    ----------
+    paths : list, optional
+        IFC file paths.
+    glob_pattern : str, optional
+        Glob selecting files, e.g. "D:/portfolio/**/*.ifc".
+    shared_params : dict
+        georeference_ifc_model parameters for every file (e.g. crs_mode, epsg;
+        stream=True for very large files: patched on disk, never loaded).
+    per_file_params : dict, optional
+        {path: {...}} per-file overrides (e.g. eastings/northings of each site).
+    output_dir / suffix / in_place :
+        Where the georeferenced copies are written.
+    max_workers : int, optional
+        Number of worker processes.
+    log_path : str, optional
+        NDJSON file receiving one result line per file as it finishes.
+    timeout : float, optional
+        Seconds to wait for the answer (default georef_core.COMMAND_TIMEOUT_S).
+
+    Returns
+    -------
+    str (JSON)
+        {"success", "job_id", "total", "workers"}. Use
+        `get_georeference_job_status` to stream the per-file results.
+    """
+    params = {
+        "paths": paths,
+        "glob_pattern": glob_pattern,
+        "shared_params": shared_params,
+        "per_file_params": per_file_params,
+        "output_dir": output_dir,
+        "suffix": suffix,
+        "in_place": in_place,
+        "max_workers": max_workers,
+        "log_path": log_path,
+    }
+    params = {k: v for k, v in params.items() if v is not None}
+
+    try:
+        result = await send_georef_command_async("georeference_ifc_batch", params, timeout)
+        return json.dumps(result, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.exception("georeference_ifc_batch error")
+        return json.dumps(
+            {"success": False, "error": "Could not start the batch georeferencing.", "details": str(e)},
+            ensure_ascii=False,
+            indent=2,
+        )
+
+
+@mcp.tool()
+async def get_georeference_job_status(job_id: str, since: int = 0, cancel: bool = False, timeout: float = None) -> str:
+    """
+    Returns the progress of a background georeferencing job (batch runs,
+    index_ifc_portfolio runs, or async IFC writes with entities/bytes
+    written) and the results finished since the `since` cursor (pass back
+    the returned `next`).
+    Set cancel=True to stop the job. `timeout` bounds the wait in seconds.
+    """
+    try:
+        result = await send_georef_command_async(
+            "get_georeference_job_status",
+            {"job_id": job_id, "since": int(since or 0), "cancel": bool(cancel)},
+            timeout,
+        )
+        return json.dumps(result, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.exception("get_georeference_job_status error")
+        return json.dumps(
+            {"success": False, "error": "Could not read the job status.", "details": str(e)},
+            ensure_ascii=False,
+            indent=2,
+        )
@@ -7,6 +7,31 @@ IMPORTANT:
 """
 
 
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This import must be added at the top of addon.py. `georef_core.py`
+    (in this folder) must be copied next to addon.py.
+"""
+#---------------------------------------------------------------------------------------------------
+
+import georef_core
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This call must be added at the end of the `register()` function.
+    It builds the pyproj Transformers for georef_core.PREWARM_EPSG_CODES
+    (env BONSAI_MCP_PREWARM_EPSG) on a background thread.
+"""
+#---------------------------------------------------------------------------------------------------
+
+georef_core.prewarm_transformers()
+
 #---------------------------------------------------------------------------------------------------
 # TO INCLUDE IN addon.py
 #---------------------------------------------------------------------------------------------------
@@ -51,9 +76,22 @@ def georeference_ifc_model(
     site_ref_elevation: float = None,
     site_ref_latitude_dd: float = None,     # Decimal degrees (optional)
     site_ref_longitude_dd: float = None,    # Decimal degrees (optional)
+    site_global_id: str = None,
+    sites: dict = None,
+    all_contexts: bool = False,
     overwrite: bool = False,
+    ellipsoidal_height: float = None,
+    geoid_grid: str = None,
+    update_mode: str = "replace",
+    gc: bool = False,
     dry_run: bool = False,
     write_path: str = None,
+    async_write: bool = False,
+    path: str = None,
+    stream: bool = False,
+    fields: list = None,
+    timings: bool = False,
+    profile: str = None,
 ):
     """
     Usage:
@@ -67,262 +105,108 @@ def georeference_ifc_model(
     - crs_mode="epsg" + epsg=XXXX    OR
     - crs_mode="custom" + (crs_name, geodetic_datum, map_projection [, map_zone])
 
+    With crs_mode="epsg", GeodeticDatum, MapProjection, MapZone, Description
+    and MapUnit come from the offline EPSG index (georef_core.EPSG_INDEX,
+    epsg_index.bin), and eastings/northings or lat/long outside the area of
+    use of the CRS are reported in `warnings`.
+
     Minimum MapConversion information:
     - eastings + northings
     (if missing but lat/long + EPSG + pyproj are available, they are computed)
+
+    Federated models:
+    - site_ref_* apply to the first IfcSite, or to `site_global_id`.
+    - sites={GlobalId: {"ref_latitude"|"ref_latitude_dd", "ref_longitude"|"ref_longitude_dd",
+      "ref_elevation"}} updates any number of sites in the same call (and the same plan).
+    - all_contexts=True adds a MapConversion to every top-level representation
+      context (sub-contexts inherit it), all pointing to one shared IfcProjectedCRS.
+      Contexts that already have one are skipped unless overwrite=True.
+    The response lists `contexts_used` and `sites_updated` (keyed by GlobalId).
+
+    Repeated edits:
+    - update_mode="replace" (default, with overwrite=True) removes the existing
+      MapConversion/CRS and creates new ones.
+    - update_mode="incremental" (implies overwrite) sets only the attributes
+      that differ on the existing MapConversion, IfcProjectedCRS and IfcSite,
+      so entity ids stay stable.
+    In both modes an IfcProjectedCRS identical to the requested one is reused.
+    gc=True also removes georeferencing entities nothing references any more
+    (orphan IfcProjectedCRS and their MapUnit, MapConversions without a CRS).
+    `changes` lists every changed attribute ({ref, type, attribute, old, new})
+    and `removed` every removed entity.
+
+    Heights: with a GNSS (ellipsoidal) height of the MapConversion origin,
+    ellipsoidal_height + geoid_grid (a GTX file name in georef_core.GEOID_GRID_DIR,
+    or a path) derive OrthogonalHeight = h − N, with N interpolated at the site
+    lat/long (or at eastings/northings projected back with the EPSG code).
+    The response reports the undulation used in `geoid`.
+
+    dry_run=True leaves the live model untouched: the planned creates, updates
+    and removals are returned as `plan` (a diff) with a `plan_id` that can be
+    committed in one step or discarded with `apply_georeference_plan`.
+
+    async_write=True serializes `write_path` in short main-thread slices (temp
+    file + atomic rename) and returns at once with `write_job.job_id`; follow it
+    with `get_georeference_job_status`.
+
+    path: georeference an IFC file on disk instead of the opened model. The file
+    stays loaded (georef_core.HOT_FILES) for the following calls with the same
+    path; edits are only on disk once written (write_path, which may be `path`).
+
+    stream=True (with path) patches the file on disk without loading it: the
+    plan is computed on the records read by the STEP scanner and written to
+    write_path as a byte copy with only the changed records rewritten and the
+    new ones appended (memory independent of the model size). IFC4/IFC4X3 only;
+    dry_run works, async_write does not apply.
+
+    `fields` optionally projects the response (e.g. ["success", "map_conversion"])
+    before it is sent back over the socket.
+
+    timings=True adds per-phase wall-clock ms ("timings": pyproj_transform,
+    select_context, apply_plan, create_entity, remove, write, ...);
+    profile="cprofile"|"tracemalloc" captures this one call in "profile".
     """
-    import math
     from bonsai.bim.ifc import IfcStore
-    file = IfcStore.get_file()
-    if file is None:
-        return {"success": False, "error": "No IFC file is currently loaded"}
-
-    warnings = []
-    actions = {"created_crs": False, "created_map_conversion": False,
-            "updated_map_conversion": False, "updated_site": False,
-            "overwrote": False, "wrote_file": False}
-    debug = {}
-
-    # ---------- helpers ----------
-    def dd_to_ifc_dms(dd: float):
-        """Converts decimal degrees to [deg, min, sec, millionth] (sign carried by degrees)."""
-        if dd is None:
-            return None
-        sign = -1 if dd < 0 else 1
-        v = abs(dd)
-        deg = int(v)
-        rem = (v - deg) * 60
-        minutes = int(rem)
-        sec_float = (rem - minutes) * 60
-        seconds = int(sec_float)
-        millionth = int(round((sec_float - seconds) * 1_000_000))
-        # Normalizes rounding (e.g. 59.999999 → 60)
-        if millionth == 1_000_000:
-            seconds += 1
-            millionth = 0
-        if seconds == 60:
-            minutes += 1
-            seconds = 0
-        if minutes == 60:
-            deg += 1
-            minutes = 0
-        return [sign * deg, minutes, seconds, millionth]
-
-    def select_context():
-        ctxs = file.by_type("IfcGeometricRepresentationContext") or []
-        if not ctxs:
-            return None, "No IfcGeometricRepresentationContext found"
-        if context_index is not None and 0 <= context_index < len(ctxs):
-            return ctxs[context_index], None
-        # By filter (default "Model", case-insensitive)
-        if context_filter:
-            for c in ctxs:
-                if (getattr(c, "ContextType", None) or "").lower() == context_filter.lower():
-                    return c, None
-        # Fallback to the first one
-        return ctxs[0], None
-
-    # ---------- 1) CRS Validation ----------
-    if crs_mode not in ("epsg", "custom"):
-        return {"success": False, "error": "crs_mode must be 'epsg' or 'custom'"}
-
-    if crs_mode == "epsg":
-        if not epsg:
-            return {"success": False, "error": "epsg code required when crs_mode='epsg'"}
-        crs_name_final = f"EPSG:{epsg}"
-        geodetic_datum = geodetic_datum or "WGS84"
-        map_projection = map_projection or "TransverseMercator"  # usual UTM
-        # map_zone is optional
-    else:
-        # custom
-        missing = [k for k in ("crs_name", "geodetic_datum", "map_projection") if locals().get(k) in (None, "")]
-        if missing:
-            return {"success": False, "error": f"Missing fields for custom CRS: {', '.join(missing)}"}
-        crs_name_final = crs_name
-
-    # ---------- 2) Complete E/N from Lat/Long (if missing and pyproj is available) ----------
-    proj_used = None
-    try:
-        if (eastings is None or northings is None) and (site_ref_latitude_dd is not None and site_ref_longitude_dd is not None) and crs_mode == "epsg":
-            try:
-                from pyproj import Transformer
-                # Assume lat/long in WGS84; if the EPSG is not WGS84-derived, pyproj handles the conversion
-                transformer = Transformer.from_crs("EPSG:4326", f"EPSG:{epsg}", always_xy=True)
-                e, n = transformer.transform(site_ref_longitude_dd, site_ref_latitude_dd)
-                eastings = e if eastings is None else eastings
-                northings = n if northings is None else northings
-                proj_used = f"EPSG:4326->EPSG:{epsg}"
-            except Exception as _e:
-                warnings.append(f"Could not convert Lat/Long to E/N: {_e}. Provide eastings/northings manually.")
-    except Exception as _e:
-        warnings.append(f"pyproj not available to compute E/N: {_e}. Provide eastings/northings manually.")
-
-    # ---------- E/N Validation ----------
-    if eastings is None or northings is None:
-        return {"success": False, "error": "eastings and northings are required (or provide lat/long + EPSG with pyproj installed)"}
-
-    # ---------- 3) Select context ----------
-    context, ctx_err = select_context()
-    if not context:
-        return {"success": False, "error": ctx_err or "No context found"}
-
-    # ---------- 4) Detect existing ones and handle overwrite ----------
-    # Inverse: context.HasCoordinateOperation is already handled by ifcopenshell as an attribute
-    existing_ops = list(getattr(context, "HasCoordinateOperation", []) or [])
-    existing_map = None
-    existing_crs = None
-    for op in existing_ops:
-        if op.is_a("IfcMapConversion"):
-            existing_map = op
-            existing_crs = getattr(op, "TargetCRS", None)
-            break
-
-    if existing_map and not overwrite:
-        return {
-            "success": True,
-            "georeferenced": True,
-            "message": "MapConversion already exists. Use overwrite=True to replace it.",
-            "context_used": {"identifier": getattr(context, "ContextIdentifier", None), "type": getattr(context, "ContextType", None)},
-            "map_conversion": {
-                "eastings": getattr(existing_map, "Eastings", None),
-                "northings": getattr(existing_map, "Northings", None),
-                "orthogonal_height": getattr(existing_map, "OrthogonalHeight", None),
-                "scale": getattr(existing_map, "Scale", None),
-                "x_axis_abscissa": getattr(existing_map, "XAxisAbscissa", None),
-                "x_axis_ordinate": getattr(existing_map, "XAxisOrdinate", None),
-            },
-            "crs": {
-                "name": getattr(existing_crs, "Name", None) if existing_crs else None,
-                "geodetic_datum": getattr(existing_crs, "GeodeticDatum", None) if existing_crs else None,
-                "map_projection": getattr(existing_crs, "MapProjection", None) if existing_crs else None,
-                "map_zone": getattr(existing_crs, "MapZone", None) if existing_crs else None,
-            },
-            "warnings": warnings,
-            "actions": actions,
-        }
-
-    # ---------- 5) Build/Update CRS ----------
-    if existing_crs and overwrite:
-        actions["overwrote"] = True
-        try:
-            file.remove(existing_crs)
-        except Exception:
-            warnings.append("Could not remove the existing CRS; a new one will be created anyway.")
-
-    # If custom, use the provided values; if EPSG, build the name and defaults
-    crs_kwargs = {
-        "Name": crs_name_final,
-        "GeodeticDatum": geodetic_datum,
-        "MapProjection": map_projection,
-    }
-    if map_zone:
-        crs_kwargs["MapZone"] = map_zone
-
-    crs_entity = file.create_entity("IfcProjectedCRS", **crs_kwargs)
-    actions["created_crs"] = True
-
-    # ---------- 6) Calculate orientation (optional) ----------
-    # If true_north_azimuth_deg is given as the azimuth from North (model +Y axis) towards East (clockwise),
-    # We can derive an approximate X vector: X = (cos(az+90°), sin(az+90°)).
-    if (x_axis_abscissa is None or x_axis_ordinate is None) and (true_north_azimuth_deg is not None):
-        az = math.radians(true_north_azimuth_deg)
-        # Estimated X vector rotated 90° from North:
-        x_axis_abscissa = math.cos(az + math.pi / 2.0)
-        x_axis_ordinate = math.sin(az + math.pi / 2.0)
-
-    # Defaults if still missing
-    x_axis_abscissa = 1.0 if x_axis_abscissa is None else float(x_axis_abscissa)
-    x_axis_ordinate = 0.0 if x_axis_ordinate is None else float(x_axis_ordinate)
-    scale = 1.0 if scale is None else float(scale)
-    orthogonal_height = 0.0 if orthogonal_height is None else float(orthogonal_height)
-
-    # ---------- 7) Build/Update IfcMapConversion ----------
-    if existing_map and overwrite:
-        try:
-            file.remove(existing_map)
-        except Exception:
-            warnings.append("Could not remove the existing MapConversion; another one will be created anyway.")
-
-    map_kwargs = {
-        "SourceCRS": context,
-        "TargetCRS": crs_entity,
-        "Eastings": float(eastings),
-        "Northings": float(northings),
-        "OrthogonalHeight": float(orthogonal_height),
-        "XAxisAbscissa": float(x_axis_abscissa),
-        "XAxisOrdinate": float(x_axis_ordinate),
-        "Scale": float(scale),
-    }
-    map_entity = file.create_entity("IfcMapConversion", **map_kwargs)
-    actions["created_map_conversion"] = True
-
-    # ---------- 8) (Optional) Update IfcSite ----------
-    try:
-        sites = file.by_type("IfcSite") or []
-        if sites:
-            site = sites[0]
-            # If no IFC lists are provided but decimal degrees are, convert them
-            if site_ref_latitude is None and site_ref_latitude_dd is not None:
-                site_ref_latitude = dd_to_ifc_dms(site_ref_latitude_dd)
-            if site_ref_longitude is None and site_ref_longitude_dd is not None:
-                site_ref_longitude = dd_to_ifc_dms(site_ref_longitude_dd)
-
-            changed = False
-            if site_ref_latitude is not None:
-                site.RefLatitude = site_ref_latitude
-                changed = True
-            if site_ref_longitude is not None:
-                site.RefLongitude = site_ref_longitude
-                changed = True
-            if site_ref_elevation is not None:
-                site.RefElevation = float(site_ref_elevation)
-                changed = True
-            if changed:
-                actions["updated_site"] = True
-        else:
-            warnings.append("No IfcSite found; lat/long/elevation were not updated.")
-    except Exception as e:
-        warnings.append(f"Could not update IfcSite: {e}")
-
-    # ---------- 9) (Optional) Save ----------
-    if write_path and not dry_run:
-        try:
-            file.write(write_path)
-            actions["wrote_file"] = True
-        except Exception as e:
-            warnings.append(f"Could not write IFC to'{write_path}': {e}")
-
-    # ---------- 10) Response ----------
-    return {
-        "success": True,
-        "georeferenced": True,
-        "crs": {
-            "name": getattr(crs_entity, "Name", None),
-            "geodetic_datum": getattr(crs_entity, "GeodeticDatum", None),
-            "map_projection": getattr(crs_entity, "MapProjection", None),
-            "map_zone": getattr(crs_entity, "MapZone", None),
-        },
-        "map_conversion": {
-            "eastings": float(eastings),
-            "northings": float(northings),
-            "orthogonal_height": float(orthogonal_height),
-            "scale": float(scale),
-            "x_axis_abscissa": float(x_axis_abscissa),
-            "x_axis_ordinate": float(x_axis_ordinate),
-        },
-        "context_used": {
-            "identifier": getattr(context, "ContextIdentifier", None),
-            "type": getattr(context, "ContextType", None),
-        },
-        "site": {
-            "ref_latitude": site_ref_latitude,
-            "ref_longitude": site_ref_longitude,
-            "ref_elevation": site_ref_elevation,
-        },
-        "proj_used": proj_used,
-        "warnings": warnings,
-        "actions": actions,
-    }
+    # Shared with the headless workers (georef_core); `path` works on a hot-loaded file on disk
+    return georef_core.georeference_command(
+        IfcStore.get_file,
+        path=path,
+        fields=fields,
+        timings=timings,
+        profile=profile,
+        stream=stream,
+        crs_mode=crs_mode,
+        epsg=epsg,
+        crs_name=crs_name,
+        geodetic_datum=geodetic_datum,
+        map_projection=map_projection,
+        map_zone=map_zone,
+        eastings=eastings,
+        northings=northings,
+        orthogonal_height=orthogonal_height,
+        scale=scale,
+        x_axis_abscissa=x_axis_abscissa,
+        x_axis_ordinate=x_axis_ordinate,
+        true_north_azimuth_deg=true_north_azimuth_deg,
+        context_filter=context_filter,
+        context_index=context_index,
+        site_ref_latitude=site_ref_latitude,
+        site_ref_longitude=site_ref_longitude,
+        site_ref_elevation=site_ref_elevation,
+        site_ref_latitude_dd=site_ref_latitude_dd,
+        site_ref_longitude_dd=site_ref_longitude_dd,
+        site_global_id=site_global_id,
+        sites=sites,
+        all_contexts=all_contexts,
+        overwrite=overwrite,
+        ellipsoidal_height=ellipsoidal_height,
+        geoid_grid=geoid_grid,
+        update_mode=update_mode,
+        gc=gc,
+        dry_run=dry_run,
+        write_path=write_path,
+        async_write=async_write,
+    )
 
 #---------------------------------------------------------------------------------------------------
 # TO INCLUDE IN tools.py
@@ -330,12 +214,13 @@ def georeference_ifc_model(
 """
 Note:
     This code snippet must be included within the IFC tools block 
-    of the `tool.py` file.
+    of the `tool.py` file. It uses the `import georef_core` line from
+    get_ifc_georeferencing_info.py.
 """
 #---------------------------------------------------------------------------------------------------
 
 @mcp.tool()
-def georeference_ifc_model(
+async def georeference_ifc_model(
     crs_mode: str,
     epsg: int = None,
     crs_name: str = None,
@@ -356,17 +241,72 @@ def georeference_ifc_model(
     site_ref_elevation: float = None,
     site_ref_latitude_dd: float = None,  # Decimal degrees (optional)
     site_ref_longitude_dd: float = None, # Decimal degrees (optional)
+    site_global_id: str = None,
+    sites: dict = None,
+    all_contexts: bool = False,
     overwrite: bool = False,
+    ellipsoidal_height: float = None,
+    geoid_grid: str = None,
+    update_mode: str = "replace",
+    gc: bool = False,
     dry_run: bool = False,
     write_path: str = None,
+    async_write: bool = False,
+    path: str = None,
+    stream: bool = False,
+    format: str = "pretty",
+    fields: list = None,
+    timings: bool = False,
+    profile: str = None,
+    timeout: float = None,
 ) -> str:
     """
     Georeferences the IFC currently opened in Bonsai/BlenderBIM by creating or 
     updating IfcProjectedCRS and IfcMapConversion. Optionally updates IfcSite 
     and writes the file to disk.
+
+    For federated models, `site_global_id` picks the site that receives the
+    site_ref_* values, `sites` ({GlobalId: {"ref_latitude_dd", "ref_longitude_dd",
+    "ref_elevation", ...}}) sets several sites at once, and all_contexts=True
+    georeferences every top-level representation context with one shared CRS.
+
+    update_mode="incremental" edits the existing MapConversion/CRS in place,
+    changing only the attributes that differ (listed in `changes`), instead of
+    replacing them (update_mode="replace" with overwrite=True); identical CRS
+    are reused in both modes. gc=True also removes orphaned IfcProjectedCRS and
+    MapConversions without a CRS (listed in `removed`).
+
+    If the known height is a GNSS ellipsoidal height, pass it as
+    ellipsoidal_height with geoid_grid (e.g. "egm08_25.gtx") instead of
+    orthogonal_height: the geoid undulation is interpolated offline and
+    OrthogonalHeight = h − N.
+
+    With dry_run=True nothing is changed: the response lists the planned edits
+    in `plan` and returns a `plan_id` for `apply_georeference_plan`.
+
+    With async_write=True the file is written in the background (atomic
+    rename when complete) and `write_job.job_id` can be polled or cancelled
+    with `get_georeference_job_status`.
+
+    `format` selects "pretty" (default), "compact" or "binary" (base64 zlib
+    frame) output, and `fields` limits the response to the given keys
+    (e.g. ["success", "map_conversion", "warnings"]), filtered in the add-on.
+
+    With `path`, the IFC file on disk is georeferenced instead of the opened
+    model, in a headless ifcopenshell worker of the MCP server (Blender is not
+    needed). The worker keeps the file loaded for later calls on the same path;
+    pass write_path (which may equal path) to save the result.
+
+    stream=True (with path and write_path) never loads the model: the file is
+    copied with only the georeferencing records changed, so very large IFC
+    files are georeferenced in about the time of a file copy (IFC4/IFC4X3).
+
+    timings=True adds per-phase timings ("timings"); profile="cprofile" or
+    "tracemalloc" returns a one-call profile ("profile").
+
+    `timeout` bounds the wait in seconds (default georef_core.COMMAND_TIMEOUT_S);
+    a call that already reached Blender still completes there.
     """
-    import json
-    blender = get_blender_connection()
 
     # Build params excluding None values to keep the payload clean
     params = {
@@ -390,19 +330,31 @@ def georeference_ifc_model(
         "site_ref_elevation": site_ref_elevation,
         "site_ref_latitude_dd": site_ref_latitude_dd,
         "site_ref_longitude_dd": site_ref_longitude_dd,
+        "site_global_id": site_global_id,
+        "sites": sites,
+        "all_contexts": all_contexts,
         "overwrite": overwrite,
+        "ellipsoidal_height": ellipsoidal_height,
+        "geoid_grid": geoid_grid,
+        "update_mode": update_mode,
+        "gc": gc,
         "dry_run": dry_run,
         "write_path": write_path,
+        "async_write": async_write,
+        "path": path,
+        "stream": stream or None,
+        "fields": list(fields) if fields else None,
+        "timings": timings or None,
+        "profile": profile,
     }
     params = {k: v for k, v in params.items() if v is not None}
 
     try:
-        result = blender.send_command("georeference_ifc_model", params)
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        result = await send_georef_command_async("georeference_ifc_model", params, timeout)
+        return georef_core.encode_response(result, format)
     except Exception as e:
         logger.exception("georeference_ifc_model error")
-        return json.dumps(
+        return georef_core.encode_response(
             {"success": False, "error": "Could not georeference the model.", "details": str(e)},
-            ensure_ascii=False,
-            indent=2,
+            format,
         )
\ No newline at end of file
@@ -0,0 +1,186 @@
+"""
+IMPORTANT:
+
+    This file contains code snippets that must be included in the
+    addon.py and tools.py files. On their own, they do not provide
+    any functionality.
+
+    Requires `georef_core.py` (in this folder) next to addon.py and tools.py,
+    and the `import georef_core` lines and `send_georef_command_async` helper from
+    get_ifc_georeferencing_info.py. Geoid grids (.gtx) go in a `geoid` folder
+    next to georef_core.py (or BONSAI_MCP_GEOID_DIR).
+"""
+
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This key-value pair must be included in the `handlers` dictionary
+    inside the `_execute_command_internal` definition.
+"""
+#---------------------------------------------------------------------------------------------------
+
+"get_geoid_heights": self.get_geoid_heights,
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This definition must be added inside the `BlenderMCPServer` class,
+    along with the other existing definitions.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@staticmethod
+def get_geoid_heights(
+    grid: str,
+    points: list = None,
+    points_b64: str = None,
+    points_path: str = None,
+    dims: int = 3,
+    source: str = "wgs84",
+    map_crs: str = None,
+    heights: str = "ellipsoidal",
+    output_format: str = "json",
+    path: str = None,
+    fields: list = None,
+    timings: bool = False,
+    profile: str = None,
+):
+    """
+    Usage:
+    Interpolates a geoid / height-offset grid (GTX, memory-mapped and kept
+    open between calls) at any number of points in one vectorized pass, and
+    converts their heights between ellipsoidal (GNSS) and orthometric.
+
+    Args:
+        grid (str): GTX file name in georef_core.GEOID_GRID_DIR, or a path.
+        points (list): [[lon, lat(, h)], ...] or [[E, N(, h)], ...] with source="map".
+        points_b64 / points_path: Packed little-endian float64 points (base64 or raw file), `dims` per point.
+        dims (int): Coordinates per point for the packed inputs (2 or 3).
+        source (str): "wgs84" (lon/lat) or "map" (projected, converted with map_crs).
+        map_crs (str): CRS of map points. Default: the TargetCRS of the model.
+        heights (str): Kind of the input heights: "ellipsoidal" (returns H = h − N)
+            or "orthometric" (returns h = H + N).
+        output_format (str): "json" or "binary" (base64 float64 [N(, height)] rows).
+        path (str): IFC file on disk whose TargetCRS is used instead of the opened model's.
+        fields (list): Optional keys to keep in the response.
+        timings (bool): Adds per-phase timings (geoid_open, geoid_interpolate, ...).
+        profile (str): "cprofile" or "tracemalloc" to capture this one call.
+
+    Returns:
+        dict: {"success", "count", "grid", "columns", "values" | "values_b64",
+               "converted_heights", "outside", "warnings"}
+    """
+    from bonsai.bim.ifc import IfcStore
+    return georef_core.geoid_command(
+        IfcStore.get_file,
+        grid,
+        map_crs=map_crs,
+        path=path,
+        fields=fields,
+        timings=timings,
+        profile=profile,
+        points=points,
+        points_b64=points_b64,
+        points_path=points_path,
+        dims=dims,
+        source=source,
+        heights=heights,
+        output_format=output_format,
+    )
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN tools.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This code snippet must be included within the IFC tools block
+    of the `tool.py` file. It uses `send_georef_command_async` from
+    get_ifc_georeferencing_info.py.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@mcp.tool()
+async def get_geoid_heights(
+    grid: str,
+    points: list = None,
+    points_b64: str = None,
+    points_path: str = None,
+    dims: int = 3,
+    source: str = "wgs84",
+    map_crs: str = None,
+    heights: str = "ellipsoidal",
+    output_format: str = "json",
+    path: str = None,
+    format: str = "pretty",
+    fields: list = None,
+    timings: bool = False,
+    profile: str = None,
+    timeout: float = None,
+) -> str:
+    """
+    Returns the geoid undulation N at the given points from an offline grid
+    file, and converts GNSS ellipsoidal heights to heights above sea level
+    (H = h − N), or back. Use it to check OrthogonalHeight / RefElevation
+    values, or on survey points before fit_ifc_georeference.
+
+    Parameters
+    ----------
+    grid : str
+        GTX grid file name (in the add-on's geoid folder) or full path.
+    points : list, optional
+        [[lon, lat, h], ...] (source="wgs84") or [[E, N, h], ...] (source="map").
+        Without a height only N is returned.
+    points_b64 / points_path / dims :
+        Packed float64 alternatives for large point sets.
+    source : str
+        "wgs84" or "map" (map_crs, default: the model's TargetCRS).
+    heights : str
+        "ellipsoidal" if the given heights are GNSS heights, "orthometric" otherwise.
+    output_format : str
+        "json" or "binary" (base64 float64).
+    path : str, optional
+        IFC file on disk (headless worker, no Blender) providing the TargetCRS.
+    format / fields :
+        Response encoding ("pretty", "compact", "binary") and key projection.
+    timings / profile :
+        Per-phase timings, or a cProfile/tracemalloc capture of the call.
+    timeout : float, optional
+        Seconds to wait for the answer (default georef_core.COMMAND_TIMEOUT_S).
+
+    Returns
+    -------
+    str (JSON)
+        {"success", "columns": ["undulation", "orthometric"|"ellipsoidal"],
+         "values": [[N, H], ...], "outside", "grid", "warnings"}
+    """
+    params = {
+        "grid": grid,
+        "points": [list(p) for p in points] if points else None,
+        "points_b64": points_b64,
+        "points_path": points_path,
+        "dims": dims,
+        "source": source,
+        "map_crs": map_crs,
+        "heights": heights,
+        "output_format": output_format,
+        "path": path,
+        "fields": list(fields) if fields else None,
+        "timings": timings or None,
+        "profile": profile,
+    }
+    params = {k: v for k, v in params.items() if v is not None}
+
+    try:
+        result = await send_georef_command_async("get_geoid_heights", params, timeout)
+        return georef_core.encode_response(result, format)
+    except Exception as e:
+        logger.exception("get_geoid_heights error")
+        return georef_core.encode_response(
+            {"success": False, "error": "Could not interpolate the geoid grid.", "details": str(e)},
+            format,
+        )
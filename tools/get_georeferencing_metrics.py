@@ -0,0 +1,112 @@
+"""
+IMPORTANT:
+
+    This file contains code snippets that must be included in the
+    addon.py and tools.py files. On their own, they do not provide
+    any functionality.
+
+    Requires `georef_core.py` (in this folder) next to addon.py, and the
+    `import georef_core` line from georeference_ifc_model.py.
+"""
+
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This key-value pair must be included in the `handlers` dictionary
+    inside the `_execute_command_internal` definition.
+"""
+#---------------------------------------------------------------------------------------------------
+
+"get_georeferencing_metrics": self.get_georeferencing_metrics,
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This definition must be added inside the `BlenderMCPServer` class,
+    along with the other existing definitions.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@staticmethod
+def get_georeferencing_metrics(command: str = None, reset: bool = False):
+    """
+    Usage:
+    Returns the metrics collected since Blender started for the georeferencing
+    commands (get_ifc_georeferencing_info, georeference_ifc_model,
+    transform_ifc_coordinates, apply_georeference_plan, georeference_ifc_batch,
+    run_georeferencing_pipeline, get_ifc_model_extent, export_ifc_geojson,
+    fit_ifc_georeference, get_geoid_heights, index_ifc_portfolio,
+    query_ifc_portfolio, find_ifc_elements_by_location, export_ifc_mesh).
+
+    Args:
+        command (str): Only this command. Default: all of them.
+        reset (bool): Clear the returned counters after reading them.
+
+    Returns:
+        dict: {
+            "uptime_s": float,
+            "commands": {name: {"calls", "errors", "mean_ms", "min_ms", "max_ms", "last_ms",
+                                "p50_le_ms", "p95_le_ms", "histogram": [[upper_ms|"inf", count], ...]}},
+            "counters": {"transformer_cache", "info_cache_entries", "placement_cache_entries",
+                         "spatial_index_entries", "snapshot", "stored_plans", "jobs"}
+        }
+    """
+    try:
+        return georef_core.georeferencing_metrics(command, reset)
+    except Exception as e:
+        import traceback
+        return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN tools.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This code snippet must be included within the IFC tools block
+    of the `tool.py` file. It uses `send_georef_command_async` from
+    get_ifc_georeferencing_info.py.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@mcp.tool()
+async def get_georeferencing_metrics(command: str = None, reset: bool = False, timeout: float = None) -> str:
+    """
+    Returns call counts, error counts and latency histograms of the
+    georeferencing commands since the add-on started, plus the state of the
+    shared caches (pyproj transformers, georeferencing info, dry-run plans)
+    and background jobs.
+
+    Parameters
+    ----------
+    command : str, optional
+        Restrict the report to one command, e.g. "georeference_ifc_model".
+    reset : bool
+        Clear the reported counters after reading them.
+    timeout : float, optional
+        Seconds to wait for the answer (default georef_core.COMMAND_TIMEOUT_S).
+
+    Returns
+    -------
+    str (JSON)
+        {"uptime_s", "commands": {name: {"calls", "errors", "mean_ms", "p50_le_ms",
+        "p95_le_ms", "histogram", ...}}, "counters": {...}}
+    """
+    params = {"reset": bool(reset)}
+    if command:
+        params["command"] = command
+
+    try:
+        result = await send_georef_command_async("get_georeferencing_metrics", params, timeout)
+        return json.dumps(result, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.exception("get_georeferencing_metrics error")
+        return json.dumps(
+            {"success": False, "error": "Could not read the georeferencing metrics.", "details": str(e)},
+            ensure_ascii=False,
+            indent=2,
+        )
@@ -7,6 +7,18 @@ IMPORTANT:
 """
 
 
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This import must be added at the top of addon.py (once for all the
+    georeferencing tools). `georef_core.py` must be copied next to addon.py.
+"""
+#---------------------------------------------------------------------------------------------------
+
+import georef_core
+
 #---------------------------------------------------------------------------------------------------
 # TO INCLUDE IN addon.py
 #---------------------------------------------------------------------------------------------------
@@ -20,6 +32,54 @@ Note:
 get_ifc_georeferencing_info": self.get_ifc_georeferencing_info,
 
 
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    These lines let the add-on answer read-only georeferencing queries
+    (georef_core.SNAPSHOT_COMMANDS: get_ifc_georeferencing_info and
+    transform_ifc_coordinates) on its socket thread, from an immutable
+    snapshot of the georeferencing data, instead of queueing them behind the
+    commands running on Blender's main thread. Only the main thread reads the
+    model: it captures a new snapshot after each command and, for edits made
+    in the Bonsai UI, every georef_core.SNAPSHOT_REFRESH_S seconds.
+
+    1. In `_handle_client` (socket thread), once a command has been parsed and
+       before `execute_wrapper` is registered with bpy.app.timers.
+    2. In `execute_wrapper` (main thread), right after
+       `response = self.execute_command(command)`, before the reply is sent,
+       so a client always reads its own edits. Other commands may edit the
+       model outside a transaction, so after them the cached info is dropped
+       and the snapshot is captured again unconditionally.
+    3. In `start()`, after the server socket is created; and in `stop()`.
+"""
+#---------------------------------------------------------------------------------------------------
+
+# 1. _handle_client
+try:
+    result = georef_core.SNAPSHOTS.serve(command.get("type"), command.get("params", {}))
+except Exception:
+    result = None  # Never drop the client; the main thread answers instead
+if result is not None:
+    client.sendall(json.dumps({"status": "success", "result": result}).encode("utf-8"))
+    continue
+
+# 2. execute_wrapper
+try:
+    georef_core.SNAPSHOTS.after_command(IfcStore.get_file(), command.get("type"))
+except Exception:
+    georef_core.SNAPSHOTS.clear()  # Reads fall back to the main thread
+
+# 3. start()
+self._georef_snapshot_timer = georef_core.SNAPSHOTS.timer(IfcStore.get_file)
+bpy.app.timers.register(self._georef_snapshot_timer, first_interval=0.0, persistent=True)
+
+# 3. stop()
+if bpy.app.timers.is_registered(self._georef_snapshot_timer):
+    bpy.app.timers.unregister(self._georef_snapshot_timer)
+georef_core.SNAPSHOTS.clear()
+
 #---------------------------------------------------------------------------------------------------
 # TO INCLUDE IN addon.py
 #---------------------------------------------------------------------------------------------------
@@ -31,12 +91,32 @@ Note:
 #---------------------------------------------------------------------------------------------------
 
 @staticmethod
-def get_ifc_georeferencing_info(include_contexts: bool = False):
+def get_ifc_georeferencing_info(
+    include_contexts: bool = False,
+    path: str = None,
+    fields: list = None,
+    timings: bool = False,
+    profile: str = None,
+    snapshot: bool = True,
+):
     """
     Retrieves georeferencing information from the currently opened IFC file (CRS, MapConversion, WCS, TrueNorth, IfcSite).
+    Every project, representation context (sub-contexts included) and site is read in one
+    pass; the top-level keys keep describing the first project and the first site.
 
     Args:
         include_contexts (bool): If True, adds the breakdown of RepresentationContexts and operations
+        path (str): Optional IFC file on disk. When given, the file is memory-mapped and only the
+            georeferencing records (and the placements/points they reference) are parsed,
+            instead of reading the model loaded in Bonsai. Requires `georef_core.py`.
+        fields (list): Optional projection, e.g. ["georeferenced", "map_conversion", "crs.name"].
+            Applied here, before the response is serialized and sent over the socket.
+        timings (bool): Adds "timings" with the wall-clock ms of each phase
+            (cache_lookup, by_type, extract, scan).
+        profile (str): "cprofile" or "tracemalloc" to capture this one call in "profile".
+        snapshot (bool): Only read by georef_core.SNAPSHOTS.serve on the socket thread,
+            which answers from the snapshot unless it is False; this main-thread
+            handler always reads the live model.
 
     Returns:
         dict: Structure with:
@@ -64,178 +144,101 @@ def get_ifc_georeferencing_info(include_contexts: bool = False):
             "ref_longitude": [deg,min,sec,millionth]|None,
             "ref_elevation": float|None
         },
-        "contexts": [...],     # only if include_contexts=True
-        "warnings": [...]
+        "projects": {GlobalId: {"name", "georeferenced", "crs", "map_conversion",
+                                "world_coordinate_system", "true_north", "contexts": ["#id", ...]}},
+        "sites": {GlobalId: {"name", "project", "parent_site", "local_placement_origin",
+                             "ref_latitude", "ref_longitude", "ref_elevation"}},
+        "contexts": [...],     # only if include_contexts=True (with "id", "project", "parent_context")
+        "warnings": [...],
+        "from_cache": bool,    # loaded model only: served from the per-file cache
+        "snapshot": {...}      # only when answered from the snapshot: seq, captured_at, age_ms
         }
     """
     try:
-                    
-        file = IfcStore.get_file()
-        debug = {"entered": True, "has_ifc": file is not None, "projects": 0, "sites": 0, "contexts": 0}
-        if file is None:
-            return {"error": "No IFC file is currently loaded", "debug": debug}
-
-        warnings = []
-        result = {
-            "georeferenced": False,
-            "crs": {
-                "name": None,
-                "geodetic_datum": None,
-                "vertical_datum": None,
-                "map_unit": None
-            },
-            "map_conversion": {
-                "eastings": None,
-                "northings": None,
-                "orthogonal_height": None,
-                "scale": None,
-                "x_axis_abscissa": None,
-                "x_axis_ordinate": None
-            },
-            "world_coordinate_system": {"origin": None},
-            "true_north": {"direction_ratios": None},
-            "site": {
-                "local_placement_origin": None,
-                "ref_latitude": None,
-                "ref_longitude": None,
-                "ref_elevation": None
-            },
-            "contexts": [],
-            "warnings": warnings,
-            "debug":debug,
-        }
-
-        # --- IfcProject & RepresentationContexts ---
-        projects = file.by_type("IfcProject")
-        debug["projects"] = len(projects)
-        if projects:
-            project = projects[0]
-            contexts = getattr(project, "RepresentationContexts", None) or []
-            debug["contexts"] = len(contexts)
-            for ctx in contexts:
-                ctx_entry = {
-                    "context_identifier": getattr(ctx, "ContextIdentifier", None),
-                    "context_type": getattr(ctx, "ContextType", None),
-                    "world_origin": None,
-                    "true_north": None,
-                    "has_coordinate_operation": []
-                }
-
-                # WorldCoordinateSystem → Local origin
-                try:
-                    wcs = getattr(ctx, "WorldCoordinateSystem", None)
-                    if wcs and getattr(wcs, "Location", None):
-                        loc = wcs.Location
-                        if getattr(loc, "Coordinates", None):
-                            coords = list(loc.Coordinates)
-                            result["world_coordinate_system"]["origin"] = coords
-                            ctx_entry["world_origin"] = coords
-                except Exception as e:
-                    warnings.append(f"WorldCoordinateSystem read error: {str(e)}")
-
-                # TrueNorth
-                try:
-                    if hasattr(ctx, "TrueNorth") and ctx.TrueNorth:
-                        tn = ctx.TrueNorth
-                        ratios = list(getattr(tn, "DirectionRatios", []) or [])
-                        result["true_north"]["direction_ratios"] = ratios
-                        ctx_entry["true_north"] = ratios
-                except Exception as e:
-                    warnings.append(f"TrueNorth read error: {str(e)}")
-
-                # HasCoordinateOperation → IfcMapConversion / TargetCRS
-                try:
-                    if hasattr(ctx, "HasCoordinateOperation") and ctx.HasCoordinateOperation:
-                        for op in ctx.HasCoordinateOperation:
-                            op_entry = {"type": op.is_a(), "target_crs": None, "map_conversion": None}
-
-                            # TargetCRS
-                            crs = getattr(op, "TargetCRS", None)
-                            if crs:
-                                result["crs"]["name"] = getattr(crs, "Name", None)
-                                result["crs"]["geodetic_datum"] = getattr(crs, "GeodeticDatum", None)
-                                result["crs"]["vertical_datum"] = getattr(crs, "VerticalDatum", None)
-                                try:
-                                    map_unit = getattr(crs, "MapUnit", None)
-                                    result["crs"]["map_unit"] = map_unit.Name if map_unit else None
-                                except Exception:
-                                    result["crs"]["map_unit"] = None
-
-                                op_entry["target_crs"] = {
-                                    "name": result["crs"]["name"],
-                                    "geodetic_datum": result["crs"]["geodetic_datum"],
-                                    "vertical_datum": result["crs"]["vertical_datum"],
-                                    "map_unit": result["crs"]["map_unit"]
-                                }
-
-                            # IfcMapConversion
-                            if op.is_a("IfcMapConversion"):
-                                mc = {
-                                    "eastings": getattr(op, "Eastings", None),
-                                    "northings": getattr(op, "Northings", None),
-                                    "orthogonal_height": getattr(op, "OrthogonalHeight", None),
-                                    "scale": getattr(op, "Scale", None),
-                                    "x_axis_abscissa": getattr(op, "XAxisAbscissa", None),
-                                    "x_axis_ordinate": getattr(op, "XAxisOrdinate", None)
-                                }
-                                result["map_conversion"].update(mc)
-                                op_entry["map_conversion"] = mc
-
-                            ctx_entry["has_coordinate_operation"].append(op_entry)
-                except Exception as e:
-                    warnings.append(f"HasCoordinateOperation read error: {str(e)}")
-
-                if include_contexts:
-                    result["contexts"].append(ctx_entry)
-        else:
-            warnings.append("IfcProject entity was not found.")
-
-        # --- IfcSite (lat/long/alt local origin of placement) ---
-        try:
-            sites = file.by_type("IfcSite")
-            debug["sites"] = len(sites)
-            if sites:
-                site = sites[0]
-                # LocalPlacement
-                try:
-                    if getattr(site, "ObjectPlacement", None):
-                        placement = site.ObjectPlacement
-                        axisPlacement = getattr(placement, "RelativePlacement", None)
-                        if axisPlacement and getattr(axisPlacement, "Location", None):
-                            loc = axisPlacement.Location
-                            if getattr(loc, "Coordinates", None):
-                                result["site"]["local_placement_origin"] = list(loc.Coordinates)
-                except Exception as e:
-                    warnings.append(f"IfcSite.ObjectPlacement read error: {str(e)}")
-
-                # Lat/Long/Alt
-                try:
-                    lat = getattr(site, "RefLatitude", None)
-                    lon = getattr(site, "RefLongitude", None)
-                    ele = getattr(site, "RefElevation", None)
-                    result["site"]["ref_latitude"]  = list(lat) if lat else None
-                    result["site"]["ref_longitude"] = list(lon) if lon else None
-                    result["site"]["ref_elevation"] = ele
-                except Exception as e:
-                    warnings.append(f"IfcSite (lat/long/elev) read error: {str(e)}")
-            else:
-                warnings.append("IfcSite was not found.")
-        except Exception as e:
-            warnings.append(f"Error while querying IfcSite: {str(e)}")
-
-        # --- Heuristic to determine georeferencing ---
-        geo_flags = [
-            any(result["crs"].values()),
-            any(v is not None for v in result["map_conversion"].values())          
-        ]
-        result["georeferenced"] = all(geo_flags)
-
-        return result
-
+        # Shared with the headless workers (georef_core); counted in georef_core.METRICS
+        return georef_core.georeferencing_info_command(
+            IfcStore.get_file,
+            include_contexts=include_contexts,
+            path=path,
+            fields=fields,
+            timings=timings,
+            profile=profile,
+        )
     except Exception as e:
         import traceback
         return {"error": str(e), "traceback": traceback.format_exc()}        
         
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN tools.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This import must be added at the top of tools.py (once for all the
+    georeferencing tools). `georef_core.py` must also be copied next to tools.py.
+    tools.py uses from it:
+      - encode_response / decode_response (response formats);
+      - ConnectionPool, AsyncCommandGate, BLENDER_HOST / BLENDER_PORT and
+        COMMAND_TIMEOUT_S (the Blender connection, see below);
+      - HEADLESS_COMMANDS, headless_available and headless_pool (commands
+        given a `path`).
+    Importing it needs only the standard library. headless_pool starts
+    ifcopenshell worker processes (multiprocessing "spawn"), so those commands
+    need ifcopenshell (plus numpy, and pyproj for CRS transforms) installed in
+    the MCP server's Python; without ifcopenshell, or with
+    BONSAI_MCP_HEADLESS=0, they are sent to Blender instead.
+"""
+#---------------------------------------------------------------------------------------------------
+
+import georef_core
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN tools.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This helper must be added to tools.py once, before the georeferencing tools.
+    Commands on a file on disk (`path`) run in a pool of headless ifcopenshell
+    worker processes when ifcopenshell is importable in the MCP server
+    (disable with BONSAI_MCP_HEADLESS=0); everything else goes to Blender over
+    a pool of persistent sockets (BLENDER_HOST / BLENDER_PORT,
+    BONSAI_MCP_CONNECTIONS), reused across tool calls.
+
+    The georeferencing tools are async and await `send_georef_command_async`:
+    the blocking call runs in a thread, at most BONSAI_MCP_MAX_CONCURRENT at
+    once towards Blender, each tool call waits at most its `timeout`
+    (BONSAI_MCP_COMMAND_TIMEOUT by default), and identical read-only calls in
+    flight (georef_core.COALESCED_COMMANDS) share a single add-on call.
+"""
+#---------------------------------------------------------------------------------------------------
+
+def _open_georef_connection():
+    connection = BlenderConnection(host=georef_core.BLENDER_HOST, port=georef_core.BLENDER_PORT)
+    if not connection.connect():
+        raise ConnectionError("Could not connect to Blender. Make sure the Blender addon is running.")
+    return connection
+
+
+_GEOREF_CONNECTIONS = georef_core.ConnectionPool(_open_georef_connection)
+
+
+def _runs_headless(command: str, params: dict) -> bool:
+    return bool(params.get("path")) and command in georef_core.HEADLESS_COMMANDS and georef_core.headless_available()
+
+
+def send_georef_command(command: str, params: dict, timeout: float = None):
+    if _runs_headless(command, params):
+        # A worker still busy after `timeout` is terminated, freeing its slot and this thread
+        return georef_core.headless_pool().execute(command, params, timeout)
+    return _GEOREF_CONNECTIONS.send(command, params)
+
+
+# Headless calls do not use a Blender connection, so they are not counted in the limit
+_GEOREF_GATE = georef_core.AsyncCommandGate(send_georef_command, unlimited=_runs_headless)
+
+
+async def send_georef_command_async(command: str, params: dict, timeout: float = None):
+    return await _GEOREF_GATE.call(command, params, timeout)
+
 #---------------------------------------------------------------------------------------------------
 # TO INCLUDE IN tools.py
 #---------------------------------------------------------------------------------------------------
@@ -247,20 +250,54 @@ Note:
 #---------------------------------------------------------------------------------------------------
 
 @mcp.tool()
-def get_ifc_georeferencing_info(include_contexts: bool = False) -> str:
+async def get_ifc_georeferencing_info(
+    include_contexts: bool = False,
+    path: str = None,
+    format: str = "pretty",
+    fields: list = None,
+    timings: bool = False,
+    profile: str = None,
+    snapshot: bool = True,
+    timeout: float = None,
+) -> str:
     """
     Checks whether the IFC currently opened in Bonsai/BlenderBIM is georeferenced
-    and returns the key georeferencing information.
+    and returns the key georeferencing information, for the first project/site
+    and for every project and site of federated models (keyed by GlobalId).
 
     Parameters
     ----------
     include_contexts : bool
         If True, adds a breakdown of the RepresentationContexts and operations.
-        
+    path : str, optional
+        IFC file on disk to inspect instead of the opened model. It is handled
+        by a headless ifcopenshell worker of the MCP server (no Blender round
+        trip): only the georeferencing records are read (memory-mapped scan),
+        unless the worker already holds the file from an earlier call.
+    format : str
+        "pretty" (indented JSON, default), "compact" (JSON without whitespace)
+        or "binary" (base64 zlib frame, see georef_core.decode_response).
+    fields : list, optional
+        Only return these keys, e.g. ["georeferenced", "map_conversion"] or
+        dotted paths like "crs.name". Filtering happens in the add-on.
+    timings : bool
+        Adds per-phase wall-clock timings ("timings") measured in the add-on.
+    profile : str, optional
+        "cprofile" (top functions) or "tracemalloc" (top allocation sites and
+        peak memory) for this one call, returned in "profile".
+    snapshot : bool
+        True (default): the add-on answers from its read-only snapshot of the
+        georeferencing data, without waiting for Blender's main thread (e.g.
+        during a long georeference_ifc_model write); the answer then has a
+        "snapshot" key with its age. Edits made in the Bonsai UI show up within
+        about half a second. False always reads the live model on the main thread.
+    timeout : float, optional
+        Seconds to wait for the answer (default georef_core.COMMAND_TIMEOUT_S).
+        Identical calls made while one is in flight share its answer.
 
     Returns
     --------
-    str (JSON pretty-printed)
+    str (JSON, pretty-printed unless another `format` is requested)
         {
           "georeferenced": true|false,
           "crs": {
@@ -289,8 +326,12 @@ def get_ifc_georeferencing_info(include_contexts: bool = False) -> str:
             "ref_longitude": [deg, min, sec, millionth]|null,
             "ref_elevation": float|null
           },
-          "contexts": [...],              # only if include_contexts = true
-          "warnings": [ ... ]             # Informational message
+          "projects": {GlobalId: {...}},  # every IfcProject (crs, map_conversion, context ids)
+          "sites": {GlobalId: {...}},     # every IfcSite (project, parent_site, ref lat/long/elev)
+          "contexts": [...],              # only if include_contexts = true (sub-contexts included)
+          "warnings": [ ... ],            # Informational message
+          "from_cache": true|false,       # repeated calls are memoized until the model changes
+          "snapshot": {"seq", "captured_at", "age_ms"}  # when answered from the snapshot
         }
 
     Notes
@@ -299,25 +340,34 @@ def get_ifc_georeferencing_info(include_contexts: bool = False) -> str:
       command to the Blender add-on. The add-on must implement that logic
       (reading IfcProject/IfcGeometricRepresentationContext, IfcMapConversion,
       TargetCRS, IfcSite.RefLatitude/RefLongitude/RefElevation, etc.).
-    - It always returns a JSON string with indentation for easier reading.
+    - By default it returns a JSON string with indentation for easier reading;
+      use format="compact" and `fields` to keep round-trips small.
     """
-    blender = get_blender_connection()
     params = {
         "include_contexts": bool(include_contexts)
     }
+    if path:
+        params["path"] = path
+    if fields:
+        params["fields"] = list(fields)
+    if timings:
+        params["timings"] = True
+    if profile:
+        params["profile"] = profile
+    if not snapshot and not path:
+        params["snapshot"] = False
 
     try:
-        result = blender.send_command("get_ifc_georeferencing_info", params)
-        # Ensures that the result is serializable and easy to read
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        result = await send_georef_command_async("get_ifc_georeferencing_info", params, timeout)
+        # Ensures that the result is serializable (pretty, compact or binary-framed)
+        return georef_core.encode_response(result, format)
     except Exception as e:
         logger.exception("get_ifc_georeferencing_info error")
-        return json.dumps(
+        return georef_core.encode_response(
             {
                 "georeferenced": False,
                 "error": "Unable to retrieve georeferencing information from the IFC model.",
                 "details": str(e)
             },
-            ensure_ascii=False,
-            indent=2
+            format
         )
\ No newline at end of file
@@ -0,0 +1,169 @@
+"""
+IMPORTANT:
+
+    This file contains code snippets that must be included in the
+    addon.py and tools.py files. On their own, they do not provide
+    any functionality.
+
+    Requires `georef_core.py` (in this folder) next to addon.py and tools.py,
+    and the `import georef_core` lines and `send_georef_command_async` helper from
+    get_ifc_georeferencing_info.py.
+"""
+
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This key-value pair must be included in the `handlers` dictionary
+    inside the `_execute_command_internal` definition.
+"""
+#---------------------------------------------------------------------------------------------------
+
+"get_ifc_model_extent": self.get_ifc_model_extent,
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This definition must be added inside the `BlenderMCPServer` class,
+    along with the other existing definitions.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@staticmethod
+def get_ifc_model_extent(
+    ifc_class: str = "IfcProduct",
+    map_conversion: dict = None,
+    map_crs: str = None,
+    include_hull: bool = True,
+    path: str = None,
+    fields: list = None,
+    timings: bool = False,
+    profile: str = None,
+):
+    """
+    Usage:
+    Computes the footprint of the model from the world placement of every
+    `ifc_class` instance: bounding box, centroid and convex hull in local
+    coordinates, in map coordinates (IfcMapConversion) and in WGS84 (TargetCRS).
+    Every IfcLocalPlacement chain is resolved once per model revision (shared
+    parents computed once, batched NumPy matrix products), so repeated calls
+    on an unchanged model only redo the product lookup.
+
+    Args:
+        ifc_class (str): Products to include, e.g. "IfcElement" or "IfcWall". Default: every IfcProduct.
+        map_conversion (dict): Optional explicit MapConversion (same keys as
+            get_ifc_georeferencing_info). By default it is read from the model.
+        map_crs (str): Projected CRS for the WGS84 step. Default: the TargetCRS name.
+        include_hull (bool): Add the convex hull ("hull") and its area ("hull_area").
+        path (str): IFC file on disk instead of the opened model (kept hot like georeference_ifc_model).
+        fields (list): Optional keys to keep in the response.
+        timings (bool): Adds per-phase timings (read_placements, read_axes, compose, collect, ...).
+        profile (str): "cprofile" or "tracemalloc" to capture this one call.
+
+    Returns:
+        dict: {
+            "success": bool, "ifc_class": str, "count": int, "placements": int,
+            "local": {"min", "max", "centroid", "hull", "hull_area"},
+            "map": {"min", "max", "centroid", "hull", "hull_area", "crs"},   # if georeferenced
+            "wgs84": {"min", "max", "centroid", "hull"},                     # [lon, lat]
+            "warnings": [...], "debug": {...}
+        }
+    """
+    try:
+        return georef_core.extent_command(
+            IfcStore.get_file,
+            ifc_class=ifc_class,
+            map_conversion=map_conversion,
+            map_crs=map_crs,
+            include_hull=include_hull,
+            path=path,
+            fields=fields,
+            timings=timings,
+            profile=profile,
+        )
+    except Exception as e:
+        import traceback
+        return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN tools.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This code snippet must be included within the IFC tools block
+    of the `tool.py` file. It uses `send_georef_command_async` from
+    get_ifc_georeferencing_info.py.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@mcp.tool()
+async def get_ifc_model_extent(
+    ifc_class: str = "IfcProduct",
+    map_conversion: dict = None,
+    map_crs: str = None,
+    include_hull: bool = True,
+    path: str = None,
+    format: str = "pretty",
+    fields: list = None,
+    timings: bool = False,
+    profile: str = None,
+    timeout: float = None,
+) -> str:
+    """
+    Returns the footprint of the IFC model in map coordinates and WGS84, to
+    check that the IfcMapConversion puts the model where it belongs.
+
+    The world position of every placed product is resolved through its
+    IfcLocalPlacement chain (placement origins, not representation geometry),
+    then transformed with the model's MapConversion and TargetCRS.
+
+    Parameters
+    ----------
+    ifc_class : str
+        Products to include ("IfcProduct" by default, e.g. "IfcElement", "IfcWall").
+    map_conversion : dict, optional
+        Explicit MapConversion to try before writing it to the model.
+    map_crs : str, optional
+        Projected CRS for WGS84 output (default: the model's TargetCRS).
+    include_hull : bool
+        Include the convex hull of the footprint and its area.
+    path : str, optional
+        IFC file on disk (headless worker, no Blender) instead of the opened model.
+    format / fields :
+        Response encoding ("pretty", "compact", "binary") and key projection.
+    timings / profile :
+        Per-phase timings, or a cProfile/tracemalloc capture of the call.
+    timeout : float, optional
+        Seconds to wait for the answer (default georef_core.COMMAND_TIMEOUT_S).
+
+    Returns
+    -------
+    str (JSON)
+        {"success", "count", "local", "map": {"min", "max", "centroid", "hull", "crs"},
+         "wgs84": {"min", "max", "centroid", "hull"}, "warnings"}
+    """
+    params = {
+        "ifc_class": ifc_class,
+        "map_conversion": map_conversion,
+        "map_crs": map_crs,
+        "include_hull": bool(include_hull),
+        "path": path,
+        "fields": list(fields) if fields else None,
+        "timings": timings or None,
+        "profile": profile,
+    }
+    params = {k: v for k, v in params.items() if v is not None}
+
+    try:
+        result = await send_georef_command_async("get_ifc_model_extent", params, timeout)
+        return georef_core.encode_response(result, format)
+    except Exception as e:
+        logger.exception("get_ifc_model_extent error")
+        return georef_core.encode_response(
+            {"success": False, "error": "Could not compute the model extent.", "details": str(e)},
+            format,
+        )
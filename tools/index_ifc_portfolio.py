@@ -0,0 +1,317 @@
+"""
+IMPORTANT:
+
+    This file contains code snippets that must be included in the
+    addon.py and tools.py files. On their own, they do not provide
+    any functionality.
+
+    Requires `georef_core.py` (in this folder) next to addon.py and tools.py,
+    and the `import georef_core` lines and `send_georef_command_async` helper from
+    get_ifc_georeferencing_info.py. The index is a SQLite file
+    (georef_portfolio.sqlite next to georef_core.py, or BONSAI_MCP_PORTFOLIO_DB).
+"""
+
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    These key-value pairs must be included in the `handlers` dictionary
+    inside the `_execute_command_internal` definition.
+"""
+#---------------------------------------------------------------------------------------------------
+
+"index_ifc_portfolio": self.index_ifc_portfolio,
+"query_ifc_portfolio": self.query_ifc_portfolio,
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    These definitions must be added inside the `BlenderMCPServer` class,
+    along with the other existing definitions.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@staticmethod
+def index_ifc_portfolio(
+    roots: list = None,
+    paths: list = None,
+    pattern: str = "*.ifc",
+    db_path: str = None,
+    extent: str = "placements",
+    prune: bool = True,
+    force: bool = False,
+    retry_errors: bool = False,
+    max_workers: int = None,
+):
+    """
+    Usage:
+    Indexes the georeferencing of every IFC file under a folder tree (not the
+    model opened in Blender) into a SQLite database with R-trees over the map
+    and WGS84 extents. Files are read in worker processes with the header-only
+    STEP scanner. Re-running it only reads the files whose size/mtime changed,
+    and re-scans only those whose content hash changed.
+
+    Args:
+        roots (list): Folders indexed recursively.
+        paths (list): Additional individual IFC files.
+        pattern (str): File name pattern, case-insensitive. Default: "*.ifc".
+        db_path (str): SQLite database. Default: georef_core.PORTFOLIO_DB_PATH.
+        extent (str): "placements" (bounding box of the placement origins; opens each
+            changed file with ifcopenshell) or "origin" (MapConversion origin / site
+            reference point only; scanner only, much faster).
+        prune (bool): Drop indexed files under `roots` that no longer exist.
+        force (bool): Re-scan every file, changed or not.
+        retry_errors (bool): Re-scan files that failed last time even if unchanged.
+        max_workers (int): Worker processes. Default: CPU count - 1.
+
+    Returns:
+        dict: {"success", "job_id", "files", "to_index", "unchanged", "stale", "workers", "db_path"}.
+        Poll the progress with `get_georeference_job_status(job_id, since)`.
+    """
+    try:
+        return georef_core.run_instrumented("index_ifc_portfolio", lambda: georef_core.start_portfolio_index(
+            roots=roots,
+            paths=paths,
+            pattern=pattern,
+            db_path=db_path,
+            extent=extent,
+            prune=prune,
+            force=force,
+            retry_errors=retry_errors,
+            max_workers=max_workers,
+        ))
+    except Exception as e:
+        import traceback
+        return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+
+
+@staticmethod
+def query_ifc_portfolio(
+    bbox: list = None,
+    bbox_space: str = "wgs84",
+    crs: str = None,
+    georeferenced: bool = None,
+    errors: bool = None,
+    path_prefix: str = None,
+    columns: list = None,
+    limit: int = 1000,
+    offset: int = 0,
+    summary: bool = False,
+    db_path: str = None,
+    timings: bool = False,
+    profile: str = None,
+):
+    """
+    Usage:
+    Queries the portfolio index built by index_ifc_portfolio without opening
+    any IFC file: files whose extent intersects a bounding box, files in a
+    CRS, files that are not georeferenced or failed to index.
+
+    Args:
+        bbox (list): [min_x, min_y, max_x, max_y] (lon/lat with bbox_space="wgs84",
+            eastings/northings with bbox_space="map"; use it with `crs`).
+        bbox_space (str): "wgs84" (default) or "map".
+        crs (str): CRS name or EPSG code of the TargetCRS, e.g. "EPSG:25830" or 25830.
+        georeferenced (bool): True / False to keep only (not) georeferenced files.
+        errors (bool): True for the files that could not be read, False to exclude them.
+        path_prefix (str): Only files under this folder.
+        columns (list): Columns returned per file. Default: all.
+        limit / offset (int): Page of results, ordered by path.
+        summary (bool): Adds file counts (georeferenced, not, failed, per CRS).
+        db_path (str): SQLite database. Default: georef_core.PORTFOLIO_DB_PATH.
+        timings (bool): Adds per-phase timings (query, summary).
+        profile (str): "cprofile" or "tracemalloc" to capture this one call.
+
+    Returns:
+        dict: {"success", "total", "count", "offset", "files": [{...}], "summary", "db_path", "elapsed_ms"}
+    """
+    try:
+        return georef_core.run_instrumented("query_ifc_portfolio", lambda: georef_core.query_portfolio_index(
+            db_path=db_path,
+            bbox=bbox,
+            bbox_space=bbox_space,
+            crs=crs,
+            georeferenced=georeferenced,
+            errors=errors,
+            path_prefix=path_prefix,
+            columns=columns,
+            limit=limit,
+            offset=offset,
+            summary=summary,
+        ), timings=timings, profile=profile)
+    except Exception as e:
+        import traceback
+        return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN tools.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This code snippet must be included within the IFC tools block
+    of the `tool.py` file. It uses `send_georef_command_async` from
+    get_ifc_georeferencing_info.py.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@mcp.tool()
+async def index_ifc_portfolio(
+    roots: list = None,
+    paths: list = None,
+    pattern: str = "*.ifc",
+    db_path: str = None,
+    extent: str = "placements",
+    prune: bool = True,
+    force: bool = False,
+    retry_errors: bool = False,
+    max_workers: int = None,
+    timeout: float = None,
+) -> str:
+    """
+    Builds or refreshes an on-disk index of the georeferencing (CRS,
+    MapConversion, site reference, extent) of every IFC file in a folder
+    tree, so that query_ifc_portfolio can answer "which models are
+    georeferenced, in which CRS, and which ones cover this area" instantly.
+    Only new or changed files are read again.
+
+    Parameters
+    ----------
+    roots : list, optional
+        Folders to index recursively, e.g. ["D:/portfolio"].
+    paths : list, optional
+        Additional IFC files.
+    pattern : str
+        File name pattern (case-insensitive), default "*.ifc".
+    db_path : str, optional
+        SQLite index file (default: next to georef_core.py).
+    extent : str
+        "placements" (bounding box of the element placements, slower) or
+        "origin" (MapConversion origin point only, fast).
+    prune : bool
+        Remove files that disappeared from the folders.
+    force / retry_errors : bool
+        Re-read every file, or the files that failed last time.
+    max_workers : int, optional
+        Number of worker processes.
+    timeout : float, optional
+        Seconds to wait for the answer (default georef_core.COMMAND_TIMEOUT_S).
+
+    Returns
+    -------
+    str (JSON)
+        {"success", "job_id", "files", "to_index", "unchanged", "stale"}. Use
+        `get_georeference_job_status` to follow the indexing.
+    """
+    params = {
+        "roots": list(roots) if roots else None,
+        "paths": list(paths) if paths else None,
+        "pattern": pattern,
+        "db_path": db_path,
+        "extent": extent,
+        "prune": bool(prune),
+        "force": force or None,
+        "retry_errors": retry_errors or None,
+        "max_workers": max_workers,
+    }
+    params = {k: v for k, v in params.items() if v is not None}
+
+    try:
+        result = await send_georef_command_async("index_ifc_portfolio", params, timeout)
+        return json.dumps(result, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.exception("index_ifc_portfolio error")
+        return json.dumps(
+            {"success": False, "error": "Could not start indexing the IFC portfolio.", "details": str(e)},
+            ensure_ascii=False,
+            indent=2,
+        )
+
+
+@mcp.tool()
+async def query_ifc_portfolio(
+    bbox: list = None,
+    bbox_space: str = "wgs84",
+    crs: str = None,
+    georeferenced: bool = None,
+    errors: bool = None,
+    path_prefix: str = None,
+    columns: list = None,
+    limit: int = 1000,
+    offset: int = 0,
+    summary: bool = False,
+    db_path: str = None,
+    format: str = "pretty",
+    timings: bool = False,
+    profile: str = None,
+    timeout: float = None,
+) -> str:
+    """
+    Searches the IFC portfolio index (built with index_ifc_portfolio) without
+    opening any model: the files overlapping an area, the files in a given
+    CRS, or the files that are not georeferenced yet.
+
+    Parameters
+    ----------
+    bbox : list, optional
+        [min_x, min_y, max_x, max_y]: [west, south, east, north] in degrees
+        (bbox_space="wgs84"), or eastings/northings (bbox_space="map", together
+        with crs).
+    crs : str, optional
+        TargetCRS, e.g. "EPSG:25830" or 25830.
+    georeferenced : bool, optional
+        False lists the models that still need georeferencing.
+    errors : bool, optional
+        True lists the files that could not be read.
+    path_prefix : str, optional
+        Restrict to one folder.
+    columns : list, optional
+        Columns per file, e.g. ["path", "crs_name", "eastings", "northings"].
+    limit / offset : int
+        Result page (ordered by path); "total" is the full match count.
+    summary : bool
+        Also return counts of georeferenced / not georeferenced / failed files per CRS.
+    db_path : str, optional
+        SQLite index file.
+    format : str
+        "pretty" (default), "compact" or "binary".
+    timings / profile :
+        Per-phase timings, or a cProfile/tracemalloc capture of the query.
+    timeout : float, optional
+        Seconds to wait for the answer (default georef_core.COMMAND_TIMEOUT_S).
+
+    Returns
+    -------
+    str (JSON)
+        {"success", "total", "count", "files": [{"path", "georeferenced", "crs_name", ...}],
+         "summary", "elapsed_ms"}
+    """
+    params = {
+        "bbox": [float(v) for v in bbox] if bbox else None,
+        "bbox_space": bbox_space,
+        "crs": str(crs) if crs is not None else None,
+        "georeferenced": georeferenced,
+        "errors": errors,
+        "path_prefix": path_prefix,
+        "columns": list(columns) if columns else None,
+        "limit": int(limit),
+        "offset": int(offset or 0),
+        "summary": summary or None,
+        "db_path": db_path,
+        "timings": timings or None,
+        "profile": profile,
+    }
+    params = {k: v for k, v in params.items() if v is not None}
+
+    try:
+        result = await send_georef_command_async("query_ifc_portfolio", params, timeout)
+        return georef_core.encode_response(result, format)
+    except Exception as e:
+        logger.exception("query_ifc_portfolio error")
+        return georef_core.encode_response(
+            {"success": False, "error": "Could not query the IFC portfolio index.", "details": str(e)},
+            format,
+        )
@@ -0,0 +1,151 @@
+"""
+IMPORTANT:
+
+    This file contains code snippets that must be included in the
+    addon.py and tools.py files. On their own, they do not provide
+    any functionality.
+
+    Requires `georef_core.py` (in this folder) next to addon.py and tools.py,
+    and the `import georef_core` lines and `send_georef_command_async` helper from
+    get_ifc_georeferencing_info.py.
+"""
+
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This key-value pair must be included in the `handlers` dictionary
+    inside the `_execute_command_internal` definition.
+"""
+#---------------------------------------------------------------------------------------------------
+
+"run_georeferencing_pipeline": self.run_georeferencing_pipeline,
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This definition must be added inside the `BlenderMCPServer` class,
+    along with the other existing definitions.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@staticmethod
+def run_georeferencing_pipeline(
+    steps: list,
+    stop_on_error: bool = True,
+    path: str = None,
+    timings: bool = False,
+    profile: str = None,
+):
+    """
+    Usage:
+    Runs several georeferencing commands in order within this one command, so
+    they share a single main-thread slot and a single socket round trip.
+
+    Args:
+        steps (list): [{"command": name, "params": {...}}, ...] (or [name, params] pairs).
+            Allowed commands: get_ifc_georeferencing_info, georeference_ifc_model,
+            transform_ifc_coordinates, apply_georeference_plan, get_ifc_model_extent,
+            export_ifc_geojson, fit_ifc_georeference, get_geoid_heights,
+            find_ifc_elements_by_location, export_ifc_mesh.
+        stop_on_error (bool): Skip the remaining steps after the first failure.
+        path (str): IFC file on disk used by the steps that do not set their own `path`.
+        timings (bool): Adds per-step timings ("timings", one phase per command).
+        profile (str): "cprofile" or "tracemalloc" to capture the whole pipeline.
+
+    Returns:
+        dict: {"success", "completed", "total", "stopped_on_error",
+               "results": [{"index", "command", "success", "result"}, ...]}
+    """
+    from bonsai.bim.ifc import IfcStore
+    return georef_core.pipeline_command(
+        IfcStore.get_file,
+        steps,
+        stop_on_error=stop_on_error,
+        path=path,
+        timings=timings,
+        profile=profile,
+    )
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN tools.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This code snippet must be included within the IFC tools block
+    of the `tool.py` file. It uses `send_georef_command_async` from
+    get_ifc_georeferencing_info.py.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@mcp.tool()
+async def run_georeferencing_pipeline(
+    steps: list,
+    stop_on_error: bool = True,
+    path: str = None,
+    format: str = "pretty",
+    timings: bool = False,
+    profile: str = None,
+    timeout: float = None,
+) -> str:
+    """
+    Runs an ordered list of georeferencing commands in one request and returns
+    all their results together, e.g. read the current state, georeference and
+    write, then read it back without three separate round trips:
+
+        steps=[
+            {"command": "get_ifc_georeferencing_info", "params": {"fields": ["georeferenced"]}},
+            {"command": "georeference_ifc_model", "params": {"crs_mode": "epsg", "epsg": 25830,
+                                                             "eastings": 440000, "northings": 4470000,
+                                                             "write_path": "D:/out/model.ifc"}},
+            {"command": "get_ifc_georeferencing_info", "params": {"fields": ["map_conversion", "crs"]}},
+        ]
+
+    Parameters
+    ----------
+    steps : list
+        [{"command", "params"}, ...] with get_ifc_georeferencing_info,
+        georeference_ifc_model, transform_ifc_coordinates, apply_georeference_plan,
+        get_ifc_model_extent, export_ifc_geojson, fit_ifc_georeference,
+        get_geoid_heights, find_ifc_elements_by_location or export_ifc_mesh and
+        the parameters those tools accept (format is not used per step).
+    stop_on_error : bool
+        Stop at the first failing step (the remaining ones are not run).
+    path : str, optional
+        Run the whole pipeline on this IFC file on disk (headless worker, no
+        Blender) unless a step sets its own `path`.
+    format : str
+        "pretty" (default), "compact" or "binary" for the combined response.
+    timings / profile :
+        Per-step timings, or a cProfile/tracemalloc capture of the pipeline.
+    timeout : float, optional
+        Seconds to wait for the answer (default georef_core.COMMAND_TIMEOUT_S).
+
+    Returns
+    -------
+    str (JSON)
+        {"success", "completed", "total", "stopped_on_error",
+         "results": [{"index", "command", "success", "result"}, ...]}
+    """
+    params = {
+        "steps": [dict(step) if isinstance(step, dict) else list(step) for step in (steps or [])],
+        "stop_on_error": bool(stop_on_error),
+        "path": path,
+        "timings": timings or None,
+        "profile": profile,
+    }
+    params = {k: v for k, v in params.items() if v is not None}
+
+    try:
+        result = await send_georef_command_async("run_georeferencing_pipeline", params, timeout)
+        return georef_core.encode_response(result, format)
+    except Exception as e:
+        logger.exception("run_georeferencing_pipeline error")
+        return georef_core.encode_response(
+            {"success": False, "error": "Could not run the georeferencing pipeline.", "details": str(e)},
+            format,
+        )
@@ -0,0 +1,195 @@
+"""
+IMPORTANT:
+
+    This file contains code snippets that must be included in the
+    addon.py and tools.py files. On their own, they do not provide
+    any functionality.
+
+    Requires `georef_core.py` (in this folder) next to addon.py, and the
+    `import georef_core` line from georeference_ifc_model.py.
+"""
+
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This key-value pair must be included in the `handlers` dictionary
+    inside the `_execute_command_internal` definition.
+"""
+#---------------------------------------------------------------------------------------------------
+
+"transform_ifc_coordinates": self.transform_ifc_coordinates,
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN addon.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This definition must be added inside the `BlenderMCPServer` class,
+    along with the other existing definitions.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@staticmethod
+def transform_ifc_coordinates(
+    points: list = None,
+    points_b64: str = None,
+    points_path: str = None,
+    dims: int = 3,
+    source: str = "local",
+    target: str = "map",
+    map_conversion: dict = None,
+    map_crs: str = None,
+    path: str = None,
+    output_format: str = "json",
+    output_path: str = None,
+    timings: bool = False,
+    profile: str = None,
+    snapshot: bool = True,
+):
+    """
+    Usage:
+    Transforms many points at once between the local engineering system of the
+    model, the map (projected CRS) and WGS84, using the model's IfcMapConversion.
+
+    Args:
+        points (list): [[x, y, z], ...] or [[x, y], ...].
+        points_b64 (str): Same points as a base64 packed little-endian float64 buffer.
+        points_path (str): Raw little-endian float64 file (memory-mapped, for millions of points).
+        dims (int): Coordinates per point for points_b64 / points_path (2 or 3).
+        source, target (str): "local", "map" or "wgs84". WGS84 points are [lon, lat(, h)].
+        map_conversion (dict): Optional explicit MapConversion (same keys as
+            get_ifc_georeferencing_info). By default it is read from the model.
+        map_crs (str): Projected CRS for the WGS84 step. Default: the TargetCRS name.
+        path (str): Read the MapConversion from this IFC file on disk instead of the opened model.
+        output_format (str): "json" (points list) or "binary" (points_b64).
+        output_path (str): Write the result as a raw float64 file instead of returning it.
+        timings (bool): Adds per-phase timings (decode, helmert, pyproj_transform, encode).
+        profile (str): "cprofile" or "tracemalloc" to capture this one call.
+        snapshot (bool): Only read by georef_core.SNAPSHOTS.serve on the socket thread,
+            which transforms with the snapshot's MapConversion unless it is False
+            (see get_ifc_georeferencing_info.py); this handler reads the live model.
+    """
+    try:
+        return georef_core.transform_command(
+            IfcStore.get_file,
+            map_conversion=map_conversion,
+            map_crs=map_crs,
+            path=path,
+            timings=timings,
+            profile=profile,
+            points=points,
+            points_b64=points_b64,
+            points_path=points_path,
+            dims=dims,
+            source=source,
+            target=target,
+            output_format=output_format,
+            output_path=output_path,
+        )
+    except Exception as e:
+        import traceback
+        return {"success": False, "error": str(e), "traceback": traceback.format_exc()}
+
+#---------------------------------------------------------------------------------------------------
+# TO INCLUDE IN tools.py
+#---------------------------------------------------------------------------------------------------
+"""
+Note:
+    This code snippet must be included within the IFC tools block
+    of the `tool.py` file.
+"""
+#---------------------------------------------------------------------------------------------------
+
+@mcp.tool()
+async def transform_ifc_coordinates(
+    points: list = None,
+    points_b64: str = None,
+    points_path: str = None,
+    dims: int = 3,
+    source: str = "local",
+    target: str = "map",
+    map_conversion: dict = None,
+    map_crs: str = None,
+    path: str = None,
+    output_format: str = "json",
+    output_path: str = None,
+    timings: bool = False,
+    profile: str = None,
+    snapshot: bool = True,
+    timeout: float = None,
+) -> str:
+    """
+    Transforms point sets in bulk between local model coordinates, map
+    coordinates (IfcMapConversion + projected CRS) and WGS84 lon/lat.
+
+    Parameters
+    ----------
+    points : list, optional
+        [[x, y, z], ...] (or 2D points).
+    points_b64 : str, optional
+        Base64 of a packed little-endian float64 array (N * dims values).
+    points_path : str, optional
+        Raw little-endian float64 file readable by the add-on.
+    dims : int
+        Values per point for points_b64 / points_path (2 or 3).
+    source, target : str
+        "local", "map" or "wgs84" (WGS84 points are [lon, lat, h]).
+    map_conversion : dict, optional
+        Explicit MapConversion; default is the one in the model.
+    map_crs : str, optional
+        Projected CRS for the WGS84 step; default is the model's TargetCRS.
+    path : str, optional
+        IFC file on disk to read the MapConversion from (handled by a headless
+        ifcopenshell worker of the MCP server, without Blender).
+    output_format : str
+        "json" or "binary" (base64 float64 in `points_b64`).
+    output_path : str, optional
+        Write the result to a raw float64 file instead of returning it.
+    timings : bool
+        Adds per-phase timings measured in the add-on.
+    profile : str, optional
+        "cprofile" or "tracemalloc" profile of this one call.
+    snapshot : bool
+        True (default): the add-on transforms with the MapConversion of its
+        read-only snapshot, without waiting for Blender's main thread. False
+        reads it from the live model on the main thread.
+    timeout : float, optional
+        Seconds to wait for the answer (default georef_core.COMMAND_TIMEOUT_S).
+
+    Returns
+    -------
+    str (JSON)
+        {"success", "count", "dims", "source", "target", "points" | "points_b64" | "output_path", ...}
+    """
+    params = {
+        "points": points,
+        "points_b64": points_b64,
+        "points_path": points_path,
+        "dims": dims,
+        "source": source,
+        "target": target,
+        "map_conversion": map_conversion,
+        "map_crs": map_crs,
+        "path": path,
+        "output_format": output_format,
+        "output_path": output_path,
+        "timings": timings or None,
+        "profile": profile,
+        "snapshot": False if not snapshot and not path else None,
+    }
+    params = {k: v for k, v in params.items() if v is not None}
+
+    try:
+        # With `path` this runs in a headless worker instead of Blender
+        result = await send_georef_command_async("transform_ifc_coordinates", params, timeout)
+        return json.dumps(result, ensure_ascii=False, indent=2)
+    except Exception as e:
+        logger.exception("transform_ifc_coordinates error")
+        return json.dumps(
+            {"success": False, "error": "Could not transform the coordinates.", "details": str(e)},
+            ensure_ascii=False,
+            indent=2,
+        )